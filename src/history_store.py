@@ -2,7 +2,13 @@
 历史读写工具（UI 查询/清理/汇总的轻量实现）。
 
 - 写入：透传至 services.history（append_price/append_purchase）。
-- 读取：基于 data/output 下 JSONL 文件进行查询与汇总。
+- 读取：基于 data/output 下 JSONL 文件进行查询与汇总（启用分段时只打开与 since_ts 相交的分段）；
+  走势图可用 `query_price_columns` 直接取列式 numpy 数组（history.columnar）；
+  走势查询可传 max_points 在返回前降采样（均价 LTTB + 桶内最高/最低），绘图点数与时间跨度无关；
+  history.backend 为 "sqlite" 时改为 history.sqlite3 上的索引范围查询。
+- 购买汇总：`purchase_summary*` 读取写入时增量维护的物化汇总（按物品/任务/日期），不扫描购买记录。
+- 导出：`iter_history` 逐条读取原始价格/购买记录，`export_history_csv` 流式写出 CSV（可选 gzip），
+  内存占用与记录数无关。
 
 默认输出目录解析顺序：
 1) 环境变量 ARENA_BUYER_OUTPUT_DIR；
@@ -12,20 +18,116 @@
 
 from __future__ import annotations
 
+from bisect import bisect_left, bisect_right
+from heapq import merge as _heap_merge
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import csv
+import gzip
 import json
 import os
+import threading
 import time
 
+from super_buyer.services import history_rollup as _rollup
+from super_buyer.services.history_columnar import (
+    PriceColumns,
+    bucket_columns as _bucket_columns,
+    columnar_available as _columnar_available,
+    downsample_columns as _downsample_columns,
+    extend_array as _extend_array,
+    get_columnar_store as _get_columnar_store,
+    records_to_array as _records_to_array,
+)
 from super_buyer.services.history import (
     HistoryPaths,
     append_price as _append_price,
     append_purchase as _append_purchase,
+    close_history_handles as _close_history_handles,
+    flush_history_writer as _flush_history_writer,
+    history_backend as _history_backend,
+    history_columnar as _history_columnar,
+    history_sources as _history_sources,
+    history_write_lock as _history_write_lock,
+    open_history_db as _open_history_db,
+    pending_minute_ts as _pending_minute_ts,
+    purchase_aggregates as _purchase_aggregates,
     resolve_paths as _resolve_paths,
 )
+from super_buyer.services.history_purchase_agg import (
+    finish_bucket as _finish_bucket,
+    get_purchase_aggregates as _get_purchase_aggregates,
+)
+from super_buyer.services.history_tombstones import get_tombstones as _get_tombstones
+
+# 增量读取：记录已解析到的字节偏移，文件增长时只解析新增的完整行
+_HEAD_PROBE_BYTES = 256
+_READ_CHUNK_BYTES = 4 * 1024 * 1024
+
+# 走势图默认目标点数（约为图表绘图区宽度的像素数）
+CHART_MAX_POINTS = 600
+
+
+@dataclass
+class _JsonlCacheEntry:
+    records: List[Dict[str, Any]] = field(default_factory=list)
+    offset: int = 0
+    mtime_ns: int = 0
+    # 文件标识：临时文件 + 原子替换（裁剪/墓碑清理）后变化
+    ino: int = 0
+    # 文件开头若干字节：增长时比对，不一致说明文件被重写
+    head: bytes = b""
+    # 物品时间索引：item_id → 按 ts 有序的 (ts, 记录下标)，随新增记录增量维护
+    index: Dict[str, "_ItemIndex"] = field(default_factory=dict)
+    indexed: int = 0
+
+
+@dataclass
+class _ItemIndex:
+    ts: List[float] = field(default_factory=list)
+    rows: List[int] = field(default_factory=list)
+
+    def add(self, ts: float, row: int) -> None:
+        if not self.ts or ts >= self.ts[-1]:
+            self.ts.append(ts)
+            self.rows.append(row)
+            return
+        # 乱序写入（如多进程追加）：保持有序，同一时间戳按写入顺序
+        pos = bisect_right(self.ts, ts)
+        self.ts.insert(pos, ts)
+        self.rows.insert(pos, row)
+
+
+class RecordsView(Sequence):
+    """缓存记录的只读快照（仅包含创建时已解析的前 n 条，不复制列表）。"""
+
+    __slots__ = ("_records", "_n")
+
+    def __init__(self, records: List[Dict[str, Any]], n: int) -> None:
+        self._records = records
+        self._n = n
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __getitem__(self, idx):  # type: ignore[override]
+        if isinstance(idx, slice):
+            return self._records[: self._n][idx]
+        if idx < 0:
+            idx += self._n
+        if not 0 <= idx < self._n:
+            raise IndexError(idx)
+        return self._records[idx]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        records = self._records
+        for i in range(self._n):
+            yield records[i]
+
 
-_JSONL_CACHE: Dict[str, tuple[int, int, List[Dict[str, Any]]]] = {}
+_JSONL_CACHE: Dict[str, _JsonlCacheEntry] = {}
+_JSONL_LOCK = threading.Lock()
 
 
 def _base_dir() -> Path:
@@ -57,6 +159,13 @@ def _paths() -> HistoryPaths:
     return _resolve_paths(_base_dir())
 
 
+def _sqlite_db():
+    """当前后端为 SQLite 时返回历史库，否则返回 None。"""
+    if _history_backend() != "sqlite":
+        return None
+    return _open_history_db(_paths())
+
+
 def _cache_key(path: Path) -> str:
     try:
         return str(path.resolve())
@@ -103,35 +212,126 @@ def _empty_purchase_summary() -> Dict[str, int]:
     }
 
 
-def _read_jsonl(path: Path) -> List[Dict[str, Any]]:
-    if not path.exists():
-        _invalidate_jsonl_cache(path)
-        return []
-    try:
-        stat = path.stat()
-        sig = (int(stat.st_mtime_ns), int(stat.st_size))
-    except Exception:
-        sig = None
-    cache_key = _cache_key(path)
-    cached = _JSONL_CACHE.get(cache_key)
-    if sig is not None and cached is not None and cached[:2] == sig:
-        return list(cached[2])
-    out: List[Dict[str, Any]] = []
+def _parse_jsonl_bytes(data: bytes, out: List[Dict[str, Any]]) -> None:
+    for line in data.split(b"\n"):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            out.append(json.loads(line))
+        except Exception:
+            continue
+
+
+def _read_head(path: Path) -> bytes:
+    with path.open("rb") as f:
+        return f.read(_HEAD_PROBE_BYTES)
+
+
+def _tail_parse(path: Path, entry: _JsonlCacheEntry, size: int) -> None:
+    """从 entry.offset 解析到文件末尾的完整行；末尾不完整的行留待下次。"""
+    with path.open("rb") as f:
+        f.seek(entry.offset)
+        pending = b""
+        remaining = size - entry.offset
+        while remaining > 0:
+            chunk = f.read(min(_READ_CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            buf = pending + chunk
+            cut = buf.rfind(b"\n")
+            if cut < 0:
+                pending = buf
+                continue
+            _parse_jsonl_bytes(buf[: cut + 1], entry.records)
+            entry.offset += len(buf[: cut + 1])
+            pending = buf[cut + 1 :]
+
+
+def _record_ts(record: Dict[str, Any]) -> float:
     try:
-        with path.open("r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    out.append(json.loads(line))
-                except Exception:
-                    continue
+        return float(record.get("ts", record.get("ts_min", 0.0)) or 0.0)
     except Exception:
+        return 0.0
+
+
+def _extend_index(entry: _JsonlCacheEntry) -> None:
+    records = entry.records
+    for row in range(entry.indexed, len(records)):
+        rec = records[row]
+        try:
+            item_id = str(rec.get("item_id", ""))
+        except Exception:
+            continue
+        idx = entry.index.get(item_id)
+        if idx is None:
+            idx = entry.index[item_id] = _ItemIndex()
+        idx.add(_record_ts(rec), row)
+    entry.indexed = len(records)
+
+
+def _records_for_item(path: Path, item_id: str, since_ts: float) -> List[Dict[str, Any]]:
+    """按物品时间索引取 ts >= since_ts 的记录（按 ts 升序），O(log n + k)。"""
+    _read_jsonl(path)
+    with _JSONL_LOCK:
+        entry = _JSONL_CACHE.get(_cache_key(path))
+        if entry is None:
+            return []
+        _extend_index(entry)
+        idx = entry.index.get(str(item_id))
+        if idx is None:
+            return []
+        start = bisect_left(idx.ts, float(since_ts))
+        records = entry.records
+        return [records[row] for row in idx.rows[start:]]
+
+
+def _visible_since(kind: str, item_id: str, since_ts: float) -> float:
+    """考虑删除墓碑后的查询起点（被清空的记录 ts <= cutoff）。"""
+    return _get_tombstones(_paths().base_dir).visible_since(kind, item_id, since_ts)
+
+
+def _records_since(kind: str, item_id: str, since_ts: float) -> List[Dict[str, Any]]:
+    """kind 对应的所有相交文件（旧版单文件 + 分段）中该物品 ts >= since_ts 且未被清空的记录，按 ts 升序。"""
+    since_ts = _visible_since(kind, item_id, since_ts)
+    parts = [_records_for_item(p, item_id, since_ts) for p in _history_sources(_paths(), kind, since_ts)]
+    parts = [part for part in parts if part]
+    if not parts:
         return []
-    if sig is not None:
-        _JSONL_CACHE[cache_key] = (sig[0], sig[1], out)
-    return out
+    if len(parts) == 1:
+        return parts[0]
+    return list(_heap_merge(*parts, key=_record_ts))
+
+
+def _read_jsonl(path: Path) -> Sequence[Dict[str, Any]]:
+    """读取 JSONL 并增量缓存；返回只读快照视图。
+
+    文件增长时只解析新增部分；文件被替换、变短或开头内容变化（被重写）时全量重新解析。
+    """
+    if not path.exists():
+        _invalidate_jsonl_cache(path)
+        return RecordsView([], 0)
+    cache_key = _cache_key(path)
+    with _JSONL_LOCK:
+        try:
+            stat = path.stat()
+            size, mtime_ns, ino = int(stat.st_size), int(stat.st_mtime_ns), int(stat.st_ino)
+            entry = _JSONL_CACHE.get(cache_key)
+            if entry is not None and size == entry.offset and mtime_ns == entry.mtime_ns and ino == entry.ino:
+                return RecordsView(entry.records, len(entry.records))
+            head = _read_head(path)
+            if entry is None or ino != entry.ino or size < entry.offset or head[: len(entry.head)] != entry.head:
+                entry = _JsonlCacheEntry()
+            _tail_parse(path, entry, size)
+            entry.mtime_ns = mtime_ns
+            entry.ino = ino
+            entry.head = head
+            _JSONL_CACHE[cache_key] = entry
+            return RecordsView(entry.records, len(entry.records))
+        except Exception:
+            _JSONL_CACHE.pop(cache_key, None)
+            return RecordsView([], 0)
 
 
 # ---------- 写入（供 MultiSnipe/Runner 复用） ----------
@@ -165,18 +365,33 @@ def append_purchase(*, item_id: str, item_name: str, price: int, qty: int, task_
 # ---------- 读取（UI 查询） ----------
 
 def query_price(item_id: str, since_ts: float) -> List[Dict[str, Any]]:
-    p = _paths().price_file
-    arr = _read_jsonl(p)
-    since = _to_float(since_ts)
-    out = [r for r in arr if str(r.get("item_id", "")) == str(item_id) and _to_float(r.get("ts", 0.0)) >= since]
-    out.sort(key=lambda r: float(r.get("ts", 0.0)))
-    return out
+    db = _sqlite_db()
+    if db is not None:
+        return db.query_price(str(item_id), _to_float(since_ts))
+    return _records_since("price", str(item_id), _to_float(since_ts))
+
+
+def _merge_minute_records(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        ca = max(1, int(a.get("count", 1) or 1))
+        cb = max(1, int(b.get("count", 1) or 1))
+        merged = dict(a)
+        merged["min"] = min(int(a.get("min", a["avg"])), int(b.get("min", b["avg"])))
+        merged["max"] = max(int(a.get("max", a["avg"])), int(b.get("max", b["avg"])))
+        merged["avg"] = int(round((int(a["avg"]) * ca + int(b["avg"]) * cb) / (ca + cb)))
+        merged["count"] = ca + cb
+        return merged
+    except Exception:
+        return b
 
 
 def query_price_minutely(item_id: str, since_ts: float) -> List[Dict[str, Any]]:
-    paths = _paths()
-    arr = _read_jsonl(paths.price_minutely_file)
+    db = _sqlite_db()
+    if db is not None:
+        # 分钟桶在写入时即 UPSERT，当前分钟无需再由原始记录补齐
+        return db.query_price_minutely(str(item_id), _to_float(since_ts))
     since = _to_float(since_ts)
+    arr = _records_since("price_minutely", str(item_id), since)
 
     def _normalize_minutely_record(record: Dict[str, Any]) -> Dict[str, Any] | None:
         """统一分钟聚合记录的时间字段，兼容旧的 ts/ts_min 读法。"""
@@ -199,10 +414,13 @@ def query_price_minutely(item_id: str, since_ts: float) -> List[Dict[str, Any]]:
         normalized = _normalize_minutely_record(record)
         if normalized is None:
             continue
-        out_by_minute[int(float(normalized.get("ts", 0.0)))] = normalized
+        key = int(float(normalized.get("ts", 0.0)))
+        prev = out_by_minute.get(key)
+        # 同一分钟可能有多条记录（共享输出时转交样本补记、租约易主），按条数合并
+        out_by_minute[key] = normalized if prev is None else _merge_minute_records(prev, normalized)
 
     # 用原始价格记录补齐“当前分钟尚未 flush”或旧数据缺少分钟聚合的情况。
-    raw_arr = _read_jsonl(paths.price_file)
+    raw_arr = _records_since("price", str(item_id), since)
     raw_buckets: Dict[int, Dict[str, Any]] = {}
     for record in raw_arr:
         try:
@@ -261,15 +479,145 @@ def query_price_minutely(item_id: str, since_ts: float) -> List[Dict[str, Any]]:
     return out
 
 
-def query_purchase(item_id: str, since_ts: float) -> List[Dict[str, Any]]:
-    p = _paths().purchase_file
-    arr = _read_jsonl(p)
+def query_price_series(
+    item_id: str, since_ts: float, *, now: Optional[float] = None, max_points: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """价格走势：按时间跨度选择分钟/小时/天层级（记录含 tier 字段，字段同分钟聚合）。
+
+    max_points 为正时降采样到最多该点数（见 `query_price_columns`）；缺少 numpy 时按相邻记录等分合并。
+    """
     since = _to_float(since_ts)
-    out = [r for r in arr if str(r.get("item_id", "")) == str(item_id) and _to_float(r.get("ts", 0.0)) >= since]
-    out.sort(key=lambda r: float(r.get("ts", 0.0)))
+    tier = _rollup.choose_tier(since, now)
+    series = _price_series(str(item_id), since, tier)
+    if not max_points or len(series) <= int(max_points):
+        return series
+    if _columnar_available():
+        cols = _downsample_columns(PriceColumns.from_records(series, tier), int(max_points))
+        return cols.to_records(str(item_id))
+    return _downsample_records(series, int(max_points))
+
+
+def _downsample_records(series: List[Dict[str, Any]], max_points: int) -> List[Dict[str, Any]]:
+    """无 numpy 时的降采样：相邻记录等分成 max_points 组，口径同 rebucket（ts 取组内首条）。"""
+    n = len(series)
+    out: List[Dict[str, Any]] = []
+    for g in range(max_points):
+        group = series[g * n // max_points : (g + 1) * n // max_points]
+        if not group:
+            continue
+        count = sum(max(1, _to_int(r.get("count", 1), 1)) for r in group)
+        total = sum(_to_int(r.get("avg", 0)) * max(1, _to_int(r.get("count", 1), 1)) for r in group)
+        out.append(
+            dict(
+                group[0],
+                min=min(_to_int(r.get("min", 0)) for r in group),
+                max=max(_to_int(r.get("max", 0)) for r in group),
+                avg=int(round(total / count)),
+                count=count,
+            )
+        )
     return out
 
 
+def _price_series(item_id: str, since: float, tier: str) -> List[Dict[str, Any]]:
+    if tier == "minute":
+        return [dict(r, tier="minute") for r in query_price_minutely(item_id, since)]
+    db = _sqlite_db()
+    if db is not None:
+        rolled = db.query_price_rolled(item_id, since, tier)
+    else:
+        paths = _paths()
+        rolled_file = paths.price_hourly_file if tier == "hour" else paths.price_daily_file
+        rolled = _records_for_item(rolled_file, item_id, _visible_since("price", item_id, since))
+    # 水位线之后尚未汇总的部分由更细一层临时合并
+    finer = "minute" if tier == "hour" else "hour"
+    return _rollup.merge_tier(rolled, lambda start: _price_series(item_id, start, finer), tier, since)
+
+
+def query_price_columns(
+    item_id: str, since_ts: float, *, now: Optional[float] = None, max_points: Optional[int] = None
+) -> Optional[PriceColumns]:
+    """价格走势的列式版本（ts/min/max/avg/count 的 numpy 数组，层级同 query_price_series）。
+
+    启用 history.columnar 时已汇总部分直接取内存映射数组，只有末尾未汇总的部分临时计算；
+    未启用时由字典记录转换。缺少 numpy 时返回 None。
+    max_points 为正时降采样到最多该点数：均价线用 LTTB 选点，min/max 为桶内极值（见 downsample_columns）。
+    """
+    if not _columnar_available():
+        return None
+    since = _to_float(since_ts)
+    tier = _rollup.choose_tier(since, now)
+    if not _history_columnar():
+        cols = PriceColumns.from_records(_price_series(str(item_id), since, tier), tier)
+    else:
+        cols = _price_columns(str(item_id), since, tier)
+    if max_points:
+        cols = _downsample_columns(cols, int(max_points))
+    return cols
+
+
+def _price_columns(item_id: str, since: float, tier: str) -> PriceColumns:
+    paths = _paths()
+    store = _get_columnar_store(paths.columns_dir)
+    if not store.exists(tier, item_id):
+        _backfill_columns(paths, item_id, tier)
+    stored = store.load(tier, item_id, _visible_since("price", item_id, since))
+    fill_from = since
+    if len(stored):
+        last = float(stored.ts[-1])
+        fill_from = max(since, _rollup.bucket_start(last + _rollup.TIER_SECONDS[tier] * 1.5, tier))
+    if tier == "minute":
+        tail = PriceColumns.from_records(query_price_minutely(item_id, fill_from), tier)
+    else:
+        # 未汇总的尾部只有最近一两个桶，逐点取桶起点即可
+        finer = _price_columns(item_id, fill_from, "minute" if tier == "hour" else "hour")
+        tail = _bucket_columns(finer, [_rollup.bucket_start(t, tier) for t in finer.ts.tolist()], tier)
+    return PriceColumns.concat([stored, tail], tier)
+
+
+def _backfill_records(paths: HistoryPaths, item_id: str, tier: str, since: float) -> List[Dict[str, Any]]:
+    if tier == "minute":
+        recs = query_price_minutely(item_id, since)
+        # 仍在内存聚合的分钟之后会由落盘追加，此处不写入
+        open_ts = _pending_minute_ts(item_id)
+        if open_ts is not None:
+            recs = [r for r in recs if _record_ts(r) < open_ts]
+        return recs
+    rolled = paths.price_hourly_file if tier == "hour" else paths.price_daily_file
+    return _records_for_item(rolled, item_id, since)
+
+
+def _backfill_columns(paths: HistoryPaths, item_id: str, tier: str) -> None:
+    """首次查询时由 JSONL 整体回填该物品的列式文件。
+
+    全量解析与建数组在锁外进行；只在最后持写锁补上期间新落盘的尾部并原子替换文件，
+    期间的追加因文件尚不存在而跳过（`ColumnarPriceStore.append` 不自动创建）。
+    """
+    store = _get_columnar_store(paths.columns_dir)
+    if store.exists(tier, item_id):
+        return
+    # 写后线程缓冲中的行先落盘
+    _flush_history_writer()
+    with _history_write_lock(paths):
+        _close_history_handles()
+    recs = _backfill_records(paths, item_id, tier, 0.0)
+    last_ts = max((_record_ts(r) for r in recs), default=0.0)
+    arr = _records_to_array(recs)
+    with _history_write_lock(paths):
+        if store.exists(tier, item_id):
+            return
+        _close_history_handles()
+        tail = [r for r in _backfill_records(paths, item_id, tier, last_ts) if _record_ts(r) > last_ts]
+        store.rewrite(tier, item_id, _extend_array(arr, tail))
+
+
+def query_purchase(item_id: str, since_ts: float) -> List[Dict[str, Any]]:
+    db = _sqlite_db()
+    if db is not None:
+        return db.query_purchase(str(item_id), _to_float(since_ts))
+    return _records_since("purchase", str(item_id), _to_float(since_ts))
+
+
 def summarize_prices(recs: Iterable[Dict[str, Any]]) -> Dict[str, int]:
     summary = _empty_price_summary()
     total = 0
@@ -298,35 +646,15 @@ def summarize_prices_by_item(item_ids: Iterable[str], since_ts: float) -> Dict[s
     summaries = {item_id: _empty_price_summary() for item_id in ids}
     if not ids:
         return summaries
+    db = _sqlite_db()
+    if db is not None:
+        summaries.update(db.summarize_prices_by_item(ids, _to_float(since_ts)))
+        return summaries
 
-    totals = {item_id: 0 for item_id in ids}
-    latest_ts = {item_id: 0.0 for item_id in ids}
+    # 逐物品走时间索引，只触及目标物品的记录
     since = _to_float(since_ts)
-
-    for r in _read_jsonl(_paths().price_file):
-        item_id = str(r.get("item_id", ""))
-        if item_id not in ids:
-            continue
-        ts = _to_float(r.get("ts", 0.0))
-        if ts < since:
-            continue
-        price = _to_int(r.get("price", 0))
-        if price <= 0:
-            continue
-        summary = summaries[item_id]
-        summary["count"] += 1
-        totals[item_id] += price
-        if summary["min_price"] <= 0 or price < summary["min_price"]:
-            summary["min_price"] = price
-        if price > summary["max_price"]:
-            summary["max_price"] = price
-        if summary["latest_price"] <= 0 or ts >= latest_ts[item_id]:
-            latest_ts[item_id] = ts
-            summary["latest_price"] = price
-
-    for item_id, summary in summaries.items():
-        if summary["count"] > 0:
-            summary["avg_price"] = int(round(totals[item_id] / summary["count"]))
+    for item_id in ids:
+        summaries[item_id] = summarize_prices(_records_since("price", item_id, since))
     return summaries
 
 
@@ -352,38 +680,233 @@ def summarize_purchases(recs: Iterable[Dict[str, Any]]) -> Dict[str, int]:
     return summary
 
 
-# ---------- 清理（UI 操作） ----------
+# ---------- 购买汇总（物化） ----------
+
+def _agg_row_summary(row: Dict[str, Any]) -> Dict[str, Any]:
+    return _finish_bucket(
+        [row["count"], row["quantity"], row["total_amount"], row["min_price"], row["max_price"], row["used_max"]]
+    )
+
+
+def purchase_summary(item_id: str) -> Dict[str, Any]:
+    """物品全部购买记录的汇总：summarize_purchases 的字段 + used_max（使用最高价次数）/used_max_ratio。"""
+    db = _sqlite_db()
+    if db is not None:
+        rows = db.query_purchase_agg("item", str(item_id))
+        return _agg_row_summary(rows[0]) if rows else _finish_bucket([0, 0, 0, 0, 0, 0])
+    return _purchase_aggregates(_paths()).item(str(item_id))
+
+
+def purchase_summaries() -> Dict[str, Dict[str, Any]]:
+    """所有有购买记录的物品：item_id → 汇总（含 item_name）。"""
+    db = _sqlite_db()
+    if db is not None:
+        return {r["item_id"]: dict(_agg_row_summary(r), item_name=r["item_name"]) for r in db.query_purchase_agg("item")}
+    return _purchase_aggregates(_paths()).items()
+
+
+def purchase_summary_by_task(item_id: str) -> Dict[str, Dict[str, Any]]:
+    """按任务（任务名，缺省 "-"）汇总物品的购买记录。"""
+    db = _sqlite_db()
+    if db is not None:
+        return {r["key"]: _agg_row_summary(r) for r in db.query_purchase_agg("task", str(item_id))}
+    return _purchase_aggregates(_paths()).by_task(str(item_id))
+
+
+def purchase_summary_by_day(item_id: str, since_ts: float = 0.0) -> List[Dict[str, Any]]:
+    """按本地日期汇总（日期升序，记录含 day 字段）；since_ts 所在日期及之后。"""
+    since = _to_float(since_ts)
+    db = _sqlite_db()
+    if db is not None:
+        since_key = time.strftime("%Y-%m-%d", time.localtime(since)) if since > 0 else ""
+        return [dict(_agg_row_summary(r), day=r["key"]) for r in db.query_purchase_agg("day", str(item_id), since_key)]
+    return _purchase_aggregates(_paths()).by_day(str(item_id), since)
 
-def _rewrite_jsonl(path: Path, keep: List[Dict[str, Any]]) -> int:
+
+# ---------- 流式导出 ----------
+
+PURCHASE_CSV_HEADER = ["时间", "任务", "单价", "数量", "总价"]
+PRICE_CSV_HEADER = ["时间", "价格"]
+# 导出全部物品时在行首追加的列
+ITEM_CSV_HEADER = ["物品ID", "物品"]
+_EXPORT_PROGRESS_ROWS = 5000
+
+
+def iter_history(
+    kind: str, item_id: Optional[str] = None, since_ts: float = 0.0, until_ts: Optional[float] = None
+) -> Iterator[Dict[str, Any]]:
+    """逐条读取原始价格（kind="price"）或购买记录（kind="purchase"），ts 属于 [since_ts, until_ts)。
+
+    item_id 为 None 时读取全部物品。JSONL 按来源文件顺序逐行读取（大致按时间），SQLite 按时间升序；
+    墓碑隐藏的记录不返回。不缓存、不排序，内存占用与记录数无关。
+    """
+    for rec, _fraction in _iter_history(kind, item_id, since_ts, until_ts):
+        yield rec
+
+
+def _iter_history(
+    kind: str, item_id: Optional[str], since_ts: float, until_ts: Optional[float]
+) -> Iterator[Tuple[Dict[str, Any], Optional[float]]]:
+    """同 iter_history，附带已读取比例（0~1，未知时为 None）。"""
+    kind = "purchase" if kind == "purchase" else "price"
+    item = None if item_id is None else str(item_id)
+    since = _to_float(since_ts)
+    until = None if until_ts is None else _to_float(until_ts)
+    # 写后队列中尚未写入的记录先写完（句柄关闭只会落盘已写入缓冲的行）
+    _flush_history_writer()
+    db = _sqlite_db()
+    if db is not None:
+        total = db.count_events(kind, item, since, until)
+        for i, rec in enumerate(db.iter_events(kind, item, since, until), 1):
+            yield rec, (min(1.0, i / total) if total else None)
+        return
+    paths = _paths()
+    # 写后线程缓冲中的行先落盘
+    with _history_write_lock():
+        _close_history_handles()
+    sources = _history_sources(paths, kind, since)
+    sizes: List[int] = []
+    for p in sources:
+        try:
+            sizes.append(int(p.stat().st_size))
+        except OSError:
+            sizes.append(0)
+    total = max(1, sum(sizes))
+    hidden = _get_tombstones(paths.base_dir).snapshot(kind)
+    # 逐行先做字节级匹配，只解析目标物品的行
+    needle = None if item is None else json.dumps(item, ensure_ascii=False).encode("utf-8")
+    done = 0
+    for path in sources:
+        try:
+            fh = path.open("rb")
+        except OSError:
+            continue
+        with fh:
+            for line in fh:
+                done += len(line)
+                if needle is not None and needle not in line:
+                    continue
+                try:
+                    rec = json.loads(line)
+                except Exception:
+                    continue
+                if not isinstance(rec, dict):
+                    continue
+                rec_item = str(rec.get("item_id", ""))
+                if item is not None and rec_item != item:
+                    continue
+                ts = _record_ts(rec)
+                if ts < since or (until is not None and ts >= until):
+                    continue
+                cutoff = hidden.get(rec_item)
+                if cutoff is not None and ts <= cutoff:
+                    continue
+                yield rec, min(1.0, done / total)
+
+
+def _csv_row(kind: str, rec: Dict[str, Any], with_item: bool) -> List[Any]:
+    ts = _record_ts(rec)
+    iso = str(rec.get("iso") or time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts)))
+    if kind == "purchase":
+        price = _to_int(rec.get("price", 0))
+        qty = _to_int(rec.get("qty", 0))
+        row: List[Any] = [iso, str(rec.get("task_name", "") or "-"), price, qty, _to_int(rec.get("amount", price * qty))]
+    else:
+        row = [iso, _to_int(rec.get("price", 0))]
+    if with_item:
+        row[:0] = [str(rec.get("item_id", "")), str(rec.get("item_name", ""))]
+    return row
+
+
+def export_history_csv(
+    path: Path | str,
+    kind: str,
+    item_id: Optional[str] = None,
+    since_ts: float = 0.0,
+    until_ts: Optional[float] = None,
+    *,
+    compress: Optional[bool] = None,
+    progress: Optional[Callable[[int, Optional[float]], None]] = None,
+    cancel: Optional[Callable[[], bool]] = None,
+) -> int:
+    """流式导出价格/购买记录为 CSV（utf-8-sig），返回写入的数据行数；取消时返回 -1。
+
+    - 记录经 `iter_history` 逐条读取、逐行写入，可在后台线程调用；
+    - compress 为 None 时按扩展名 .gz 决定是否 gzip 压缩；
+    - 先写同目录临时文件，完成后原子替换；cancel() 为真时中止并删除临时文件；
+    - progress(rows, fraction) 每 5000 行及结束时调用，fraction 为已读取比例（未知时为 None）。
+    """
+    kind = "purchase" if kind == "purchase" else "price"
+    target = Path(path)
+    if compress is None:
+        compress = target.suffix.lower() == ".gz"
+    with_item = item_id is None
+    header = PURCHASE_CSV_HEADER if kind == "purchase" else PRICE_CSV_HEADER
+    tmp = target.with_name(target.name + ".part")
+    rows = 0
     try:
-        with path.open("w", encoding="utf-8") as f:
-            for r in keep:
-                f.write(json.dumps(r, ensure_ascii=False) + "\n")
-        _invalidate_jsonl_cache(path)
-        return 0
-    except Exception:
-        _invalidate_jsonl_cache(path)
+        if compress:
+            fh = gzip.open(tmp, "wt", encoding="utf-8-sig", newline="")
+        else:
+            fh = open(tmp, "w", encoding="utf-8-sig", newline="")
+        with fh:
+            writer = csv.writer(fh)
+            writer.writerow((ITEM_CSV_HEADER if with_item else []) + header)
+            for rec, fraction in _iter_history(kind, item_id, since_ts, until_ts):
+                writer.writerow(_csv_row(kind, rec, with_item))
+                rows += 1
+                if rows % _EXPORT_PROGRESS_ROWS == 0:
+                    if cancel is not None and cancel():
+                        raise _ExportCancelled()
+                    if progress is not None:
+                        progress(rows, fraction)
+        os.replace(tmp, target)
+    except _ExportCancelled:
+        _unlink_quiet(tmp)
         return -1
+    except BaseException:
+        _unlink_quiet(tmp)
+        raise
+    if progress is not None:
+        progress(rows, 1.0)
+    return rows
+
+
+class _ExportCancelled(Exception):
+    pass
 
 
+def _unlink_quiet(path: Path) -> None:
+    try:
+        path.unlink()
+    except OSError:
+        pass
+
+
+# ---------- 清理（UI 操作） ----------
+
 def clear_price_history(item_id: str) -> int:
-    p = _paths().price_file
-    arr = _read_jsonl(p)
-    keep = [r for r in arr if str(r.get("item_id", "")) != str(item_id)]
-    removed = len(arr) - len(keep)
-    _rewrite_jsonl(p, keep)
-    # 同时清理聚合文件中对应 item_id 的记录
-    pm = _paths().price_minutely_file
-    marr = _read_jsonl(pm)
-    mkeep = [r for r in marr if str(r.get("item_id", "")) != str(item_id)]
-    _rewrite_jsonl(pm, mkeep)
-    return removed
+    """清空物品的价格历史（含分钟/小时/天聚合）。
+
+    SQLite 后端直接删除并返回删除条数；JSONL 后端只记录删除墓碑（O(1)，不阻塞写入方），
+    读取立即生效，物理删除由后台压缩线程完成，返回 -1。
+    """
+    db = _sqlite_db()
+    if db is not None:
+        return db.clear_price_history(str(item_id))
+    paths = _paths()
+    with _history_write_lock(paths):
+        _get_tombstones(paths.base_dir).add("price", str(item_id), time.time())
+    return -1
 
 
 def clear_purchase_history(item_id: str) -> int:
-    p = _paths().purchase_file
-    arr = _read_jsonl(p)
-    keep = [r for r in arr if str(r.get("item_id", "")) != str(item_id)]
-    removed = len(arr) - len(keep)
-    _rewrite_jsonl(p, keep)
-    return removed
+    """清空物品的购买记录；返回值约定同 clear_price_history。"""
+    db = _sqlite_db()
+    if db is not None:
+        return db.clear_purchase_history(str(item_id))
+    paths = _paths()
+    with _history_write_lock(paths):
+        _get_tombstones(paths.base_dir).add("purchase", str(item_id), time.time())
+        _get_purchase_aggregates(paths.base_dir).remove_item(str(item_id))
+    return -1
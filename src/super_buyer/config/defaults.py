@@ -44,6 +44,7 @@ DEFAULT_MULTI_SNIPE_TUNING: Dict[str, Any] = {
     "fast_chain_max": 10,
     "fast_chain_interval_ms": 35.0,
     "relocate_after_fail": 3,
+    "speculative_ocr": True,
 }
 
 
@@ -59,14 +60,85 @@ DEFAULT_CONFIG: Dict[str, Any] = {
         "auto_start": True,
         "startup_wait_sec": 20.0,
         "exe_path": "",
+        # 多实例：instances=K 时在 base_url 端口上连续分配 K 个端口；
+        # base_urls 非空时直接使用；额外托管实例需在 exe_paths 中按顺序配置独立安装目录
+        "instances": 1,
+        "base_urls": [],
+        "exe_paths": [],
+        # 启动后预热：合成纯数字 ROI 识别若干轮，直到延迟稳定
+        "warmup_enabled": True,
+        "warmup_max_rounds": 8,
+        "warmup_min_rounds": 3,
+        "warmup_stable_ratio": 0.25,
+        "warmup_first_timeout_sec": 30.0,
+        # Runner 在步骤 1 前等待托管 OCR 就绪的最长时间
+        "ready_wait_sec": 60.0,
+        # 自适应超时：样本足够后每次请求超时取 p99 × 系数，限制在 [floor, min(ceiling, timeout_sec)]
+        "adaptive_timeout": True,
+        "timeout_floor_sec": 1.5,
+        "timeout_ceiling_sec": 0.0,
+        "timeout_p99_factor": 2.0,
+        "timeout_min_samples": 20,
+        # 熔断：连续失败 N 次后冷却期内直接失败，并重启本应用托管的实例
+        "breaker_enabled": True,
+        "breaker_failures": 3,
+        "breaker_cooldown_sec": 5.0,
+        "breaker_restart": True,
+        # 冷请求（实例首个请求、引擎启动参数变化或重启后）的超时下限；冷请求失败不计入熔断
+        "cold_timeout_sec": 15.0,
         "options": {
             "data.format": "text",
         },
+        # 按 ROI 类型覆盖识别参数（price/quantity/name），未配置的键使用
+        # services.ocr.DEFAULT_OCR_PROFILES 的内置值；引擎启动参数（ocr.cls/ocr.limit_side_len 等）
+        # 只在 options 中生效，档位间切换不会触发引擎重启
+        "profiles": {},
     },
     "ocr_allowlist": "0123456789KkMm",
     "paths": {
         "output_dir": "output",
     },
+    "history": {
+        # 历史存储后端："jsonl"（追加写 JSONL）或 "sqlite"（output/history.sqlite3）
+        "backend": "jsonl",
+        # 启用 sqlite 后首次打开时导入已有 JSONL（每个文件仅导入一次，原文件保留）
+        "import_jsonl": True,
+        # JSONL 分段："day"/"hour" 按记录时间写入 history_segments/ 下的分段文件，查询只读相交分段；"none" 为旧版单文件
+        "partition": "day",
+        # 列式走势存储：分钟/小时/天聚合另存为定长二进制（history_columns/），走势图以内存映射数组读取
+        "columnar": True,
+        # 多个进程（多开）共用同一输出目录：JSONL 追加/改写加跨进程文件锁并附带写入者序号，
+        # 分钟聚合由持有租约（秒）的进程负责，其余进程把样本转交持有者。
+        # 每条记录都要加锁并重新打开文件，购买汇总改为从文件尾部补齐，单进程时保持关闭
+        "shared_output": False,
+        "owner_lease_sec": 30,
+        # 分层汇总与保留（天，0 表示永久保留）；压缩线程执行间隔（秒）
+        "retention": {
+            "raw_days": 7,
+            "minute_days": 30,
+            "hour_days": 0,
+            "day_days": 0,
+        },
+        "compact_interval_sec": 600,
+        # 写后线程：记录先入有界队列，由后台线程批量追加；每批 flush，fsync 间隔（秒，0 关闭）
+        "write_behind": True,
+        "writer_queue_size": 10000,
+        "writer_flush_sec": 0.5,
+        "writer_fsync_sec": 5.0,
+    },
+    "runtime_logs": {
+        # 写后线程：每个频道保持当天文件句柄，按间隔（秒）或累计行数 flush，零点切换日期目录
+        "write_behind": True,
+        "queue_size": 20000,
+        "flush_sec": 0.3,
+        "flush_lines": 200,
+    },
+    "metrics": {
+        # 运行指标（各步骤/OCR/截图/匹配耗时直方图）：每次运行开始时清零，
+        # 按间隔（秒）把快照追加到 output/metrics/<日期>.jsonl，结束时写入最终快照
+        "export": True,
+        "export_sec": 60,
+    },
     "debug": {
         # 是否在均价识别轮最终失败时保存 ROI 原图与二值图（默认关闭）
         "save_roi_on_fail": False,
@@ -118,5 +190,12 @@ DEFAULT_CONFIG: Dict[str, Any] = {
         "distance_from_buy_top": 5,
         "height": 45,
         "scale": 1.0,
+        # 均价多变体投票（按需开启，如 ["otsu", "fixed", "scaled"]）：先识别 vote_min_agree 个变体，
+        # 一致或单个变体置信度 >= vote_accept_score 即接受，不一致时才补识别下一个变体；
+        # 默认 ["otsu"] 为单变体读取，每次读价只发一次请求
+        "vote_variants": ["otsu"],
+        "vote_min_agree": 2,
+        "vote_accept_score": 0.95,
+        "vote_fixed_level": 128,
     },
 }
@@ -30,6 +30,7 @@ from typing import Any, Callable, Dict, List, Optional, Tuple
 from pathlib import Path
 
 import base64
+import contextvars
 import io
 import os
 import random
@@ -50,8 +51,20 @@ except Exception:
 
 from super_buyer.core.common import parse_price_text as _parse_price_text
 from super_buyer.services.font_loader import draw_text, pil_font, tk_font
-from super_buyer.services.ocr import recognize_numbers
+from super_buyer.services.history import configure_history_from_cfg
+from super_buyer.services.metrics import (
+    begin_metrics_session,
+    end_metrics_session,
+    inc as _metric_inc,
+    observe_ms,
+    set_gauge,
+)
+from super_buyer.services.ocr import ocr_allowlist, ocr_options, recognize_numbers
+from super_buyer.services.ocr_guard import configure_ocr_guard_from_cfg
+from super_buyer.services.ocr_pool import configure_umi_ocr_fleet_from_cfg
+from super_buyer.services.preprocess import PreprocessPipeline, PreprocessSpec
 from super_buyer.services.screen_ops import ScreenOps
+from super_buyer.services.umi_runtime import wait_umi_ocr_ready
 
 # 卡片与 ROI 固定参数（与“测试”页逻辑一致）
 CARD_W = 165
@@ -92,6 +105,14 @@ class MultiSnipeRunner:
     def __init__(self, cfg: Dict[str, Any], items: List[Dict[str, Any]] | List[SnipeItem], on_log: Callable[[str], None]) -> None:
         self.cfg = cfg
         self.on_log = on_log
+        try:
+            configure_umi_ocr_fleet_from_cfg(cfg)
+            configure_ocr_guard_from_cfg(cfg)
+            configure_history_from_cfg(cfg)
+        except Exception:
+            pass
+        # 详情均价 ROI 前处理（跨轮询复用缓冲区）
+        self._prep = PreprocessPipeline()
         self.items: List[SnipeItem] = []
         for it in items:
             if isinstance(it, SnipeItem):
@@ -116,6 +137,7 @@ class MultiSnipeRunner:
                 )
         # 运行控制
         self._stop = threading.Event()
+        self._metrics_session: Optional[str] = None
         self._pause = threading.Event()
         self._pause.clear()
 
@@ -323,6 +345,46 @@ class MultiSnipeRunner:
         x, y, w, h = box
         return int(x + w / 2), int(y + h / 2)
 
+    def begin_session(self, output_dir: str | Path) -> str:
+        """开始一次运行：建立本次运行的指标会话（与单商品运行器相同，由运行器负责）。"""
+        self.end_session()
+        self._metrics_session = begin_metrics_session(output_dir, self.cfg, "multi")
+        return self._metrics_session
+
+    def end_session(self) -> None:
+        """结束运行：只结束本运行器的指标会话，不影响同时进行的其他运行。"""
+        session, self._metrics_session = self._metrics_session, None
+        if session:
+            end_metrics_session(session)
+
+    def wait_ocr_ready(self, stop: Optional[threading.Event] = None) -> bool:
+        """首轮扫描前等待托管 Umi-OCR 完成预热；返回是否已就绪（未托管视为就绪）。
+
+        stop（缺省为运行器自身的停止事件）被置位时立即返回 False。
+        """
+        stop = stop if stop is not None else self._stop
+        try:
+            wait_sec = float((self.cfg.get("umi_ocr", {}) or {}).get("ready_wait_sec", 60.0) or 0.0)
+        except Exception:
+            wait_sec = 60.0
+        t0 = time.time()
+        status = wait_umi_ocr_ready(wait_sec, stop)
+        waited_ms = int((time.time() - t0) * 1000)
+        if status is None:
+            if stop.is_set():
+                return False
+            if wait_sec > 0 and waited_ms >= int(wait_sec * 1000):
+                self._log_info(f"[OCR] 等待 Umi-OCR 预热超时（{waited_ms}ms），继续执行")
+                return False
+            return True
+        if not status.ready:
+            self._log_error(f"[OCR] Umi-OCR 未就绪：{status.message or '-'}")
+            return False
+        self._log_info(
+            f"[OCR] Umi-OCR 已就绪 等待={waited_ms}ms 稳态延迟={status.warm_latency_ms}ms 冷启动={status.cold_start_ms}ms"
+        )
+        return True
+
     def _wait_buy_result_window(self) -> str:
         """购买结果识别窗口轮询，返回 ok/fail/unknown。"""
         t_end = time.time() + float(getattr(self, "_buy_result_timeout_sec", 0.8))
@@ -1089,6 +1151,8 @@ class MultiSnipeRunner:
             except Exception:
                 pass
             time.sleep(0.02)
+        observe_ms("multi.match", (time.time() - t0) * 1000.0)
+        _metric_inc("multi.match.hit" if box is not None else "multi.match.miss")
         if box is None:
             try:
                 self._log_debug(f"[定位][{item.name}] 结束 未命中 耗时={int((time.time()-t0)*1000)}ms")
@@ -1174,6 +1238,7 @@ class MultiSnipeRunner:
                 "top_rect": top_rect,
                 "btm_rect": btm_rect,
             })
+        observe_ms("multi.capture", (time.time() - t0) * 1000.0)
         try:
             self._log_debug(f"[截图] 批量完成 目标={total} 有效={len(jobs)} 耗时={int((time.time()-t0)*1000)}ms")
         except Exception:
@@ -1181,13 +1246,22 @@ class MultiSnipeRunner:
         return jobs
 
     # ---------- 并发 OCR ----------
-    def _umi_ocr_one(self, pil_image, *, allowlist: Optional[str] = None) -> str:
+    def _price_allowlist(self) -> str:
+        """价格 ROI 的字符白名单：取 `umi_ocr` 价格档位的 allowlist，未配置时回退旧键 `ocr_allowlist`。"""
+        try:
+            allow = ocr_allowlist(self.cfg.get("umi_ocr", {}) or {}, "price")
+            return str(allow or self.cfg.get("ocr_allowlist", "0123456789KkMm"))
+        except Exception:
+            return "0123456789KkMm"
+
+    def _umi_ocr_one(self, pil_image, *, allowlist: Optional[str] = None, profile: Optional[str] = None) -> str:
         # 优先使用 super_buyer.services.ocr 作为统一识别实现
-        from super_buyer.services.ocr import recognize_text  # type: ignore
+        from super_buyer.services.ocr import ocr_options, recognize_text  # type: ignore
         umi = (self.cfg.get("umi_ocr", {}) or {})
         base_url = str(umi.get("base_url", "http://127.0.0.1:1224"))
         timeout = float(umi.get("timeout_sec", 5.0) or 5.0)
-        options = umi.get("options", {}) or {}
+        # 按 ROI 类型选择识别档位（数字 ROI 不做排版解析）
+        options = ocr_options(umi, profile)
         # 统一使用 Umi-OCR：若提供 allowlist，则透传至 options 的常见键位（由 Umi 端决定是否采纳）
         if allowlist:
             try:
@@ -1221,17 +1295,16 @@ class MultiSnipeRunner:
         except Exception:
             pass
         # Determine allowlist for price images (key startswith 'price:')
-        try:
-            price_allow = str(self.cfg.get("ocr_allowlist", "0123456789KkMm"))
-        except Exception:
-            price_allow = "0123456789KkMm"
+        price_allow = self._price_allowlist()
         with ThreadPoolExecutor(max_workers=max_workers) as ex:
             futs = {}
             for key, im in imgs:
+                # 每个任务带上本线程的上下文，识别耗时记入本次运行的指标会话
+                run = contextvars.copy_context().run
                 if isinstance(key, str) and key.startswith("price:"):
-                    fut = ex.submit(self._umi_ocr_one, im, allowlist=price_allow)
+                    fut = ex.submit(run, self._umi_ocr_one, im, allowlist=price_allow, profile="price")
                 else:
-                    fut = ex.submit(self._umi_ocr_one, im)
+                    fut = ex.submit(run, self._umi_ocr_one, im, profile="name")
                 futs[fut] = key
             for fu in as_completed(futs):
                 key = futs[fu]
@@ -1239,6 +1312,8 @@ class MultiSnipeRunner:
                     results[key] = fu.result() or ""
                 except Exception:
                     results[key] = ""
+        observe_ms("multi.ocr_batch", (time.time() - t0) * 1000.0)
+        set_gauge("multi.ocr_batch.size", len(imgs))
         try:
             self._log_debug(f"[OCR] 结束 耗时={int((time.time()-t0)*1000)}ms")
         except Exception:
@@ -1293,7 +1368,6 @@ class MultiSnipeRunner:
         if h0 < 2:
             return None
         mid_h = h0 // 2
-        img_top = img.crop((0, 0, w0, mid_h))
         try:
             sc = float((avg_cfg.get("scale", 1.0) or 1.0))
         except Exception:
@@ -1302,22 +1376,18 @@ class MultiSnipeRunner:
             sc = 0.6
         if sc > 2.5:
             sc = 2.5
-        if abs(sc - 1.0) > 1e-3:
-            try:
-                img_top = img_top.resize((max(1, int(img_top.width * sc)), max(1, int(img_top.height * sc))))
-            except Exception:
-                pass
-        # Downstream allowlist hint to OCR service
+        # 上半裁剪 + 缩放（保留彩色，交由 OCR 服务处理）
         try:
-            avg_allow = str(self.cfg.get("ocr_allowlist", "0123456789KkMm"))
+            img_top = self._prep.run(
+                img,
+                {"top": PreprocessSpec(crop=(0, 0, w0, mid_h), scale=sc, gray=False, threshold="none")},
+            )["top"]
         except Exception:
-            avg_allow = "0123456789KkMm"
-        txt = self._umi_ocr_one(img_top, allowlist=avg_allow) or ""
-        # 白名单清洗：仅保留 0-9 与 KkMm
-        try:
-            allowlist = str(self.cfg.get("ocr_allowlist", "0123456789KkMm"))
-        except Exception:
-            allowlist = "0123456789KkMm"
+            img_top = img.crop((0, 0, w0, mid_h))
+        # Downstream allowlist hint to OCR service
+        allowlist = self._price_allowlist()
+        txt = self._umi_ocr_one(img_top, allowlist=allowlist, profile="price") or ""
+        # 白名单清洗：仅保留价格档位允许的字符
         txt_clean = "".join(ch for ch in (txt or "") if ch in allowlist)
         val = _parse_price_text(txt_clean or "")
         if val is None or val <= 0:
@@ -1345,6 +1415,7 @@ class MultiSnipeRunner:
         self._log_debug("[扫描] 开始：刷新与批量截图")
         self.refresh_favorites()
         jobs = self.collect_batch_rois()
+        observe_ms("multi.scan.capture", (time.time() - t0) * 1000.0)
         self._log_debug(f"[扫描] 截图完成 jobs={len(jobs)} 耗时={int((time.time()-t0)*1000)}ms")
         pairs: List[Tuple[str, Any]] = []
         for j in jobs:
@@ -1364,6 +1435,8 @@ class MultiSnipeRunner:
             # 列表价改为 utils/ocr_utils 识别，批量 OCR 不再包含 price
         t1 = time.time()
         texts = self.ocr_batch(pairs)
+        observe_ms("multi.scan.ocr", (time.time() - t1) * 1000.0)
+        observe_ms("multi.scan", (time.time() - t0) * 1000.0)
         self._log_debug(f"[扫描] OCR完成 耗时={int((time.time()-t1)*1000)}ms 总耗时={int((time.time()-t0)*1000)}ms")
         out: List[Dict[str, Any]] = []
         for j in jobs:
@@ -1382,7 +1455,7 @@ class MultiSnipeRunner:
                 umi = (self.cfg.get("umi_ocr", {}) or {})
                 _umi_base = str(umi.get("base_url", "http://127.0.0.1:1224"))
                 _umi_timeout = float(umi.get("timeout_sec", 2.5) or 2.5)
-                _umi_opts = dict(umi.get("options", {}) or {})
+                _umi_opts = ocr_options(umi, "price")
             except Exception:
                 _umi_base, _umi_timeout, _umi_opts = "http://127.0.0.1:1224", 2.5, {}
             try:
@@ -1392,6 +1465,7 @@ class MultiSnipeRunner:
                     timeout=_umi_timeout,
                     options=_umi_opts,
                     offset=offset,
+                    allowlist=self._price_allowlist(),
                 )
             except Exception:
                 cands = []
@@ -1433,7 +1507,7 @@ class MultiSnipeRunner:
                 price_cfg = self.cfg.get("price_roi", {}) or {}
             except Exception:
                 price_cfg = {}
-            allowlist = str(self.cfg.get("ocr_allowlist", "0123456789KkMm"))
+            allowlist = self._price_allowlist()
             price_txt_clean = "".join(ch for ch in price_txt if ch in allowlist)
             val = _parse_price_text(price_txt_clean or "")
             if cand_val is not None:
@@ -18,6 +18,7 @@ import json
 import os
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, Callable, Dict, List, Optional, Tuple
@@ -38,10 +39,19 @@ from super_buyer.services.history import (
     HistoryPaths,
     append_price,
     append_purchase,
+    configure_history_from_cfg,
+    flush_history_writer,
     resolve_paths as _resolve_history_paths,
 )
-from super_buyer.services.ocr import recognize_numbers, recognize_text
+from super_buyer.services.metrics import begin_metrics_session, end_metrics_session, inc as _metric_inc, observe_ms
+from super_buyer.services.ocr import ocr_allowlist, ocr_options, recognize_numbers, recognize_text
+from super_buyer.services.ocr_guard import configure_ocr_guard_from_cfg
+from super_buyer.services.ocr_pool import configure_umi_ocr_fleet_from_cfg
+from super_buyer.services.ocr_speculate import SpeculationResult, SpeculativeOcr
+from super_buyer.services.ocr_vote import vote_numbers
+from super_buyer.services.preprocess import PreprocessPipeline, PreprocessSpec
 from super_buyer.services.screen_ops import ScreenOps
+from super_buyer.services.umi_runtime import wait_umi_ocr_ready
 
 
 # ------------------------------ 时序/策略 ------------------------------
@@ -81,7 +91,7 @@ class Timings:
 
 
 class StageTimer:
-    """阶段计时器（用于 debug 输出流程耗时）。"""
+    """阶段计时器（debug 输出流程耗时，并记入 `<步骤指标>:<阶段>` 直方图）。"""
 
     def __init__(self, emit: Callable[[str, str], None], step_name: str, phase: str) -> None:
         self._emit = emit
@@ -98,7 +108,9 @@ class StageTimer:
         return self
 
     def __exit__(self, exc_type, exc, tb):
-        elapsed_ms = int((time.perf_counter() - self._t0) * 1000.0)
+        elapsed = (time.perf_counter() - self._t0) * 1000.0
+        observe_ms(f"{_step_metric(self._step_name)}:{self._phase}", elapsed)
+        elapsed_ms = int(elapsed)
         self._emit(
             "debug",
             build_context_message(
@@ -119,6 +131,33 @@ STEP_6_NAME = "步骤6-价格读取与阈值判定"
 STEP_7_NAME = "步骤7-执行购买"
 STEP_8_NAME = "步骤8-会话内循环与退出条件"
 
+# 步骤名 → 指标名（services.metrics）
+_STEP_METRICS = {
+    STEP_1_NAME: "single.step1",
+    STEP_2_NAME: "single.step2",
+    STEP_3_NAME: "single.step3",
+    STEP_4_NAME: "single.step4",
+    STEP_5_NAME: "single.step5",
+    STEP_6_NAME: "single.step6",
+    STEP_7_NAME: "single.step7",
+    STEP_8_NAME: "single.step8",
+}
+
+
+def _step_metric(step_name: str) -> str:
+    return _STEP_METRICS.get(step_name) or f"single.{step_name}"
+
+
+def _record_step(step_name: str, elapsed_ms: int, result: str) -> None:
+    """步骤耗时与结果计数记入运行指标（不论日志级别）。"""
+    name = _step_metric(step_name)
+    observe_ms(name, max(0, int(elapsed_ms)))
+    _metric_inc(f"{name}.{result or '-'}")
+
+
+# 均价读取可选的前处理变体（见 `_avg_vote_specs`）
+_AVG_VOTE_VARIANTS = ("otsu", "fixed", "scaled", "invert", "gray")
+
 
 def _format_step_value(value: Any) -> str:
     if value is None:
@@ -205,6 +244,19 @@ class SinglePurchaseBuyerV2:
         self._avg_ocr_streak: int = 0
         # 最近一次 OCR 使用的 ROI 与二值图（用于最终失败时落盘）
         self._last_roi_debug: Dict[str, Any] = {}
+        # OCR 前处理（跨轮询复用缓冲区）；均价与数量识别可能分处两个线程，各用一条流水线
+        self._prep = PreprocessPipeline()
+        self._qty_prep = PreprocessPipeline()
+        # 均价多变体投票线程池（按需创建）与最近一次投票摘要
+        self._vote_pool: Optional[ThreadPoolExecutor] = None
+        self._vote_pool_size: int = 0
+        self._last_avg_vote: Dict[str, Any] = {}
+        # 推测执行：均价/数量 OCR 提前在后台识别；详情每次打开/关闭递增场景序号，用于丢弃过期结果。
+        # 均价读取会改写按钮来源/投票摘要/ROI 调试等状态，后台与主流程读取经 _avg_read_lock 串行
+        self._spec_ocr = SpeculativeOcr(max_workers=2)
+        self._avg_read_lock = threading.Lock()
+        self._speculative_ocr: bool = True
+        self._detail_epoch: int = 0
         self._last_open_detail_source: str = "-"
         self._last_btn_source: str = "-"
         self._last_btn_match_ms: int = 0
@@ -269,6 +321,7 @@ class SinglePurchaseBuyerV2:
         result: str,
         params: Optional[Dict[str, Any]] = None,
     ) -> None:
+        _record_step(step_name, elapsed_ms, result)
         try:
             self.on_log(_build_step_log(item, purchased, step_name, elapsed_ms, result, params))
         except Exception:
@@ -295,6 +348,7 @@ class SinglePurchaseBuyerV2:
     def _mark_detail_opened(self, goods: Goods) -> None:
         self._anchor_revalidate_needed = False
         self._pending_anchor_settle_goods_id = goods.id
+        self._detail_epoch += 1
 
     def _consume_anchor_settle(self, goods: Goods) -> None:
         if self._pending_anchor_settle_goods_id != goods.id:
@@ -372,6 +426,9 @@ class SinglePurchaseBuyerV2:
             "ocr_round": int(meta.get("rounds", 0) or 0),
             "btn_source": str(meta.get("btn_source", "-") or "-"),
         }
+        vote = meta.get("vote") or {}
+        if vote.get("decided_by"):
+            params["ocr_vote"] = f"{vote.get('decided_by')}:{'+'.join(vote.get('variants') or []) or '-'}"
         if reason:
             params["reason"] = reason
         self._log_step(item, purchased, STEP_6_NAME, elapsed_ms, result, params)
@@ -444,13 +501,155 @@ class SinglePurchaseBuyerV2:
         except Exception:
             self._last_roi_debug = {}
 
-    def _dump_last_roi_debug(self, item_disp: str, purchased_str: str) -> None:
-        """若开启了 debug.save_roi_on_fail，则将最近一次 ROI/二值图落盘。"""
+    def _avg_vote_cfg(self) -> Dict[str, Any]:
+        """均价投票参数（`avg_price_area.vote_*`）。"""
+        avg_cfg = self.cfg.get("avg_price_area") or {}
+        raw = avg_cfg.get("vote_variants", ["otsu"])
+        names = [str(n).strip().lower() for n in (raw if isinstance(raw, (list, tuple)) else [raw]) if str(n).strip()]
+        names = [n for n in names if n in _AVG_VOTE_VARIANTS] or ["otsu"]
+        try:
+            min_agree = max(1, int(avg_cfg.get("vote_min_agree", 2) or 2))
+        except Exception:
+            min_agree = 2
+        try:
+            score = avg_cfg.get("vote_accept_score", 0.95)
+            accept_score = None if score in (None, "", 0) else float(score)
+        except Exception:
+            accept_score = 0.95
+        try:
+            fixed_level = max(1, min(254, int(avg_cfg.get("vote_fixed_level", 128) or 128)))
+        except Exception:
+            fixed_level = 128
+        return {
+            "variants": list(dict.fromkeys(names)),
+            "min_agree": min_agree,
+            "accept_score": accept_score,
+            "fixed_level": fixed_level,
+        }
+
+    @staticmethod
+    def _avg_vote_specs(
+        crop: Tuple[int, int, int, int],
+        scale: float,
+        vote_cfg: Dict[str, Any],
+    ) -> Dict[str, PreprocessSpec]:
+        # 备选缩放：放大 1.5 倍（超过上限时改为缩小），与主变体拉开差异
+        alt = scale * 1.5 if scale * 1.5 <= 2.5 else max(0.6, scale / 1.5)
+        table = {
+            "otsu": PreprocessSpec(crop=crop, scale=scale),
+            "fixed": PreprocessSpec(crop=crop, scale=scale, threshold="fixed", fixed_level=int(vote_cfg["fixed_level"])),
+            "scaled": PreprocessSpec(crop=crop, scale=alt),
+            "invert": PreprocessSpec(crop=crop, scale=scale, invert=True),
+            "gray": PreprocessSpec(crop=crop, scale=scale, threshold="none"),
+        }
+        return {name: table[name] for name in vote_cfg["variants"] if name in table}
+
+    def _avg_vote_executor(self, workers: int) -> ThreadPoolExecutor:
+        size = max(1, min(4, int(workers)))
+        pool = self._vote_pool
+        if pool is None or self._vote_pool_size < size:
+            if pool is not None:
+                pool.shutdown(wait=False)
+            pool = ThreadPoolExecutor(max_workers=size, thread_name_prefix="avg-ocr-vote")
+            self._vote_pool = pool
+            self._vote_pool_size = size
+        return pool
+
+    def close(self) -> None:
+        """释放后台识别线程（投票线程池、推测执行）；Runner 结束时调用，可重复调用。"""
+        pool, self._vote_pool = self._vote_pool, None
+        self._vote_pool_size = 0
+        if pool is not None:
+            try:
+                pool.shutdown(wait=False, cancel_futures=True)
+            except Exception:
+                pass
+        try:
+            self._spec_ocr.shutdown()
+        except Exception:
+            pass
+
+    # -------------------- 推测执行（后台 OCR） --------------------
+    def _scene_token(self, goods: Goods) -> Tuple[Any, ...]:
+        """当前详情场景：详情打开/关闭序号 + 购买按钮坐标，任一变化即视为换了场景。"""
+        return (goods.id, int(self._detail_epoch), self._cached_detail_btn_box(goods, "btn_buy"))
+
+    def _speculation_join_timeout(self) -> float:
+        try:
+            ocfg = self.cfg.get("umi_ocr") or {}
+            return float(ocfg.get("timeout_sec", 2.5) or 2.5) + 0.5
+        except Exception:
+            return 3.0
+
+    def _speculate_avg_price(
+        self,
+        goods: Goods,
+        item_disp: str,
+        purchased_str: str,
+        *,
+        expected_floor: Optional[int],
+    ) -> bool:
+        """详情已确认（btn_buy 已缓存）时在后台提前读取均价，供随后识别轮的首轮直接取用。
+
+        调用方须保证数量已校验或已稳定（均价随数量变化）。后台结果连同当时的投票摘要/
+        按钮来源一起返回，主流程取回时不再读取可能被改写的实例状态。
+        """
+        if not self._speculative_ocr or self._cached_detail_btn_box(goods, "btn_buy") is None:
+            return False
+
+        def _run() -> Dict[str, Any]:
+            with self._avg_read_lock:
+                value = self._read_avg_unit_price_locked(
+                    goods,
+                    item_disp,
+                    purchased_str,
+                    expected_floor=expected_floor,
+                    allow_bottom_fallback=False,
+                    fast_anchor_only=True,
+                )
+                return {
+                    "value": value,
+                    "vote": dict(self._last_avg_vote or {}),
+                    "btn_source": str(self._last_btn_source or "-"),
+                }
+
+        self._spec_ocr.submit("avg", _run, scene=(self._scene_token(goods), expected_floor))
+        return True
+
+    def _join_speculation(
+        self,
+        key: str,
+        scene: Any,
+        item_disp: str,
+        purchased_str: str,
+        step_name: str,
+    ) -> Optional[SpeculationResult]:
+        """取回推测识别结果；无在途任务返回 None。"""
+        if not self._spec_ocr.pending(key):
+            return None
+        res = self._spec_ocr.join(key, scene=scene, timeout=self._speculation_join_timeout())
+        self._log_step_debug_text(
+            item_disp,
+            purchased_str,
+            step_name,
+            phase="推测识别",
+            message=(
+                f"{key} 结果={res.status} 等待={int(res.waited_ms)}ms 重叠={int(res.saved_ms)}ms"
+                + (f" 错误={res.error}" if res.error else "")
+            ),
+        )
+        return res
+
+    def _save_roi_on_fail(self) -> bool:
         try:
             dbg = (self.cfg.get("debug", {}) or {})
-            if not bool(dbg.get("save_roi_on_fail", False)):
-                return
+            return bool(dbg.get("save_roi_on_fail", False))
         except Exception:
+            return False
+
+    def _dump_last_roi_debug(self, item_disp: str, purchased_str: str) -> None:
+        """若开启了 debug.save_roi_on_fail，则将最近一次 ROI/二值图落盘。"""
+        if not self._save_roi_on_fail():
             return
         data = self._last_roi_debug or {}
         if not data:
@@ -901,6 +1100,7 @@ class SinglePurchaseBuyerV2:
         if c is not None:
             self.screen.click_center(c)
             self._pending_anchor_settle_goods_id = None
+            self._detail_epoch += 1
             safe_sleep(self.timings.post_close_detail)
             if not _detail_still_open():
                 return True
@@ -923,6 +1123,8 @@ class SinglePurchaseBuyerV2:
     # -------------------- 步骤 3：障碍清理 --------------------
     def step3_clear_obstacles(self, item: str = "全局", purchased: str = "-") -> None:
         t0 = time.perf_counter()
+        self._detail_epoch += 1
+        self._spec_ocr.discard()
         scene_before = self._detect_scene(timeout=0.03)
         b = None
         c = None
@@ -1251,6 +1453,28 @@ class SinglePurchaseBuyerV2:
                 f"失败上限={fail_limit}"
             ),
         )
+        # 推测执行：后台已提前读取且场景未变化时，直接作为首轮结果
+        spec = self._join_speculation(
+            "avg",
+            (self._scene_token(goods), expected_floor),
+            item_disp,
+            purchased_str,
+            STEP_6_NAME,
+        )
+        spec_out = spec.value if spec is not None and spec.hit and isinstance(spec.value, dict) else {}
+        spec_value = spec_out.get("value")
+        if isinstance(spec_value, int) and spec_value > 0:
+            self._last_avg_read_meta.update(
+                {
+                    "rounds": 1,
+                    "btn_source": str(spec_out.get("btn_source") or "-"),
+                    "unit_price": int(spec_value),
+                    "result": "success",
+                    "vote": dict(spec_out.get("vote") or {}),
+                    "speculative": True,
+                }
+            )
+            return int(spec_value)
         while fails < fail_limit:
             if self._stop_requested():
                 self._last_avg_read_meta.update(
@@ -1313,6 +1537,7 @@ class SinglePurchaseBuyerV2:
                             "btn_source": str(getattr(self, "_last_btn_source", "-") or "-"),
                             "unit_price": int(unit_price),
                             "result": "success",
+                            "vote": dict(self._last_avg_vote or {}),
                         }
                     )
                     return unit_price
@@ -1561,7 +1786,28 @@ class SinglePurchaseBuyerV2:
         allow_bottom_fallback: bool = True,
         fast_anchor_only: bool = False,
     ) -> Optional[int]:
-        """以 btn_buy 为锚点计算 ROI，并识别“平均单价”。
+        """识别“平均单价”；与后台推测读取互斥（未结束的推测读取先完成）。"""
+        with self._avg_read_lock:
+            return self._read_avg_unit_price_locked(
+                goods,
+                item_disp,
+                purchased_str,
+                expected_floor=expected_floor,
+                allow_bottom_fallback=allow_bottom_fallback,
+                fast_anchor_only=fast_anchor_only,
+            )
+
+    def _read_avg_unit_price_locked(
+        self,
+        goods: Goods,
+        item_disp: str,
+        purchased_str: str,
+        *,
+        expected_floor: Optional[int] = None,
+        allow_bottom_fallback: bool = True,
+        fast_anchor_only: bool = False,
+    ) -> Optional[int]:
+        """以 btn_buy 为锚点计算 ROI，并识别“平均单价”（调用方持有 `_avg_read_lock`）。
 
         算法要点：
         - 锚点来源优先级：会话缓存 → 缓存附近小区域快速重定位 → 全局匹配；
@@ -1732,12 +1978,6 @@ class SinglePurchaseBuyerV2:
             sc = 0.6
         if sc > 2.5:
             sc = 2.5
-        if abs(sc - 1.0) > 1e-3:
-            try:
-                img_top = img_top.resize((max(1, int(img_top.width * sc)), max(1, int(img_top.height * sc))))
-                img_bot = img_bot.resize((max(1, int(img_bot.width * sc)), max(1, int(img_bot.height * sc))))
-            except Exception:
-                pass
         self._log_step_debug_text(
             item_disp,
             purchased_str,
@@ -1746,33 +1986,24 @@ class SinglePurchaseBuyerV2:
             message=f"dist={dist} height={hei} scale={sc}",
         )
 
-        # 二值化：优先 Otsu
+        # 缩放 + 二值化：共享前处理流水线一次产出全部投票变体，跨轮询复用缓冲区；
+        # 下半（合计）仅在开启失败落盘时才处理
+        vote_cfg = self._avg_vote_cfg()
+        vote_specs = self._avg_vote_specs((0, 0, w0, mid_h), sc, vote_cfg)
         bin_top = None
         bin_bot = None
+        variants: Dict[str, Any] = {}
+        specs: Dict[str, PreprocessSpec] = dict(vote_specs)
+        if self._save_roi_on_fail():
+            specs["bot"] = PreprocessSpec(crop=(0, mid_h, w0, h0 - mid_h), scale=sc)
         try:
-            import numpy as _np  # type: ignore
-            import cv2 as _cv2  # type: ignore
-            from PIL import Image as _PIL  # type: ignore
-            for src, name in ((img_top, "top"), (img_bot, "bot")):
-                arr = _np.array(src)
-                bgr = _cv2.cvtColor(arr, _cv2.COLOR_RGB2BGR)
-                gray = _cv2.cvtColor(bgr, _cv2.COLOR_BGR2GRAY)
-                _thr, th = _cv2.threshold(gray, 0, 255, _cv2.THRESH_BINARY + _cv2.THRESH_OTSU)
-                if name == "top":
-                    bin_top = _PIL.fromarray(th)
-                else:
-                    bin_bot = _PIL.fromarray(th)
+            bins = self._prep.run(img, specs)
+            variants = {name: bins[name] for name in vote_specs if bins.get(name) is not None}
+            bin_top = next(iter(variants.values()), None)
+            bin_bot = bins.get("bot")
         except Exception:
-            try:
-                _lut = [255 if i > 128 else 0 for i in range(256)]
-                bin_top = img_top.convert("L").point(_lut)
-            except Exception:
-                bin_top = img_top
-            try:
-                _lut = [255 if i > 128 else 0 for i in range(256)]
-                bin_bot = img_bot.convert("L").point(_lut)
-            except Exception:
-                bin_bot = img_bot
+            bin_top = img_top
+            variants = {"raw": img_top}
 
         # 识别：仅上半（平均单价）数字 → 文本解析；不使用下半兜底
         # 先缓存 ROI/二值图用于可能的最终失败落盘
@@ -1788,29 +2019,58 @@ class SinglePurchaseBuyerV2:
             )
         except Exception:
             pass
+        # 数字识别：先并发提交 min_agree 个变体，一致（或单个置信度达标）即接受，不一致时才补交下一个
         try:
             ocfg = self.cfg.get("umi_ocr") or {}
-            t_ocr = time.perf_counter()
-            cands = recognize_numbers(
-                bin_top,
-                base_url=str(ocfg.get("base_url", "http://127.0.0.1:1224")),
-                timeout=float(ocfg.get("timeout_sec", 2.5) or 2.5),
-                options=dict(ocfg.get("options", {}) or {}),
-                offset=(x_left, y_top),
-            ) if bin_top is not None else []
-            cand = max([c for c in cands if getattr(c, "value", None) is not None], key=lambda c: int(c.value)) if cands else None  # type: ignore[arg-type]
-            val = int(getattr(cand, "value", 0)) if cand is not None and getattr(cand, "value", None) is not None else None
-            ocr_ms = int((time.perf_counter() - t_ocr) * 1000.0)
-            try:
-                cand_vals = [int(getattr(c, "value", 0)) for c in (cands or []) if getattr(c, "value", None) is not None]
-            except Exception:
-                cand_vals = []
+            base_url = str(ocfg.get("base_url", "http://127.0.0.1:1224"))
+            timeout = float(ocfg.get("timeout_sec", 2.5) or 2.5)
+            options = ocr_options(ocfg, "price")
+            allowlist = ocr_allowlist(ocfg, "price")
+
+            def _reader(im: Any) -> Callable[[], Tuple[Optional[int], Optional[float]]]:
+                def _run() -> Tuple[Optional[int], Optional[float]]:
+                    cands = recognize_numbers(
+                        im,
+                        base_url=base_url,
+                        timeout=timeout,
+                        options=options,
+                        offset=(x_left, y_top),
+                        allowlist=allowlist,
+                    )
+                    valid = [c for c in (cands or []) if getattr(c, "value", None) is not None]
+                    if not valid:
+                        return None, None
+                    best = max(valid, key=lambda c: int(c.value))  # type: ignore[arg-type]
+                    return int(best.value), best.score  # type: ignore[arg-type]
+
+                return _run
+
+            vote = vote_numbers(
+                {name: _reader(im) for name, im in variants.items()},
+                executor=self._avg_vote_executor(len(variants)),
+                min_agree=int(vote_cfg["min_agree"]),
+                accept_score=vote_cfg["accept_score"],
+                timeout_sec=timeout + 0.5,
+                fallback_order=list(variants.keys()),
+                max_in_flight=int(vote_cfg["min_agree"]),
+            )
+            val = vote.value
+            ocr_ms = int(vote.elapsed_ms)
+            self._last_avg_vote = {
+                "decided_by": vote.decided_by,
+                "variants": list(vote.variants),
+                "submitted": len(variants),
+                "cancelled": int(vote.cancelled),
+            }
             self._log_step_debug_text(
                 item_disp,
                 purchased_str,
                 STEP_6_NAME,
                 phase="数字OCR",
-                message=f"候选={cand_vals} 选={getattr(cand, 'value', None)} 耗时={ocr_ms}ms",
+                message=(
+                    f"变体={vote.summary()} 选={val} 依据={vote.decided_by} "
+                    f"耗时={ocr_ms}ms 预处理={self._prep.last_ms:.1f}ms"
+                ),
             )
         except Exception:
             val = None
@@ -1863,7 +2123,7 @@ class SinglePurchaseBuyerV2:
                     bin_top,
                     base_url=str(ocfg.get("base_url", "http://127.0.0.1:1224")),
                     timeout=float(ocfg.get("timeout_sec", 2.5) or 2.5),
-                    options=dict(ocfg.get("options", {}) or {}),
+                    options=ocr_options(ocfg, "price"),
                 )
                 txt = " ".join((b.text or "").strip() for b in boxes if (b.text or "").strip())
             ocr_ms = int((time.perf_counter() - t_ocr) * 1000.0)
@@ -2053,6 +2313,31 @@ class SinglePurchaseBuyerV2:
         item_disp: str,
         purchased_str: str,
     ) -> Optional[int]:
+        shot = self._capture_quantity_roi(item_disp, purchased_str)
+        if shot is None:
+            return None
+        return self._ocr_quantity_image(shot[0], shot[1], item_disp, purchased_str)
+
+    def _speculate_quantity(self, goods: Goods, item_disp: str, purchased_str: str) -> bool:
+        """立即截取数量框，识别放到后台；首次用到数量时再取回。"""
+        if not self._speculative_ocr:
+            return False
+        shot = self._capture_quantity_roi(item_disp, purchased_str)
+        if shot is None:
+            return False
+        img, roi = shot
+        self._spec_ocr.submit(
+            "qty",
+            lambda: self._ocr_quantity_image(img, roi, item_disp, purchased_str),
+            scene=self._scene_token(goods),
+        )
+        return True
+
+    def _capture_quantity_roi(
+        self,
+        item_disp: str,
+        purchased_str: str,
+    ) -> Optional[Tuple[Any, Tuple[int, int, int, int]]]:
         roi = self._calc_qty_input_roi()
         if roi is None:
             self._log_step_debug_text(
@@ -2073,32 +2358,29 @@ class SinglePurchaseBuyerV2:
                 message=f"数量截图失败 ROI={roi}",
             )
             return None
+        return img, roi
+
+    def _ocr_quantity_image(
+        self,
+        img: Any,
+        roi: Tuple[int, int, int, int],
+        item_disp: str,
+        purchased_str: str,
+    ) -> Optional[int]:
+        # 放大 2 倍 + Otsu 二值化
         try:
-            img = img.resize((max(1, int(img.width * 2.0)), max(1, int(img.height * 2.0))))
-        except Exception:
-            pass
-        try:
-            import numpy as _np  # type: ignore
-            import cv2 as _cv2  # type: ignore
-            from PIL import Image as _PIL  # type: ignore
-
-            arr = _np.array(img)
-            gray = _cv2.cvtColor(_cv2.cvtColor(arr, _cv2.COLOR_RGB2BGR), _cv2.COLOR_BGR2GRAY)
-            _thr, th = _cv2.threshold(gray, 0, 255, _cv2.THRESH_BINARY + _cv2.THRESH_OTSU)
-            bin_img = _PIL.fromarray(th)
+            bin_img = self._qty_prep.run(img, {"qty": PreprocessSpec(scale=2.0)})["qty"]
         except Exception:
-            try:
-                bin_img = img.convert("L").point(lambda p: 255 if p > 128 else 0)  # type: ignore[arg-type]
-            except Exception:
-                bin_img = img
+            bin_img = img
         try:
             ocfg = self.cfg.get("umi_ocr") or {}
             cands = recognize_numbers(
                 bin_img,
                 base_url=str(ocfg.get("base_url", "http://127.0.0.1:1224")),
                 timeout=float(ocfg.get("timeout_sec", 2.5) or 2.5),
-                options=dict(ocfg.get("options", {}) or {}),
+                options=ocr_options(ocfg, "quantity"),
                 offset=(int(roi[0]), int(roi[1])),
+                allowlist=ocr_allowlist(ocfg, "quantity"),
             )
             vals = [int(getattr(c, "value", 0)) for c in (cands or []) if getattr(c, "value", None) is not None]
         except Exception:
@@ -2151,12 +2433,45 @@ class SinglePurchaseBuyerV2:
             fast_interval_sec = 0.035
         fast_interval_sec = max(0.03, fast_interval_sec)
         burst_seed_price = int(initial_unit_price) if isinstance(initial_unit_price, int) and initial_unit_price > 0 else None
+        def _settle_typed_qty(qty_after_type: Optional[int]) -> int:
+            """输入 120 后的校验值 → 实际准备数量。"""
+            if qty_after_type is None or qty_after_type == 120:
+                self._log_step_debug_text(
+                    item_disp,
+                    prep_progress,
+                    STEP_7_NAME,
+                    phase="执行补货",
+                    message=f"数量准备=输入120{'(校验成功)' if qty_after_type == 120 else '(未校验到明确值)'}",
+                )
+                return 120
+            self._log_step_debug_text(
+                item_disp,
+                prep_progress,
+                STEP_7_NAME,
+                phase="执行补货",
+                message=f"数量准备=输入120后校验值={qty_after_type}，按当前值继续",
+            )
+            return max(1, int(qty_after_type))
+
         # 会话准备：弹药 Max / 非弹药数量
         is_ammo = (goods.big_category or "").strip() == "弹药"
         used_max = False
         typed_qty = 0
         prepared_qty = 0
         prep_progress = f"{purchased_so_far}/{target_total}"
+        # 推测执行：数量准备后首轮即会读取均价时，均价与数量校验并行识别。
+        # 均价随数量变化：推测截图只在数量已校验（或已截取数量框并等待界面稳定）后进行，
+        # 数量校验在后台时，取用推测均价前先确认校验值为 120，否则作废
+        try:
+            thr_base0 = int(task.get("price_threshold", 0) or 0)
+        except Exception:
+            thr_base0 = 0
+        base0 = restock if restock > 0 else thr_base0
+        spec_floor = base0 if base0 > 0 else None
+        spec_first_read = not (fast_mode and fast_max > 1 and burst_seed_price is not None)
+        qty_verify_pending = False
+        qty_verified = False
+        avg_spec_needs_qty = False
         if is_ammo:
             mx = self._get_btn_box(goods, "btn_max", timeout=0.35)
             qty_after_max = None
@@ -2192,25 +2507,17 @@ class SinglePurchaseBuyerV2:
             if prepared_qty <= 0:
                 if self._focus_and_type_quantity_fast(120):
                     typed_qty = 120
-                    qty_after_type = self._read_quantity_value(item_disp, prep_progress)
-                    if qty_after_type is None or qty_after_type == 120:
+                    # 先按 120 继续，数量校验在后台识别，首次用到数量时再取回
+                    if self._speculate_quantity(goods, item_disp, prep_progress):
                         prepared_qty = 120
-                        self._log_step_debug_text(
-                            item_disp,
-                            prep_progress,
-                            STEP_7_NAME,
-                            phase="执行补货",
-                            message=f"数量准备=输入120{'(校验成功)' if qty_after_type == 120 else '(未校验到明确值)'}",
-                        )
+                        qty_verify_pending = True
                     else:
-                        prepared_qty = max(1, int(qty_after_type))
-                        self._log_step_debug_text(
-                            item_disp,
-                            prep_progress,
-                            STEP_7_NAME,
-                            phase="执行补货",
-                            message=f"数量准备=输入120后校验值={qty_after_type}，按当前值继续",
-                        )
+                        prepared_qty = _settle_typed_qty(self._read_quantity_value(item_disp, prep_progress))
+                    if spec_first_read:
+                        # 数量框已截取：等界面按新数量刷新均价后再截取均价 ROI
+                        safe_sleep(max(0.05, float(getattr(self.timings, "ocr_min_wait", 0.05) or 0.05)))
+                        if self._speculate_avg_price(goods, item_disp, prep_progress, expected_floor=spec_floor):
+                            avg_spec_needs_qty = qty_verify_pending
                 else:
                     prepared_qty = 10
                     self._log_step_debug_text(
@@ -2243,6 +2550,23 @@ class SinglePurchaseBuyerV2:
                 )
 
         def _effective_restock_qty() -> int:
+            nonlocal prepared_qty, qty_verify_pending, qty_verified
+            if qty_verify_pending:
+                qty_verify_pending = False
+                spec = self._join_speculation(
+                    "qty", self._scene_token(goods), item_disp, prep_progress, STEP_7_NAME
+                )
+                if spec is not None and spec.hit:
+                    qty_verified = spec.value == 120
+                    prepared_qty = _settle_typed_qty(spec.value)
+                else:
+                    self._log_step_debug_text(
+                        item_disp,
+                        prep_progress,
+                        STEP_7_NAME,
+                        phase="执行补货",
+                        message="数量准备=输入120(后台校验未取回)",
+                    )
             if prepared_qty > 0:
                 return int(prepared_qty)
             if is_ammo:
@@ -2270,6 +2594,19 @@ class SinglePurchaseBuyerV2:
                     thr_base = 0
                 # 补货优先：补货循环以 restock 为基准，避免普通阈值过高导致识别过滤过严。
                 base = restock if restock > 0 else thr_base
+                if avg_spec_needs_qty:
+                    avg_spec_needs_qty = False
+                    _effective_restock_qty()
+                    if not qty_verified:
+                        # 无法确认截图时数量已生效：推测均价可能是改数量前的值，改为同步读取
+                        self._spec_ocr.discard("avg")
+                        self._log_step_debug_text(
+                            item_disp,
+                            purchased_str,
+                            STEP_6_NAME,
+                            phase="推测识别",
+                            message="avg 作废：数量未校验为120",
+                        )
                 step6_t0 = time.perf_counter()
                 unit_price = self._read_avg_price_with_rounds(
                     goods,
@@ -3424,6 +3761,12 @@ class SinglePurchaseTaskRunnerV2:
 
         # 配置
         self.cfg = load_config(cfg_path)
+        try:
+            configure_umi_ocr_fleet_from_cfg(self.cfg)
+            configure_ocr_guard_from_cfg(self.cfg)
+            configure_history_from_cfg(self.cfg)
+        except Exception:
+            pass
         self.tasks_data = json.loads(json.dumps(tasks_data or {"tasks": []}))
         self.goods_map: Dict[str, Goods] = self._load_goods(goods_path)
         paths_cfg = self.cfg.get("paths", {}) or {}
@@ -3501,6 +3844,7 @@ class SinglePurchaseTaskRunnerV2:
             setattr(self.buyer, "_fast_chain_max", max(1, fast_max))
             # 确保间隔不少于 30ms
             setattr(self.buyer, "_fast_chain_interval_ms", max(30.0, fast_interval_ms))
+            setattr(self.buyer, "_speculative_ocr", bool(tuning.get("speculative_ocr", True)))
         except Exception:
             pass
 
@@ -3544,6 +3888,7 @@ class SinglePurchaseTaskRunnerV2:
         result: str,
         params: Optional[Dict[str, Any]] = None,
     ) -> None:
+        _record_step(step_name, elapsed_ms, result)
         self._relay_log(_build_step_log(item, purchased, step_name, elapsed_ms, result, params))
 
     def _progress_text(self, purchased: int, target: int) -> str:
@@ -3581,6 +3926,32 @@ class SinglePurchaseTaskRunnerV2:
                 )
         return goods_map
 
+    def _wait_ocr_ready(self) -> None:
+        """步骤 1 前等待托管 Umi-OCR 完成预热，避免冷启动落在首轮购买。"""
+        try:
+            umi_cfg = self.cfg.get("umi_ocr") or {}
+            wait_sec = float(umi_cfg.get("ready_wait_sec", 60.0) or 0.0)
+        except Exception:
+            wait_sec = 60.0
+        t0 = time.perf_counter()
+        status = wait_umi_ocr_ready(wait_sec, self._stop)
+        waited_ms = int((time.perf_counter() - t0) * 1000.0)
+        if status is None:
+            if self._stop.is_set():
+                return
+            # 未托管时立即返回 None；仅等满时长才视为超时
+            if wait_sec > 0 and waited_ms >= int(wait_sec * 1000.0):
+                self._relay_log(f"【{now_label()}】【全局】【-】：等待 Umi-OCR 预热超时（{waited_ms}ms），继续执行")
+            return
+        if not status.ready:
+            self._relay_log(f"【{now_label()}】【全局】【-】：Umi-OCR 未就绪：{status.message or '-'}")
+            return
+        self._relay_log(
+            f"【{now_label()}】【全局】【-】：Umi-OCR 已就绪 | 等待={waited_ms}ms "
+            f"稳态延迟={status.warm_latency_ms if status.warm_latency_ms is not None else '-'}ms "
+            f"冷启动={status.cold_start_ms if status.cold_start_ms is not None else '-'}ms"
+        )
+
     def _ensure_ready(self) -> bool:
         t0 = time.perf_counter()
         def _on(s: str) -> None:
@@ -3641,7 +4012,11 @@ class SinglePurchaseTaskRunnerV2:
             t["_valid"] = bool(ok)
 
     def _run(self) -> None:
+        metrics_session = begin_metrics_session(self.history_paths.base_dir, self.cfg, "single")
         try:
+            self._wait_ocr_ready()
+            if self._stop.is_set():
+                return
             if not self._ensure_ready():
                 return
             tasks: List[Dict[str, Any]] = list(self.tasks_data.get("tasks", []) or [])
@@ -3661,6 +4036,14 @@ class SinglePurchaseTaskRunnerV2:
                 self._run_time_window(tasks)
         except Exception as e:
             self._relay_log(f"【{now_label()}】【全局】【-】：运行异常：{e}")
+        finally:
+            # 任务结束：把写后队列中的历史记录落盘，写入最终指标快照
+            try:
+                flush_history_writer()
+            except Exception:
+                pass
+            self.buyer.close()
+            end_metrics_session(metrics_session)
 
     def _precache_with_retries(self, goods: Goods, item_disp: str, purchased_str: str) -> bool:
         """预缓存重试：最多 3 次，指数退避（1s→2s→4s），失败触发清理并可触发处罚逻辑。
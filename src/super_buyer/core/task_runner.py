@@ -29,9 +29,12 @@ from super_buyer.services.history import (
     HistoryPaths,
     append_price as _append_price,
     append_purchase as _append_purchase,
+    configure_history_from_cfg,
+    flush_history_writer as _flush_history_writer,
     resolve_paths as _resolve_history_paths,
 )
-from super_buyer.services.ocr import recognize_numbers, recognize_text
+from super_buyer.services.ocr import ocr_allowlist, ocr_options, recognize_numbers, recognize_text
+from super_buyer.services.preprocess import PreprocessPipeline, PreprocessSpec
 from super_buyer.services.screen_ops import ScreenOps
 
 ensure_pyautogui_confidence_compat()
@@ -72,6 +75,8 @@ class Buyer:
         self._last_avg_ocr_ok: bool = True
         # 平均价 OCR 连续未识别计数（在本类内维护，成功即清零）
         self._avg_ocr_streak: int = 0
+        # 平均价 ROI 前处理（跨轮询复用缓冲区）
+        self._prep = PreprocessPipeline()
         # 统一本模块内的延时（秒），来源于 ScreenOps 的 step_delay（由外层以 ms 配置），默认 15ms
         try:
             self._delay_sec: float = float(getattr(self.screen, "step_delay", 0.015))
@@ -753,44 +758,22 @@ class Buyer:
             sc = 0.6
         if sc > 2.5:
             sc = 2.5
-        if abs(sc - 1.0) > 1e-3:
-            try:
-                img_top = img_top.resize(
-                    (max(1, int(img_top.width * sc)), max(1, int(img_top.height * sc)))
-                )
-                img_bot = img_bot.resize(
-                    (max(1, int(img_bot.width * sc)), max(1, int(img_bot.height * sc)))
-                )
-            except Exception:
-                pass
-        # 对上下两半分别二值化（优先用 cv2；回退 PIL）
-        bin_top: Optional[_PIL.Image] = None
-        bin_bot: Optional[_PIL.Image] = None
+        # 上下两半分别缩放 + 二值化（共享前处理流水线，一次产出两个变体）
+        bin_top = None
+        bin_bot = None
         try:
-            import numpy as _np  # type: ignore
-            import cv2 as _cv2  # type: ignore
-            from PIL import Image as _PIL  # type: ignore
-
-            for _src, _set in ((img_top, "top"), (img_bot, "bot")):
-                arr = _np.array(_src)
-                bgr = _cv2.cvtColor(arr, _cv2.COLOR_RGB2BGR)
-                gray = _cv2.cvtColor(bgr, _cv2.COLOR_BGR2GRAY)
-                _thr, th = _cv2.threshold(
-                    gray, 0, 255, _cv2.THRESH_BINARY + _cv2.THRESH_OTSU
-                )
-                if _set == "top":
-                    bin_top = _PIL.fromarray(th)
-                else:
-                    bin_bot = _PIL.fromarray(th)
+            bins = self._prep.run(
+                img,
+                {
+                    "top": PreprocessSpec(crop=(0, 0, w0, mid_h), scale=sc),
+                    "bot": PreprocessSpec(crop=(0, mid_h, w0, h0 - mid_h), scale=sc),
+                },
+            )
+            bin_top = bins.get("top")
+            bin_bot = bins.get("bot")
         except Exception:
-            try:
-                bin_top = img_top.convert("L").point(lambda p: 255 if p > 128 else 0)  # type: ignore
-            except Exception:
-                bin_top = img_top
-            try:
-                bin_bot = img_bot.convert("L").point(lambda p: 255 if p > 128 else 0)  # type: ignore
-            except Exception:
-                bin_bot = img_bot
+            bin_top = img_top
+            bin_bot = img_bot
         # 调试：保存 ROI 及上下半区（含二值化）到 output/debug/roi
         try:
             dbg = (self.cfg.get("debug", {}) or {})
@@ -848,8 +831,9 @@ class Buyer:
                 bin_top,
                 base_url=str(ocfg.get("base_url", "http://127.0.0.1:1224")),
                 timeout=float(ocfg.get("timeout_sec", 2.5) or 2.5),
-                options=dict(ocfg.get("options", {}) or {}),
+                options=ocr_options(ocfg, "price"),
                 offset=(x_left, y_top),
+                allowlist=ocr_allowlist(ocfg, "price"),
             ) if bin_top is not None else []
             cand = max([c for c in cands if getattr(c, "value", None) is not None], key=lambda c: int(c.value)) if cands else None  # type: ignore[arg-type]
             val = int(getattr(cand, "value", 0)) if cand is not None and getattr(cand, "value", None) is not None else None
@@ -907,7 +891,7 @@ class Buyer:
                     bin_top,
                     base_url=str(ocfg.get("base_url", "http://127.0.0.1:1224")),
                     timeout=float(ocfg.get("timeout_sec", 2.5) or 2.5),
-                    options=dict(ocfg.get("options", {}) or {}),
+                    options=ocr_options(ocfg, "price"),
                 )
                 txt = " ".join((b.text or "").strip() for b in boxes if (b.text or "").strip())
             ocr_ms = int((time.perf_counter() - t_ocr) * 1000.0)
@@ -939,8 +923,9 @@ class Buyer:
                         bin_bot,
                         base_url=str(ocfg.get("base_url", "http://127.0.0.1:1224")),
                         timeout=float(ocfg.get("timeout_sec", 2.5) or 2.5),
-                        options=dict(ocfg.get("options", {}) or {}),
+                        options=ocr_options(ocfg, "price"),
                         offset=(x_left, y_top + mid_h),
+                        allowlist=ocr_allowlist(ocfg, "price"),
                     )
                     cand2 = max([c for c in cands2 if getattr(c, "value", None) is not None], key=lambda c: int(c.value)) if cands2 else None  # type: ignore[arg-type]
                     val2 = int(getattr(cand2, "value", 0)) if cand2 is not None and getattr(cand2, "value", None) is not None else None
@@ -1296,6 +1281,10 @@ class TaskRunner:
             paths_cfg = {}
         out_dir = Path(output_dir) if output_dir is not None else Path(paths_cfg.get("output_dir", "output"))
         self.history_paths = _resolve_history_paths(out_dir)
+        try:
+            configure_history_from_cfg(self.cfg)
+        except Exception:
+            pass
 
         # 派生辅助对象
         # 高级配置：延时单位 ms，默认 15ms；兼容旧字段 step_delays.default（秒）
@@ -1951,6 +1940,12 @@ class TaskRunner:
                 self._relay_log(f"【{_now_label()}】【全局】【-】：运行异常：{e}")
             except Exception:
                 pass
+        finally:
+            # 任务结束：把写后队列中的历史记录落盘
+            try:
+                _flush_history_writer()
+            except Exception:
+                pass
 
     def _run_round_robin(self, tasks: List[Dict[str, Any]]) -> None:
         # 按顺序循环执行已启用的任务
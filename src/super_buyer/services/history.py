@@ -1,17 +1,73 @@
 """
 价格与购买历史记录写入。
+
+存储后端由 `configure_history_from_cfg` 按配置 `history.backend` 切换：
+- "jsonl"（默认）：追加写入 output 下的 JSONL 文件；
+- "sqlite"：写入 output/history.sqlite3（见 services.history_sqlite），首次打开时导入已有 JSONL。
+
+JSONL 后端下 `history.partition` 为 "day"/"hour" 时，价格/分钟聚合/购买记录按记录时间
+写入 output/history_segments 下的分段文件（见 services.history_segments），查询只打开
+与 since_ts 相交的分段；"none" 保持旧版单文件追加。
+`history.columnar` 为真时分钟聚合落盘同时追加到列式存储（见 services.history_columnar），
+供走势图以内存映射数组读取。
+`history.shared_output` 为真时（多个进程共用同一输出目录，仅 JSONL 后端）：追加与改写在
+输出目录的跨进程文件锁内进行、不复用打开的句柄（压缩线程替换文件后不会写入旧文件），
+记录附带写入者标识 wid 与序号 seq，分钟聚合由持有租约的进程负责，其余进程把样本转交持有者，
+由持有者在落盘分钟前并入（见 services.history_locking）。
+购买记录写入时同步更新物化汇总（按物品/任务/日期，见 services.history_purchase_agg），
+UI 通过 `purchase_aggregates` 读取，无需扫描全部购买记录。
+
+配置 `history.write_behind` 为真时启用写后线程（`HistoryWriter`）：`append_*` 只把记录
+放入有界队列，由后台线程批量写入（JSONL 复用打开的句柄，每批 flush、定期 fsync）；
+队列满时退回调用方线程同步写入，不丢记录。
 """
 
 from __future__ import annotations
 
+import atexit
 import json
+import os
+import queue
 import threading
 import time
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, Optional, Tuple
+from typing import IO, Any, Callable, ContextManager, Dict, List, Optional, Tuple
+
+from super_buyer.services.history_columnar import COLUMNAR_DIRNAME, columnar_available, get_columnar_store
+from super_buyer.services.history_locking import (
+    DEFAULT_LEASE_SEC,
+    forward_minute_sample,
+    get_minute_owners,
+    get_process_lock,
+    inbox_items,
+    release_minute_owners,
+    take_minute_samples,
+    writer_identity,
+)
+from super_buyer.services.history_purchase_agg import (
+    PurchaseAggregates,
+    get_purchase_aggregates,
+    save_purchase_aggregates,
+)
+from super_buyer.services.history_segments import SEGMENT_DIRNAME, SegmentManifest, get_manifest, normalize_partition
+from super_buyer.services.history_sqlite import DB_FILENAME, HistoryDB, get_history_db
+from super_buyer.services.history_tombstones import get_tombstones
+
+# 所有历史写入（含分钟聚合状态）共用的可重入锁
+_LOCK = threading.RLock()
 
-_LOCK = threading.Lock()
+HISTORY_BACKENDS = ("jsonl", "sqlite")
+_BACKEND: Dict[str, Any] = {
+    "name": "jsonl",
+    "import_jsonl": True,
+    "partition": "none",
+    "columnar": False,
+    "shared": False,
+    "owner_lease_sec": DEFAULT_LEASE_SEC,
+}
+# 本进程已完成 JSONL 导入检查的库文件
+_IMPORT_CHECKED: set[str] = set()
 
 
 @dataclass
@@ -20,6 +76,14 @@ class HistoryPaths:
     price_file: Path
     price_minutely_file: Path
     purchase_file: Path
+    sqlite_file: Path
+    # 汇总层级（见 services.history_rollup）
+    price_hourly_file: Path
+    price_daily_file: Path
+    # 分段存储目录（history.partition != "none" 时写入）
+    segments_dir: Path
+    # 列式走势存储目录（history.columnar 为真时写入）
+    columns_dir: Path
 
 
 def resolve_paths(base_dir: Path | str) -> HistoryPaths:
@@ -30,12 +94,394 @@ def resolve_paths(base_dir: Path | str) -> HistoryPaths:
         price_file=base / "price_history.jsonl",
         price_minutely_file=base / "price_history_minutely.jsonl",
         purchase_file=base / "purchase_history.jsonl",
+        sqlite_file=base / DB_FILENAME,
+        price_hourly_file=base / "price_history_hourly.jsonl",
+        price_daily_file=base / "price_history_daily.jsonl",
+        segments_dir=base / SEGMENT_DIRNAME,
+        columns_dir=base / COLUMNAR_DIRNAME,
+    )
+
+
+def _legacy_file(paths: HistoryPaths, kind: str) -> Path:
+    if kind == "price_minutely":
+        return paths.price_minutely_file
+    if kind == "purchase":
+        return paths.purchase_file
+    return paths.price_file
+
+
+def history_manifest(paths: HistoryPaths) -> SegmentManifest:
+    """输出目录的分段 manifest；共享模式下修改 manifest 时持跨进程写锁并合并其他进程的改动。"""
+    lock = get_process_lock(paths.base_dir) if history_shared() else None
+    return get_manifest(paths.segments_dir, lock)
+
+
+def _target_file(paths: HistoryPaths, kind: str, ts: float) -> Path:
+    partition = history_partition()
+    if partition == "none":
+        return _legacy_file(paths, kind)
+    return history_manifest(paths).segment_for(kind, ts, partition)
+
+
+def history_sources(paths: HistoryPaths, kind: str, since_ts: Optional[float] = None) -> List[Path]:
+    """kind（price/price_minutely/purchase）在 since_ts 之后可能有记录的 JSONL 文件，按时间先后。
+
+    旧版单文件在前：未启用分段时它仍在追加，总是包含；启用分段后按其最大 ts 判断是否跳过。
+    分段目录存在即参与查询（切回 "none" 后已写入的分段仍可见）。
+    """
+    out: List[Path] = []
+    legacy = _legacy_file(paths, kind)
+    manifest = history_manifest(paths) if paths.segments_dir.exists() else None
+    if legacy.exists():
+        if since_ts is None or manifest is None or history_partition() == "none":
+            out.append(legacy)
+        else:
+            max_ts = manifest.legacy_max_ts(kind, legacy)
+            if max_ts is not None and max_ts >= float(since_ts):
+                out.append(legacy)
+    if manifest is not None:
+        out.extend(manifest.segments(kind, since_ts))
+    return out
+
+
+class _SharedWriteLock:
+    """进程内写锁 + 输出目录的跨进程文件锁（history.shared_output）。"""
+
+    def __init__(self, base_dir: Path) -> None:
+        self._proc = get_process_lock(base_dir)
+
+    def __enter__(self) -> "_SharedWriteLock":
+        _LOCK.acquire()
+        try:
+            self._proc.acquire()
+        except BaseException:
+            _LOCK.release()
+            raise
+        return self
+
+    def __exit__(self, *_exc: object) -> None:
+        try:
+            self._proc.release()
+        finally:
+            _LOCK.release()
+
+
+def history_write_lock(paths: Optional[HistoryPaths] = None) -> ContextManager[Any]:
+    """历史文件写锁：追加、改写/裁剪 JSONL 时持有，避免与追加写交错。
+
+    传入 paths 且启用 history.shared_output 时同时持有该输出目录的跨进程文件锁。
+    替换文件前需调用 `close_history_handles()`，否则写后线程仍持有旧文件句柄。
+    """
+    if paths is not None and history_shared():
+        return _SharedWriteLock(paths.base_dir)
+    return _LOCK
+
+
+def configure_history_backend(
+    name: str,
+    *,
+    import_jsonl: bool = True,
+    partition: str = "none",
+    columnar: bool = False,
+    shared: bool = False,
+    owner_lease_sec: float = DEFAULT_LEASE_SEC,
+) -> str:
+    """切换进程内历史存储后端、JSONL 分段方式、列式存储与多进程共享；未知名称回退 jsonl/none。返回生效的后端名。"""
+    backend = str(name or "jsonl").strip().lower()
+    if backend not in HISTORY_BACKENDS:
+        backend = "jsonl"
+    _BACKEND["name"] = backend
+    _BACKEND["import_jsonl"] = bool(import_jsonl)
+    _BACKEND["partition"] = normalize_partition(partition)
+    _BACKEND["columnar"] = bool(columnar) and columnar_available()
+    with _LOCK:
+        if bool(shared) and not _BACKEND.get("shared"):
+            # 切换为共享模式：不再复用打开的句柄
+            close_history_handles()
+        _BACKEND["shared"] = bool(shared)
+    _BACKEND["owner_lease_sec"] = max(1.0, float(owner_lease_sec or DEFAULT_LEASE_SEC))
+    return backend
+
+
+def configure_history_from_cfg(cfg: Dict[str, Any]) -> str:
+    try:
+        hcfg = cfg.get("history") or {}
+    except Exception:
+        hcfg = {}
+    if not isinstance(hcfg, dict):
+        hcfg = {}
+    backend = configure_history_backend(
+        str(hcfg.get("backend", "jsonl") or "jsonl"),
+        import_jsonl=bool(hcfg.get("import_jsonl", True)),
+        partition=str(hcfg.get("partition", "none") or "none"),
+        columnar=bool(hcfg.get("columnar", False)),
+        shared=bool(hcfg.get("shared_output", False)),
+        owner_lease_sec=float(hcfg.get("owner_lease_sec", DEFAULT_LEASE_SEC) or DEFAULT_LEASE_SEC),
     )
+    try:
+        if bool(hcfg.get("write_behind", False)):
+            start_history_writer(
+                queue_size=int(hcfg.get("writer_queue_size", 10000) or 10000),
+                flush_interval_sec=float(hcfg.get("writer_flush_sec", 0.5) or 0.5),
+                fsync_interval_sec=float(hcfg.get("writer_fsync_sec", 5.0) or 0.0),
+            )
+        else:
+            stop_history_writer()
+    except Exception:
+        pass
+    return backend
+
+
+def history_backend() -> str:
+    return str(_BACKEND.get("name", "jsonl"))
+
+
+def history_partition() -> str:
+    return str(_BACKEND.get("partition", "none"))
+
+
+def history_shared() -> bool:
+    """JSONL 后端下是否与其他进程共享输出目录（SQLite 自带跨进程锁，无需协调）。"""
+    return bool(_BACKEND.get("shared", False)) and history_backend() == "jsonl"
+
+
+def history_columnar() -> bool:
+    """JSONL 后端下是否维护列式走势存储。"""
+    return bool(_BACKEND.get("columnar", False)) and history_backend() == "jsonl"
+
+
+def open_history_db(paths: HistoryPaths) -> HistoryDB:
+    """打开 paths 对应的 SQLite 历史库；按配置在首次打开时导入已有 JSONL。"""
+    db = get_history_db(paths.sqlite_file)
+    key = str(paths.sqlite_file)
+    if _BACKEND.get("import_jsonl", True) and key not in _IMPORT_CHECKED:
+        db.import_jsonl(paths)
+        _IMPORT_CHECKED.add(key)
+    return db
 
 
 _LAST_PRICE_CACHE: Dict[str, Tuple[int, float]] = {}
 _LAST_RAW_WRITE: Dict[str, Tuple[int, float]] = {}
 _MIN_AGG: Dict[str, Dict[str, Any]] = {}
+# 写后线程运行期间复用的追加句柄：路径 -> 文件对象（均在 _LOCK 下访问）
+_HANDLES: Dict[str, IO[str]] = {}
+_WRITER: Dict[str, Optional["HistoryWriter"]] = {"writer": None}
+_MAX_HANDLES = 8
+
+
+def _append_line(path: Path, text: str) -> None:
+    """追加一行 JSONL（调用方需持有写锁）；写后线程运行时复用打开的句柄。
+
+    共享模式下每次打开/追加/关闭：其他进程可能在文件锁内替换该文件。
+    """
+    if _WRITER.get("writer") is None or history_shared():
+        with path.open("a", encoding="utf-8") as fh:
+            fh.write(text)
+        return
+    key = str(path)
+    fh = _HANDLES.get(key)
+    if fh is None or fh.closed:
+        if len(_HANDLES) >= _MAX_HANDLES:
+            # 分段切换后旧分段不再写入，超过上限时整体关闭
+            close_history_handles()
+        fh = path.open("a", encoding="utf-8")
+        _HANDLES[key] = fh
+    fh.write(text)
+
+
+def _flush_handles(*, fsync: bool = False) -> None:
+    for fh in list(_HANDLES.values()):
+        try:
+            fh.flush()
+            if fsync:
+                os.fsync(fh.fileno())
+        except Exception:
+            pass
+
+
+def close_history_handles() -> None:
+    """刷新并关闭写后线程持有的文件句柄；改写/替换 JSONL 文件前在写锁内调用。"""
+    with _LOCK:
+        _flush_handles(fsync=True)
+        for fh in list(_HANDLES.values()):
+            try:
+                fh.close()
+            except Exception:
+                pass
+        _HANDLES.clear()
+
+
+class HistoryWriter:
+    """写后历史写入线程。
+
+    - 热路径 `submit` 只做入队；队列满时最多等待 `put_timeout_sec`，仍满则返回 False
+      （由调用方同步写入，保证不丢记录）；
+    - 后台线程一次取出最多 `batch_max` 条，在写锁内顺序执行后统一 flush；
+    - 距上次 fsync 超过 `fsync_interval_sec`（<=0 关闭）时对打开的句柄 fsync；
+    - `drain` 等待队列清空，`stop` 写完剩余记录后关闭句柄。
+    """
+
+    def __init__(
+        self,
+        *,
+        queue_size: int = 10000,
+        batch_max: int = 512,
+        flush_interval_sec: float = 0.5,
+        fsync_interval_sec: float = 5.0,
+        put_timeout_sec: float = 0.2,
+    ) -> None:
+        self._queue: "queue.Queue[Optional[Tuple[Callable[..., None], Tuple[Any, ...]]]]" = queue.Queue(
+            maxsize=max(1, int(queue_size))
+        )
+        self.batch_max = max(1, int(batch_max))
+        self.flush_interval_sec = max(0.01, float(flush_interval_sec))
+        self.fsync_interval_sec = float(fsync_interval_sec)
+        self.put_timeout_sec = max(0.0, float(put_timeout_sec))
+        self._thread: Optional[threading.Thread] = None
+        self._last_fsync = time.monotonic()
+        self.stats: Dict[str, int] = {"enqueued": 0, "written": 0, "batches": 0, "full": 0, "errors": 0}
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._loop, name="history-writer", daemon=True)
+        self._thread.start()
+
+    def is_alive(self) -> bool:
+        return bool(self._thread is not None and self._thread.is_alive())
+
+    def backlog(self) -> int:
+        return int(self._queue.unfinished_tasks)
+
+    def submit(self, fn: Callable[..., None], args: Tuple[Any, ...]) -> bool:
+        try:
+            self._queue.put_nowait((fn, args))
+        except queue.Full:
+            self.stats["full"] += 1
+            try:
+                # 短暂背压，尽量保持写入顺序；写线程卡住时再退回同步写
+                self._queue.put((fn, args), timeout=self.put_timeout_sec)
+            except queue.Full:
+                return False
+        self.stats["enqueued"] += 1
+        return True
+
+    def _loop(self) -> None:
+        while True:
+            try:
+                first = self._queue.get(timeout=self.flush_interval_sec)
+            except queue.Empty:
+                self._maybe_fsync(force=False)
+                continue
+            batch: List[Optional[Tuple[Callable[..., None], Tuple[Any, ...]]]] = [first]
+            while len(batch) < self.batch_max:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = False
+            with _LOCK:
+                for op in batch:
+                    if op is None:
+                        stopping = True
+                        continue
+                    fn, args = op
+                    try:
+                        fn(*args)
+                        self.stats["written"] += 1
+                    except Exception:
+                        self.stats["errors"] += 1
+                _flush_handles()
+            self.stats["batches"] += 1
+            self._maybe_fsync(force=False)
+            for _ in batch:
+                self._queue.task_done()
+            if stopping:
+                return
+
+    def _maybe_fsync(self, *, force: bool) -> None:
+        if not force and (self.fsync_interval_sec <= 0 or time.monotonic() - self._last_fsync < self.fsync_interval_sec):
+            return
+        with _LOCK:
+            _flush_handles(fsync=True)
+        self._last_fsync = time.monotonic()
+
+    def drain(self, timeout: float = 2.0) -> bool:
+        """等待已入队记录全部写入（并 flush）；超时返回 False。"""
+        deadline = time.monotonic() + max(0.0, float(timeout))
+        while self._queue.unfinished_tasks > 0:
+            if not self.is_alive() or time.monotonic() >= deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+    def stop(self, timeout: float = 5.0) -> bool:
+        """写完队列中剩余记录后退出；返回是否在超时前完成。"""
+        done = True
+        if self.is_alive():
+            try:
+                self._queue.put(None, timeout=max(0.0, float(timeout)))
+            except queue.Full:
+                done = False
+            if self._thread is not None:
+                self._thread.join(timeout=max(0.0, float(timeout)))
+                done = done and not self._thread.is_alive()
+        return done
+
+
+def start_history_writer(**kwargs: Any) -> HistoryWriter:
+    """启动（或复用已运行的）写后线程。"""
+    with _LOCK:
+        writer = _WRITER.get("writer")
+        if writer is not None and writer.is_alive():
+            return writer
+        writer = HistoryWriter(**kwargs)
+        writer.start()
+        _WRITER["writer"] = writer
+        return writer
+
+
+def stop_history_writer(timeout: float = 5.0) -> bool:
+    """排空并停止写后线程，关闭句柄、保存购买汇总并释放分钟聚合租约；之后的写入恢复同步模式。"""
+    writer = _WRITER.get("writer")
+    if writer is None:
+        with _LOCK:
+            save_purchase_aggregates()
+        release_minute_owners()
+        return True
+    done = writer.stop(timeout=timeout)
+    with _LOCK:
+        close_history_handles()
+        save_purchase_aggregates()
+        if _WRITER.get("writer") is writer:
+            _WRITER["writer"] = None
+    release_minute_owners()
+    return done
+
+
+def flush_history_writer(timeout: float = 2.0) -> bool:
+    """等待写后队列写完并落盘（例如任务结束时）；未启用写后线程时直接返回 True。"""
+    writer = _WRITER.get("writer")
+    if writer is None:
+        return True
+    ok = writer.drain(timeout=timeout)
+    writer._maybe_fsync(force=True)
+    return ok
+
+
+def history_writer() -> Optional[HistoryWriter]:
+    return _WRITER.get("writer")
+
+
+def _dispatch(fn: Callable[..., None], args: Tuple[Any, ...]) -> None:
+    writer = _WRITER.get("writer")
+    if writer is not None and writer.is_alive() and writer.submit(fn, args):
+        return
+    with _LOCK:
+        fn(*args)
+
+
+atexit.register(stop_history_writer)
 
 
 def _now_iso(ts: Optional[float] = None) -> Tuple[float, str]:
@@ -64,40 +510,105 @@ def append_price(
         return
     if price_val <= 0:
         return
-    now_ts, iso = _now_iso(ts)
+    now_ts = time.time() if ts is None else float(ts)
+    _dispatch(_write_price, (str(item_id), str(item_name or ""), price_val, now_ts, category, paths))
+
+
+def _write_price(
+    item_id: str,
+    item_name: str,
+    price_val: int,
+    now_ts: float,
+    category: Optional[str],
+    paths: HistoryPaths,
+) -> None:
+    """去重/节流后写入一次价格观测并更新分钟聚合（调用方持有 _LOCK）。
+
+    共享模式下原始记录附带 wid/seq，只有持有该物品租约的进程维护分钟聚合，
+    其余进程把样本（含未写原始记录的）转交持有者。
+    """
     last = _LAST_PRICE_CACHE.get(item_id)
     if last is not None:
         last_price, last_ts = last
         if last_price == price_val and (now_ts - last_ts) <= 2.0:
             return
+    now_ts, iso = _now_iso(now_ts)
     record = {
         "ts": now_ts,
         "iso": iso,
-        "item_id": str(item_id),
-        "item_name": str(item_name or ""),
+        "item_id": item_id,
+        "item_name": item_name,
         "price": price_val,
     }
     if category:
         record["category"] = str(category)
-    with _LOCK:
-        allow_raw = True
-        prev_raw = _LAST_RAW_WRITE.get(item_id)
-        if prev_raw is not None:
-            prev_price, prev_ts = prev_raw
-            time_ok = (now_ts - prev_ts) >= 10.0
-            abs_ok = abs(price_val - prev_price) >= 100
+    allow_raw = True
+    prev_raw = _LAST_RAW_WRITE.get(item_id)
+    if prev_raw is not None:
+        prev_price, prev_ts = prev_raw
+        time_ok = (now_ts - prev_ts) >= 10.0
+        abs_ok = abs(price_val - prev_price) >= 100
+        rel_ok = False
+        try:
+            rel_ok = abs(price_val - prev_price) >= int(round(0.02 * max(1, prev_price)))
+        except Exception:
             rel_ok = False
-            try:
-                rel_ok = abs(price_val - prev_price) >= int(round(0.02 * max(1, prev_price)))
-            except Exception:
-                rel_ok = False
-            allow_raw = bool(time_ok or abs_ok or rel_ok)
-        if allow_raw:
-            with paths.price_file.open("a", encoding="utf-8") as fh:
-                fh.write(json.dumps(record, ensure_ascii=False) + "\n")
-            _LAST_RAW_WRITE[item_id] = (price_val, now_ts)
-        _LAST_PRICE_CACHE[item_id] = (price_val, now_ts)
-    _agg_minutely(item_id, record, paths, category=category)
+        allow_raw = bool(time_ok or abs_ok or rel_ok)
+    if history_backend() == "sqlite":
+        # 分钟聚合直接在库内 UPSERT，无需内存聚合
+        open_history_db(paths).insert_price(
+            item_id=str(item_id),
+            item_name=record["item_name"],
+            price=price_val,
+            ts=now_ts,
+            iso=iso,
+            category=category,
+            raw=allow_raw,
+        )
+    elif allow_raw:
+        line = record
+        if history_shared():
+            line = writer_identity().stamp(dict(record))
+        with history_write_lock(paths):
+            _append_line(_target_file(paths, "price", now_ts), json.dumps(line, ensure_ascii=False) + "\n")
+    if allow_raw:
+        _LAST_RAW_WRITE[item_id] = (price_val, now_ts)
+    _LAST_PRICE_CACHE[item_id] = (price_val, now_ts)
+    if history_backend() != "sqlite":
+        if history_shared() and not _owns_minutes(item_id, paths):
+            _forward_minutely(item_id, record, paths, category=category)
+            return
+        _agg_minutely(item_id, record, paths, category=category)
+
+
+def _forward_minutely(item_id: str, record: Dict[str, Any], paths: HistoryPaths, *, category: Optional[str]) -> None:
+    sample = {"ts": record["ts"], "price": record["price"], "item_name": record.get("item_name", "")}
+    if category:
+        sample["category"] = str(category)
+    try:
+        with history_write_lock(paths):
+            forward_minute_sample(paths.base_dir, item_id, writer_identity().stamp(sample))
+    except Exception:
+        pass
+
+
+def _merge_forwarded(item_id: str, paths: HistoryPaths) -> None:
+    """持有者并入其他进程转交的样本（落盘分钟前调用）。"""
+    try:
+        with history_write_lock(paths):
+            samples = take_minute_samples(paths.base_dir, item_id)
+            for sample in samples:
+                _agg_minutely(item_id, sample, paths, category=sample.get("category"), forwarded=True)
+    except Exception:
+        pass
+
+
+def _owns_minutes(item_id: str, paths: HistoryPaths) -> bool:
+    """共享模式下本进程是否负责该物品的分钟聚合；租约文件不可用时按持有处理。"""
+    try:
+        return get_minute_owners(paths.base_dir, float(_BACKEND.get("owner_lease_sec") or DEFAULT_LEASE_SEC)).owns(item_id)
+    except Exception:
+        return True
 
 
 def _agg_minutely(
@@ -106,27 +617,74 @@ def _agg_minutely(
     paths: HistoryPaths,
     *,
     category: Optional[str] = None,
+    forwarded: bool = False,
 ) -> None:
     ts = float(record.get("ts", time.time()))
     minute = int(ts // 60)
-    state = _MIN_AGG.get(item_id)
-    if state is None or int(state.get("minute", -1)) != minute:
-        if state is not None:
-            _flush_minutely(item_id, state, paths, category=category)
-        _MIN_AGG[item_id] = {
-            "minute": minute,
-            "min": int(record.get("price", 0)),
-            "max": int(record.get("price", 0)),
-            "sum": int(record.get("price", 0)),
-            "cnt": 1,
-            "name": record.get("item_name", ""),
-        }
-    else:
-        state["min"] = min(int(state.get("min", record["price"])), int(record["price"]))
-        state["max"] = max(int(state.get("max", record["price"])), int(record["price"]))
-        state["sum"] = int(state.get("sum", 0)) + int(record["price"])
-        state["cnt"] = int(state.get("cnt", 0)) + 1
-        state["name"] = record.get("item_name", state.get("name", ""))
+    with _LOCK:
+        state = _MIN_AGG.get(item_id)
+        if state is not None and int(state.get("minute", -1)) != minute and not forwarded and history_shared():
+            # 本分钟落盘前先并入转交样本
+            _merge_forwarded(item_id, paths)
+            state = _MIN_AGG.get(item_id)
+        if forwarded and state is not None and minute < int(state.get("minute", minute)):
+            # 该分钟已落盘：补一条分钟记录（读取方合并同一分钟的多条记录）
+            _flush_minutely(item_id, _minute_state(minute, record, category), paths, category=category)
+            return
+        if state is None or int(state.get("minute", -1)) != minute:
+            if state is not None:
+                _flush_minutely(item_id, state, paths, category=category)
+            _MIN_AGG[item_id] = _minute_state(minute, record, category)
+        else:
+            state["min"] = min(int(state.get("min", record["price"])), int(record["price"]))
+            state["max"] = max(int(state.get("max", record["price"])), int(record["price"]))
+            state["sum"] = int(state.get("sum", 0)) + int(record["price"])
+            state["cnt"] = int(state.get("cnt", 0)) + 1
+            state["name"] = record.get("item_name", state.get("name", ""))
+            state["category"] = category or state.get("category")
+
+
+def _minute_state(minute: int, record: Dict[str, Any], category: Optional[str]) -> Dict[str, Any]:
+    price = int(record.get("price", 0))
+    return {
+        "minute": minute,
+        "min": price,
+        "max": price,
+        "sum": price,
+        "cnt": 1,
+        "name": record.get("item_name", ""),
+        "category": category,
+    }
+
+
+def pending_minute_ts(item_id: str) -> Optional[float]:
+    """物品尚在内存中聚合（未落盘）的分钟起点；没有则返回 None。"""
+    with _LOCK:
+        state = _MIN_AGG.get(str(item_id))
+        if state is None:
+            return None
+        return float(int(state.get("minute", 0)) * 60)
+
+
+def flush_closed_minutes(paths: HistoryPaths, now: Optional[float] = None) -> int:
+    """落盘已结束分钟的内存聚合（物品停止上报后其最后一分钟不会再被后续记录触发落盘）。
+
+    共享模式下先并入本进程负责（或已无人持有租约）的物品的转交样本。
+    """
+    current = int((time.time() if now is None else float(now)) // 60)
+    flushed = 0
+    with history_write_lock(paths):
+        if history_shared():
+            for item_id in inbox_items(paths.base_dir):
+                if _owns_minutes(item_id, paths):
+                    _merge_forwarded(item_id, paths)
+        for item_id, state in list(_MIN_AGG.items()):
+            if int(state.get("minute", current)) >= current:
+                continue
+            _flush_minutely(item_id, state, paths, category=state.get("category"))
+            _MIN_AGG.pop(item_id, None)
+            flushed += 1
+    return flushed
 
 
 def _flush_minutely(
@@ -152,8 +710,11 @@ def _flush_minutely(
         }
         if category:
             rec["category"] = str(category)
-        with paths.price_minutely_file.open("a", encoding="utf-8") as fh:
-            fh.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        with history_write_lock(paths):
+            line = writer_identity().stamp(dict(rec)) if history_shared() else rec
+            _append_line(_target_file(paths, "price_minutely", minute * 60), json.dumps(line, ensure_ascii=False) + "\n")
+            if history_columnar():
+                get_columnar_store(paths.columns_dir).append("minute", item_id, [rec])
     except Exception:
         pass
 
@@ -198,10 +759,72 @@ def append_purchase(
         record["category"] = str(category)
     if used_max is not None:
         record["used_max"] = bool(used_max)
-    with _LOCK:
-        with paths.purchase_file.open("a", encoding="utf-8") as fh:
-            fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+    _dispatch(_write_purchase, (record, paths))
+
+
+def _write_purchase(record: Dict[str, Any], paths: HistoryPaths) -> None:
+    if history_backend() == "sqlite":
+        # 汇总表在同一事务内 UPSERT
+        open_history_db(paths).insert_purchase(record)
+        return
+    target = _target_file(paths, "purchase", float(record["ts"]))
+    if history_shared():
+        # 其他进程也在追加：汇总由 `purchase_aggregates` 在文件锁内从文件尾部补齐
+        with history_write_lock(paths):
+            _append_line(target, json.dumps(writer_identity().stamp(dict(record)), ensure_ascii=False) + "\n")
+        return
+    _append_line(target, json.dumps(record, ensure_ascii=False) + "\n")
+    try:
+        aggs = get_purchase_aggregates(paths.base_dir)
+        # 写后队列中早于清空时间的记录已被墓碑隐藏，不计入汇总
+        cutoff = get_tombstones(paths.base_dir).cutoff("purchase", record["item_id"])
+        aggs.add(record, target, counted=cutoff is None or float(record["ts"]) > cutoff)
+        if aggs.save_due():
+            _flush_handles()
+            aggs.save()
+    except Exception:
+        pass
+
+
+def purchase_aggregates(paths: HistoryPaths) -> PurchaseAggregates:
+    """与购买记录文件对齐后的物化汇总（JSONL 后端；首次调用可能全量构建并持久化）。"""
+    aggs = get_purchase_aggregates(paths.base_dir)
+    tombstones = get_tombstones(paths.base_dir)
+
+    def _hidden(item_id: str, ts: float) -> bool:
+        cutoff = tombstones.cutoff("purchase", item_id)
+        return cutoff is not None and ts <= cutoff
+
+    with history_write_lock(paths):
+        _flush_handles()
+        aggs.sync(history_sources(paths, "purchase"), _hidden)
+    return aggs
 
 
-__all__ = ["HistoryPaths", "append_price", "append_purchase", "resolve_paths"]
+__all__ = [
+    "HISTORY_BACKENDS",
+    "HistoryPaths",
+    "HistoryWriter",
+    "append_price",
+    "append_purchase",
+    "close_history_handles",
+    "configure_history_backend",
+    "configure_history_from_cfg",
+    "flush_closed_minutes",
+    "flush_history_writer",
+    "history_backend",
+    "history_columnar",
+    "history_shared",
+    "history_partition",
+    "history_sources",
+    "history_manifest",
+    "history_write_lock",
+    "history_writer",
+    "open_history_db",
+    "pending_minute_ts",
+    "purchase_aggregates",
+    "resolve_paths",
+    "start_history_writer",
+    "stop_history_writer",
+]
 
@@ -0,0 +1,339 @@
+"""
+价格走势的列式存储（每个物品、每个层级一个定长二进制文件，内存映射读取）。
+
+布局：
+    <output>/history_columns/<tier>/<quote(item_id)>.bin
+
+- 记录为定长结构 `RECORD_DTYPE`（ts/min/max/avg/count，40 字节，小端），按时间追加；
+- 读取使用 `numpy.memmap`，按 ts 二分定位 since_ts，返回各列的只读视图（不复制、不解析 JSON）；
+- 文件不存在表示尚未从 JSONL 回填；写入方（分钟聚合落盘、小时/天汇总）只向已存在的文件追加，
+  回填由查询方在写锁内一次性完成（见 history_store.query_price_columns），避免新旧数据交错缺失；
+- 末尾不完整的记录（写入中途崩溃）读取时忽略，下次追加前截掉，避免后续记录整体错位；
+- `downsample_columns` 把任意长度的走势压到目标点数（均价线 LTTB，区间带取桶内极值），
+  图表绘制开销与时间跨度无关；
+- Windows 上被映射的文件无法替换：`rewrite`/`remove_item` 前会释放本进程的缓存映射，
+  仍失败（UI 持有视图）时返回 False，由下一轮压缩重试。
+
+缺少 numpy 时 `columnar_available()` 为 False，调用方回退到字典记录。
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote, unquote
+
+try:
+    import numpy as np  # type: ignore
+except Exception:
+    np = None  # type: ignore
+
+COLUMNAR_DIRNAME = "history_columns"
+COLUMNS = ("ts", "min", "max", "avg", "count")
+RECORD_DTYPE = (
+    np.dtype([("ts", "<f8"), ("min", "<i8"), ("max", "<i8"), ("avg", "<i8"), ("count", "<i8")])
+    if np is not None
+    else None
+)
+
+
+def columnar_available() -> bool:
+    return np is not None
+
+
+@dataclass
+class PriceColumns:
+    """一段价格走势的列视图（ts 升序）；字段与分钟/小时/天聚合记录一致。"""
+
+    tier: str
+    ts: Any
+    min: Any
+    max: Any
+    avg: Any
+    count: Any
+
+    def __len__(self) -> int:
+        return int(len(self.ts))
+
+    @classmethod
+    def empty(cls, tier: str) -> "PriceColumns":
+        return cls.from_array(np.zeros(0, dtype=RECORD_DTYPE), tier)
+
+    @classmethod
+    def from_array(cls, arr: Any, tier: str) -> "PriceColumns":
+        return cls(tier, arr["ts"], arr["min"], arr["max"], arr["avg"], arr["count"])
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]], tier: str) -> "PriceColumns":
+        return cls.from_array(records_to_array(records), tier)
+
+    @classmethod
+    def concat(cls, parts: List["PriceColumns"], tier: str) -> "PriceColumns":
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return cls.empty(tier)
+        if len(parts) == 1:
+            return parts[0]
+        return cls(tier, *(np.concatenate([getattr(p, name) for p in parts]) for name in COLUMNS))
+
+    def to_records(self, item_id: str = "") -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        for ts, lo, hi, avg, cnt in zip(
+            self.ts.tolist(), self.min.tolist(), self.max.tolist(), self.avg.tolist(), self.count.tolist()
+        ):
+            out.append({"ts": ts, "item_id": item_id, "min": lo, "max": hi, "avg": avg, "count": cnt, "tier": self.tier})
+        return out
+
+
+def records_to_array(records: Iterable[Dict[str, Any]]) -> Any:
+    """聚合记录（dict）→ RECORD_DTYPE 数组；avg<=0 或字段异常的记录跳过。"""
+    rows: List[Tuple[float, int, int, int, int]] = []
+    for rec in records:
+        try:
+            ts = float(rec.get("ts", rec.get("ts_min", 0.0)) or 0.0)
+            avg = int(rec.get("avg", rec.get("price", 0)) or 0)
+            if avg <= 0:
+                continue
+            lo = int(rec.get("min", avg) or avg)
+            hi = int(rec.get("max", avg) or avg)
+            cnt = max(1, int(rec.get("count", 1) or 1))
+        except Exception:
+            continue
+        rows.append((ts, lo, hi, avg, cnt))
+    return np.array(rows, dtype=RECORD_DTYPE)
+
+
+def extend_array(arr: Any, records: Iterable[Dict[str, Any]]) -> Any:
+    """在 RECORD_DTYPE 数组尾部接上记录（回填时补锁外期间新落盘的尾部）。"""
+    tail = records_to_array(records)
+    return np.concatenate([arr, tail]) if len(tail) else arr
+
+
+def bucket_columns(cols: PriceColumns, keys: Any, tier: str) -> PriceColumns:
+    """按已排序的桶起点 keys 合并列（min/max 取极值，avg 按 count 加权，与 rebucket 口径一致）。"""
+    if not len(cols):
+        return PriceColumns.empty(tier)
+    keys = np.asarray(keys, dtype="<f8")
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    count = np.add.reduceat(cols.count, starts)
+    total = np.add.reduceat(cols.avg * cols.count, starts)
+    return PriceColumns(
+        tier,
+        keys[starts].astype("<f8"),
+        np.minimum.reduceat(cols.min, starts),
+        np.maximum.reduceat(cols.max, starts),
+        # 与 Python round 一致的银行家舍入
+        np.round(total / count).astype("<i8"),
+        count,
+    )
+
+
+def downsample_columns(cols: PriceColumns, max_points: int) -> PriceColumns:
+    """把走势压到最多 max_points 个点（首尾点保留）。
+
+    中间部分等分为 max_points-2 个桶：均价线用 largest-triangle-three-buckets 选出每桶一个代表点
+    （保留尖峰与拐点），ts/avg 取该点；min/max 取桶内极值、count 取桶内合计，区间带不丢失极端价格。
+    """
+    n = len(cols)
+    m = max(3, int(max_points))
+    if n <= m:
+        return cols
+    x = np.asarray(cols.ts, dtype="<f8")
+    y = np.asarray(cols.avg, dtype="<f8")
+    every = (n - 2) / (m - 2)
+    # 第 i 个桶为 [bounds[i], bounds[i+1])
+    bounds = np.r_[(np.arange(m - 2) * every).astype(np.intp) + 1, n - 1]
+    sizes = np.diff(bounds)
+    next_x = np.r_[(np.add.reduceat(x[: n - 1], bounds[:-1]) / sizes)[1:], x[-1]]
+    next_y = np.r_[(np.add.reduceat(y[: n - 1], bounds[:-1]) / sizes)[1:], y[-1]]
+    sel = np.empty(m, dtype=np.intp)
+    sel[0], sel[-1] = 0, n - 1
+    a = 0
+    for i in range(m - 2):
+        lo, hi = int(bounds[i]), int(bounds[i + 1])
+        # 三角形 (a, 候选点, 下一桶均值) 面积的两倍
+        area = np.abs((x[a] - next_x[i]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y[i] - y[a]))
+        a = lo + int(np.argmax(area))
+        sel[i + 1] = a
+    # 分组：首点、各桶、尾点
+    starts = np.r_[0, bounds]
+    return PriceColumns(
+        cols.tier,
+        x[sel],
+        np.minimum.reduceat(cols.min, starts),
+        np.maximum.reduceat(cols.max, starts),
+        np.asarray(cols.avg)[sel],
+        np.add.reduceat(cols.count, starts),
+    )
+
+
+def local_date_nums(ts: Any) -> Any:
+    """epoch 秒 → matplotlib 日期数（按本地时区，与 datetime.fromtimestamp 绘图一致），向量化。"""
+    ts = np.asarray(ts, dtype="<f8")
+    if not len(ts):
+        return ts
+    first = time.localtime(float(ts[0])).tm_gmtoff
+    last = time.localtime(float(ts[-1])).tm_gmtoff
+    if first == last:
+        offset: Any = float(first)
+    else:
+        # 跨夏令时切换：逐点取偏移
+        offset = np.array([time.localtime(t).tm_gmtoff for t in ts.tolist()], dtype="<f8")
+    return (ts + offset) / 86400.0
+
+
+class ColumnarPriceStore:
+    """列式价格存储（线程安全）；同一目录在进程内共享一个实例，见 `get_columnar_store`。"""
+
+    def __init__(self, root: Path | str) -> None:
+        self.root = Path(root)
+        self._lock = threading.RLock()
+        # 路径 → ((size, mtime_ns), memmap)
+        self._maps: Dict[str, Tuple[Tuple[int, int], Any]] = {}
+
+    def file_for(self, tier: str, item_id: str) -> Path:
+        return self.root / tier / f"{quote(str(item_id), safe='')}.bin"
+
+    def exists(self, tier: str, item_id: str) -> bool:
+        return self.file_for(tier, item_id).exists()
+
+    # ---------- 写入 ----------
+    def append(self, tier: str, item_id: str, records: Iterable[Dict[str, Any]], *, create: bool = False) -> int:
+        """向已回填的文件追加记录；文件不存在且 create 为假时不写（等待回填）。返回写入条数。"""
+        path = self.file_for(tier, item_id)
+        with self._lock:
+            if not create and not path.exists():
+                return 0
+            arr = records_to_array(records)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                size = path.stat().st_size
+            except OSError:
+                size = 0
+            torn = size % RECORD_DTYPE.itemsize
+            if torn:
+                # 截掉上次崩溃留下的半条记录（Windows 上须先释放本进程的映射）
+                self._maps.pop(str(path), None)
+                try:
+                    os.truncate(path, size - torn)
+                except OSError:
+                    return 0
+            with path.open("ab") as fh:
+                fh.write(arr.tobytes())
+            return int(len(arr))
+
+    def rewrite(self, tier: str, item_id: str, arr: Any) -> bool:
+        """整文件替换（回填/裁剪）；写临时文件后原子替换。"""
+        path = self.file_for(tier, item_id)
+        with self._lock:
+            self._maps.pop(str(path), None)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(path.name + ".tmp")
+            try:
+                with tmp.open("wb") as fh:
+                    fh.write(np.ascontiguousarray(arr, dtype=RECORD_DTYPE).tobytes())
+                os.replace(tmp, path)
+                return True
+            except OSError:
+                try:
+                    tmp.unlink()
+                except OSError:
+                    pass
+                return False
+
+    def remove_item(self, item_id: str) -> None:
+        with self._lock:
+            for tier_dir in (self.root.iterdir() if self.root.exists() else []):
+                path = tier_dir / f"{quote(str(item_id), safe='')}.bin"
+                self._maps.pop(str(path), None)
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+    def prune(self, tier: str, cutoff: float) -> int:
+        """删除 ts < cutoff 的记录；返回删除条数。"""
+        removed = 0
+        tier_dir = self.root / tier
+        if not tier_dir.is_dir():
+            return 0
+        with self._lock:
+            for path in sorted(tier_dir.glob("*.bin")):
+                arr = self._map(path)
+                if arr is None or not len(arr) or float(arr["ts"][0]) >= float(cutoff):
+                    continue
+                cut = int(np.searchsorted(arr["ts"], float(cutoff), side="left"))
+                keep = np.array(arr[cut:])
+                del arr
+                if self.rewrite(tier, unquote(path.stem), keep):
+                    removed += cut
+        return removed
+
+    # ---------- 读取 ----------
+    def _map(self, path: Path) -> Optional[Any]:
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        sig = (int(st.st_size), int(st.st_mtime_ns))
+        key = str(path)
+        cached = self._maps.get(key)
+        if cached is not None and cached[0] == sig:
+            return cached[1]
+        n = int(st.st_size // RECORD_DTYPE.itemsize)
+        if n <= 0:
+            arr = np.zeros(0, dtype=RECORD_DTYPE)
+        else:
+            arr = np.memmap(path, dtype=RECORD_DTYPE, mode="r", shape=(n,))
+        self._maps[key] = (sig, arr)
+        return arr
+
+    def load(self, tier: str, item_id: str, since_ts: Optional[float] = None) -> PriceColumns:
+        """ts >= since_ts 的列视图；文件不存在时返回空列。"""
+        with self._lock:
+            arr = self._map(self.file_for(tier, item_id))
+        if arr is None or not len(arr):
+            return PriceColumns.empty(tier)
+        if since_ts is not None:
+            arr = arr[int(np.searchsorted(arr["ts"], float(since_ts), side="left")) :]
+        return PriceColumns.from_array(arr, tier)
+
+
+_STORES: Dict[str, ColumnarPriceStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_columnar_store(root: Path | str) -> ColumnarPriceStore:
+    key = str(Path(root).resolve())
+    with _STORES_LOCK:
+        store = _STORES.get(key)
+        if store is None:
+            store = _STORES[key] = ColumnarPriceStore(root)
+        return store
+
+
+def reset_columnar_stores() -> None:
+    """丢弃进程内缓存的存储实例与映射（测试或外部改动目录后使用）。"""
+    with _STORES_LOCK:
+        _STORES.clear()
+
+
+__all__ = [
+    "COLUMNAR_DIRNAME",
+    "COLUMNS",
+    "ColumnarPriceStore",
+    "PriceColumns",
+    "RECORD_DTYPE",
+    "bucket_columns",
+    "columnar_available",
+    "downsample_columns",
+    "extend_array",
+    "get_columnar_store",
+    "local_date_nums",
+    "records_to_array",
+    "reset_columnar_stores",
+]
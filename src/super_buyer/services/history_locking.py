@@ -0,0 +1,327 @@
+"""
+多进程共享同一输出目录时的历史写入协调（history.shared_output）。
+
+- `InterProcessLock`：<output>/history.lock 上的建议性文件锁（POSIX flock / Windows msvcrt），
+  进程内可重入；追加、改写/替换 JSONL、分钟聚合落盘都在该锁内进行；
+  后台压缩另用 history_compact.lock，保证同一时刻只有一个进程压缩；
+- `WriterIdentity`：每个进程一个写入者标识（wid）与单调递增序号（seq），写入记录时附带，
+  读取方可据此区分来源、检测重复或缺失的记录；
+- `MinuteOwners`：分钟聚合的归属租约（<output>/history_owners.json）。同一物品同一时刻只有一个
+  进程（租约持有者）维护分钟聚合，避免多个进程各自落盘同一分钟而互相覆盖/重复累计。
+  租约由持有者在写入时续期，进程退出时释放；异常退出时到期后由其他进程接管；
+- 转交箱：非持有者把样本追加到 <output>/history_minute_inbox/<物品>.jsonl，持有者在落盘分钟前
+  取出并入自己的分钟聚合（`forward_minute_sample` / `take_minute_samples`，调用方持写锁）。
+  转交箱按物品而非持有者划分，租约易主后由新持有者继续取出。
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote, unquote
+
+try:
+    import fcntl  # type: ignore
+except Exception:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore
+try:
+    import msvcrt  # type: ignore
+except Exception:
+    msvcrt = None  # type: ignore
+
+LOCK_FILENAME = "history.lock"
+COMPACT_LOCK_FILENAME = "history_compact.lock"
+OWNERS_FILENAME = "history_owners.json"
+INBOX_DIRNAME = "history_minute_inbox"
+DEFAULT_LEASE_SEC = 30.0
+
+
+def _lock_fd(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+    if msvcrt is not None:  # pragma: no cover - Windows
+        os.lseek(fd, 0, os.SEEK_SET)
+        while True:
+            try:
+                # LK_LOCK 内部重试约 10 秒后仍失败则抛出，继续等待
+                msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue
+
+
+def _unlock_fd(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        return
+    if msvcrt is not None:  # pragma: no cover - Windows
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+class InterProcessLock:
+    """跨进程互斥（进程内可重入、线程间互斥）；锁文件句柄在进程生命周期内保持打开。"""
+
+    def __init__(self, path: Path | str) -> None:
+        self.path = Path(path)
+        self._guard = threading.RLock()
+        self._fd: Optional[int] = None
+        self._depth = 0
+
+    def acquire(self) -> None:
+        self._guard.acquire()
+        try:
+            if self._depth == 0:
+                if self._fd is None:
+                    self.path.parent.mkdir(parents=True, exist_ok=True)
+                    self._fd = os.open(str(self.path), os.O_RDWR | os.O_CREAT, 0o644)
+                _lock_fd(self._fd)
+            self._depth += 1
+        except BaseException:
+            self._guard.release()
+            raise
+
+    def release(self) -> None:
+        try:
+            self._depth -= 1
+            if self._depth == 0 and self._fd is not None:
+                _unlock_fd(self._fd)
+        finally:
+            self._guard.release()
+
+    def __enter__(self) -> "InterProcessLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *_exc: object) -> None:
+        self.release()
+
+    def close(self) -> None:
+        with self._guard:
+            if self._fd is not None and self._depth == 0:
+                try:
+                    os.close(self._fd)
+                except OSError:
+                    pass
+                self._fd = None
+
+
+class WriterIdentity:
+    """进程级写入者标识与序号（线程安全）。"""
+
+    def __init__(self) -> None:
+        self.wid = f"{os.getpid():x}-{uuid.uuid4().hex[:6]}"
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def next_seq(self) -> int:
+        with self._lock:
+            return next(self._seq)
+
+    def stamp(self, record: Dict[str, object]) -> Dict[str, object]:
+        record["wid"] = self.wid
+        record["seq"] = self.next_seq()
+        return record
+
+
+class MinuteOwners:
+    """分钟聚合归属租约；持有者在剩余时间不足一半时续期，其余时间只查本地缓存。"""
+
+    def __init__(self, base_dir: Path | str, lock: InterProcessLock, wid: str, lease_sec: float = DEFAULT_LEASE_SEC) -> None:
+        self.path = Path(base_dir) / OWNERS_FILENAME
+        self.lock = lock
+        self.wid = wid
+        self.lease_sec = max(1.0, float(lease_sec))
+        self._mine: Dict[str, float] = {}
+        self._others: Dict[str, float] = {}
+        self._guard = threading.Lock()
+
+    def _read(self) -> Dict[str, Tuple[str, float]]:
+        try:
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+            return {str(k): (str(v[0]), float(v[1])) for k, v in dict(raw).items()}
+        except Exception:
+            return {}
+
+    def _write(self, data: Dict[str, Tuple[str, float]]) -> None:
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        try:
+            tmp.write_text(json.dumps({k: list(v) for k, v in data.items()}, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    def _cached(self, item_id: str, t: float) -> Optional[bool]:
+        """仅凭本地缓存能判定时返回结果，需要读写租约文件时返回 None（调用方持 _guard）。"""
+        until = self._mine.get(item_id)
+        if until is not None and until - t > self.lease_sec / 2:
+            return True
+        other = self._others.get(item_id)
+        if until is None and other is not None and t < other:
+            return False
+        return None
+
+    def owns(self, item_id: str, now: Optional[float] = None) -> bool:
+        """本进程是否负责该物品的分钟聚合（必要时认领/续期租约）。
+
+        加锁顺序固定为先写锁（self.lock）后 _guard：落盘线程持写锁时也会调用本方法，
+        反过来持 _guard 等写锁会与之死锁。
+        """
+        item_id = str(item_id)
+        t = time.time() if now is None else float(now)
+        with self._guard:
+            cached = self._cached(item_id, t)
+        if cached is not None:
+            return cached
+        with self.lock, self._guard:
+            cached = self._cached(item_id, t)
+            if cached is not None:
+                return cached
+            data = self._read()
+            holder = data.get(item_id)
+            if holder is not None and holder[0] != self.wid and holder[1] > t:
+                self._mine.pop(item_id, None)
+                self._others[item_id] = holder[1]
+                return False
+            data[item_id] = (self.wid, t + self.lease_sec)
+            # 顺带清理过期租约
+            data = {k: v for k, v in data.items() if v[1] > t}
+            self._write(data)
+            self._others.pop(item_id, None)
+            self._mine[item_id] = t + self.lease_sec
+            return True
+
+    def release_all(self) -> None:
+        """释放本进程持有的全部租约（退出时）。"""
+        with self._guard:
+            if not self._mine:
+                return
+        with self.lock, self._guard:
+            if not self._mine:
+                return
+            data = self._read()
+            data = {k: v for k, v in data.items() if v[0] != self.wid}
+            self._write(data)
+            self._mine.clear()
+
+
+def inbox_file(base_dir: Path | str, item_id: str) -> Path:
+    return Path(base_dir) / INBOX_DIRNAME / f"{quote(str(item_id), safe='')}.jsonl"
+
+
+def forward_minute_sample(base_dir: Path | str, item_id: str, sample: Dict[str, Any]) -> None:
+    """把一条价格样本转交给该物品的分钟聚合持有者（调用方持有写锁）。"""
+    path = inbox_file(base_dir, item_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a", encoding="utf-8") as fh:
+        fh.write(json.dumps(sample, ensure_ascii=False) + "\n")
+
+
+def take_minute_samples(base_dir: Path | str, item_id: str) -> List[Dict[str, Any]]:
+    """取出并清空该物品的转交样本（调用方持有写锁），按时间升序。"""
+    path = inbox_file(base_dir, item_id)
+    try:
+        with path.open("r", encoding="utf-8") as fh:
+            lines = fh.readlines()
+        os.remove(path)
+    except OSError:
+        return []
+    out: List[Dict[str, Any]] = []
+    for line in lines:
+        try:
+            rec = json.loads(line)
+        except Exception:
+            continue
+        if isinstance(rec, dict):
+            out.append(rec)
+    out.sort(key=lambda r: float(r.get("ts", 0.0) or 0.0))
+    return out
+
+
+def inbox_items(base_dir: Path | str) -> List[str]:
+    """有待取出转交样本的物品。"""
+    try:
+        names = os.listdir(Path(base_dir) / INBOX_DIRNAME)
+    except OSError:
+        return []
+    return [unquote(n[: -len(".jsonl")]) for n in names if n.endswith(".jsonl")]
+
+
+_IDENTITY = WriterIdentity()
+_LOCKS: Dict[str, InterProcessLock] = {}
+_OWNERS: Dict[str, MinuteOwners] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def writer_identity() -> WriterIdentity:
+    return _IDENTITY
+
+
+def get_process_lock(base_dir: Path | str, filename: str = LOCK_FILENAME) -> InterProcessLock:
+    """输出目录下 filename 对应的进程内唯一锁实例（默认写锁；压缩互斥用 COMPACT_LOCK_FILENAME）。"""
+    key = str((Path(base_dir) / filename).resolve())
+    with _REGISTRY_LOCK:
+        lock = _LOCKS.get(key)
+        if lock is None:
+            lock = _LOCKS[key] = InterProcessLock(Path(base_dir) / filename)
+        return lock
+
+
+def get_minute_owners(base_dir: Path | str, lease_sec: float = DEFAULT_LEASE_SEC) -> MinuteOwners:
+    key = str(Path(base_dir).resolve())
+    lock = get_process_lock(base_dir)
+    with _REGISTRY_LOCK:
+        owners = _OWNERS.get(key)
+        if owners is None:
+            owners = _OWNERS[key] = MinuteOwners(base_dir, lock, _IDENTITY.wid, lease_sec)
+        owners.lease_sec = max(1.0, float(lease_sec))
+        return owners
+
+
+def release_minute_owners() -> None:
+    """释放本进程在所有输出目录上的分钟聚合租约。"""
+    with _REGISTRY_LOCK:
+        owners = list(_OWNERS.values())
+    for o in owners:
+        try:
+            o.release_all()
+        except Exception:
+            pass
+
+
+def reset_history_locking() -> None:
+    """丢弃进程内缓存的锁与租约状态（测试或外部改动目录后使用）。"""
+    with _REGISTRY_LOCK:
+        locks = list(_LOCKS.values())
+        _LOCKS.clear()
+        _OWNERS.clear()
+    for lock in locks:
+        lock.close()
+
+
+__all__ = [
+    "COMPACT_LOCK_FILENAME",
+    "DEFAULT_LEASE_SEC",
+    "INBOX_DIRNAME",
+    "InterProcessLock",
+    "LOCK_FILENAME",
+    "MinuteOwners",
+    "OWNERS_FILENAME",
+    "WriterIdentity",
+    "forward_minute_sample",
+    "get_minute_owners",
+    "get_process_lock",
+    "inbox_file",
+    "inbox_items",
+    "release_minute_owners",
+    "reset_history_locking",
+    "take_minute_samples",
+    "writer_identity",
+]
@@ -0,0 +1,320 @@
+"""
+购买记录的物化汇总（JSONL 后端；SQLite 后端见 HistoryDB 的 purchase_agg 表）。
+
+每个物品维护三类汇总桶：整体（item）、按任务（task，键为任务名/任务 ID，缺省 "-"）、
+按本地日期（day，键为 YYYY-MM-DD）。桶字段：count/quantity/total_amount/min_price/max_price/
+used_max（使用最高价购买的记录数），口径同 history_store.summarize_purchases。
+
+- 写入方（services.history._write_purchase）追加一行后在写锁内调用 `add` 增量更新；
+- 持久化到 <output>/purchase_aggregates.json，同时记录每个来源文件的 (inode, 已汇总字节数)；
+  保存前调用方需 flush 写后句柄，保证偏移与汇总一致；
+- 加载时 `sync` 对比来源文件：增长的文件只读取新增部分（崩溃前未保存的记录），
+  被替换/截断/删除时全量重建；墓碑隐藏的记录不计入（清空时调用 `remove_item`）。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+AGG_FILENAME = "purchase_aggregates.json"
+AGG_VERSION = 1
+AGG_SCOPES = ("item", "task", "day")
+# 桶在文件中按列表保存：[count, quantity, total_amount, min_price, max_price, used_max]
+BUCKET_FIELDS = ("count", "quantity", "total_amount", "min_price", "max_price", "used_max")
+_SAVE_INTERVAL_SEC = 10.0
+_READ_CHUNK_BYTES = 4 * 1024 * 1024
+
+
+def empty_bucket() -> List[int]:
+    return [0, 0, 0, 0, 0, 0]
+
+
+def add_to_bucket(bucket: List[int], price: int, qty: int, amount: int, used_max: bool) -> None:
+    bucket[0] += 1
+    bucket[1] += qty
+    bucket[2] += amount
+    if bucket[3] <= 0 or price < bucket[3]:
+        bucket[3] = price
+    if price > bucket[4]:
+        bucket[4] = price
+    if used_max:
+        bucket[5] += 1
+
+
+def finish_bucket(bucket: Iterable[int]) -> Dict[str, Any]:
+    """桶 → 汇总字典（summarize_purchases 的字段 + used_max / used_max_ratio）。"""
+    out: Dict[str, Any] = dict(zip(BUCKET_FIELDS, (int(v) for v in bucket)))
+    out["avg_price"] = int(round(out["total_amount"] / out["quantity"])) if out["quantity"] > 0 else 0
+    out["used_max_ratio"] = (out["used_max"] / out["count"]) if out["count"] > 0 else 0.0
+    return out
+
+
+def day_key(ts: float) -> str:
+    return time.strftime("%Y-%m-%d", time.localtime(float(ts)))
+
+
+def task_key(record: Dict[str, Any]) -> str:
+    return str(record.get("task_name") or record.get("task_id") or "-")
+
+
+def parse_purchase(record: Dict[str, Any]) -> Optional[Tuple[str, float, int, int, int, bool]]:
+    """(item_id, ts, price, qty, amount, used_max)；无效记录返回 None。"""
+    try:
+        item_id = str(record.get("item_id") or "")
+        ts = float(record.get("ts", 0.0) or 0.0)
+        price = int(record.get("price", 0) or 0)
+        qty = int(record.get("qty", 0) or 0)
+        amount = int(record.get("amount", price * qty) or 0)
+    except Exception:
+        return None
+    if not item_id or price <= 0 or qty <= 0:
+        return None
+    if amount <= 0:
+        amount = price * qty
+    return item_id, ts, price, qty, amount, bool(record.get("used_max"))
+
+
+class PurchaseAggregates:
+    """单个输出目录的购买汇总（线程安全）；同一目录在进程内共享一个实例，见 `get_purchase_aggregates`。"""
+
+    def __init__(self, base_dir: Path | str) -> None:
+        self.path = Path(base_dir) / AGG_FILENAME
+        self._lock = threading.RLock()
+        # item_id → {"name": str, "item": bucket, "task": {key: bucket}, "day": {key: bucket}}
+        self._items: Optional[Dict[str, Dict[str, Any]]] = None
+        # 来源文件 → [inode, 已汇总字节数]
+        self._sources: Dict[str, List[int]] = {}
+        # 加载后经 `add` 追加过的文件：保存/同步时其当前大小即为已汇总字节数
+        self._touched: set[str] = set()
+        # 已与来源文件对齐（之后的追加由 `add` 增量计入）
+        self._synced = False
+        self._dirty = False
+        self._saved_at = 0.0
+
+    # ---------- 持久化 ----------
+    def _load(self) -> None:
+        items: Dict[str, Dict[str, Any]] = {}
+        sources: Dict[str, List[int]] = {}
+        try:
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+            if int(raw.get("version", 0)) == AGG_VERSION:
+                items = dict(raw.get("items") or {})
+                sources = {str(k): [int(v[0]), int(v[1])] for k, v in dict(raw.get("sources") or {}).items()}
+        except Exception:
+            items, sources = {}, {}
+        self._items = items
+        self._sources = sources
+        self._touched.clear()
+
+    def _commit_touched(self) -> None:
+        for key in self._touched:
+            try:
+                st = os.stat(key)
+            except OSError:
+                self._sources.pop(key, None)
+                continue
+            self._sources[key] = [int(st.st_ino), int(st.st_size)]
+        self._touched.clear()
+
+    def save_due(self) -> bool:
+        return self._synced and self._dirty and time.time() - self._saved_at >= _SAVE_INTERVAL_SEC
+
+    def save(self) -> None:
+        """写入汇总文件（调用方持写锁且已 flush 写后句柄）。"""
+        with self._lock:
+            if self._items is None:
+                return
+            self._commit_touched()
+            data = {"version": AGG_VERSION, "sources": self._sources, "items": self._items}
+            tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            try:
+                tmp.write_text(json.dumps(data, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+                os.replace(tmp, self.path)
+            except OSError:
+                return
+            self._dirty = False
+            self._saved_at = time.time()
+
+    # ---------- 增量更新 ----------
+    def _apply(self, record: Dict[str, Any], hidden: Optional[Callable[[str, float], bool]] = None) -> bool:
+        parsed = parse_purchase(record)
+        if parsed is None:
+            return False
+        item_id, ts, price, qty, amount, used_max = parsed
+        if hidden is not None and hidden(item_id, ts):
+            return False
+        assert self._items is not None
+        entry = self._items.get(item_id)
+        if entry is None:
+            entry = self._items[item_id] = {"name": "", "item": empty_bucket(), "task": {}, "day": {}}
+        name = str(record.get("item_name") or "")
+        if name:
+            entry["name"] = name
+        add_to_bucket(entry["item"], price, qty, amount, used_max)
+        add_to_bucket(entry["task"].setdefault(task_key(record), empty_bucket()), price, qty, amount, used_max)
+        add_to_bucket(entry["day"].setdefault(day_key(ts), empty_bucket()), price, qty, amount, used_max)
+        return True
+
+    def add(self, record: Dict[str, Any], path: Path, *, counted: bool = True) -> None:
+        """写入方把 record 追加到 path 后调用（持写锁）；尚未同步时忽略，由下次 `sync` 从文件补齐。
+
+        counted 为假（记录已被墓碑隐藏）时只推进文件偏移。
+        """
+        with self._lock:
+            if not self._synced or self._items is None:
+                return
+            if counted:
+                self._apply(record)
+            self._touched.add(str(path))
+            self._dirty = True
+
+    def remove_item(self, item_id: str) -> None:
+        """清空物品时调用（与写入墓碑在同一写锁内）。"""
+        with self._lock:
+            if self._items is None:
+                self._load()
+            assert self._items is not None
+            if self._items.pop(str(item_id), None) is not None:
+                self._dirty = True
+
+    def _read_from(self, path: Path, offset: int, hidden: Callable[[str, float], bool]) -> int:
+        """读取 offset 之后的完整行并计入汇总；返回新的偏移。"""
+        with path.open("rb") as fh:
+            fh.seek(offset)
+            rest = b""
+            while True:
+                chunk = fh.read(_READ_CHUNK_BYTES)
+                if not chunk:
+                    break
+                data = rest + chunk
+                cut = data.rfind(b"\n") + 1
+                rest = data[cut:]
+                for line in data[:cut].splitlines():
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        rec = json.loads(line)
+                    except Exception:
+                        continue
+                    if isinstance(rec, dict):
+                        self._apply(rec, hidden)
+                offset += cut
+        return offset
+
+    def sync(self, sources: List[Path], hidden: Callable[[str, float], bool]) -> None:
+        """使汇总覆盖 sources 中的全部记录（调用方持写锁且已 flush 写后句柄）。"""
+        with self._lock:
+            if self._items is None:
+                self._load()
+            self._commit_touched()
+            current: Dict[str, Tuple[Path, int, int]] = {}
+            for p in sources:
+                try:
+                    st = p.stat()
+                except OSError:
+                    continue
+                current[str(p)] = (p, int(st.st_ino), int(st.st_size))
+            rebuild = any(key not in current for key in self._sources)
+            plan: List[Tuple[str, int]] = []
+            for key, (_p, ino, size) in current.items():
+                known = self._sources.get(key)
+                if known is None:
+                    plan.append((key, 0))
+                elif known[0] != ino or size < known[1]:
+                    rebuild = True
+                elif size > known[1]:
+                    plan.append((key, known[1]))
+            if rebuild:
+                self._items = {}
+                self._sources = {}
+                plan = [(key, 0) for key in current]
+            for key, offset in plan:
+                p, ino, _size = current[key]
+                try:
+                    self._sources[key] = [ino, self._read_from(p, offset, hidden)]
+                except OSError:
+                    continue
+            self._synced = True
+            if plan or rebuild:
+                self._dirty = True
+                self.save()
+
+    # ---------- 查询 ----------
+    def item(self, item_id: str) -> Dict[str, Any]:
+        with self._lock:
+            entry = (self._items or {}).get(str(item_id))
+            return finish_bucket(entry["item"] if entry else empty_bucket())
+
+    def items(self) -> Dict[str, Dict[str, Any]]:
+        """全部物品的整体汇总（含 item_name）。"""
+        with self._lock:
+            out: Dict[str, Dict[str, Any]] = {}
+            for item_id, entry in (self._items or {}).items():
+                summary = finish_bucket(entry["item"])
+                summary["item_name"] = entry.get("name", "")
+                out[item_id] = summary
+            return out
+
+    def by_task(self, item_id: str) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            entry = (self._items or {}).get(str(item_id))
+            return {k: finish_bucket(b) for k, b in (entry["task"] if entry else {}).items()}
+
+    def by_day(self, item_id: str, since_ts: float = 0.0) -> List[Dict[str, Any]]:
+        """按日期升序；since_ts 所在日期及之后。"""
+        since_day = day_key(since_ts) if since_ts > 0 else ""
+        with self._lock:
+            entry = (self._items or {}).get(str(item_id))
+            days = sorted((entry["day"] if entry else {}).items())
+        return [dict(finish_bucket(b), day=k) for k, b in days if k >= since_day]
+
+
+_AGGS: Dict[str, PurchaseAggregates] = {}
+_AGGS_LOCK = threading.Lock()
+
+
+def get_purchase_aggregates(base_dir: Path | str) -> PurchaseAggregates:
+    key = str(Path(base_dir).resolve())
+    with _AGGS_LOCK:
+        aggs = _AGGS.get(key)
+        if aggs is None:
+            aggs = _AGGS[key] = PurchaseAggregates(base_dir)
+        return aggs
+
+
+def save_purchase_aggregates() -> None:
+    """保存进程内所有有未保存改动的汇总（调用方持写锁且已 flush 写后句柄）。"""
+    with _AGGS_LOCK:
+        aggs = list(_AGGS.values())
+    for a in aggs:
+        if a._synced and a._dirty:
+            a.save()
+
+
+def reset_purchase_aggregates() -> None:
+    """丢弃进程内缓存的汇总实例（测试或外部改动目录后使用）。"""
+    with _AGGS_LOCK:
+        _AGGS.clear()
+
+
+__all__ = [
+    "AGG_FILENAME",
+    "AGG_SCOPES",
+    "BUCKET_FIELDS",
+    "PurchaseAggregates",
+    "add_to_bucket",
+    "day_key",
+    "empty_bucket",
+    "finish_bucket",
+    "get_purchase_aggregates",
+    "parse_purchase",
+    "reset_purchase_aggregates",
+    "save_purchase_aggregates",
+    "task_key",
+]
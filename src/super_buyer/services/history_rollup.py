@@ -0,0 +1,597 @@
+"""
+价格历史分层汇总（分钟 → 小时 → 天）、保留策略与后台压缩。
+
+- 层级：分钟桶由写入路径产生（services.history._agg_minutely / SQLite UPSERT）；
+  小时、天两层由压缩器按“水位线”增量生成，只处理已结束（含 `grace_sec` 余量）的时间段；
+- 保留：原始价格默认 7 天、分钟桶 30 天，小时/天默认永久（0 表示不清理），
+  裁剪仅在文件最早记录已过期时才改写文件；
+- 查询：`choose_tier` 按时间跨度选择足够精细的最粗层级，
+  长时间范围的图表只需读取数百个小时/天桶；
+- 删除：UI 清空记录只写删除墓碑（services.history_tombstones），汇总时跳过被隐藏的记录，
+  压缩时由 `purge_tombstones` 物理删除。
+
+JSONL 后端：小时/天桶写入 `price_history_hourly.jsonl` / `price_history_daily.jsonl`，
+水位线保存在 `history_rollup_state.json`；SQLite 后端由 `HistoryDB.compact` 在库内完成。
+多进程共享输出目录（history.shared_output）时由 `history_compact.lock` 保证同一时刻只有一个进程压缩。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from super_buyer.services.history import (
+    HistoryPaths,
+    close_history_handles,
+    flush_closed_minutes,
+    history_backend,
+    history_columnar,
+    history_manifest,
+    history_shared,
+    history_sources,
+    history_write_lock,
+    open_history_db,
+)
+from super_buyer.services.history_columnar import get_columnar_store
+from super_buyer.services.history_locking import COMPACT_LOCK_FILENAME, get_process_lock
+from super_buyer.services.history_tombstones import get_tombstones
+
+TIERS = ("minute", "hour", "day")
+TIER_SECONDS: Dict[str, int] = {"minute": 60, "hour": 3600, "day": 86400}
+STATE_FILENAME = "history_rollup_state.json"
+
+
+@dataclass
+class RetentionPolicy:
+    raw_days: float = 7.0
+    minute_days: float = 30.0
+    # 0 表示永久保留
+    hour_days: float = 0.0
+    day_days: float = 0.0
+    # 选层：跨度不超过该值时使用分钟/小时层
+    minute_max_span_sec: float = 2 * 86400.0
+    hour_max_span_sec: float = 90 * 86400.0
+    # 时间段结束后再等待的秒数（等待迟到的分钟聚合落盘）
+    grace_sec: float = 120.0
+
+    @classmethod
+    def from_cfg(cls, cfg: Optional[Dict[str, Any]]) -> "RetentionPolicy":
+        try:
+            hcfg = (cfg or {}).get("history") or {}
+            rcfg = hcfg.get("retention") or {}
+        except Exception:
+            rcfg = {}
+        if not isinstance(rcfg, dict):
+            rcfg = {}
+        base = cls()
+
+        def _f(key: str, default: float) -> float:
+            try:
+                return max(0.0, float(rcfg.get(key, default)))
+            except Exception:
+                return default
+
+        return cls(
+            raw_days=_f("raw_days", base.raw_days),
+            minute_days=_f("minute_days", base.minute_days),
+            hour_days=_f("hour_days", base.hour_days),
+            day_days=_f("day_days", base.day_days),
+            minute_max_span_sec=_f("minute_max_span_sec", base.minute_max_span_sec),
+            hour_max_span_sec=_f("hour_max_span_sec", base.hour_max_span_sec),
+            grace_sec=_f("grace_sec", base.grace_sec),
+        )
+
+
+_POLICY = RetentionPolicy()
+
+
+def current_policy() -> RetentionPolicy:
+    return _POLICY
+
+
+def configure_retention_from_cfg(cfg: Dict[str, Any]) -> RetentionPolicy:
+    global _POLICY
+    _POLICY = RetentionPolicy.from_cfg(cfg)
+    return _POLICY
+
+
+# ---------- 桶与选层 ----------
+def bucket_start(ts: float, tier: str) -> float:
+    """ts 所在桶的起点；天桶按本地日期零点划分。"""
+    if tier == "day":
+        lt = time.localtime(float(ts))
+        return float(time.mktime((lt.tm_year, lt.tm_mon, lt.tm_mday, 0, 0, 0, 0, 0, -1)))
+    width = TIER_SECONDS.get(tier, 60)
+    return float(int(float(ts) // width) * width)
+
+
+def choose_tier(since_ts: float, now: Optional[float] = None, policy: Optional[RetentionPolicy] = None) -> str:
+    pol = policy or _POLICY
+    t_now = time.time() if now is None else float(now)
+    span = max(0.0, t_now - float(since_ts))
+    minute_floor = t_now - pol.minute_days * 86400.0 if pol.minute_days > 0 else float("-inf")
+    if span <= pol.minute_max_span_sec and float(since_ts) >= minute_floor:
+        return "minute"
+    if span <= pol.hour_max_span_sec:
+        return "hour"
+    return "day"
+
+
+def _record_ts(rec: Dict[str, Any]) -> float:
+    try:
+        return float(rec.get("ts", rec.get("ts_min", 0.0)) or 0.0)
+    except Exception:
+        return 0.0
+
+
+def rebucket(records: Iterable[Dict[str, Any]], tier: str) -> List[Dict[str, Any]]:
+    """将 (min/max/avg/count) 聚合记录合并到更粗的桶；按 (item_id, 桶) 分组，按时间升序返回。"""
+    groups: Dict[Tuple[str, float], Dict[str, Any]] = {}
+    for rec in records:
+        try:
+            avg = int(rec.get("avg", 0) or 0)
+            count = max(1, int(rec.get("count", 1) or 1))
+        except Exception:
+            continue
+        if avg <= 0:
+            continue
+        key = (str(rec.get("item_id", "")), bucket_start(_record_ts(rec), tier))
+        lo = int(rec.get("min", avg) or avg)
+        hi = int(rec.get("max", avg) or avg)
+        g = groups.get(key)
+        if g is None:
+            groups[key] = {
+                "min": lo,
+                "max": hi,
+                "sum": avg * count,
+                "count": count,
+                "item_name": str(rec.get("item_name", "") or ""),
+                "category": rec.get("category"),
+            }
+            continue
+        g["min"] = min(g["min"], lo)
+        g["max"] = max(g["max"], hi)
+        g["sum"] += avg * count
+        g["count"] += count
+        g["item_name"] = str(rec.get("item_name", "") or "") or g["item_name"]
+        g["category"] = rec.get("category") or g["category"]
+    out: List[Dict[str, Any]] = []
+    for (item_id, start), g in sorted(groups.items(), key=lambda kv: (kv[0][1], kv[0][0])):
+        rec = {
+            "ts": start,
+            "iso": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(start)),
+            "item_id": item_id,
+            "item_name": g["item_name"],
+            "min": g["min"],
+            "max": g["max"],
+            "avg": int(round(g["sum"] / g["count"])),
+            "count": g["count"],
+            "tier": tier,
+        }
+        if g["category"]:
+            rec["category"] = g["category"]
+        out.append(rec)
+    return out
+
+
+def merge_tier(
+    rolled: List[Dict[str, Any]],
+    finer: Callable[[float], List[Dict[str, Any]]],
+    tier: str,
+    since_ts: float,
+) -> List[Dict[str, Any]]:
+    """已汇总的桶 + 水位线之后由更细层临时合并的桶（同一桶以已汇总为准）。"""
+    by_ts: Dict[float, Dict[str, Any]] = {}
+    for rec in rolled:
+        item = dict(rec)
+        item["tier"] = tier
+        by_ts[_record_ts(rec)] = item
+    fill_from = float(since_ts)
+    if by_ts:
+        last = max(by_ts)
+        fill_from = max(fill_from, bucket_start(last + TIER_SECONDS[tier] * 1.5, tier))
+    for rec in rebucket(finer(fill_from), tier):
+        by_ts.setdefault(float(rec["ts"]), rec)
+    return [by_ts[k] for k in sorted(by_ts)]
+
+
+# ---------- JSONL 压缩 ----------
+def _iter_jsonl(path: Path) -> Iterator[Dict[str, Any]]:
+    if not path.exists():
+        return
+    with path.open("r", encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+            except Exception:
+                continue
+            if isinstance(rec, dict):
+                yield rec
+
+
+def _append_records(path: Path, records: List[Dict[str, Any]], paths: Optional[HistoryPaths] = None) -> None:
+    if not records:
+        return
+    with history_write_lock(paths):
+        with path.open("a", encoding="utf-8") as fh:
+            for rec in records:
+                rec = {k: v for k, v in rec.items() if k != "tier"}
+                fh.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+
+def _iter_sources(paths: HistoryPaths, kind: str, since_ts: float) -> Iterator[Dict[str, Any]]:
+    for path in history_sources(paths, kind, since_ts):
+        yield from _iter_jsonl(path)
+
+
+def _is_hidden(hidden: Dict[str, float], rec: Dict[str, Any], ts: float) -> bool:
+    cutoff = hidden.get(str(rec.get("item_id", ""))) if hidden else None
+    return cutoff is not None and ts <= cutoff
+
+
+def _minute_view(paths: HistoryPaths, start: float, end: float) -> List[Dict[str, Any]]:
+    """[start, end) 内的分钟桶：分钟文件为准，缺失的分钟由原始价格补齐（与查询口径一致）。
+
+    同一分钟的多条分钟记录（共享输出时的补记）全部保留，由上层 rebucket 按条数合并。
+    """
+    buckets: Dict[Tuple[str, float], List[Dict[str, Any]]] = {}
+    hidden = get_tombstones(paths.base_dir).snapshot("price")
+    for rec in _iter_sources(paths, "price_minutely", start):
+        ts = _record_ts(rec)
+        if _is_hidden(hidden, rec, ts):
+            continue
+        if start <= ts < end:
+            buckets.setdefault((str(rec.get("item_id", "")), bucket_start(ts, "minute")), []).append(rec)
+    raw: List[Dict[str, Any]] = []
+    for rec in _iter_sources(paths, "price", start):
+        ts = _record_ts(rec)
+        if not (start <= ts < end) or _is_hidden(hidden, rec, ts):
+            continue
+        if (str(rec.get("item_id", "")), bucket_start(ts, "minute")) in buckets:
+            continue
+        try:
+            price = int(rec.get("price", 0) or 0)
+        except Exception:
+            continue
+        if price > 0:
+            raw.append({**rec, "min": price, "max": price, "avg": price, "count": 1})
+    out = [rec for recs in buckets.values() for rec in recs]
+    out.extend(rebucket(raw, "minute"))
+    return out
+
+
+def _first_ts(path: Path) -> Optional[float]:
+    for rec in _iter_jsonl(path):
+        return _record_ts(rec)
+    return None
+
+
+def prune_jsonl(path: Path, cutoff: float, paths: Optional[HistoryPaths] = None) -> int:
+    """删除 ts < cutoff 的记录；返回删除条数。"""
+    first = _first_ts(path)
+    if first is None or first >= cutoff:
+        return 0
+    return rewrite_jsonl(path, lambda rec: _record_ts(rec) < cutoff, paths)
+
+
+def rewrite_jsonl(path: Path, drop: Callable[[Dict[str, Any]], bool], paths: Optional[HistoryPaths] = None) -> int:
+    """删除 drop(rec) 为真的记录；返回删除条数（没有可删记录时不替换文件）。
+
+    先在锁外写临时文件，持锁时仅补上期间新追加的字节并原子替换，避免长时间阻塞写入方。
+    传入 paths 时在共享模式下同时持有输出目录的跨进程文件锁。
+    """
+    if not path.exists():
+        return 0
+    tmp = path.with_name(path.name + ".compact")
+    removed = 0
+    size0 = path.stat().st_size
+    with path.open("rb") as src, tmp.open("wb") as dst:
+        consumed = 0
+        for line in src:
+            consumed += len(line)
+            if consumed > size0:
+                # 期间追加的内容留给持锁阶段整体拷贝
+                consumed -= len(line)
+                break
+            stripped = line.strip()
+            if not stripped:
+                continue
+            try:
+                rec = json.loads(stripped)
+            except Exception:
+                continue
+            if isinstance(rec, dict) and drop(rec):
+                removed += 1
+                continue
+            dst.write(stripped + b"\n")
+        if removed == 0:
+            dst.close()
+            tmp.unlink()
+            return 0
+        with history_write_lock(paths):
+            close_history_handles()
+            src.seek(consumed)
+            dst.write(src.read())
+            dst.flush()
+            src.close()
+            dst.close()
+            os.replace(tmp, path)
+    return removed
+
+
+def purge_tombstones(paths: HistoryPaths) -> Dict[str, int]:
+    """物理删除删除墓碑覆盖的记录并撤销墓碑；返回各 kind 删除的记录数。
+
+    每个文件经 `rewrite_jsonl` 临时文件 + 原子替换；列式文件整体删除，下次查询时由 JSONL 回填。
+    任一文件失败时保留墓碑，下轮重试（已改写的文件再次处理时不会重复删除）。
+    """
+    stones = get_tombstones(paths.base_dir)
+    stats = {"price": 0, "purchase": 0}
+    for tkind, kinds, rolled in (
+        ("price", ("price", "price_minutely"), (paths.price_hourly_file, paths.price_daily_file)),
+        ("purchase", ("purchase",), ()),
+    ):
+        snap = stones.snapshot(tkind)
+        if not snap:
+            continue
+
+        def _drop(rec: Dict[str, Any], snap: Dict[str, float] = snap) -> bool:
+            return _is_hidden(snap, rec, _record_ts(rec))
+
+        files = [p for kind in kinds for p in history_sources(paths, kind)] + [p for p in rolled if p.exists()]
+        ok = True
+        for path in files:
+            try:
+                stats[tkind] += rewrite_jsonl(path, _drop, paths)
+            except Exception:
+                ok = False
+        if tkind == "price" and paths.columns_dir.exists():
+            with history_write_lock(paths):
+                store = get_columnar_store(paths.columns_dir)
+                for item_id in snap:
+                    store.remove_item(item_id)
+        if ok:
+            with history_write_lock(paths):
+                for item_id, cutoff in snap.items():
+                    stones.discard(tkind, item_id, cutoff)
+    return stats
+
+
+class _State:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.data: Dict[str, float] = {"hour_until": 0.0, "day_until": 0.0}
+        try:
+            raw = json.loads(path.read_text(encoding="utf-8"))
+            if isinstance(raw, dict):
+                for key in self.data:
+                    self.data[key] = float(raw.get(key, 0.0) or 0.0)
+        except Exception:
+            pass
+
+    def save(self) -> None:
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(self.data), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+
+def compact_jsonl(paths: HistoryPaths, policy: RetentionPolicy, now: Optional[float] = None) -> Dict[str, int]:
+    if history_shared():
+        # 多进程共享输出目录：同一时刻只有一个进程压缩，进度状态在锁内读取
+        with get_process_lock(paths.base_dir, COMPACT_LOCK_FILENAME):
+            return _compact_jsonl(paths, policy, now)
+    return _compact_jsonl(paths, policy, now)
+
+
+def _compact_jsonl(paths: HistoryPaths, policy: RetentionPolicy, now: Optional[float] = None) -> Dict[str, int]:
+    t_now = time.time() if now is None else float(now)
+    stats = {"minutes_flushed": flush_closed_minutes(paths, t_now), "hours": 0, "days": 0}
+    try:
+        purged = purge_tombstones(paths)
+        stats["tombstones_purged"] = purged["price"] + purged["purchase"]
+    except Exception:
+        stats["tombstones_purged"] = -1
+    state = _State(paths.base_dir / STATE_FILENAME)
+    settled = t_now - policy.grace_sec
+
+    hour_end = bucket_start(settled, "hour")
+    hour_from = state.data["hour_until"]
+    if hour_end > hour_from:
+        hours = rebucket(_minute_view(paths, hour_from, hour_end), "hour")
+        with history_write_lock(paths):
+            # 与列式回填互斥：JSONL 与列式文件同时可见新汇总
+            _append_records(paths.price_hourly_file, hours, paths)
+            _append_columns(paths, "hour", hours)
+        stats["hours"] = len(hours)
+        state.data["hour_until"] = hour_end
+        state.save()
+
+    day_end = min(bucket_start(settled, "day"), state.data["hour_until"])
+    day_from = state.data["day_until"]
+    if day_end > day_from:
+        hour_recs = [r for r in _iter_jsonl(paths.price_hourly_file) if day_from <= _record_ts(r) < day_end]
+        days = rebucket(hour_recs, "day")
+        with history_write_lock(paths):
+            _append_records(paths.price_daily_file, days, paths)
+            _append_columns(paths, "day", days)
+        stats["days"] = len(days)
+        state.data["day_until"] = day_end
+        state.save()
+
+    # 裁剪：分钟/原始数据只在其所属小时已汇总后才删除
+    rolled = state.data["hour_until"]
+    for key, path, kind, tier, days_keep in (
+        ("raw_pruned", paths.price_file, "price", None, policy.raw_days),
+        ("minute_pruned", paths.price_minutely_file, "price_minutely", "minute", policy.minute_days),
+        ("hour_pruned", paths.price_hourly_file, None, "hour", policy.hour_days),
+        ("day_pruned", paths.price_daily_file, None, "day", policy.day_days),
+    ):
+        if days_keep <= 0:
+            continue
+        cutoff = t_now - days_keep * 86400.0
+        if kind is not None:
+            cutoff = min(cutoff, rolled)
+        try:
+            stats[key] = prune_jsonl(path, cutoff, paths)
+            if kind is not None:
+                stats[key] += drop_segments(paths, kind, cutoff)
+            if tier is not None and history_columnar():
+                get_columnar_store(paths.columns_dir).prune(tier, cutoff)
+        except Exception:
+            stats[key] = -1
+    return stats
+
+
+def _append_columns(paths: HistoryPaths, tier: str, records: List[Dict[str, Any]]) -> None:
+    """汇总结果同步追加到已回填的列式文件（未回填的物品在首次查询时整体回填）。"""
+    if not records or not history_columnar():
+        return
+    by_item: Dict[str, List[Dict[str, Any]]] = {}
+    for rec in records:
+        by_item.setdefault(str(rec.get("item_id", "")), []).append(rec)
+    store = get_columnar_store(paths.columns_dir)
+    with history_write_lock(paths):
+        for item_id, recs in by_item.items():
+            try:
+                store.append(tier, item_id, recs)
+            except Exception:
+                pass
+
+
+def drop_segments(paths: HistoryPaths, kind: str, cutoff: float) -> int:
+    """删除整体早于 cutoff 的分段文件（分段粒度，跨 cutoff 的分段保留）；返回删除的记录数。"""
+    if not paths.segments_dir.exists():
+        return 0
+    removed = 0
+    with history_write_lock(paths):
+        close_history_handles()
+        for path in history_manifest(paths).drop_before(kind, cutoff):
+            try:
+                with path.open("rb") as fh:
+                    removed += sum(1 for line in fh if line.strip())
+                path.unlink()
+            except FileNotFoundError:
+                continue
+    return removed
+
+
+def compact_history(paths: HistoryPaths, policy: Optional[RetentionPolicy] = None, now: Optional[float] = None) -> Dict[str, int]:
+    """按当前后端执行一次汇总与裁剪。"""
+    pol = policy or _POLICY
+    if history_backend() == "sqlite":
+        return open_history_db(paths).compact(
+            now=time.time() if now is None else float(now),
+            raw_days=pol.raw_days,
+            minute_days=pol.minute_days,
+            hour_days=pol.hour_days,
+            day_days=pol.day_days,
+            grace_sec=pol.grace_sec,
+        )
+    return compact_jsonl(paths, pol, now)
+
+
+class HistoryCompactor:
+    """后台压缩线程：启动后延迟 `initial_delay_sec`，之后每 `interval_sec` 执行一次。"""
+
+    def __init__(
+        self,
+        paths: HistoryPaths,
+        *,
+        interval_sec: float = 600.0,
+        initial_delay_sec: float = 30.0,
+        on_error: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self.paths = paths
+        self.interval_sec = max(5.0, float(interval_sec))
+        self.initial_delay_sec = max(0.0, float(initial_delay_sec))
+        self.on_error = on_error
+        self.last_stats: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="history-compactor", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        th = self._thread
+        if th is not None:
+            th.join(timeout=timeout)
+        self._thread = None
+
+    def run_once(self, now: Optional[float] = None) -> Dict[str, int]:
+        self.last_stats = compact_history(self.paths, now=now)
+        return self.last_stats
+
+    def _run(self) -> None:
+        if self._stop.wait(self.initial_delay_sec):
+            return
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as exc:
+                if self.on_error is not None:
+                    try:
+                        self.on_error(f"历史压缩失败：{exc}")
+                    except Exception:
+                        pass
+            if self._stop.wait(self.interval_sec):
+                return
+
+
+_COMPACTOR: Optional[HistoryCompactor] = None
+
+
+def start_history_compactor(paths: HistoryPaths, cfg: Dict[str, Any], **kwargs: Any) -> HistoryCompactor:
+    """按配置启动（或重启）进程内唯一的压缩线程。"""
+    global _COMPACTOR
+    configure_retention_from_cfg(cfg)
+    try:
+        interval = float(((cfg.get("history") or {}).get("compact_interval_sec", 600.0)) or 600.0)
+    except Exception:
+        interval = 600.0
+    stop_history_compactor()
+    _COMPACTOR = HistoryCompactor(paths, interval_sec=interval, **kwargs)
+    _COMPACTOR.start()
+    return _COMPACTOR
+
+
+def stop_history_compactor() -> None:
+    global _COMPACTOR
+    comp, _COMPACTOR = _COMPACTOR, None
+    if comp is not None:
+        comp.stop()
+
+
+__all__ = [
+    "HistoryCompactor",
+    "RetentionPolicy",
+    "TIERS",
+    "TIER_SECONDS",
+    "bucket_start",
+    "choose_tier",
+    "compact_history",
+    "compact_jsonl",
+    "configure_retention_from_cfg",
+    "current_policy",
+    "drop_segments",
+    "merge_tier",
+    "prune_jsonl",
+    "purge_tombstones",
+    "rebucket",
+    "rewrite_jsonl",
+    "start_history_compactor",
+    "stop_history_compactor",
+]
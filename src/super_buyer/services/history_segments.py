@@ -0,0 +1,264 @@
+"""
+历史记录分段存储（按本地日期/小时切分 JSONL）。
+
+布局（与 logs/ 按日分目录一致的思路）：
+    <output>/history_segments/manifest.json
+    <output>/history_segments/<kind>/<YYYY-MM-DD>.jsonl        # partition = "day"
+    <output>/history_segments/<kind>/<YYYY-MM-DD_HH>.jsonl     # partition = "hour"
+
+- kind：price / price_minutely / purchase；记录按自身 ts 落入对应分段；
+- manifest 记录每个分段的 [start, end) 时间范围，查询按 since_ts 只打开相交的分段；
+  manifest 缺失或损坏时扫描目录重建；
+- 旧版单文件（price_history.jsonl 等）在启用分段后不再追加，其最大 ts 按文件
+  大小/修改时间缓存在 manifest 中，since_ts 之后没有数据时整文件跳过；
+- 多进程共享输出目录（history.shared_output）时传入跨进程写锁：读取前按 (size, mtime_ns)
+  检查 manifest 是否被其他进程改过，修改时在写锁内重新读取后合并，不以本进程的旧副本覆盖。
+
+本模块只处理文件布局，不依赖 services.history。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, ContextManager, Dict, Iterator, List, Optional, Tuple
+
+PARTITIONS = ("none", "day", "hour")
+SEGMENT_KINDS = ("price", "price_minutely", "purchase")
+SEGMENT_DIRNAME = "history_segments"
+MANIFEST_FILENAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+_DAY_FMT = "%Y-%m-%d"
+_HOUR_FMT = "%Y-%m-%d_%H"
+
+
+def normalize_partition(name: Any) -> str:
+    value = str(name or "none").strip().lower()
+    return value if value in PARTITIONS else "none"
+
+
+def segment_key(ts: float, partition: str) -> str:
+    """记录时间戳所属分段名（本地时间）。"""
+    fmt = _HOUR_FMT if partition == "hour" else _DAY_FMT
+    return time.strftime(fmt, time.localtime(float(ts)))
+
+
+def segment_bounds(key: str) -> Tuple[float, float]:
+    """分段名 → [start, end) 时间戳；日分段按本地午夜计算（跨夏令时亦正确）。"""
+    if "_" in key:
+        st = time.strptime(key, _HOUR_FMT)
+        start = time.mktime(st)
+        return start, start + 3600.0
+    st = time.strptime(key, _DAY_FMT)
+    start = time.mktime(st)
+    end = time.mktime((st.tm_year, st.tm_mon, st.tm_mday + 1, 0, 0, 0, 0, 0, -1))
+    return start, end
+
+
+def _scan_max_ts(path: Path) -> Optional[float]:
+    best: Optional[float] = None
+    with path.open("r", encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+                ts = float(rec.get("ts", rec.get("ts_min", 0.0)) or 0.0)
+            except Exception:
+                continue
+            if best is None or ts > best:
+                best = ts
+    return best
+
+
+class SegmentManifest:
+    """分段清单（线程安全）；同一目录在进程内共享一个实例，见 `get_manifest`。
+
+    lock 为跨进程写锁（共享输出目录时），加锁顺序为先 lock 后进程内锁。
+    """
+
+    def __init__(self, root: Path | str, lock: Optional[ContextManager[Any]] = None) -> None:
+        self.root = Path(root)
+        self.path = self.root / MANIFEST_FILENAME
+        self.lock = lock
+        self._lock = threading.RLock()
+        self._data: Optional[Dict[str, Any]] = None
+        self._sig: Optional[Tuple[int, int]] = None
+
+    # ---------- 读写 manifest ----------
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = self.path.stat()
+        except OSError:
+            return None
+        return int(st.st_size), int(st.st_mtime_ns)
+
+    def _load(self, fresh: bool = False) -> Dict[str, Any]:
+        """当前 manifest；共享模式下文件签名变化（其他进程写过）时重新读取，fresh 时总是重读。"""
+        if self._data is not None and not fresh and (self.lock is None or self._stat() == self._sig):
+            return self._data
+        sig = self._stat()
+        data: Dict[str, Any] = {}
+        try:
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+            if isinstance(raw, dict) and int(raw.get("version", 0)) == MANIFEST_VERSION:
+                data = raw
+        except Exception:
+            data = {}
+        if not isinstance(data.get("segments"), dict):
+            # 共享模式下只在写锁内落盘重建结果，避免覆盖其他进程刚登记的分段
+            data = self._rebuild(save=fresh or self.lock is None)
+        else:
+            self._sig = sig
+        data.setdefault("legacy", {})
+        self._data = data
+        return data
+
+    @contextmanager
+    def _writing(self) -> Iterator[Dict[str, Any]]:
+        """修改 manifest：持跨进程写锁并重新读取最新内容，由调用方在其上修改后 `_save`。"""
+        with self.lock if self.lock is not None else nullcontext():
+            with self._lock:
+                yield self._load(fresh=self.lock is not None)
+
+    def _rebuild(self, save: bool = True) -> Dict[str, Any]:
+        segments: Dict[str, Dict[str, Any]] = {}
+        for kind in SEGMENT_KINDS:
+            entries: Dict[str, Any] = {}
+            kind_dir = self.root / kind
+            if kind_dir.is_dir():
+                for p in kind_dir.glob("*.jsonl"):
+                    try:
+                        start, end = segment_bounds(p.stem)
+                    except Exception:
+                        continue
+                    entries[p.stem] = {"start": start, "end": end}
+            segments[kind] = entries
+        data = {"version": MANIFEST_VERSION, "segments": segments, "legacy": {}}
+        if save and any(segments.values()):
+            self._save(data)
+        return data
+
+    def _save(self, data: Dict[str, Any]) -> None:
+        try:
+            self.root.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            tmp.write_text(json.dumps(data, ensure_ascii=False, indent=1), encoding="utf-8")
+            os.replace(tmp, self.path)
+            self._sig = self._stat()
+        except Exception:
+            pass
+
+    def reload(self) -> None:
+        with self._lock:
+            self._data = None
+            self._sig = None
+
+    # ---------- 分段 ----------
+    def segment_file(self, kind: str, key: str) -> Path:
+        return self.root / kind / f"{key}.jsonl"
+
+    def segment_for(self, kind: str, ts: float, partition: str) -> Path:
+        """写入目标分段；首次出现的分段登记到 manifest。"""
+        key = segment_key(ts, partition)
+        with self._lock:
+            if key in self._load()["segments"].get(kind, {}):
+                return self.segment_file(kind, key)
+        with self._writing() as data:
+            kinds = data["segments"].setdefault(kind, {})
+            if key not in kinds:
+                start, end = segment_bounds(key)
+                (self.root / kind).mkdir(parents=True, exist_ok=True)
+                kinds[key] = {"start": start, "end": end}
+                self._save(data)
+        return self.segment_file(kind, key)
+
+    def segments(self, kind: str, since_ts: Optional[float] = None) -> List[Path]:
+        """与 [since_ts, +inf) 相交的分段（按起始时间升序，仅返回存在的文件）。"""
+        with self._lock:
+            entries = list(self._load()["segments"].get(kind, {}).items())
+        out: List[Tuple[float, Path]] = []
+        for key, meta in entries:
+            try:
+                start, end = float(meta["start"]), float(meta["end"])
+            except Exception:
+                continue
+            if since_ts is not None and end <= float(since_ts):
+                continue
+            p = self.segment_file(kind, key)
+            if p.exists():
+                out.append((start, p))
+        out.sort(key=lambda x: x[0])
+        return [p for _, p in out]
+
+    def drop_before(self, kind: str, cutoff: float) -> List[Path]:
+        """从 manifest 移除结束时间 <= cutoff 的分段并返回其文件（由调用方在写锁内删除）。"""
+        removed: List[Path] = []
+        with self._writing() as data:
+            kinds = data["segments"].get(kind, {})
+            for key in [k for k, m in kinds.items() if float(m.get("end", 0.0)) <= float(cutoff)]:
+                kinds.pop(key, None)
+                removed.append(self.segment_file(kind, key))
+            if removed:
+                self._save(data)
+        return removed
+
+    # ---------- 旧版单文件 ----------
+    def legacy_max_ts(self, kind: str, path: Path) -> Optional[float]:
+        """旧版单文件的最大 ts；按 (size, mtime_ns) 缓存，文件不存在返回 None。"""
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        sig = [int(st.st_size), int(st.st_mtime_ns)]
+        with self._lock:
+            data = self._load()
+            cached = data["legacy"].get(kind)
+            if isinstance(cached, dict) and cached.get("sig") == sig:
+                return cached.get("max_ts")
+        max_ts = _scan_max_ts(path)
+        with self._writing() as data:
+            data["legacy"][kind] = {"sig": sig, "max_ts": max_ts}
+            self._save(data)
+        return max_ts
+
+
+_MANIFESTS: Dict[str, SegmentManifest] = {}
+_MANIFESTS_LOCK = threading.Lock()
+
+
+def get_manifest(root: Path | str, lock: Optional[ContextManager[Any]] = None) -> SegmentManifest:
+    """root 对应的进程内唯一 manifest；lock 为共享输出目录时的跨进程写锁（每次调用更新）。"""
+    key = str(Path(root).resolve())
+    with _MANIFESTS_LOCK:
+        manifest = _MANIFESTS.get(key)
+        if manifest is None:
+            manifest = _MANIFESTS[key] = SegmentManifest(root, lock)
+        manifest.lock = lock
+        return manifest
+
+
+def reset_manifests() -> None:
+    """丢弃进程内缓存的 manifest（测试或外部改动目录后使用）。"""
+    with _MANIFESTS_LOCK:
+        _MANIFESTS.clear()
+
+
+__all__ = [
+    "MANIFEST_FILENAME",
+    "PARTITIONS",
+    "SEGMENT_DIRNAME",
+    "SEGMENT_KINDS",
+    "SegmentManifest",
+    "get_manifest",
+    "normalize_partition",
+    "reset_manifests",
+    "segment_bounds",
+    "segment_key",
+]
@@ -0,0 +1,798 @@
+"""
+价格/购买历史的 SQLite 存储（实现 docs/sqlite_storage_design.md 的历史部分）。
+
+- 表：`price_event`（原始价格事件）、`price_minutely`（分钟聚合，写入时 UPSERT）、
+  `price_hourly` / `price_daily`（小时/天汇总，由 `compact` 增量生成）、`purchase_event`（购买记录）、
+  `purchase_agg`（按物品/任务/日期的购买汇总，写入时同事务 UPSERT）、`config_meta`（schema 版本）；
+- 连接：单连接 + WAL，`check_same_thread=False`，所有读写经同一把锁串行；
+- 查询均为 `(item_id, ts_epoch)` / `(item_id, bucket_minute)` 索引上的范围查询，
+  返回的记录字段与 JSONL 读法保持一致（ts/iso/item_id/item_name/price ...）；
+- `import_jsonl` 将已有 JSONL（含 history_segments 下的分段）一次性导入，按文件名记入
+  `import_log` 防止重复导入，原文件保留。
+
+与设计文档的差异：`ts_epoch` 使用 REAL 以保留 JSONL 中的小数秒；分钟/小时聚合额外保存
+`sum_price`，平均价由 sum/count 计算，避免反复取整造成漂移。
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from super_buyer.services.history_segments import get_manifest
+
+if TYPE_CHECKING:  # pragma: no cover
+    from super_buyer.services.history import HistoryPaths
+
+SCHEMA_VERSION = 1
+DB_FILENAME = "history.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS config_meta (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    schema_version INTEGER NOT NULL,
+    created_at INTEGER NOT NULL,
+    updated_at INTEGER NOT NULL,
+    notes TEXT
+);
+CREATE TABLE IF NOT EXISTS price_event (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    item_id TEXT NOT NULL,
+    item_name TEXT NOT NULL DEFAULT '',
+    category TEXT,
+    price INTEGER NOT NULL,
+    ts_epoch REAL NOT NULL,
+    iso TEXT NOT NULL,
+    source TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_price_event_item_ts ON price_event(item_id, ts_epoch);
+CREATE INDEX IF NOT EXISTS idx_price_event_ts ON price_event(ts_epoch);
+CREATE TABLE IF NOT EXISTS price_minutely (
+    item_id TEXT NOT NULL,
+    bucket_minute INTEGER NOT NULL,
+    min_price INTEGER NOT NULL,
+    max_price INTEGER NOT NULL,
+    avg_price INTEGER NOT NULL,
+    sum_price INTEGER NOT NULL DEFAULT 0,
+    sample_count INTEGER NOT NULL,
+    item_name TEXT,
+    category TEXT,
+    updated_at INTEGER NOT NULL,
+    PRIMARY KEY (item_id, bucket_minute)
+);
+CREATE INDEX IF NOT EXISTS idx_price_minutely_bucket ON price_minutely(bucket_minute);
+CREATE TABLE IF NOT EXISTS price_hourly (
+    item_id TEXT NOT NULL,
+    bucket_hour INTEGER NOT NULL,
+    min_price INTEGER NOT NULL,
+    max_price INTEGER NOT NULL,
+    avg_price INTEGER NOT NULL,
+    sum_price INTEGER NOT NULL DEFAULT 0,
+    sample_count INTEGER NOT NULL,
+    item_name TEXT,
+    category TEXT,
+    aggregated_at INTEGER NOT NULL,
+    PRIMARY KEY (item_id, bucket_hour)
+);
+CREATE INDEX IF NOT EXISTS idx_price_hourly_bucket ON price_hourly(bucket_hour);
+CREATE TABLE IF NOT EXISTS price_daily (
+    item_id TEXT NOT NULL,
+    bucket_day INTEGER NOT NULL,
+    min_price INTEGER NOT NULL,
+    max_price INTEGER NOT NULL,
+    avg_price INTEGER NOT NULL,
+    sum_price INTEGER NOT NULL DEFAULT 0,
+    sample_count INTEGER NOT NULL,
+    item_name TEXT,
+    category TEXT,
+    aggregated_at INTEGER NOT NULL,
+    PRIMARY KEY (item_id, bucket_day)
+);
+CREATE INDEX IF NOT EXISTS idx_price_daily_bucket ON price_daily(bucket_day);
+CREATE TABLE IF NOT EXISTS purchase_event (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    item_id TEXT NOT NULL,
+    item_name TEXT NOT NULL DEFAULT '',
+    category TEXT,
+    price INTEGER NOT NULL,
+    qty INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    ts_epoch REAL NOT NULL,
+    iso TEXT NOT NULL,
+    task_id TEXT,
+    task_name TEXT,
+    used_max INTEGER,
+    meta_json TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_purchase_item_ts ON purchase_event(item_id, ts_epoch);
+CREATE INDEX IF NOT EXISTS idx_purchase_ts ON purchase_event(ts_epoch);
+CREATE TABLE IF NOT EXISTS purchase_agg (
+    item_id TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    key TEXT NOT NULL,
+    item_name TEXT NOT NULL DEFAULT '',
+    count INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    total_amount INTEGER NOT NULL,
+    min_price INTEGER NOT NULL,
+    max_price INTEGER NOT NULL,
+    used_max INTEGER NOT NULL,
+    PRIMARY KEY (item_id, scope, key)
+);
+CREATE TABLE IF NOT EXISTS import_log (
+    source TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    rows INTEGER NOT NULL,
+    imported_at INTEGER NOT NULL
+);
+"""
+
+_UPSERT_MINUTELY = """
+INSERT INTO price_minutely (
+    item_id, bucket_minute, min_price, max_price, avg_price, sum_price, sample_count,
+    item_name, category, updated_at
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(item_id, bucket_minute) DO UPDATE SET
+    min_price = MIN(price_minutely.min_price, excluded.min_price),
+    max_price = MAX(price_minutely.max_price, excluded.max_price),
+    sum_price = price_minutely.sum_price + excluded.sum_price,
+    sample_count = price_minutely.sample_count + excluded.sample_count,
+    avg_price = CAST(ROUND(
+        CAST(price_minutely.sum_price + excluded.sum_price AS REAL)
+        / (price_minutely.sample_count + excluded.sample_count)
+    ) AS INTEGER),
+    item_name = COALESCE(NULLIF(excluded.item_name, ''), price_minutely.item_name),
+    category = COALESCE(excluded.category, price_minutely.category),
+    updated_at = excluded.updated_at
+"""
+
+_UPSERT_PURCHASE_AGG = """
+INSERT INTO purchase_agg (
+    item_id, scope, key, item_name, count, quantity, total_amount, min_price, max_price, used_max
+) VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?, ?)
+ON CONFLICT(item_id, scope, key) DO UPDATE SET
+    item_name = COALESCE(NULLIF(excluded.item_name, ''), purchase_agg.item_name),
+    count = purchase_agg.count + 1,
+    quantity = purchase_agg.quantity + excluded.quantity,
+    total_amount = purchase_agg.total_amount + excluded.total_amount,
+    min_price = MIN(purchase_agg.min_price, excluded.min_price),
+    max_price = MAX(purchase_agg.max_price, excluded.max_price),
+    used_max = purchase_agg.used_max + excluded.used_max
+"""
+
+# 由 purchase_event 重建汇总（导入后/旧库首次打开）；键与 history_purchase_agg 一致
+_REBUILD_PURCHASE_AGG = """
+INSERT INTO purchase_agg (
+    item_id, scope, key, item_name, count, quantity, total_amount, min_price, max_price, used_max
+)
+SELECT item_id, 'item', '', MAX(item_name), COUNT(*), SUM(qty), SUM(amount), MIN(price), MAX(price),
+       SUM(COALESCE(used_max, 0))
+FROM purchase_event GROUP BY item_id
+UNION ALL
+SELECT item_id, 'task', COALESCE(NULLIF(task_name, ''), NULLIF(task_id, ''), '-') AS k, MAX(item_name), COUNT(*),
+       SUM(qty), SUM(amount), MIN(price), MAX(price), SUM(COALESCE(used_max, 0))
+FROM purchase_event GROUP BY item_id, k
+UNION ALL
+SELECT item_id, 'day', date(ts_epoch, 'unixepoch', 'localtime') AS k, MAX(item_name), COUNT(*),
+       SUM(qty), SUM(amount), MIN(price), MAX(price), SUM(COALESCE(used_max, 0))
+FROM purchase_event GROUP BY item_id, k
+"""
+
+# 单条 IN 查询的参数上限（SQLite 默认变量上限 999）
+_IN_CHUNK = 500
+_IMPORT_BATCH = 5000
+
+
+def _iso(ts: float) -> str:
+    try:
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))
+    except Exception:
+        return str(ts)
+
+
+def _chunks(items: List[str], size: int) -> Iterator[List[str]]:
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def _iter_jsonl(path: Path) -> Iterator[Dict[str, Any]]:
+    with path.open("r", encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+            except Exception:
+                continue
+            if isinstance(rec, dict):
+                yield rec
+
+
+class HistoryDB:
+    """单个 SQLite 历史库（线程安全）。"""
+
+    def __init__(self, path: Path | str) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=2.0)
+        self._conn.row_factory = sqlite3.Row
+        for pragma in (
+            "PRAGMA journal_mode = WAL",
+            "PRAGMA synchronous = NORMAL",
+            "PRAGMA temp_store = MEMORY",
+            "PRAGMA busy_timeout = 2000",
+        ):
+            try:
+                self._conn.execute(pragma)
+            except sqlite3.DatabaseError:
+                pass
+        self._init_schema()
+
+    def _init_schema(self) -> None:
+        now = int(time.time())
+        with self._lock, self._conn:
+            self._conn.executescript(_SCHEMA)
+            self._conn.execute(
+                "INSERT INTO config_meta (id, schema_version, created_at, updated_at) VALUES (1, ?, ?, ?) "
+                "ON CONFLICT(id) DO NOTHING",
+                (SCHEMA_VERSION, now, now),
+            )
+            # 汇总表晚于 purchase_event 引入：旧库首次打开时补建
+            if self._conn.execute("SELECT 1 FROM purchase_agg LIMIT 1").fetchone() is None:
+                self._conn.execute(_REBUILD_PURCHASE_AGG)
+
+    def close(self) -> None:
+        with self._lock:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+
+    # ---------- 写入 ----------
+    def insert_price(
+        self,
+        *,
+        item_id: str,
+        item_name: str,
+        price: int,
+        ts: float,
+        iso: Optional[str] = None,
+        category: Optional[str] = None,
+        raw: bool = True,
+        source: Optional[str] = "ocr",
+    ) -> None:
+        """写入一次价格观测：`raw` 为真时插入原始事件；分钟聚合总是 UPSERT。"""
+        ts_val = float(ts)
+        price_val = int(price)
+        name = str(item_name or "")
+        with self._lock, self._conn:
+            if raw:
+                self._conn.execute(
+                    "INSERT INTO price_event (item_id, item_name, category, price, ts_epoch, iso, source) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (str(item_id), name, category or None, price_val, ts_val, iso or _iso(ts_val), source),
+                )
+            self._conn.execute(
+                _UPSERT_MINUTELY,
+                (
+                    str(item_id),
+                    int(ts_val // 60),
+                    price_val,
+                    price_val,
+                    price_val,
+                    price_val,
+                    1,
+                    name,
+                    category or None,
+                    int(ts_val),
+                ),
+            )
+
+    def insert_purchase(self, record: Dict[str, Any]) -> None:
+        """写入一条购买记录，并在同一事务内更新 purchase_agg（物品/任务/日期三类汇总）。"""
+        ts_val = float(record.get("ts", time.time()))
+        used_max = record.get("used_max")
+        row = self._purchase_row(record, ts_val, used_max)
+        item_id, name, price, qty, amount = row[0], row[1], row[3], row[4], row[5]
+        used = 1 if used_max else 0
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO purchase_event (item_id, item_name, category, price, qty, amount, ts_epoch, iso, "
+                "task_id, task_name, used_max) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+            self._conn.executemany(
+                _UPSERT_PURCHASE_AGG,
+                [
+                    (item_id, scope, key, name, qty, amount, price, price, used)
+                    for scope, key in (
+                        ("item", ""),
+                        ("task", str(record.get("task_name") or record.get("task_id") or "-")),
+                        ("day", time.strftime("%Y-%m-%d", time.localtime(ts_val))),
+                    )
+                ],
+            )
+
+    @staticmethod
+    def _purchase_row(record: Dict[str, Any], ts_val: float, used_max: Any) -> Tuple[Any, ...]:
+        price = int(record.get("price", 0) or 0)
+        qty = int(record.get("qty", 0) or 0)
+        return (
+            str(record.get("item_id", "")),
+            str(record.get("item_name", "") or ""),
+            record.get("category") or None,
+            price,
+            qty,
+            int(record.get("amount", price * qty) or price * qty),
+            ts_val,
+            str(record.get("iso") or _iso(ts_val)),
+            record.get("task_id") or None,
+            record.get("task_name") or None,
+            None if used_max is None else int(bool(used_max)),
+        )
+
+    # ---------- 查询 ----------
+    def query_price(self, item_id: str, since_ts: float) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT ts_epoch, iso, item_id, item_name, price, category FROM price_event "
+                "WHERE item_id = ? AND ts_epoch >= ? ORDER BY ts_epoch, id",
+                (str(item_id), float(since_ts)),
+            ).fetchall()
+        return [self._price_record(r) for r in rows]
+
+    @staticmethod
+    def _price_record(r: Any) -> Dict[str, Any]:
+        rec = {"ts": r["ts_epoch"], "iso": r["iso"], "item_id": r["item_id"], "item_name": r["item_name"], "price": r["price"]}
+        if r["category"]:
+            rec["category"] = r["category"]
+        return rec
+
+    def query_price_minutely(self, item_id: str, since_ts: float) -> List[Dict[str, Any]]:
+        since_minute = int(float(since_ts) // 60)
+        if since_minute * 60 < float(since_ts):
+            since_minute += 1
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT bucket_minute, item_name, min_price, max_price, avg_price, sample_count, category "
+                "FROM price_minutely WHERE item_id = ? AND bucket_minute >= ? ORDER BY bucket_minute",
+                (str(item_id), since_minute),
+            ).fetchall()
+        out: List[Dict[str, Any]] = []
+        for r in rows:
+            ts_val = float(int(r["bucket_minute"]) * 60)
+            rec = {
+                "ts": ts_val,
+                "ts_min": ts_val,
+                "iso": _iso(ts_val),
+                "item_id": str(item_id),
+                "item_name": r["item_name"] or "",
+                "min": int(r["min_price"]),
+                "max": int(r["max_price"]),
+                "avg": int(r["avg_price"]),
+                "count": int(r["sample_count"]),
+            }
+            if r["category"]:
+                rec["category"] = r["category"]
+            out.append(rec)
+        return out
+
+    def query_purchase(self, item_id: str, since_ts: float) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT ts_epoch, iso, item_id, item_name, price, qty, amount, task_id, task_name, category, used_max "
+                "FROM purchase_event WHERE item_id = ? AND ts_epoch >= ? ORDER BY ts_epoch, id",
+                (str(item_id), float(since_ts)),
+            ).fetchall()
+        return [self._purchase_record(r) for r in rows]
+
+    @staticmethod
+    def _purchase_record(r: Any) -> Dict[str, Any]:
+        rec: Dict[str, Any] = {
+            "ts": r["ts_epoch"],
+            "iso": r["iso"],
+            "item_id": r["item_id"],
+            "item_name": r["item_name"],
+            "price": r["price"],
+            "qty": r["qty"],
+            "amount": r["amount"],
+        }
+        for key in ("task_id", "task_name", "category"):
+            if r[key]:
+                rec[key] = r[key]
+        if r["used_max"] is not None:
+            rec["used_max"] = bool(r["used_max"])
+        return rec
+
+    def count_events(self, kind: str, item_id: Optional[str], since_ts: float, until_ts: Optional[float] = None) -> int:
+        """iter_events 将返回的记录数（用于进度）。"""
+        where, args = self._event_filter(item_id, since_ts, until_ts)
+        table = "purchase_event" if kind == "purchase" else "price_event"
+        with self._lock:
+            row = self._conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {where}", args).fetchone()
+        return int(row[0] or 0)
+
+    @staticmethod
+    def _event_filter(item_id: Optional[str], since_ts: float, until_ts: Optional[float]) -> Tuple[str, List[Any]]:
+        clauses = ["ts_epoch >= ?"]
+        args: List[Any] = [float(since_ts)]
+        if until_ts is not None:
+            clauses.append("ts_epoch < ?")
+            args.append(float(until_ts))
+        if item_id is not None:
+            clauses.append("item_id = ?")
+            args.append(str(item_id))
+        return " AND ".join(clauses), args
+
+    def iter_events(
+        self, kind: str, item_id: Optional[str], since_ts: float, until_ts: Optional[float] = None, *, batch: int = 5000
+    ) -> Iterator[Dict[str, Any]]:
+        """流式读取原始价格/购买事件（kind: price/purchase），按时间升序。
+
+        使用独立的只读连接（WAL 下与写入并发），不占用本实例的锁；逐批 fetchmany，内存占用与结果行数无关。
+        """
+        where, args = self._event_filter(item_id, since_ts, until_ts)
+        if kind == "purchase":
+            sql = (
+                "SELECT ts_epoch, iso, item_id, item_name, price, qty, amount, task_id, task_name, category, used_max "
+                f"FROM purchase_event WHERE {where} ORDER BY ts_epoch, id"
+            )
+            convert = self._purchase_record
+        else:
+            sql = f"SELECT ts_epoch, iso, item_id, item_name, price, category FROM price_event WHERE {where} ORDER BY ts_epoch, id"
+            convert = self._price_record
+        conn = sqlite3.connect(self.path.resolve().as_uri() + "?mode=ro", uri=True, check_same_thread=False, timeout=2.0)
+        conn.row_factory = sqlite3.Row
+        try:
+            cur = conn.execute(sql, args)
+            while True:
+                rows = cur.fetchmany(max(1, int(batch)))
+                if not rows:
+                    break
+                for r in rows:
+                    yield convert(r)
+        finally:
+            conn.close()
+
+    def query_purchase_agg(self, scope: str, item_id: Optional[str] = None, since_key: str = "") -> List[Dict[str, Any]]:
+        """读取购买汇总行（scope: item/task/day）；item_id 为 None 时返回全部物品，按 key 升序。"""
+        sql = (
+            "SELECT item_id, key, item_name, count, quantity, total_amount, min_price, max_price, used_max "
+            "FROM purchase_agg WHERE scope = ? AND key >= ?"
+        )
+        args: List[Any] = [str(scope), str(since_key)]
+        if item_id is not None:
+            sql += " AND item_id = ?"
+            args.append(str(item_id))
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY item_id, key", args).fetchall()
+        return [dict(r) for r in rows]
+
+    def summarize_prices_by_item(self, item_ids: Iterable[str], since_ts: float) -> Dict[str, Dict[str, int]]:
+        """按物品批量汇总 since_ts 之后的原始价格（count/min/max/avg/latest）。"""
+        ids = sorted({str(i) for i in item_ids if str(i)})
+        out: Dict[str, Dict[str, int]] = {}
+        since = float(since_ts)
+        with self._lock:
+            for chunk in _chunks(ids, _IN_CHUNK):
+                marks = ",".join("?" for _ in chunk)
+                params = (*chunk, since)
+                agg = self._conn.execute(
+                    f"SELECT item_id, COUNT(*) AS n, MIN(price) AS lo, MAX(price) AS hi, SUM(price) AS total "
+                    f"FROM price_event WHERE item_id IN ({marks}) AND ts_epoch >= ? AND price > 0 GROUP BY item_id",
+                    params,
+                ).fetchall()
+                # SQLite：仅含单个 MAX() 的聚合查询中，裸列取自最大值所在行
+                latest = self._conn.execute(
+                    f"SELECT item_id, price, MAX(ts_epoch) AS ts FROM price_event "
+                    f"WHERE item_id IN ({marks}) AND ts_epoch >= ? AND price > 0 GROUP BY item_id",
+                    params,
+                ).fetchall()
+                latest_map = {r["item_id"]: int(r["price"]) for r in latest}
+                for r in agg:
+                    n = int(r["n"])
+                    out[r["item_id"]] = {
+                        "count": n,
+                        "min_price": int(r["lo"]),
+                        "max_price": int(r["hi"]),
+                        "avg_price": int(round(int(r["total"]) / n)) if n else 0,
+                        "latest_price": latest_map.get(r["item_id"], 0),
+                    }
+        return out
+
+    def query_price_rolled(self, item_id: str, since_ts: float, tier: str) -> List[Dict[str, Any]]:
+        """已汇总的小时/天桶（ts 为桶起点）。"""
+        if tier == "hour":
+            sql = (
+                "SELECT bucket_hour * 3600 AS ts, item_name, min_price, max_price, avg_price, sample_count, category "
+                "FROM price_hourly WHERE item_id = ? AND bucket_hour * 3600 >= ? ORDER BY bucket_hour"
+            )
+        elif tier == "day":
+            sql = (
+                "SELECT bucket_day AS ts, item_name, min_price, max_price, avg_price, sample_count, category "
+                "FROM price_daily WHERE item_id = ? AND bucket_day >= ? ORDER BY bucket_day"
+            )
+        else:
+            return self.query_price_minutely(item_id, since_ts)
+        with self._lock:
+            rows = self._conn.execute(sql, (str(item_id), float(since_ts))).fetchall()
+        out: List[Dict[str, Any]] = []
+        for r in rows:
+            ts_val = float(r["ts"])
+            rec = {
+                "ts": ts_val,
+                "iso": _iso(ts_val),
+                "item_id": str(item_id),
+                "item_name": r["item_name"] or "",
+                "min": int(r["min_price"]),
+                "max": int(r["max_price"]),
+                "avg": int(r["avg_price"]),
+                "count": int(r["sample_count"]),
+            }
+            if r["category"]:
+                rec["category"] = r["category"]
+            out.append(rec)
+        return out
+
+    def count_rows(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                table: int(self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0])
+                for table in ("price_event", "price_minutely", "price_hourly", "price_daily", "purchase_event")
+            }
+
+    # ---------- 汇总与保留 ----------
+    def compact(
+        self,
+        *,
+        now: float,
+        raw_days: float,
+        minute_days: float,
+        hour_days: float = 0.0,
+        day_days: float = 0.0,
+        grace_sec: float = 120.0,
+    ) -> Dict[str, int]:
+        """分钟 → 小时 → 天增量汇总（从上次最后一个桶重算，幂等），再按保留天数删除过期数据。"""
+        settled = float(now) - float(grace_sec)
+        hour_end = int(settled // 3600)
+        lt = time.localtime(settled)
+        day_end = int(time.mktime((lt.tm_year, lt.tm_mon, lt.tm_mday, 0, 0, 0, 0, 0, -1)))
+        stats: Dict[str, int] = {}
+        with self._lock, self._conn:
+            hour_from = int(self._conn.execute("SELECT COALESCE(MAX(bucket_hour), 0) FROM price_hourly").fetchone()[0])
+            stats["hours"] = self._conn.execute(
+                "INSERT OR REPLACE INTO price_hourly (item_id, bucket_hour, min_price, max_price, avg_price, sum_price, "
+                "sample_count, item_name, category, aggregated_at) "
+                "SELECT item_id, bucket_minute / 60 AS h, MIN(min_price), MAX(max_price), "
+                "CAST(ROUND(CAST(SUM(sum_price) AS REAL) / SUM(sample_count)) AS INTEGER), SUM(sum_price), "
+                "SUM(sample_count), MAX(item_name), MAX(category), ? "
+                "FROM price_minutely WHERE bucket_minute >= ? AND bucket_minute < ? GROUP BY item_id, h",
+                (int(now), hour_from * 60, hour_end * 60),
+            ).rowcount
+            day_from = int(self._conn.execute("SELECT COALESCE(MAX(bucket_day), 0) FROM price_daily").fetchone()[0])
+            day_end = min(day_end, hour_end * 3600)
+            # 天桶：本地日期零点对应的 Unix 秒
+            stats["days"] = self._conn.execute(
+                "INSERT OR REPLACE INTO price_daily (item_id, bucket_day, min_price, max_price, avg_price, sum_price, "
+                "sample_count, item_name, category, aggregated_at) "
+                "SELECT item_id, CAST(strftime('%s', date(bucket_hour * 3600, 'unixepoch', 'localtime'), 'utc') AS INTEGER) AS d, "
+                "MIN(min_price), MAX(max_price), "
+                "CAST(ROUND(CAST(SUM(sum_price) AS REAL) / SUM(sample_count)) AS INTEGER), SUM(sum_price), "
+                "SUM(sample_count), MAX(item_name), MAX(category), ? "
+                "FROM price_hourly WHERE bucket_hour * 3600 >= ? AND bucket_hour * 3600 < ? GROUP BY item_id, d",
+                (int(now), day_from, day_end),
+            ).rowcount
+            rolled_until = hour_end * 3600
+            for key, days_keep, sql, scale in (
+                ("raw_pruned", raw_days, "DELETE FROM price_event WHERE ts_epoch < ?", 1),
+                ("minute_pruned", minute_days, "DELETE FROM price_minutely WHERE bucket_minute < ?", 60),
+                ("hour_pruned", hour_days, "DELETE FROM price_hourly WHERE bucket_hour < ?", 3600),
+                ("day_pruned", day_days, "DELETE FROM price_daily WHERE bucket_day < ?", 1),
+            ):
+                if days_keep <= 0:
+                    continue
+                cutoff = float(now) - float(days_keep) * 86400.0
+                if key in ("raw_pruned", "minute_pruned"):
+                    cutoff = min(cutoff, rolled_until)
+                stats[key] = int(self._conn.execute(sql, (int(cutoff // scale),)).rowcount or 0)
+        return stats
+
+    # ---------- 清理 ----------
+    def clear_price_history(self, item_id: str) -> int:
+        with self._lock, self._conn:
+            removed = self._conn.execute("DELETE FROM price_event WHERE item_id = ?", (str(item_id),)).rowcount
+            self._conn.execute("DELETE FROM price_minutely WHERE item_id = ?", (str(item_id),))
+            self._conn.execute("DELETE FROM price_hourly WHERE item_id = ?", (str(item_id),))
+            self._conn.execute("DELETE FROM price_daily WHERE item_id = ?", (str(item_id),))
+        return int(removed or 0)
+
+    def clear_purchase_history(self, item_id: str) -> int:
+        with self._lock, self._conn:
+            removed = self._conn.execute("DELETE FROM purchase_event WHERE item_id = ?", (str(item_id),)).rowcount
+            self._conn.execute("DELETE FROM purchase_agg WHERE item_id = ?", (str(item_id),))
+        return int(removed or 0)
+
+    # ---------- JSONL 导入 ----------
+    def _imported(self, source: str) -> bool:
+        row = self._conn.execute("SELECT 1 FROM import_log WHERE source = ?", (source,)).fetchone()
+        return row is not None
+
+    def import_jsonl(self, paths: "HistoryPaths") -> Dict[str, int]:
+        """将 JSONL 历史一次性导入（每个文件/分段仅导入一次）；返回各来源导入的行数。"""
+        result: Dict[str, int] = {}
+        price_rows = 0
+        purchase_rows = 0
+        with self._lock:
+            jobs: List[Tuple[str, Path, Any]] = [
+                (paths.price_minutely_file.name, paths.price_minutely_file, self._import_minutely_rows),
+                (paths.price_file.name, paths.price_file, self._import_price_rows),
+                (paths.purchase_file.name, paths.purchase_file, self._import_purchase_rows),
+            ]
+            if paths.segments_dir.exists():
+                manifest = get_manifest(paths.segments_dir)
+                for kind, importer in (
+                    ("price_minutely", self._import_minutely_rows),
+                    ("price", self._import_price_rows),
+                    ("purchase", self._import_purchase_rows),
+                ):
+                    for seg in manifest.segments(kind):
+                        jobs.append((f"{kind}/{seg.name}", seg, importer))
+            for source, path, importer in jobs:
+                if self._imported(source):
+                    continue
+                rows = 0
+                size = 0
+                if path.exists():
+                    size = int(path.stat().st_size)
+                    with self._conn:
+                        rows = importer(path)
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO import_log (source, size, rows, imported_at) VALUES (?, ?, ?, ?)",
+                        (source, size, rows, int(time.time())),
+                    )
+                result[source] = rows
+                if importer == self._import_price_rows:
+                    price_rows += rows
+                elif importer == self._import_purchase_rows:
+                    purchase_rows += rows
+            if purchase_rows:
+                with self._conn:
+                    self._conn.execute("DELETE FROM purchase_agg")
+                    self._conn.execute(_REBUILD_PURCHASE_AGG)
+            if price_rows:
+                # 旧数据中尚未 flush 的分钟：由原始事件补齐（与 JSONL 查询的补齐口径一致）
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT OR IGNORE INTO price_minutely (item_id, bucket_minute, min_price, max_price, avg_price, "
+                        "sum_price, sample_count, item_name, category, updated_at) "
+                        "SELECT item_id, CAST(ts_epoch / 60 AS INTEGER) AS m, MIN(price), MAX(price), "
+                        "CAST(ROUND(CAST(SUM(price) AS REAL) / COUNT(*)) AS INTEGER), SUM(price), COUNT(*), "
+                        "MAX(item_name), MAX(category), CAST(MAX(ts_epoch) AS INTEGER) "
+                        "FROM price_event GROUP BY item_id, m"
+                    )
+        return result
+
+    def _batched(self, sql: str, rows: Iterator[Tuple[Any, ...]]) -> int:
+        total = 0
+        batch: List[Tuple[Any, ...]] = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= _IMPORT_BATCH:
+                self._conn.executemany(sql, batch)
+                total += len(batch)
+                batch.clear()
+        if batch:
+            self._conn.executemany(sql, batch)
+            total += len(batch)
+        return total
+
+    def _import_price_rows(self, path: Path) -> int:
+        def _rows() -> Iterator[Tuple[Any, ...]]:
+            for rec in _iter_jsonl(path):
+                try:
+                    ts_val = float(rec.get("ts", 0.0) or 0.0)
+                    price = int(rec.get("price", 0) or 0)
+                except Exception:
+                    continue
+                if not rec.get("item_id") or price <= 0:
+                    continue
+                yield (
+                    str(rec.get("item_id")),
+                    str(rec.get("item_name", "") or ""),
+                    rec.get("category") or None,
+                    price,
+                    ts_val,
+                    str(rec.get("iso") or _iso(ts_val)),
+                    "jsonl",
+                )
+
+        return self._batched(
+            "INSERT INTO price_event (item_id, item_name, category, price, ts_epoch, iso, source) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            _rows(),
+        )
+
+    def _import_minutely_rows(self, path: Path) -> int:
+        def _rows() -> Iterator[Tuple[Any, ...]]:
+            for rec in _iter_jsonl(path):
+                try:
+                    ts_val = float(rec.get("ts", rec.get("ts_min", 0.0)) or 0.0)
+                    avg = int(rec.get("avg", 0) or 0)
+                    count = max(1, int(rec.get("count", 1) or 1))
+                except Exception:
+                    continue
+                if not rec.get("item_id") or avg <= 0:
+                    continue
+                yield (
+                    str(rec.get("item_id")),
+                    int(ts_val // 60),
+                    int(rec.get("min", avg) or avg),
+                    int(rec.get("max", avg) or avg),
+                    avg,
+                    avg * count,
+                    count,
+                    str(rec.get("item_name", "") or ""),
+                    rec.get("category") or None,
+                    int(ts_val),
+                )
+
+        return self._batched(_UPSERT_MINUTELY, _rows())
+
+    def _import_purchase_rows(self, path: Path) -> int:
+        def _rows() -> Iterator[Tuple[Any, ...]]:
+            for rec in _iter_jsonl(path):
+                try:
+                    row = self._purchase_row(rec, float(rec.get("ts", 0.0) or 0.0), rec.get("used_max"))
+                except Exception:
+                    continue
+                if not row[0] or row[3] <= 0 or row[4] <= 0:
+                    continue
+                yield row
+
+        return self._batched(
+            "INSERT INTO purchase_event (item_id, item_name, category, price, qty, amount, ts_epoch, iso, "
+            "task_id, task_name, used_max) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            _rows(),
+        )
+
+
+_DBS: Dict[str, HistoryDB] = {}
+_DBS_LOCK = threading.Lock()
+
+
+def get_history_db(path: Path | str) -> HistoryDB:
+    """按文件路径复用进程内的 HistoryDB 实例。"""
+    p = Path(path)
+    try:
+        key = str(p.resolve())
+    except Exception:
+        key = str(p)
+    with _DBS_LOCK:
+        db = _DBS.get(key)
+        if db is None:
+            db = HistoryDB(p)
+            _DBS[key] = db
+        return db
+
+
+def close_history_dbs() -> None:
+    with _DBS_LOCK:
+        dbs = list(_DBS.values())
+        _DBS.clear()
+    for db in dbs:
+        db.close()
+
+
+__all__ = [
+    "DB_FILENAME",
+    "HistoryDB",
+    "SCHEMA_VERSION",
+    "close_history_dbs",
+    "get_history_db",
+]
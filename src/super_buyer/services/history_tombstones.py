@@ -0,0 +1,135 @@
+"""
+历史记录删除墓碑（JSONL 后端）。
+
+清空某物品的历史时只记录 (kind, item_id, cutoff_ts)，不改写文件：
+- 读取方（history_store / 分层汇总）隐藏该物品 ts <= cutoff_ts 的记录；
+- 后台压缩线程（services.history_rollup.purge_tombstones）在写锁内以临时文件 + 原子替换
+  物理删除记录，完成后撤销墓碑。
+
+kind：price（同时作用于原始价格、分钟/小时/天聚合与列式存储）/ purchase。
+墓碑保存在 <output>/history_tombstones.json，按文件大小/修改时间感知其他进程的改动。
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+TOMBSTONE_FILENAME = "history_tombstones.json"
+TOMBSTONE_KINDS = ("price", "purchase")
+
+
+def tombstone_kind(kind: str) -> str:
+    """存储 kind（price/price_minutely/purchase/...）对应的墓碑 kind。"""
+    return "purchase" if kind == "purchase" else "price"
+
+
+class TombstoneSet:
+    """墓碑集合（线程安全）；同一文件在进程内共享一个实例，见 `get_tombstones`。"""
+
+    def __init__(self, path: Path | str) -> None:
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._data: Dict[str, Dict[str, float]] = {k: {} for k in TOMBSTONE_KINDS}
+        self._sig: Optional[Tuple[int, int]] = None
+
+    def _refresh(self) -> None:
+        try:
+            st = self.path.stat()
+        except OSError:
+            self._sig = None
+            self._data = {k: {} for k in TOMBSTONE_KINDS}
+            return
+        sig = (int(st.st_size), int(st.st_mtime_ns))
+        if sig == self._sig:
+            return
+        data: Dict[str, Dict[str, float]] = {k: {} for k in TOMBSTONE_KINDS}
+        try:
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+            for kind in TOMBSTONE_KINDS:
+                for item_id, cutoff in dict(raw.get(kind) or {}).items():
+                    data[kind][str(item_id)] = float(cutoff)
+        except Exception:
+            pass
+        self._data = data
+        self._sig = sig
+
+    def _save(self) -> None:
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(self._data, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.path)
+        try:
+            st = self.path.stat()
+            self._sig = (int(st.st_size), int(st.st_mtime_ns))
+        except OSError:
+            self._sig = None
+
+    def add(self, kind: str, item_id: str, cutoff: float) -> float:
+        """隐藏 item_id 在 cutoff 及之前的记录；已有更晚的墓碑时保留较晚者。返回生效的 cutoff。"""
+        kind = tombstone_kind(kind)
+        with self._lock:
+            self._refresh()
+            value = max(float(cutoff), self._data[kind].get(str(item_id), float("-inf")))
+            self._data[kind][str(item_id)] = value
+            self._save()
+            return value
+
+    def cutoff(self, kind: str, item_id: str) -> Optional[float]:
+        with self._lock:
+            self._refresh()
+            return self._data[tombstone_kind(kind)].get(str(item_id))
+
+    def visible_since(self, kind: str, item_id: str, since_ts: float) -> float:
+        """把查询起点推到墓碑之后：返回 max(since_ts, 刚好大于 cutoff 的值)。"""
+        cutoff = self.cutoff(kind, item_id)
+        if cutoff is None:
+            return float(since_ts)
+        return max(float(since_ts), math.nextafter(cutoff, math.inf))
+
+    def snapshot(self, kind: str) -> Dict[str, float]:
+        with self._lock:
+            self._refresh()
+            return dict(self._data[tombstone_kind(kind)])
+
+    def discard(self, kind: str, item_id: str, cutoff: float) -> None:
+        """物理删除完成后撤销墓碑；期间被更晚的清空覆盖时保留。"""
+        kind = tombstone_kind(kind)
+        with self._lock:
+            self._refresh()
+            if self._data[kind].get(str(item_id)) == float(cutoff):
+                self._data[kind].pop(str(item_id), None)
+                self._save()
+
+
+_SETS: Dict[str, TombstoneSet] = {}
+_SETS_LOCK = threading.Lock()
+
+
+def get_tombstones(base_dir: Path | str) -> TombstoneSet:
+    path = Path(base_dir) / TOMBSTONE_FILENAME
+    key = str(path.resolve())
+    with _SETS_LOCK:
+        ts = _SETS.get(key)
+        if ts is None:
+            ts = _SETS[key] = TombstoneSet(path)
+        return ts
+
+
+def reset_tombstones() -> None:
+    """丢弃进程内缓存的墓碑实例（测试或外部改动目录后使用）。"""
+    with _SETS_LOCK:
+        _SETS.clear()
+
+
+__all__ = [
+    "TOMBSTONE_FILENAME",
+    "TOMBSTONE_KINDS",
+    "TombstoneSet",
+    "get_tombstones",
+    "reset_tombstones",
+    "tombstone_kind",
+]
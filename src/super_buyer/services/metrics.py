@@ -0,0 +1,362 @@
+"""
+运行指标：计数器、仪表与延迟直方图（进程内），供流程各步骤/OCR/截图/模板匹配记录耗时。
+
+- `Histogram`：HDR 风格的对数-线性分桶（值按微秒取整，每个 2 的幂区间再分 32 个子桶，
+  相对误差约 3%），记录为 O(1)、内存与样本数无关，可随时给出 p50/p95/p99；
+- `MetricsRegistry`：按名称创建/复用指标，`snapshot()` 返回可 JSON 序列化的快照；
+- 会话：每次运行（单商品/多商品运行器）`begin_metrics_session` 新建独立的注册表与导出线程，
+  按 `metrics.export_sec` 间隔把快照追加到 <output>/metrics/<日期>.jsonl，
+  `end_metrics_session(session)` 只结束该会话（写入最终快照并停止线程）。
+  会话绑定到开始它的线程（contextvars）：模块级 `observe_ms`/`inc`/`set_gauge` 只记录到调用方
+  所属的会话，不属于任何进行中会话时记录到默认注册表；同时运行的两次运行互不串数、互不清零、
+  互不替换导出线程。向线程池提交的任务需用 `contextvars.copy_context().run` 带上调用方的会话。
+
+指标命名（耗时单位 ms）：
+- 单商品：single.step1 … single.step8（`_log_step`），single.step2:<阶段>（`StageTimer`）；
+- 多商品：multi.scan / multi.scan.capture / multi.scan.ocr（`scan_once`）、multi.ocr_batch、
+  multi.match（卡片模板定位）；
+- 服务：ocr.request（Umi-OCR 请求）、screen.locate / screen.capture（`ScreenOps`）。
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+METRICS_DIRNAME = "metrics"
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
+
+# 子桶位数：每个 2 的幂区间 2**_SUB_BITS 个子桶
+_SUB_BITS = 5
+_SUB_COUNT = 1 << _SUB_BITS
+_LINEAR_LIMIT = _SUB_COUNT * 2
+
+
+def bucket_index(value_us: int) -> int:
+    """微秒值 → 桶序号（< 64 时一一对应，之后每个 2 的幂区间 32 个桶）。"""
+    v = max(0, int(value_us))
+    if v < _LINEAR_LIMIT:
+        return v
+    shift = v.bit_length() - (_SUB_BITS + 1)
+    return _LINEAR_LIMIT + (shift - 1) * _SUB_COUNT + ((v >> shift) - _SUB_COUNT)
+
+
+def bucket_bounds(index: int) -> Tuple[int, int]:
+    """桶序号 → 覆盖的微秒区间 [low, high]。"""
+    if index < _LINEAR_LIMIT:
+        return index, index
+    shift = (index - _LINEAR_LIMIT) // _SUB_COUNT + 1
+    sub = (index - _LINEAR_LIMIT) % _SUB_COUNT + _SUB_COUNT
+    return sub << shift, ((sub + 1) << shift) - 1
+
+
+class Histogram:
+    """延迟直方图（线程安全）；observe 以毫秒为单位。"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._buckets: Dict[int, int] = {}
+        self.count = 0
+        self.sum_ms = 0.0
+        self.min_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, value_ms: float) -> None:
+        v = max(0.0, float(value_ms))
+        idx = bucket_index(int(round(v * 1000.0)))
+        with self._lock:
+            self._buckets[idx] = self._buckets.get(idx, 0) + 1
+            if self.count == 0 or v < self.min_ms:
+                self.min_ms = v
+            if v > self.max_ms:
+                self.max_ms = v
+            self.count += 1
+            self.sum_ms += v
+
+    def quantiles(self, qs: Tuple[float, ...] = DEFAULT_QUANTILES) -> List[float]:
+        """按分位返回桶中点（ms），并夹在实际最小/最大值之间；无样本时全为 0。"""
+        with self._lock:
+            if self.count == 0:
+                return [0.0 for _ in qs]
+            items = sorted(self._buckets.items())
+            total, lo, hi = self.count, self.min_ms, self.max_ms
+        out: List[float] = []
+        for q in qs:
+            rank = max(1, math.ceil(float(q) * total))
+            seen = 0
+            value = hi
+            for idx, n in items:
+                seen += n
+                if seen >= rank:
+                    low, high = bucket_bounds(idx)
+                    value = (low + high) / 2000.0
+                    break
+            out.append(min(hi, max(lo, value)))
+        return out
+
+    def summary(self) -> Dict[str, Any]:
+        p50, p95, p99 = self.quantiles(DEFAULT_QUANTILES)
+        with self._lock:
+            count, total, lo, hi = self.count, self.sum_ms, self.min_ms, self.max_ms
+        return {
+            "count": count,
+            "sum_ms": round(total, 3),
+            "min_ms": round(lo, 3),
+            "max_ms": round(hi, 3),
+            "mean_ms": round(total / count, 3) if count else 0.0,
+            "p50_ms": round(p50, 3),
+            "p95_ms": round(p95, 3),
+            "p99_ms": round(p99, 3),
+        }
+
+
+class MetricsRegistry:
+    """按名称管理计数器/仪表/直方图（线程安全）。"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._histograms: Dict[str, Histogram] = {}
+        self.session = ""
+        self.started_at = time.time()
+
+    def inc(self, name: str, value: float = 1.0) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0.0) + float(value)
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self._gauges[name] = float(value)
+
+    def histogram(self, name: str) -> Histogram:
+        with self._lock:
+            hist = self._histograms.get(name)
+            if hist is None:
+                hist = self._histograms[name] = Histogram()
+            return hist
+
+    def observe_ms(self, name: str, value_ms: float) -> None:
+        self.histogram(name).observe(value_ms)
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        """记录 with 块耗时（异常时同样记录）。"""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_ms(name, (time.perf_counter() - t0) * 1000.0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            hists = dict(self._histograms)
+            session, started = self.session, self.started_at
+        now = time.time()
+        return {
+            "ts": now,
+            "iso": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now)),
+            "session": session,
+            "uptime_sec": round(now - started, 3),
+            "counters": counters,
+            "gauges": gauges,
+            "histograms": {name: h.summary() for name, h in sorted(hists.items())},
+        }
+
+    def reset(self, session: Optional[str] = None) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+            self.session = str(session if session is not None else uuid.uuid4().hex[:8])
+            self.started_at = time.time()
+
+
+_REGISTRY = MetricsRegistry()
+
+
+class _Session:
+    __slots__ = ("registry", "exporter", "token")
+
+    def __init__(self, registry: MetricsRegistry, exporter: Optional["MetricsExporter"]) -> None:
+        self.registry = registry
+        self.exporter = exporter
+        self.token: Optional[Token] = None
+
+
+# 进行中的会话（按开始先后）；热路径按 _CURRENT 直接取，无需加锁
+_SESSIONS: Dict[str, _Session] = {}
+_SESSIONS_LOCK = threading.Lock()
+# 当前上下文（线程）所属的会话，由 begin_metrics_session 设置
+_CURRENT: ContextVar[Optional[str]] = ContextVar("metrics_session", default=None)
+
+
+def _current_registry() -> MetricsRegistry:
+    session = _CURRENT.get()
+    if session is not None:
+        s = _SESSIONS.get(session)
+        if s is not None:
+            return s.registry
+    return _REGISTRY
+
+
+def get_metrics(session: Optional[str] = None) -> MetricsRegistry:
+    """指定会话的注册表；省略时为调用方所属的进行中会话，没有时为默认注册表。"""
+    if session is None:
+        return _current_registry()
+    with _SESSIONS_LOCK:
+        s = _SESSIONS.get(str(session))
+    return s.registry if s is not None else _REGISTRY
+
+
+def observe_ms(name: str, value_ms: float) -> None:
+    """记录一次耗时（ms）；不抛异常，可放在热路径。"""
+    try:
+        _current_registry().observe_ms(name, value_ms)
+    except Exception:
+        pass
+
+
+def inc(name: str, value: float = 1.0) -> None:
+    try:
+        _current_registry().inc(name, value)
+    except Exception:
+        pass
+
+
+def set_gauge(name: str, value: float) -> None:
+    try:
+        _current_registry().set_gauge(name, value)
+    except Exception:
+        pass
+
+
+def metrics_file(output_dir: str | Path, *, ts: Optional[float] = None) -> Path:
+    now_ts = time.time() if ts is None else float(ts)
+    return Path(output_dir) / METRICS_DIRNAME / f"{time.strftime('%Y-%m-%d', time.localtime(now_ts))}.jsonl"
+
+
+def export_metrics_snapshot(output_dir: str | Path, registry: Optional[MetricsRegistry] = None) -> Dict[str, Any]:
+    """把当前快照追加到 <output>/metrics/<日期>.jsonl，返回快照。"""
+    snap = (registry or _REGISTRY).snapshot()
+    path = metrics_file(output_dir, ts=snap["ts"])
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a", encoding="utf-8") as fh:
+        fh.write(json.dumps(snap, ensure_ascii=False) + "\n")
+    return snap
+
+
+class MetricsExporter:
+    """后台定期导出快照；`stop` 时写入最终快照。"""
+
+    def __init__(
+        self, output_dir: str | Path, interval_sec: float = 60.0, registry: Optional[MetricsRegistry] = None
+    ) -> None:
+        self.output_dir = Path(output_dir)
+        self.interval_sec = max(1.0, float(interval_sec))
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_sec):
+            try:
+                export_metrics_snapshot(self.output_dir, self.registry)
+            except Exception:
+                pass
+
+    def stop(self, timeout: float = 2.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=max(0.0, float(timeout)))
+        try:
+            export_metrics_snapshot(self.output_dir, self.registry)
+        except Exception:
+            pass
+
+
+def begin_metrics_session(output_dir: str | Path, cfg: Optional[Dict[str, Any]] = None, name: str = "") -> str:
+    """开始一次运行：新建该运行的指标会话并按配置 `metrics` 启动定期导出；返回会话标识。
+
+    会话绑定到调用方的上下文（线程），此后该线程的记录只进入本会话。
+    """
+    try:
+        mcfg = (cfg or {}).get("metrics") or {}
+    except Exception:
+        mcfg = {}
+    if not isinstance(mcfg, dict):
+        mcfg = {}
+    base = f"{name}-{time.strftime('%Y%m%d-%H%M%S')}" if name else time.strftime("%Y%m%d-%H%M%S")
+    registry = MetricsRegistry()
+    exporter: Optional[MetricsExporter] = None
+    if bool(mcfg.get("export", False)):
+        exporter = MetricsExporter(output_dir, float(mcfg.get("export_sec", 60.0) or 60.0), registry)
+    with _SESSIONS_LOCK:
+        session, n = base, 1
+        while session in _SESSIONS:
+            n += 1
+            session = f"{base}-{n}"
+        registry.reset(session)
+        s = _SESSIONS[session] = _Session(registry, exporter)
+    s.token = _CURRENT.set(session)
+    if exporter is not None:
+        exporter.start()
+    return session
+
+
+def end_metrics_session(session: Optional[str] = None) -> None:
+    """结束运行：停止该会话的定期导出并写入最终快照（未启动导出时不写文件）；省略时结束全部会话。"""
+    with _SESSIONS_LOCK:
+        if session is None:
+            ended = list(_SESSIONS.values())
+            _SESSIONS.clear()
+        else:
+            s = _SESSIONS.pop(str(session), None)
+            ended = [s] if s is not None else []
+    current = _CURRENT.get()
+    for s in ended:
+        if s.registry.session == current and s.token is not None:
+            # 在开始会话的上下文中结束：恢复之前所属的会话
+            try:
+                _CURRENT.reset(s.token)
+            except Exception:
+                _CURRENT.set(None)
+            current = _CURRENT.get()
+        if s.exporter is not None:
+            s.exporter.stop()
+    if session is None:
+        _CURRENT.set(None)
+
+
+__all__ = [
+    "DEFAULT_QUANTILES",
+    "Histogram",
+    "METRICS_DIRNAME",
+    "MetricsExporter",
+    "MetricsRegistry",
+    "begin_metrics_session",
+    "bucket_bounds",
+    "bucket_index",
+    "end_metrics_session",
+    "export_metrics_snapshot",
+    "get_metrics",
+    "inc",
+    "metrics_file",
+    "observe_ms",
+    "set_gauge",
+]
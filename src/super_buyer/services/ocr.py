@@ -7,9 +7,14 @@ from __future__ import annotations
 import base64
 import io
 import os
+import time
 from dataclasses import dataclass
 from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
 
+from super_buyer.services.metrics import inc as _metric_inc, observe_ms
+from super_buyer.services.ocr_guard import OcrCircuitOpenError, get_ocr_guard
+from super_buyer.services.ocr_pool import get_umi_ocr_pool
+
 ImageLike = Union["Image.Image", "numpy.ndarray", str]
 
 try:
@@ -36,6 +41,89 @@ class NumberBox(OcrBox):
     value: Optional[int] = None
 
 
+# 按 ROI 类型区分的识别参数（在 `umi_ocr.options` 之上覆盖）。
+# 数字 ROI 只有一行短文本：关闭排版解析（默认 multi_para）。
+# 档位只能改变逐请求生效的键：Umi-OCR 插件在引擎启动参数（语言、方向分类、长边限制）
+# 变化时会重启引擎，价格/名称请求交替或预热后的首次读价都会因此重新加载模型。
+# 这些键统一放在 `umi_ocr.options`，档位中出现时忽略（见 `ENGINE_START_KEYS`）。
+# `allowlist` 为客户端参数：Umi-OCR 不支持字符白名单，由调用方过滤识别结果。
+DEFAULT_OCR_PROFILES: Dict[str, Dict[str, Any]] = {
+    "price": {
+        "tbpu.parser": "none",
+        "allowlist": "0123456789KkMm.",
+    },
+    "quantity": {
+        "tbpu.parser": "none",
+        "allowlist": "0123456789",
+    },
+    "name": {
+        "tbpu.parser": "single_none",
+    },
+}
+
+# 引擎启动参数（Paddle 版 ocr.*_side_len/ocr.cls，Rapid 版 ocr.maxSideLen/ocr.angle 等）
+ENGINE_START_KEYS = (
+    "ocr.language",
+    "ocr.cls",
+    "ocr.angle",
+    "ocr.limit_side_len",
+    "ocr.maxSideLen",
+    "ocr.enable_mkldnn",
+)
+
+_CLIENT_PROFILE_KEYS = ("allowlist",)
+
+
+@dataclass
+class OcrProfile:
+    name: str
+    options: Dict[str, Any]
+    allowlist: Optional[str] = None
+
+
+def resolve_ocr_profile(umi_cfg: Optional[Dict[str, Any]], profile: Optional[str] = None) -> OcrProfile:
+    """合并 `umi_ocr.options`、内置档位与 `umi_ocr.profiles.<name>` 配置。
+
+    - profile 为空或未知时仅返回通用 options（保持旧行为）；
+    - 配置中的档位覆盖内置档位的同名键；
+    - 档位中的引擎启动参数（`ENGINE_START_KEYS`）被忽略，所有档位共用 options 中的值。
+    """
+    cfg = umi_cfg if isinstance(umi_cfg, dict) else {}
+    try:
+        options: Dict[str, Any] = dict(cfg.get("options", {}) or {})
+    except Exception:
+        options = {}
+    name = str(profile or "").strip().lower()
+    spec: Dict[str, Any] = dict(DEFAULT_OCR_PROFILES.get(name, {}))
+    try:
+        custom = (cfg.get("profiles") or {}).get(name) if name else None
+        if isinstance(custom, dict):
+            spec.update(custom)
+    except Exception:
+        pass
+    allowlist = spec.get("allowlist")
+    for key in _CLIENT_PROFILE_KEYS + ENGINE_START_KEYS:
+        spec.pop(key, None)
+    options.update(spec)
+    return OcrProfile(name=name, options=options, allowlist=(str(allowlist) if allowlist else None))
+
+
+def engine_start_key(options: Optional[Dict[str, Any]]) -> Tuple[Tuple[str, str], ...]:
+    """引擎启动参数的签名：变化时 Umi-OCR 会重启引擎（OCR 熔断据此识别冷请求）。"""
+    opts = options or {}
+    return tuple((key, repr(opts.get(key))) for key in ENGINE_START_KEYS)
+
+
+def ocr_options(umi_cfg: Optional[Dict[str, Any]], profile: Optional[str] = None) -> Dict[str, Any]:
+    """返回指定档位的 Umi-OCR options（调用方可直接传给 recognize_*）。"""
+    return resolve_ocr_profile(umi_cfg, profile).options
+
+
+def ocr_allowlist(umi_cfg: Optional[Dict[str, Any]], profile: Optional[str] = None) -> Optional[str]:
+    """返回指定档位的字符白名单（传给 `recognize_numbers(allowlist=...)` 或用于清洗文本）。"""
+    return resolve_ocr_profile(umi_cfg, profile).allowlist
+
+
 def _ensure_pil(img: ImageLike) -> "Image.Image":
     if Image is None:
         raise RuntimeError("缺少 Pillow 依赖，请安装 pillow 库")
@@ -59,11 +147,15 @@ def _ensure_pil(img: ImageLike) -> "Image.Image":
     raise TypeError("不支持的图片类型：请传入路径/PIL.Image/numpy.ndarray")
 
 
-def _pil_to_base64(pil_img: "Image.Image") -> str:
+def _pil_to_base64(pil_img: "Image.Image", image_format: str = "PNG") -> str:
+    fmt = str(image_format or "PNG").upper()
     buf = io.BytesIO()
     try:
-        pil_img.save(buf, format="PNG")
+        if fmt in ("JPEG", "JPG") and pil_img.mode not in ("L", "RGB"):
+            pil_img = pil_img.convert("RGB")
+        pil_img.save(buf, format=("JPEG" if fmt == "JPG" else fmt))
     except Exception:
+        buf = io.BytesIO()
         pil_img.convert("RGB").save(buf, format="PNG")
     return base64.b64encode(buf.getvalue()).decode("ascii")
 
@@ -89,24 +181,75 @@ def _post_umi_ocr(
     base_url: str = "http://127.0.0.1:1224",
     timeout: float = 2.5,
     options: Optional[Dict[str, Any]] = None,
+    balance: bool = True,
+    image_format: str = "PNG",
+    guarded: bool = True,
 ) -> Dict[str, Any]:
     try:
         import requests  # type: ignore
     except Exception as exc:
         raise RuntimeError("缺少 requests 依赖，请安装 requests 库") from exc
-    url = str(base_url).rstrip("/") + "/api/ocr"
     payload: Dict[str, Any] = {
-        "base64": _pil_to_base64(pil_img),
+        "base64": _pil_to_base64(pil_img, image_format),
         "options": dict(options or {}),
     }
     payload["options"]["data.format"] = "dict"
-    resp = requests.post(url, json=payload, timeout=float(timeout or 2.5))
-    resp.raise_for_status()
-    data = resp.json()
-    code = int(data.get("code", 0) or 0)
-    if code in (100, 101):
-        return data
-    raise RuntimeError(f"Umi-OCR 识别失败: code={code}, data={data.get('data')}")
+    # 多实例：base_url 属于已注册实例集合时，改派到在途最少的健康实例
+    pool = get_umi_ocr_pool() if balance else None
+    target = str(base_url)
+    if pool is not None and target in pool:
+        target = pool.acquire() or target
+    else:
+        pool = None
+    # 自适应超时 + 熔断：熔断期内直接失败；预热等场景传 guarded=False 绕过。
+    # 多实例时跳过已熔断的实例，改派到其余实例，全部熔断才失败。
+    guard = get_ocr_guard() if guarded else None
+    engine_key = engine_start_key(payload["options"]) if guard is not None else None
+    req_timeout = float(timeout or 2.5)
+    if guard is not None:
+        tried: List[str] = []
+        while True:
+            try:
+                req_timeout = guard.before_request(target, float(timeout or 2.5), engine_key=engine_key)
+                break
+            except OcrCircuitOpenError:
+                if pool is None:
+                    raise
+                pool.cancel(target)
+                pool.eject(target)
+                tried.append(target)
+                nxt = pool.acquire(exclude=tried)
+                if nxt is None:
+                    raise
+                target = nxt
+            except Exception:
+                if pool is not None:
+                    pool.cancel(target)
+                raise
+    url = target.rstrip("/") + "/api/ocr"
+    t0 = time.perf_counter()
+    try:
+        resp = requests.post(url, json=payload, timeout=req_timeout)
+        resp.raise_for_status()
+        data = resp.json()
+        code = int(data.get("code", 0) or 0)
+        if code not in (100, 101):
+            raise RuntimeError(f"Umi-OCR 识别失败: code={code}, data={data.get('data')}")
+    except Exception as exc:
+        elapsed_ms = (time.perf_counter() - t0) * 1000.0
+        _metric_inc("ocr.request.error")
+        if pool is not None:
+            pool.release(target, ok=False, elapsed_ms=elapsed_ms)
+        if guard is not None:
+            guard.record_failure(target, exc, timed_out="Timeout" in type(exc).__name__, engine_key=engine_key)
+        raise
+    elapsed_ms = (time.perf_counter() - t0) * 1000.0
+    observe_ms("ocr.request", elapsed_ms)
+    if pool is not None:
+        pool.release(target, ok=True, elapsed_ms=elapsed_ms)
+    if guard is not None:
+        guard.record_success(target, elapsed_ms, engine_key=engine_key)
+    return data
 
 
 def recognize_text(
@@ -116,9 +259,20 @@ def recognize_text(
     timeout: float = 2.5,
     options: Optional[Dict[str, Any]] = None,
     offset: Tuple[int, int] = (0, 0),
+    balance: bool = True,
+    image_format: str = "PNG",
+    guarded: bool = True,
 ) -> List[OcrBox]:
     pil = _ensure_pil(image)
-    payload = _post_umi_ocr(pil, base_url=base_url, timeout=timeout, options=options)
+    payload = _post_umi_ocr(
+        pil,
+        base_url=base_url,
+        timeout=timeout,
+        options=options,
+        balance=balance,
+        image_format=image_format,
+        guarded=guarded,
+    )
     if int(payload.get("code", 0) or 0) == 101:
         return []
     data = payload.get("data")
@@ -156,9 +310,19 @@ def recognize_numbers(
     options: Optional[Dict[str, Any]] = None,
     offset: Tuple[int, int] = (0, 0),
     allowlist: Iterable[str] | None = None,
+    balance: bool = True,
+    image_format: str = "PNG",
+    guarded: bool = True,
 ) -> List[NumberBox]:
     boxes = recognize_text(
-        image, base_url=base_url, timeout=timeout, options=options, offset=offset
+        image,
+        base_url=base_url,
+        timeout=timeout,
+        options=options,
+        offset=offset,
+        balance=balance,
+        image_format=image_format,
+        guarded=guarded,
     )
     allow = set(allowlist or ())
     result: List[NumberBox] = []
@@ -186,4 +350,16 @@ def recognize_numbers(
     return result
 
 
-__all__ = ["OcrBox", "NumberBox", "recognize_numbers", "recognize_text"]
+__all__ = [
+    "DEFAULT_OCR_PROFILES",
+    "ENGINE_START_KEYS",
+    "NumberBox",
+    "OcrBox",
+    "OcrProfile",
+    "engine_start_key",
+    "ocr_allowlist",
+    "ocr_options",
+    "recognize_numbers",
+    "recognize_text",
+    "resolve_ocr_profile",
+]
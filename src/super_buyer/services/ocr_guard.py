@@ -0,0 +1,332 @@
+"""
+Umi-OCR 客户端自适应超时与熔断。
+
+- 延迟跟踪：按实例记录最近成功请求的耗时，样本足够后每次请求的超时取
+  `p99 × timeout_p99_factor`，并限制在 [timeout_floor_sec, min(timeout_ceiling_sec, 调用方 timeout)]；
+- 熔断：同一实例连续失败 `breaker_failures` 次后熔断 `breaker_cooldown_sec` 秒，
+  期间请求立即抛出 `OcrCircuitOpenError`（毫秒级失败，而不是每次等满超时）；
+  冷却结束放行一个探测请求，成功即恢复，失败则重新熔断；
+- 熔断时通知已注册的监听者（托管进程据此重启对应实例），并累计熔断指标；
+- 冷请求：实例的首个请求、引擎启动参数（`engine_key`）变化后的首个请求与熔断恢复后的首个请求
+  可能触发数秒的模型加载，改用 `cold_timeout_sec`，失败不计入熔断、耗时不计入延迟分布。
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional
+
+from super_buyer.services.ocr_pool import normalize_base_url
+
+# 熔断监听：参数为实例地址与该实例的指标快照
+TripListener = Callable[[str, Dict[str, Any]], None]
+
+
+class OcrCircuitOpenError(RuntimeError):
+    """实例处于熔断期，请求被直接拒绝。"""
+
+
+@dataclass
+class OcrGuardSettings:
+    adaptive_timeout: bool = True
+    timeout_floor_sec: float = 1.5
+    # 0 表示仅以调用方传入的 timeout 为上限
+    timeout_ceiling_sec: float = 0.0
+    timeout_p99_factor: float = 2.0
+    timeout_min_samples: int = 20
+    latency_window: int = 200
+    breaker_enabled: bool = True
+    breaker_failures: int = 3
+    breaker_cooldown_sec: float = 5.0
+    # 冷请求（引擎可能重新加载模型）的超时下限
+    cold_timeout_sec: float = 15.0
+
+    @classmethod
+    def from_cfg(cls, umi_cfg: Optional[Dict[str, Any]]) -> "OcrGuardSettings":
+        cfg = umi_cfg if isinstance(umi_cfg, dict) else {}
+        base = cls()
+
+        def _f(key: str, default: float, lo: float) -> float:
+            try:
+                return max(lo, float(cfg.get(key, default)))
+            except Exception:
+                return default
+
+        def _i(key: str, default: int, lo: int) -> int:
+            try:
+                return max(lo, int(cfg.get(key, default)))
+            except Exception:
+                return default
+
+        return cls(
+            adaptive_timeout=bool(cfg.get("adaptive_timeout", base.adaptive_timeout)),
+            timeout_floor_sec=_f("timeout_floor_sec", base.timeout_floor_sec, 0.05),
+            timeout_ceiling_sec=_f("timeout_ceiling_sec", base.timeout_ceiling_sec, 0.0),
+            timeout_p99_factor=_f("timeout_p99_factor", base.timeout_p99_factor, 1.0),
+            timeout_min_samples=_i("timeout_min_samples", base.timeout_min_samples, 1),
+            latency_window=_i("latency_window", base.latency_window, 10),
+            breaker_enabled=bool(cfg.get("breaker_enabled", base.breaker_enabled)),
+            breaker_failures=_i("breaker_failures", base.breaker_failures, 1),
+            breaker_cooldown_sec=_f("breaker_cooldown_sec", base.breaker_cooldown_sec, 0.0),
+            cold_timeout_sec=_f("cold_timeout_sec", base.cold_timeout_sec, 0.05),
+        )
+
+
+@dataclass
+class _EndpointGuard:
+    latencies: Deque[float]
+    # "closed" | "open" | "half_open"
+    state: str = "closed"
+    consecutive_failures: int = 0
+    open_until: float = 0.0
+    probing: bool = False
+    requests: int = 0
+    failures: int = 0
+    timeouts: int = 0
+    trips: int = 0
+    fast_fails: int = 0
+    last_trip_at: float = 0.0
+    last_error: str = ""
+    # 最近一次成功请求（或预热）的引擎启动参数；None 表示引擎状态未知（首个请求/重启后）
+    engine_key: Optional[Hashable] = None
+    cold_requests: int = 0
+    # 已放行过冷请求的引擎参数：同一参数只放行一次，之后的失败计入熔断
+    cold_key: Optional[Hashable] = None
+    cold_pending: bool = False
+
+
+def _percentile(ordered: List[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+class OcrGuard:
+    """按实例维护延迟分布与熔断状态（线程安全）。"""
+
+    def __init__(self, settings: Optional[OcrGuardSettings] = None) -> None:
+        self._lock = threading.Lock()
+        self.settings = settings or OcrGuardSettings()
+        self._endpoints: Dict[str, _EndpointGuard] = {}
+        self._listeners: List[TripListener] = []
+
+    def _ep(self, base_url: str) -> _EndpointGuard:
+        key = normalize_base_url(base_url)
+        ep = self._endpoints.get(key)
+        if ep is None:
+            ep = _EndpointGuard(latencies=deque(maxlen=self.settings.latency_window))
+            self._endpoints[key] = ep
+        return ep
+
+    def update_settings(self, settings: OcrGuardSettings) -> None:
+        with self._lock:
+            resize = settings.latency_window != self.settings.latency_window
+            self.settings = settings
+            if resize:
+                for ep in self._endpoints.values():
+                    ep.latencies = deque(ep.latencies, maxlen=settings.latency_window)
+
+    def add_trip_listener(self, listener: TripListener) -> None:
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    def remove_trip_listener(self, listener: TripListener) -> None:
+        with self._lock:
+            try:
+                self._listeners.remove(listener)
+            except ValueError:
+                pass
+
+    @staticmethod
+    def _take_cold(ep: _EndpointGuard, engine_key: Optional[Hashable]) -> bool:
+        """请求结束时判断是否为放行的那一个冷请求（只认领一次）。"""
+        if engine_key is None or not ep.cold_pending or ep.cold_key != engine_key or ep.engine_key == engine_key:
+            return False
+        ep.cold_pending = False
+        return True
+
+    # ---------- 请求前后 ----------
+    def before_request(self, base_url: str, timeout: float, *, engine_key: Optional[Hashable] = None) -> float:
+        """检查熔断状态并返回本次请求应使用的超时（秒）。
+
+        熔断期内抛出 `OcrCircuitOpenError`；冷却结束后仅放行一个探测请求。
+        传入 `engine_key` 且与实例最近一次成功请求（或预热）不同时，每个（实例, 参数）只放行
+        一个冷请求：超时取 `max(timeout, cold_timeout_sec)`，失败一次不计入熔断；
+        其余请求（含冷请求失败后的重试）按普通请求处理。
+        """
+        now = time.time()
+        st = self.settings
+        requested = max(0.05, float(timeout or 2.5))
+        with self._lock:
+            ep = self._ep(base_url)
+            if st.breaker_enabled and ep.state != "closed":
+                if ep.state == "open" and now >= ep.open_until:
+                    ep.state = "half_open"
+                    ep.probing = False
+                if ep.state == "open" or ep.probing:
+                    ep.fast_fails += 1
+                    remain = max(0.0, ep.open_until - now)
+                    raise OcrCircuitOpenError(
+                        f"Umi-OCR 熔断中（{normalize_base_url(base_url)}，剩余 {remain:.1f}s）：{ep.last_error or '连续失败'}"
+                    )
+                ep.probing = True
+            if engine_key is not None and ep.engine_key != engine_key and ep.cold_key != engine_key:
+                ep.cold_key = engine_key
+                ep.cold_pending = True
+                return max(requested, st.cold_timeout_sec)
+            if not st.adaptive_timeout or len(ep.latencies) < st.timeout_min_samples:
+                return requested
+            p99_sec = _percentile(sorted(ep.latencies), 99) / 1000.0
+        ceiling = requested if st.timeout_ceiling_sec <= 0 else min(requested, st.timeout_ceiling_sec)
+        floor = min(st.timeout_floor_sec, ceiling)
+        return max(floor, min(ceiling, p99_sec * st.timeout_p99_factor))
+
+    def record_success(self, base_url: str, elapsed_ms: float, *, engine_key: Optional[Hashable] = None) -> None:
+        with self._lock:
+            ep = self._ep(base_url)
+            ep.requests += 1
+            if self._take_cold(ep, engine_key):
+                # 冷请求含模型加载时间，不进入延迟分布
+                ep.cold_requests += 1
+            else:
+                ep.latencies.append(max(0.0, float(elapsed_ms)))
+            if engine_key is not None:
+                ep.engine_key = engine_key
+                ep.cold_key = None
+                ep.cold_pending = False
+            ep.consecutive_failures = 0
+            ep.state = "closed"
+            ep.probing = False
+            ep.open_until = 0.0
+
+    def record_failure(
+        self,
+        base_url: str,
+        error: BaseException | str,
+        *,
+        timed_out: bool = False,
+        engine_key: Optional[Hashable] = None,
+    ) -> None:
+        st = self.settings
+        tripped: Optional[Dict[str, Any]] = None
+        key = normalize_base_url(base_url)
+        with self._lock:
+            ep = self._ep(key)
+            ep.requests += 1
+            ep.failures += 1
+            ep.timeouts += 1 if timed_out else 0
+            ep.last_error = str(error)[:120]
+            if self._take_cold(ep, engine_key):
+                # 放行的冷请求失败一次不计入熔断；半开状态下放行下一个探测
+                ep.cold_requests += 1
+                ep.probing = False
+                return
+            ep.consecutive_failures += 1
+            was_probe = ep.state == "half_open"
+            ep.probing = False
+            # 熔断前已发出的在途请求随后失败时不重复熔断
+            closed = ep.state == "closed"
+            if st.breaker_enabled and (was_probe or (closed and ep.consecutive_failures >= st.breaker_failures)):
+                now = time.time()
+                ep.state = "open"
+                ep.open_until = now + st.breaker_cooldown_sec
+                ep.trips += 1
+                ep.last_trip_at = now
+                tripped = self._snapshot_one(key, ep)
+            listeners = list(self._listeners)
+        if tripped is None:
+            return
+        for listener in listeners:
+            try:
+                listener(key, tripped)
+            except Exception:
+                pass
+
+    def reset(self, base_url: Optional[str] = None) -> None:
+        """关闭熔断（实例重启成功后调用）；不传地址时重置全部实例。"""
+        with self._lock:
+            targets = [self._ep(base_url)] if base_url else list(self._endpoints.values())
+            for ep in targets:
+                ep.state = "closed"
+                ep.probing = False
+                ep.open_until = 0.0
+                ep.consecutive_failures = 0
+                # 重启后的新进程延迟分布可能不同，首个请求按冷请求处理
+                ep.latencies.clear()
+                ep.engine_key = None
+                ep.cold_key = None
+                ep.cold_pending = False
+
+    def mark_warm(self, base_url: str, engine_key: Optional[Hashable]) -> None:
+        """预热（guarded=False）成功后记录实例已加载的引擎参数，之后同参数的请求不再按冷请求处理。"""
+        with self._lock:
+            ep = self._ep(base_url)
+            ep.engine_key = engine_key
+            ep.cold_key = None
+            ep.cold_pending = False
+
+    def is_open(self, base_url: str) -> bool:
+        with self._lock:
+            ep = self._endpoints.get(normalize_base_url(base_url))
+            return ep is not None and ep.state == "open" and time.time() < ep.open_until
+
+    # ---------- 指标 ----------
+    def _snapshot_one(self, key: str, ep: _EndpointGuard) -> Dict[str, Any]:
+        ordered = sorted(ep.latencies)
+        return {
+            "base_url": key,
+            "state": ep.state,
+            "requests": ep.requests,
+            "failures": ep.failures,
+            "timeouts": ep.timeouts,
+            "consecutive_failures": ep.consecutive_failures,
+            "trips": ep.trips,
+            "fast_fails": ep.fast_fails,
+            "cold_requests": ep.cold_requests,
+            "last_trip_at": ep.last_trip_at,
+            "last_error": ep.last_error,
+            "p50_ms": round(_percentile(ordered, 50), 1),
+            "p99_ms": round(_percentile(ordered, 99), 1),
+            "samples": len(ordered),
+        }
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [self._snapshot_one(key, ep) for key, ep in self._endpoints.items()]
+
+
+_GUARD = OcrGuard()
+
+
+def get_ocr_guard() -> OcrGuard:
+    return _GUARD
+
+
+def configure_ocr_guard_from_cfg(cfg: Dict[str, Any]) -> OcrGuard:
+    """按完整配置更新进程内的超时/熔断参数（保留已有统计）。"""
+    try:
+        umi_cfg = cfg.get("umi_ocr") or {}
+    except Exception:
+        umi_cfg = {}
+    _GUARD.update_settings(OcrGuardSettings.from_cfg(umi_cfg))
+    return _GUARD
+
+
+def ocr_guard_metrics() -> List[Dict[str, Any]]:
+    return _GUARD.snapshot()
+
+
+__all__ = [
+    "OcrCircuitOpenError",
+    "OcrGuard",
+    "OcrGuardSettings",
+    "TripListener",
+    "configure_ocr_guard_from_cfg",
+    "get_ocr_guard",
+    "ocr_guard_metrics",
+]
@@ -0,0 +1,258 @@
+"""
+Umi-OCR 多实例客户端负载均衡。
+
+- 每个实例维护在途请求数与延迟滑动均值，派发时选择在途最少（延迟次之）的健康实例；
+- 请求出错/超时后将实例剔除一段冷却时间（指数退避），冷却结束后自动放回；
+- 未配置多实例时不介入，`recognize_text` 直接请求调用方传入的 base_url。
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+
+def normalize_base_url(url: str) -> str:
+    raw = str(url or "").strip().rstrip("/")
+    if raw.endswith("/api/ocr"):
+        raw = raw[: -len("/api/ocr")]
+    if raw and "://" not in raw:
+        raw = f"http://{raw}"
+    return raw
+
+
+def fleet_urls_from_cfg(umi_cfg: Dict[str, Any]) -> List[str]:
+    """解析 `umi_ocr` 配置中的实例列表。
+
+    - `base_urls` 非空：直接使用；
+    - 否则 `instances`=K>1 时，在 `base_url` 端口基础上连续分配 K 个端口；
+    - 否则仅 `base_url` 一个实例。
+    """
+    if not isinstance(umi_cfg, dict):
+        umi_cfg = {}
+    base_url = normalize_base_url(umi_cfg.get("base_url", "http://127.0.0.1:1224") or "http://127.0.0.1:1224")
+    raw_list = umi_cfg.get("base_urls")
+    urls: List[str] = []
+    if isinstance(raw_list, (list, tuple)):
+        for item in raw_list:
+            url = normalize_base_url(str(item or ""))
+            if url and url not in urls:
+                urls.append(url)
+    if urls:
+        return urls
+    try:
+        count = max(1, int(umi_cfg.get("instances", 1) or 1))
+    except Exception:
+        count = 1
+    if count <= 1:
+        return [base_url]
+    parsed = urlparse(base_url)
+    host = str(parsed.hostname or "127.0.0.1")
+    port = int(parsed.port or 80)
+    scheme = parsed.scheme or "http"
+    return [f"{scheme}://{host}:{port + idx}" for idx in range(count)]
+
+
+@dataclass
+class UmiEndpoint:
+    base_url: str
+    inflight: int = 0
+    ewma_ms: float = 0.0
+    requests: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    ejected_until: float = 0.0
+    ejections: int = 0
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+
+class UmiOcrPool:
+    """多实例派发器（线程安全）。"""
+
+    def __init__(
+        self,
+        base_urls: Iterable[str],
+        *,
+        eject_base_sec: float = 2.0,
+        eject_max_sec: float = 60.0,
+    ) -> None:
+        self._lock = threading.Lock()
+        self.eject_base_sec = max(0.1, float(eject_base_sec))
+        self.eject_max_sec = max(self.eject_base_sec, float(eject_max_sec))
+        self._endpoints: Dict[str, UmiEndpoint] = {}
+        # 调用方仍以单实例 base_url 发请求时，别名地址同样走派发
+        self._aliases: set[str] = set()
+        for url in base_urls:
+            key = normalize_base_url(url)
+            if key and key not in self._endpoints:
+                self._endpoints[key] = UmiEndpoint(base_url=key)
+
+    @property
+    def urls(self) -> List[str]:
+        return list(self._endpoints.keys())
+
+    def __contains__(self, base_url: str) -> bool:
+        key = normalize_base_url(base_url)
+        return key in self._endpoints or key in self._aliases
+
+    def add_aliases(self, base_urls: Iterable[str]) -> None:
+        with self._lock:
+            for url in base_urls:
+                key = normalize_base_url(url)
+                if key:
+                    self._aliases.add(key)
+
+    def __len__(self) -> int:
+        return len(self._endpoints)
+
+    def acquire(self, exclude: Iterable[str] = ()) -> Optional[str]:
+        """选择在途请求最少的健康实例并占用一个并发槽位。
+
+        全部被剔除时返回最早恢复的实例，避免调用方完全无可用地址；
+        `exclude` 中的实例（如已熔断）不参与选择，全部被排除时返回 None。
+        """
+        now = time.time()
+        skip = {normalize_base_url(u) for u in exclude}
+        with self._lock:
+            candidates = [ep for key, ep in self._endpoints.items() if key not in skip]
+            if not candidates:
+                return None
+            healthy = [ep for ep in candidates if ep.healthy(now)]
+            if healthy:
+                chosen = min(healthy, key=lambda ep: (ep.inflight, ep.ewma_ms))
+            else:
+                chosen = min(candidates, key=lambda ep: ep.ejected_until)
+            chosen.inflight += 1
+            return chosen.base_url
+
+    def cancel(self, base_url: str) -> None:
+        """归还未实际发出请求的槽位（不计入统计）。"""
+        key = normalize_base_url(base_url)
+        with self._lock:
+            ep = self._endpoints.get(key)
+            if ep is not None:
+                ep.inflight = max(0, ep.inflight - 1)
+
+    def release(self, base_url: str, *, ok: bool, elapsed_ms: float) -> None:
+        key = normalize_base_url(base_url)
+        with self._lock:
+            ep = self._endpoints.get(key)
+            if ep is None:
+                return
+            ep.inflight = max(0, ep.inflight - 1)
+            ep.requests += 1
+            if ok:
+                ep.consecutive_failures = 0
+                ep.ejected_until = 0.0
+                sample = max(0.0, float(elapsed_ms))
+                ep.ewma_ms = sample if ep.ewma_ms <= 0.0 else (0.8 * ep.ewma_ms + 0.2 * sample)
+                return
+            ep.failures += 1
+            ep.consecutive_failures += 1
+            ep.ejections += 1
+            backoff = self.eject_base_sec * (2 ** min(6, ep.consecutive_failures - 1))
+            ep.ejected_until = time.time() + min(self.eject_max_sec, backoff)
+
+    def eject(self, base_url: str, *, duration_sec: Optional[float] = None) -> None:
+        key = normalize_base_url(base_url)
+        with self._lock:
+            ep = self._endpoints.get(key)
+            if ep is None:
+                return
+            ep.ejections += 1
+            ep.ejected_until = time.time() + float(self.eject_base_sec if duration_sec is None else duration_sec)
+
+    def readmit(self, base_url: str) -> None:
+        key = normalize_base_url(base_url)
+        with self._lock:
+            ep = self._endpoints.get(key)
+            if ep is not None:
+                ep.consecutive_failures = 0
+                ep.ejected_until = 0.0
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            return [
+                {
+                    "base_url": ep.base_url,
+                    "healthy": ep.healthy(now),
+                    "inflight": ep.inflight,
+                    "ewma_ms": round(ep.ewma_ms, 1),
+                    "requests": ep.requests,
+                    "failures": ep.failures,
+                    "ejections": ep.ejections,
+                }
+                for ep in self._endpoints.values()
+            ]
+
+
+_POOL_LOCK = threading.Lock()
+_POOL: Optional[UmiOcrPool] = None
+
+
+def configure_umi_ocr_fleet(
+    base_urls: Iterable[str],
+    *,
+    unhealthy: Iterable[str] = (),
+    aliases: Iterable[str] = (),
+) -> Optional[UmiOcrPool]:
+    """注册进程内的 Umi-OCR 实例集合；少于 2 个实例时清除注册，不做负载均衡。
+
+    同一组地址重复注册时保留已有统计，仅按 `unhealthy` 更新剔除状态。
+    """
+    global _POOL
+    urls = [normalize_base_url(u) for u in base_urls if normalize_base_url(u)]
+    with _POOL_LOCK:
+        if len(urls) < 2:
+            _POOL = None
+            return None
+        if _POOL is None or _POOL.urls != urls:
+            _POOL = UmiOcrPool(urls)
+        pool = _POOL
+    pool.add_aliases(aliases)
+    bad = {normalize_base_url(u) for u in unhealthy}
+    for url in urls:
+        if url in bad:
+            pool.eject(url)
+        else:
+            pool.readmit(url)
+    return pool
+
+
+def configure_umi_ocr_fleet_from_cfg(cfg: Dict[str, Any]) -> Optional[UmiOcrPool]:
+    """按完整配置注册实例集合（供未经托管进程启动的 Runner 使用）。"""
+    try:
+        umi_cfg = cfg.get("umi_ocr") or {}
+    except Exception:
+        umi_cfg = {}
+    umi_cfg = umi_cfg if isinstance(umi_cfg, dict) else {}
+    urls = fleet_urls_from_cfg(umi_cfg)
+    alias = str(umi_cfg.get("base_url", "") or "")
+    with _POOL_LOCK:
+        existing = _POOL
+    if existing is not None and existing.urls == urls:
+        existing.add_aliases([alias])
+        return existing
+    return configure_umi_ocr_fleet(urls, aliases=[alias])
+
+
+def get_umi_ocr_pool() -> Optional[UmiOcrPool]:
+    with _POOL_LOCK:
+        return _POOL
+
+
+__all__ = [
+    "UmiEndpoint",
+    "UmiOcrPool",
+    "configure_umi_ocr_fleet",
+    "configure_umi_ocr_fleet_from_cfg",
+    "fleet_urls_from_cfg",
+    "get_umi_ocr_pool",
+    "normalize_base_url",
+]
@@ -0,0 +1,146 @@
+"""
+OCR 推测执行（后台提前识别，稍后带截止时间取回）。
+
+购买循环中 OCR 与输入/等待本是串行的：例如补货时先点击 Max / 输入数量并同步校验，
+再读取均价。推测执行把识别提前提交到后台线程，主流程继续做输入、等待或其它识别，
+需要结果时再 `join`：
+- 提交与取回各带一个“场景令牌”（调用方定义，如详情打开序号 + 按钮坐标），
+  不一致说明期间界面已变化，结果作废（stale）；
+- `join` 最多等待 `timeout` 秒，未完成即放弃（timeout），由调用方回退同步识别；
+- 同一 key 重复提交时旧任务作废。
+"""
+
+from __future__ import annotations
+
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+@dataclass
+class SpeculationResult:
+    # "hit" | "miss" | "stale" | "timeout" | "error"
+    status: str
+    value: Any = None
+    waited_ms: float = 0.0
+    # 后台识别耗时中与主流程重叠（无需等待）的部分
+    saved_ms: float = 0.0
+    error: str = ""
+
+    @property
+    def hit(self) -> bool:
+        return self.status == "hit"
+
+
+@dataclass
+class _Pending:
+    scene: Hashable
+    future: Future
+    timing: Dict[str, float]
+
+
+class SpeculativeOcr:
+    """按 key 管理后台识别任务（线程安全）。"""
+
+    def __init__(self, *, max_workers: int = 1) -> None:
+        self._lock = threading.Lock()
+        self._max_workers = max(1, int(max_workers))
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pending: Dict[str, _Pending] = {}
+        self._stats: Dict[str, float] = {
+            "submitted": 0,
+            "hit": 0,
+            "miss": 0,
+            "stale": 0,
+            "timeout": 0,
+            "error": 0,
+            "saved_ms": 0.0,
+        }
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="spec-ocr")
+        return self._pool
+
+    def submit(self, key: str, fn: Callable[[], Any], *, scene: Hashable) -> None:
+        timing: Dict[str, float] = {}
+
+        def _run() -> Any:
+            timing["start"] = time.perf_counter()
+            try:
+                return fn()
+            finally:
+                timing["end"] = time.perf_counter()
+
+        with self._lock:
+            old = self._pending.pop(key, None)
+            if old is not None:
+                old.future.cancel()
+                self._stats["stale"] += 1
+            # 带上提交方的上下文（运行指标会话等）
+            fut = self._executor().submit(contextvars.copy_context().run, _run)
+            self._pending[key] = _Pending(scene=scene, future=fut, timing=timing)
+            self._stats["submitted"] += 1
+
+    def pending(self, key: str) -> bool:
+        with self._lock:
+            return key in self._pending
+
+    def discard(self, key: Optional[str] = None) -> None:
+        """作废指定 key（或全部）的推测任务。"""
+        with self._lock:
+            keys = [key] if key is not None else list(self._pending.keys())
+            for k in keys:
+                task = self._pending.pop(k, None)
+                if task is not None:
+                    task.future.cancel()
+                    self._stats["stale"] += 1
+
+    def join(self, key: str, *, scene: Hashable, timeout: float) -> SpeculationResult:
+        with self._lock:
+            task = self._pending.pop(key, None)
+        if task is None:
+            return self._count(SpeculationResult(status="miss"))
+        if task.scene != scene:
+            task.future.cancel()
+            return self._count(SpeculationResult(status="stale"))
+        t0 = time.perf_counter()
+        try:
+            value = task.future.result(timeout=max(0.0, float(timeout)))
+        except Exception as exc:
+            waited = (time.perf_counter() - t0) * 1000.0
+            if not task.future.done():
+                task.future.cancel()
+                return self._count(SpeculationResult(status="timeout", waited_ms=waited))
+            return self._count(SpeculationResult(status="error", waited_ms=waited, error=str(exc)))
+        waited = (time.perf_counter() - t0) * 1000.0
+        run_ms = (task.timing.get("end", t0) - task.timing.get("start", t0)) * 1000.0
+        return self._count(
+            SpeculationResult(status="hit", value=value, waited_ms=waited, saved_ms=max(0.0, run_ms - waited))
+        )
+
+    def _count(self, res: SpeculationResult) -> SpeculationResult:
+        with self._lock:
+            self._stats[res.status] = self._stats.get(res.status, 0) + 1
+            self._stats["saved_ms"] += res.saved_ms
+        return res
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out["saved_ms"] = round(float(out["saved_ms"]), 1)
+            out["pending"] = len(self._pending)
+            return out
+
+    def shutdown(self) -> None:
+        self.discard()
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+__all__ = ["SpeculationResult", "SpeculativeOcr"]
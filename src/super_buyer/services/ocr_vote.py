@@ -0,0 +1,130 @@
+"""
+多变体并发 OCR 投票（提前结束）。
+
+同一 ROI 的多个前处理变体并发识别：
+- 任意值被 `min_agree` 个变体同时识别出即接受；
+- 或单个变体的置信度达到 `accept_score` 即接受；
+- 接受后取消尚未开始的任务，不再等待其余在途请求；
+- `max_in_flight` 限制同时在途的变体数：先提交前 N 个，只有未形成一致结果时才补交下一个，
+  一致的两个变体即可结束，不必让每个变体都打到服务端；
+- 全部完成仍无一致结果时，按 `fallback_order` 取第一个有值的变体（与单变体行为一致）。
+"""
+
+from __future__ import annotations
+
+import contextvars
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+# 单个变体的识别函数：返回 (值, 置信度)，无结果时值为 None
+VariantReader = Callable[[], Tuple[Optional[int], Optional[float]]]
+
+
+@dataclass
+class VoteResult:
+    value: Optional[int] = None
+    # 决定结果的方式："agree" | "score" | "fallback" | "none"
+    decided_by: str = "none"
+    variants: List[str] = field(default_factory=list)
+    results: Dict[str, Tuple[Optional[int], Optional[float]]] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+    elapsed_ms: float = 0.0
+    cancelled: int = 0
+
+    def summary(self) -> str:
+        parts = []
+        for name, (val, score) in self.results.items():
+            s = f"{score:.2f}" if isinstance(score, (int, float)) else "-"
+            parts.append(f"{name}={val}@{s}")
+        for name, err in self.errors.items():
+            parts.append(f"{name}=错误({err})")
+        return " ".join(parts) if parts else "-"
+
+
+def vote_numbers(
+    readers: Mapping[str, VariantReader],
+    *,
+    executor: Executor,
+    min_agree: int = 2,
+    accept_score: Optional[float] = None,
+    timeout_sec: Optional[float] = None,
+    fallback_order: Optional[Sequence[str]] = None,
+    max_in_flight: Optional[int] = None,
+) -> VoteResult:
+    """并发执行各变体识别并投票，满足接受条件即返回。"""
+    t0 = time.perf_counter()
+    res = VoteResult()
+    if not readers:
+        return res
+    need = max(1, min(int(min_agree), len(readers)))
+    queued = list(readers.items())
+    lazy = bool(max_in_flight)
+    limit = max(1, int(max_in_flight)) if lazy else len(queued)
+    futs: Dict[Future, str] = {}
+    pending: set = set()
+
+    def _submit_next() -> None:
+        # 限流时：在途变体仍可能凑成一致则不补交
+        while queued and len(pending) < limit:
+            best = max(counts.values()) if counts else 0
+            if lazy and pending and best + len(pending) >= need:
+                break
+            name, fn = queued.pop(0)
+            # 带上调用方的上下文（运行指标会话等）
+            fut = executor.submit(contextvars.copy_context().run, fn)
+            futs[fut] = name
+            pending.add(fut)
+
+    deadline = (time.perf_counter() + float(timeout_sec)) if timeout_sec else None
+    counts: Counter = Counter()
+    supporters: Dict[int, List[str]] = {}
+    _submit_next()
+    try:
+        while pending:
+            remain = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            if remain is not None and remain <= 0.0:
+                break
+            done, not_done = wait(pending, timeout=remain, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            pending.clear()
+            pending.update(not_done)
+            for fut in done:
+                name = futs[fut]
+                try:
+                    val, score = fut.result()
+                except Exception as exc:
+                    res.errors[name] = str(exc)
+                    continue
+                val = int(val) if isinstance(val, int) and val > 0 else None
+                res.results[name] = (val, score)
+                if val is None:
+                    continue
+                counts[val] += 1
+                supporters.setdefault(val, []).append(name)
+                if counts[val] >= need:
+                    res.value, res.decided_by, res.variants = val, "agree", list(supporters[val])
+                    return res
+                if accept_score is not None and isinstance(score, (int, float)) and float(score) >= float(accept_score):
+                    res.value, res.decided_by, res.variants = val, "score", [name]
+                    return res
+            _submit_next()
+        order = list(fallback_order or readers.keys())
+        for name in order:
+            val = (res.results.get(name) or (None, None))[0]
+            if val is not None:
+                res.value, res.decided_by, res.variants = val, "fallback", [name]
+                break
+        return res
+    finally:
+        for fut in pending:
+            if fut.cancel():
+                res.cancelled += 1
+        res.cancelled += len(queued)
+        res.elapsed_ms = (time.perf_counter() - t0) * 1000.0
+
+
+__all__ = ["VariantReader", "VoteResult", "vote_numbers"]
@@ -0,0 +1,304 @@
+"""
+OCR 前处理流水线（裁剪 → 缩放 → 灰度 → 阈值 → 反相 → 补边）。
+
+- 一次调用可产出多个变体；共享前缀（同一裁剪/缩放/灰度）的变体只计算一次；
+- OpenCV 可用时所有中间结果写入按 (阶段, 参数, 尺寸) 缓存的预分配缓冲区，
+  同一 `PreprocessPipeline` 跨轮询复用，稳定 ROI 下每轮不再新分配中间数组；
+- 缺少 OpenCV/numpy 时回退到 Pillow 实现（语义一致，不复用缓冲区）；
+- 记录累计耗时与缓冲区分配次数，便于观察前处理开销。
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+try:
+    import numpy as np  # type: ignore
+except Exception:
+    np = None  # type: ignore
+
+try:
+    import cv2  # type: ignore
+except Exception:
+    cv2 = None  # type: ignore
+
+try:
+    from PIL import Image, ImageOps  # type: ignore
+except Exception:
+    Image = None  # type: ignore
+    ImageOps = None  # type: ignore
+
+
+_CV_INTERP = {
+    "nearest": "INTER_NEAREST",
+    "linear": "INTER_LINEAR",
+    "cubic": "INTER_CUBIC",
+    "area": "INTER_AREA",
+    "lanczos": "INTER_LANCZOS4",
+}
+
+_PIL_RESAMPLE = {
+    "nearest": "NEAREST",
+    "linear": "BILINEAR",
+    "cubic": "BICUBIC",
+    "area": "BOX",
+    "lanczos": "LANCZOS",
+}
+
+
+@dataclass(frozen=True)
+class PreprocessSpec:
+    """单个变体的声明式处理链。
+
+    - crop: 相对输入图像的 (x, y, w, h)，None 表示整图；
+    - scale: 缩放倍数（1.0 表示不缩放）；
+    - gray: 是否转灰度（threshold/invert 隐含灰度）；
+    - threshold: "otsu" | "fixed" | "none"；fixed_level 为固定阈值（> 阈值置 255）；
+    - blur: 阈值前高斯模糊核大小（0 关闭，偶数自动 +1）；
+    - invert: 反相（与阈值合并为一次计算）；
+    - pad: 四周补边像素，pad_value 为补边灰度。
+    """
+
+    crop: Optional[Tuple[int, int, int, int]] = None
+    scale: float = 1.0
+    gray: bool = True
+    threshold: str = "otsu"
+    fixed_level: int = 128
+    blur: int = 0
+    invert: bool = False
+    pad: int = 0
+    pad_value: int = 255
+    interpolation: str = "cubic"
+
+    def needs_gray(self) -> bool:
+        return bool(self.gray or self.threshold != "none" or self.invert)
+
+
+def _clamp_crop(crop: Optional[Tuple[int, int, int, int]], width: int, height: int) -> Tuple[int, int, int, int]:
+    if crop is None:
+        return 0, 0, width, height
+    x, y, w, h = (int(v) for v in crop)
+    x = max(0, min(width - 1, x))
+    y = max(0, min(height - 1, y))
+    w = max(1, min(w, width - x))
+    h = max(1, min(h, height - y))
+    return x, y, w, h
+
+
+def _scaled_size(w: int, h: int, scale: float) -> Tuple[int, int]:
+    return max(1, int(w * scale)), max(1, int(h * scale))
+
+
+def otsu_level(hist) -> int:
+    """由 256 级灰度直方图计算 Otsu 阈值（与 cv2.THRESH_OTSU 一致：> 阈值为前景）。"""
+    total = 0
+    sum_all = 0.0
+    for i, c in enumerate(hist[:256]):
+        total += int(c)
+        sum_all += i * float(c)
+    if total <= 0:
+        return 0
+    sum_b = 0.0
+    w_b = 0
+    best = -1.0
+    level = 0
+    for i in range(256):
+        w_b += int(hist[i])
+        if w_b == 0:
+            continue
+        w_f = total - w_b
+        if w_f == 0:
+            break
+        sum_b += i * float(hist[i])
+        m_b = sum_b / w_b
+        m_f = (sum_all - sum_b) / w_f
+        between = float(w_b) * float(w_f) * (m_b - m_f) ** 2
+        if between > best:
+            best = between
+            level = i
+    return level
+
+
+class PreprocessPipeline:
+    """可复用的 OCR 前处理器（线程安全；同一实例的调用串行执行）。"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._buffers: Dict[Tuple[Any, ...], Any] = {}
+        self.runs = 0
+        self.total_ms = 0.0
+        self.last_ms = 0.0
+        self.allocations = 0
+
+    @staticmethod
+    def accelerated() -> bool:
+        return cv2 is not None and np is not None
+
+    # ---------- 公共接口 ----------
+    def run(self, image: Any, specs: Mapping[str, PreprocessSpec], *, bgr: bool = False) -> Dict[str, Any]:
+        """处理一张图并返回 {变体名: PIL.Image}。
+
+        输入可为 PIL.Image 或 numpy 数组（彩色数组默认 RGB，OpenCV 截图传 bgr=True）。
+        返回的图片拥有独立内存，可安全缓存（如失败时落盘）。
+        """
+        t0 = time.perf_counter()
+        with self._lock:
+            try:
+                if self.accelerated():
+                    arrays = self._run_cv(image, specs, bgr=bgr)
+                    out = {name: Image.fromarray(arr.copy()) if Image is not None else arr.copy() for name, arr in arrays.items()}
+                else:
+                    out = self._run_pil(image, specs, bgr=bgr)
+            finally:
+                self._account(t0)
+        return out
+
+    def run_arrays(self, image: Any, specs: Mapping[str, PreprocessSpec], *, bgr: bool = False) -> Dict[str, Any]:
+        """同 run，但返回 numpy 数组。
+
+        返回值直接引用内部缓冲区，仅在下一次调用本实例前有效；需要保留时请自行 copy。
+        """
+        if not self.accelerated():
+            raise RuntimeError("缺少 OpenCV/numpy 依赖，无法返回数组结果")
+        t0 = time.perf_counter()
+        with self._lock:
+            try:
+                return self._run_cv(image, specs, bgr=bgr)
+            finally:
+                self._account(t0)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "total_ms": round(self.total_ms, 3),
+                "avg_ms": round(self.total_ms / self.runs, 3) if self.runs else 0.0,
+                "last_ms": round(self.last_ms, 3),
+                "allocations": self.allocations,
+                "buffers": len(self._buffers),
+                "accelerated": self.accelerated(),
+            }
+
+    # ---------- 内部实现 ----------
+    def _account(self, t0: float) -> None:
+        self.last_ms = (time.perf_counter() - t0) * 1000.0
+        self.total_ms += self.last_ms
+        self.runs += 1
+
+    def _buf(self, key: Tuple[Any, ...], shape: Tuple[int, ...]):
+        buf = self._buffers.get(key)
+        if buf is None or buf.shape != shape:
+            buf = np.empty(shape, dtype=np.uint8)
+            self._buffers[key] = buf
+            self.allocations += 1
+        return buf
+
+    def _run_cv(self, image: Any, specs: Mapping[str, PreprocessSpec], *, bgr: bool) -> Dict[str, Any]:
+        src = np.asarray(image)
+        if src.dtype != np.uint8:
+            src = src.astype(np.uint8)
+        height, width = src.shape[:2]
+        channels = 1 if src.ndim == 2 else int(src.shape[2])
+        stages: Dict[Tuple[Any, ...], Any] = {}
+        out: Dict[str, Any] = {}
+        for name, spec in specs.items():
+            box = _clamp_crop(spec.crop, width, height)
+            x, y, w, h = box
+            cur = src[y:y + h, x:x + w]
+            key: Tuple[Any, ...] = ("crop", box)
+
+            sc = float(spec.scale or 1.0)
+            if abs(sc - 1.0) > 1e-3:
+                key = key + ("scale", round(sc, 4), spec.interpolation)
+                if key not in stages:
+                    dw, dh = _scaled_size(w, h, sc)
+                    shape = (dh, dw) if channels == 1 else (dh, dw, channels)
+                    interp = getattr(cv2, _CV_INTERP.get(spec.interpolation, "INTER_CUBIC"))
+                    stages[key] = cv2.resize(cur, (dw, dh), dst=self._buf(key, shape), interpolation=interp)
+                cur = stages[key]
+
+            if spec.needs_gray() and channels > 1:
+                key = key + ("gray",)
+                if key not in stages:
+                    if channels == 4:
+                        code = cv2.COLOR_BGRA2GRAY if bgr else cv2.COLOR_RGBA2GRAY
+                    else:
+                        code = cv2.COLOR_BGR2GRAY if bgr else cv2.COLOR_RGB2GRAY
+                    stages[key] = cv2.cvtColor(cur, code, dst=self._buf(key, cur.shape[:2]))
+                cur = stages[key]
+
+            if spec.blur and spec.threshold != "none":
+                k = int(spec.blur) | 1
+                key = key + ("blur", k)
+                if key not in stages:
+                    stages[key] = cv2.GaussianBlur(cur, (k, k), 0, dst=self._buf(key, cur.shape))
+                cur = stages[key]
+
+            if spec.threshold != "none":
+                # 反相与阈值合并为 THRESH_BINARY_INV，避免额外一次遍历
+                key = key + ("thr", spec.threshold, int(spec.fixed_level), bool(spec.invert))
+                if key not in stages:
+                    flag = cv2.THRESH_BINARY_INV if spec.invert else cv2.THRESH_BINARY
+                    level = int(spec.fixed_level)
+                    if spec.threshold == "otsu":
+                        flag += cv2.THRESH_OTSU
+                        level = 0
+                    _t, th = cv2.threshold(cur, level, 255, flag, dst=self._buf(key, cur.shape))
+                    stages[key] = th
+                cur = stages[key]
+            elif spec.invert:
+                key = key + ("invert",)
+                if key not in stages:
+                    stages[key] = cv2.bitwise_not(cur, dst=self._buf(key, cur.shape))
+                cur = stages[key]
+
+            if spec.pad > 0:
+                p = int(spec.pad)
+                key = key + ("pad", p, int(spec.pad_value))
+                if key not in stages:
+                    shape = (cur.shape[0] + 2 * p, cur.shape[1] + 2 * p) + tuple(cur.shape[2:])
+                    value = int(spec.pad_value) if cur.ndim == 2 else (int(spec.pad_value),) * int(cur.shape[2])
+                    stages[key] = cv2.copyMakeBorder(
+                        cur, p, p, p, p, cv2.BORDER_CONSTANT, dst=self._buf(key, shape), value=value
+                    )
+                cur = stages[key]
+            out[name] = cur
+        return out
+
+    def _run_pil(self, image: Any, specs: Mapping[str, PreprocessSpec], *, bgr: bool) -> Dict[str, Any]:
+        if Image is None:
+            raise RuntimeError("缺少 Pillow 依赖，请安装 pillow 库")
+        pil = image
+        if not hasattr(pil, "crop"):
+            arr = image
+            if bgr and getattr(arr, "ndim", 0) == 3:
+                arr = arr[:, :, 2::-1] if arr.shape[2] >= 3 else arr
+            pil = Image.fromarray(arr)
+        width, height = pil.size
+        out: Dict[str, Any] = {}
+        for name, spec in specs.items():
+            x, y, w, h = _clamp_crop(spec.crop, width, height)
+            cur = pil.crop((x, y, x + w, y + h))
+            sc = float(spec.scale or 1.0)
+            if abs(sc - 1.0) > 1e-3:
+                resample = getattr(Image, _PIL_RESAMPLE.get(spec.interpolation, "BICUBIC"), 3)
+                cur = cur.resize(_scaled_size(w, h, sc), resample=resample)
+            if spec.needs_gray():
+                cur = cur.convert("L")
+            if spec.threshold != "none":
+                level = otsu_level(cur.histogram()) if spec.threshold == "otsu" else int(spec.fixed_level)
+                hi, lo = (0, 255) if spec.invert else (255, 0)
+                cur = cur.point([hi if i > level else lo for i in range(256)])
+            elif spec.invert and ImageOps is not None:
+                cur = ImageOps.invert(cur)
+            if spec.pad > 0 and ImageOps is not None:
+                fill = int(spec.pad_value) if cur.mode == "L" else (int(spec.pad_value),) * len(cur.getbands())
+                cur = ImageOps.expand(cur, border=int(spec.pad), fill=fill)
+            out[name] = cur
+        return out
+
+
+__all__ = ["PreprocessPipeline", "PreprocessSpec", "otsu_level"]
@@ -10,7 +10,8 @@ from typing import Dict, List, Optional, Tuple
 import pyautogui
 
 from super_buyer.config.loader import load_config
-from super_buyer.services.ocr import NumberBox, recognize_numbers, recognize_text
+from super_buyer.services.ocr import NumberBox, ocr_allowlist, ocr_options, recognize_numbers, recognize_text
+from super_buyer.services.preprocess import PreprocessPipeline, PreprocessSpec
 
 
 def _load_ocr_config(config_path: str) -> Dict[str, any]:
@@ -53,7 +54,8 @@ def read_lowest_price_from_roi(
             pil,
             base_url=str(ocr_cfg.get("base_url", "http://127.0.0.1:1224")),
             timeout=float(ocr_cfg.get("timeout_sec", 2.5) or 2.5),
-            options=dict(ocr_cfg.get("options", {}) or {}),
+            options=ocr_options(ocr_cfg, "price"),
+            allowlist=ocr_allowlist(ocr_cfg, "price"),
         )
     except Exception:
         return None
@@ -89,7 +91,8 @@ def read_price_and_stock_from_roi(
             pil,
             base_url=str(ocr_cfg.get("base_url", "http://127.0.0.1:1224")),
             timeout=float(ocr_cfg.get("timeout_sec", 2.5) or 2.5),
-            options=dict(ocr_cfg.get("options", {}) or {}),
+            options=ocr_options(ocr_cfg, "price"),
+            allowlist=ocr_allowlist(ocr_cfg, "price"),
         )
     except Exception:
         return 0, 0
@@ -119,38 +122,24 @@ def read_price_and_stock_from_roi(
     return price, qty
 
 
+# 灰度 / Otsu / 模糊后 Otsu 三个变体共享同一灰度结果
+_DIGIT_VARIANTS = {
+    "gray": PreprocessSpec(threshold="none"),
+    "otsu": PreprocessSpec(),
+    "blur_otsu": PreprocessSpec(blur=3),
+}
+_DIGIT_PREP = PreprocessPipeline()
+
+
 def preprocess_variants_for_digits(image) -> List["numpy.ndarray"]:
     """生成若干二值化候选图，辅助手动 OCR 调试。"""
-    variants: List["numpy.ndarray"] = []
-    try:
-        import cv2  # type: ignore
-        import numpy as np  # type: ignore
-    except Exception:
-        return variants
-    try:
-        arr = np.array(image)
-    except Exception:
-        return variants
-    if arr.ndim == 3:
-        try:
-            gray = cv2.cvtColor(arr, cv2.COLOR_RGB2GRAY)
-        except Exception:
-            gray = arr[:, :, 0]
-    else:
-        gray = arr
-    variants.append(gray)
-    try:
-        _, otsu = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        variants.append(otsu)
-    except Exception:
-        pass
+    if not _DIGIT_PREP.accelerated():
+        return []
     try:
-        blur = cv2.GaussianBlur(gray, (3, 3), 0)
-        _, thr = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        variants.append(thr)
+        arrays = _DIGIT_PREP.run_arrays(image, _DIGIT_VARIANTS)
     except Exception:
-        pass
-    return variants
+        return []
+    return [arrays[name].copy() for name in _DIGIT_VARIANTS]
 
 
 def _preprocess_variants_for_digits(image):
@@ -1,19 +1,34 @@
-"""运行日志按日落库与按需回放。"""
+"""运行日志按日落库与按需回放。
+
+配置 `runtime_logs.write_behind` 为真时启用写后线程（`RuntimeLogWriter`）：`append_runtime_log`
+只做格式化与入队，后台线程为每个频道保持当天文件的打开句柄，按 `flush_sec` 间隔或
+累计 `flush_lines` 行统一 flush，跨零点时关闭旧句柄并切换到新日期目录；
+回放前与退出时（`stop_runtime_log_writer`，另有 atexit 兜底）写完队列。未启用时同步逐条追加。
+
+回放（`read_latest_runtime_logs`）从最新日期起逐个文件自末尾反向按块读取，
+只解析所需的最后 N 行，耗时与单日文件大小无关。
+"""
 
 from __future__ import annotations
 
+import atexit
 import json
+import queue
 import threading
 import time
 from collections import deque
 from pathlib import Path
-from typing import Any, Deque, Dict, List
+from typing import IO, Any, Deque, Dict, List, Optional, Set, Tuple
 
 from super_buyer.core.logging import ensure_level_tag
 
 MAX_VISIBLE_LOG_LINES = 5000
 
 _LOCK = threading.Lock()
+# 回放时反向读取的块大小
+_TAIL_BLOCK_BYTES = 64 * 1024
+# 已创建的日期目录（避免每条日志都 mkdir）
+_KNOWN_DIRS: Set[str] = set()
 
 
 def _safe_channel_name(channel: str) -> str:
@@ -29,11 +44,17 @@ def _logs_root(output_dir: str | Path) -> Path:
     return root
 
 
+def _day_name(ts: float) -> str:
+    return time.strftime("%Y-%m-%d", time.localtime(ts))
+
+
 def _day_dir(output_dir: str | Path, *, ts: float | None = None) -> Path:
     now_ts = time.time() if ts is None else float(ts)
-    day = time.strftime("%Y-%m-%d", time.localtime(now_ts))
-    path = _logs_root(output_dir) / day
-    path.mkdir(parents=True, exist_ok=True)
+    path = Path(output_dir).resolve() / "logs" / _day_name(now_ts)
+    key = str(path)
+    if key not in _KNOWN_DIRS:
+        path.mkdir(parents=True, exist_ok=True)
+        _KNOWN_DIRS.add(key)
     return path
 
 
@@ -41,6 +62,215 @@ def _log_file(output_dir: str | Path, channel: str, *, ts: float | None = None)
     return _day_dir(output_dir, ts=ts) / f"{_safe_channel_name(channel)}.jsonl"
 
 
+def _open_log(output_dir: str | Path, channel: str, ts: float) -> IO[str]:
+    path = _log_file(output_dir, channel, ts=ts)
+    try:
+        return path.open("a", encoding="utf-8")
+    except FileNotFoundError:
+        # 日期目录在运行期间被删除：重新创建
+        _KNOWN_DIRS.discard(str(path.parent))
+        return _log_file(output_dir, channel, ts=ts).open("a", encoding="utf-8")
+
+
+class RuntimeLogWriter:
+    """写后运行日志线程。
+
+    - `submit` 只入队；队列满时最多等待 `put_timeout_sec`，仍满则返回 False（调用方同步写入）；
+    - 每个 (输出目录, 频道) 保持一个当天文件句柄，记录日期变化时关闭旧句柄（零点切换）；
+    - 距上次 flush 超过 `flush_interval_sec` 或累计 `flush_lines` 行时 flush；
+    - `drain` 等待队列写完并 flush，`stop` 写完剩余记录后关闭句柄。
+    """
+
+    def __init__(
+        self,
+        *,
+        queue_size: int = 20000,
+        flush_interval_sec: float = 0.3,
+        flush_lines: int = 200,
+        put_timeout_sec: float = 0.2,
+    ) -> None:
+        self._queue: "queue.Queue[Optional[Tuple[str, str, float, str]]]" = queue.Queue(maxsize=max(1, int(queue_size)))
+        self.flush_interval_sec = max(0.01, float(flush_interval_sec))
+        self.flush_lines = max(1, int(flush_lines))
+        self.put_timeout_sec = max(0.0, float(put_timeout_sec))
+        # (输出目录, 频道) → (日期, 句柄)
+        self._handles: Dict[Tuple[str, str], Tuple[str, IO[str]]] = {}
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._thread: Optional[threading.Thread] = None
+        self.stats: Dict[str, int] = {"enqueued": 0, "written": 0, "flushes": 0, "full": 0, "errors": 0}
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._loop, name="runtime-log-writer", daemon=True)
+        self._thread.start()
+
+    def is_alive(self) -> bool:
+        return bool(self._thread is not None and self._thread.is_alive())
+
+    def submit(self, output_dir: str, channel: str, ts: float, line: str) -> bool:
+        item = (output_dir, channel, ts, line)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.stats["full"] += 1
+            try:
+                self._queue.put(item, timeout=self.put_timeout_sec)
+            except queue.Full:
+                return False
+        self.stats["enqueued"] += 1
+        return True
+
+    def _handle(self, output_dir: str, channel: str, ts: float) -> IO[str]:
+        key = (output_dir, channel)
+        day = _day_name(ts)
+        cur = self._handles.get(key)
+        if cur is not None:
+            if cur[0] == day:
+                return cur[1]
+            # 跨零点：关闭前一天的句柄
+            self._handles.pop(key, None)
+            try:
+                cur[1].close()
+            except Exception:
+                pass
+        fh = _open_log(output_dir, channel, ts)
+        self._handles[key] = (day, fh)
+        return fh
+
+    def _write(self, output_dir: str, channel: str, ts: float, line: str) -> None:
+        with _LOCK:
+            self._handle(output_dir, channel, ts).write(line)
+        self._pending += 1
+
+    def _flush(self) -> None:
+        with _LOCK:
+            for _day, fh in list(self._handles.values()):
+                try:
+                    fh.flush()
+                except Exception:
+                    pass
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self.stats["flushes"] += 1
+
+    def _close_handles(self) -> None:
+        self._flush()
+        with _LOCK:
+            for _day, fh in list(self._handles.values()):
+                try:
+                    fh.close()
+                except Exception:
+                    pass
+            self._handles.clear()
+
+    def _loop(self) -> None:
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval_sec)
+            except queue.Empty:
+                if self._pending:
+                    self._flush()
+                continue
+            if item is None:
+                self._close_handles()
+                self._queue.task_done()
+                return
+            try:
+                self._write(*item)
+                self.stats["written"] += 1
+            except Exception:
+                self.stats["errors"] += 1
+            if self._pending >= self.flush_lines or time.monotonic() - self._last_flush >= self.flush_interval_sec:
+                self._flush()
+            self._queue.task_done()
+
+    def drain(self, timeout: float = 2.0) -> bool:
+        """等待已入队日志全部写入并 flush；超时返回 False。"""
+        deadline = time.monotonic() + max(0.0, float(timeout))
+        while self._queue.unfinished_tasks > 0:
+            if not self.is_alive() or time.monotonic() >= deadline:
+                return False
+            time.sleep(0.005)
+        if self.is_alive():
+            self._flush()
+        return True
+
+    def stop(self, timeout: float = 5.0) -> bool:
+        """写完队列中剩余日志、关闭句柄后退出；返回是否在超时前完成。"""
+        done = True
+        if self.is_alive():
+            try:
+                self._queue.put(None, timeout=max(0.0, float(timeout)))
+            except queue.Full:
+                done = False
+            if self._thread is not None:
+                self._thread.join(timeout=max(0.0, float(timeout)))
+                done = done and not self._thread.is_alive()
+        return done
+
+
+_WRITER: Dict[str, Optional[RuntimeLogWriter]] = {"writer": None}
+
+
+def start_runtime_log_writer(**kwargs: Any) -> RuntimeLogWriter:
+    """启动（或复用已运行的）运行日志写后线程。"""
+    with _LOCK:
+        writer = _WRITER.get("writer")
+        if writer is not None and writer.is_alive():
+            return writer
+        writer = RuntimeLogWriter(**kwargs)
+        writer.start()
+        _WRITER["writer"] = writer
+        return writer
+
+
+def stop_runtime_log_writer(timeout: float = 5.0) -> bool:
+    """写完并停止运行日志写后线程；之后的日志恢复同步写入。"""
+    writer = _WRITER.get("writer")
+    if writer is None:
+        return True
+    done = writer.stop(timeout=timeout)
+    with _LOCK:
+        if _WRITER.get("writer") is writer:
+            _WRITER["writer"] = None
+    return done
+
+
+def flush_runtime_logs(timeout: float = 2.0) -> bool:
+    """等待写后队列中的日志落盘；未启用写后线程时直接返回 True。"""
+    writer = _WRITER.get("writer")
+    if writer is None:
+        return True
+    return writer.drain(timeout=timeout)
+
+
+def configure_runtime_logs_from_cfg(cfg: Dict[str, Any]) -> bool:
+    """按配置 `runtime_logs` 启停写后线程；返回是否启用。"""
+    try:
+        lcfg = cfg.get("runtime_logs") or {}
+    except Exception:
+        lcfg = {}
+    if not isinstance(lcfg, dict):
+        lcfg = {}
+    try:
+        if bool(lcfg.get("write_behind", False)):
+            start_runtime_log_writer(
+                queue_size=int(lcfg.get("queue_size", 20000) or 20000),
+                flush_interval_sec=float(lcfg.get("flush_sec", 0.3) or 0.3),
+                flush_lines=int(lcfg.get("flush_lines", 200) or 200),
+            )
+            return True
+        stop_runtime_log_writer()
+    except Exception:
+        pass
+    return False
+
+
+atexit.register(stop_runtime_log_writer)
+
+
 def append_runtime_log(
     output_dir: str | Path,
     channel: str,
@@ -48,7 +278,7 @@ def append_runtime_log(
     *,
     ts: float | None = None,
 ) -> str:
-    """写入一条运行日志，并返回标准化后的展示文本。"""
+    """写入一条运行日志，并返回标准化后的展示文本（启用写后线程时只入队）。"""
     now_ts = time.time() if ts is None else float(ts)
     normalized = ensure_level_tag(message, "detail", ts=now_ts)
     record: Dict[str, Any] = {
@@ -57,23 +287,44 @@ def append_runtime_log(
         "channel": _safe_channel_name(channel),
         "message": normalized,
     }
-    path = _log_file(output_dir, channel, ts=now_ts)
+    line = json.dumps(record, ensure_ascii=False) + "\n"
+    writer = _WRITER.get("writer")
+    if writer is not None and writer.is_alive() and writer.submit(str(output_dir), channel, now_ts, line):
+        return normalized
     with _LOCK:
-        with path.open("a", encoding="utf-8") as fh:
-            fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+        with _open_log(output_dir, channel, now_ts) as fh:
+            fh.write(line)
     return normalized
 
 
+def _tail_lines(path: Path, limit: int, *, block_size: int = _TAIL_BLOCK_BYTES) -> List[str]:
+    """从文件末尾按块反向读取，返回最后 limit 个非空行（按原顺序）；只解码用到的部分。"""
+    out: Deque[str] = deque()
+    with path.open("rb") as fh:
+        pos = fh.seek(0, 2)
+        rest = b""
+        while pos > 0 and len(out) < limit:
+            step = min(block_size, pos)
+            pos -= step
+            fh.seek(pos)
+            data = fh.read(step) + rest
+            lines = data.split(b"\n")
+            # 第一段可能是被块边界截断的行，留到下一块拼接（到达文件头时为完整行）
+            rest = lines.pop(0) if pos > 0 else b""
+            for raw in reversed(lines):
+                line = raw.strip()
+                if line:
+                    out.appendleft(line.decode("utf-8", errors="replace"))
+                    if len(out) >= limit:
+                        break
+    return list(out)
+
+
 def _read_last_messages(path: Path, *, limit: int) -> List[str]:
     if limit <= 0 or (not path.exists()):
         return []
-    tail: Deque[str] = deque(maxlen=limit)
     try:
-        with path.open("r", encoding="utf-8") as fh:
-            for line in fh:
-                line = line.strip()
-                if line:
-                    tail.append(line)
+        tail = _tail_lines(path, limit)
     except Exception:
         return []
 
@@ -98,6 +349,8 @@ def read_latest_runtime_logs(
     """按日期倒序回放指定频道的最新若干条日志。"""
     if limit <= 0:
         return []
+    # 写后队列中的日志先落盘
+    flush_runtime_logs()
     root = _logs_root(output_dir)
     day_dirs = sorted((p for p in root.iterdir() if p.is_dir()), key=lambda p: p.name)
     if not day_dirs:
@@ -124,6 +377,11 @@ def read_latest_runtime_logs(
 
 __all__ = [
     "MAX_VISIBLE_LOG_LINES",
+    "RuntimeLogWriter",
     "append_runtime_log",
+    "configure_runtime_logs_from_cfg",
+    "flush_runtime_logs",
     "read_latest_runtime_logs",
+    "start_runtime_log_writer",
+    "stop_runtime_log_writer",
 ]
@@ -9,6 +9,7 @@ import time
 from typing import Any, Dict, Optional, Tuple
 
 from super_buyer.core.common import safe_sleep
+from super_buyer.services.metrics import inc as _metric_inc, observe_ms
 
 
 class ScreenOps:
@@ -61,11 +62,14 @@ class ScreenOps:
         path, confidence = self._template(tpl_key)
         if not path or not os.path.exists(path):
             return None
+        t0 = time.perf_counter()
         end = time.time() + max(0.0, float(timeout or 0.0))
         while True:
             try:
                 box = self._pg.locateOnScreen(path, confidence=confidence, region=region)
                 if box is not None:
+                    observe_ms("screen.locate", (time.perf_counter() - t0) * 1000.0)
+                    _metric_inc("screen.locate.hit")
                     return (
                         int(box.left),
                         int(box.top),
@@ -75,6 +79,8 @@ class ScreenOps:
             except Exception:
                 pass
             if time.time() >= end:
+                observe_ms("screen.locate", (time.perf_counter() - t0) * 1000.0)
+                _metric_inc("screen.locate.miss")
                 return None
             safe_sleep(self.step_delay)
 
@@ -144,12 +150,15 @@ class ScreenOps:
 
     def screenshot_region(self, region: Tuple[int, int, int, int]):
         left, top, width, height = region
+        t0 = time.perf_counter()
         try:
-            return self._pg.screenshot(
+            img = self._pg.screenshot(
                 region=(int(left), int(top), int(width), int(height))
             )
         except Exception:
             return None
+        observe_ms("screen.capture", (time.perf_counter() - t0) * 1000.0)
+        return img
 
 
 __all__ = ["ScreenOps"]
@@ -5,16 +5,36 @@ Umi-OCR 进程托管。
 from __future__ import annotations
 
 import atexit
+import json
 import os
+import shutil
 import socket
 import subprocess
+import threading
 import time
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass, field
 from pathlib import Path
-from typing import Any, Callable, Dict, Iterable, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
 from urllib.parse import urlparse
 
-__all__ = ["ManagedUmiOcrProcess", "ManagedUmiOcrStatus"]
+from super_buyer.services.ocr_guard import configure_ocr_guard_from_cfg, get_ocr_guard
+from super_buyer.services.ocr_pool import (
+    configure_umi_ocr_fleet,
+    fleet_urls_from_cfg,
+    get_umi_ocr_pool,
+    normalize_base_url,
+)
+
+__all__ = [
+    "ManagedUmiOcrProcess",
+    "ManagedUmiOcrStatus",
+    "current_umi_ocr_status",
+    "wait_umi_ocr_ready",
+]
+
+# 预热样本：与价格/数量 ROI 同类的纯数字短条
+_WARMUP_TEXTS = ("1234567", "89012", "345678")
 
 
 @dataclass
@@ -25,10 +45,106 @@ class ManagedUmiOcrStatus:
     started: bool = False
     exe_path: str = ""
     message: str = ""
+    # ready 表示端口可连（或复用已有实例），不代表预热成功；预热完成与否见 warmed
+    warmed: bool = False
+    warmup_rounds: int = 0
+    warm_latency_ms: Optional[float] = None
+    first_ocr_ms: Optional[float] = None
+    cold_start_ms: Optional[float] = None
+    warmup_latencies_ms: List[float] = field(default_factory=list)
+    # 多实例：已就绪的实例地址与各实例的启动/预热摘要
+    endpoints: List[str] = field(default_factory=list)
+    instances: List[Dict[str, Any]] = field(default_factory=list)
+    # 熔断触发的实例重启次数
+    restarts: int = 0
+
+
+# 当前进程内托管实例的就绪状态（供 Runner 在步骤 1 前阻塞等待）
+_STATUS_LOCK = threading.Lock()
+_READY_EVENT = threading.Event()
+_PENDING = False
+_LAST_STATUS: Optional[ManagedUmiOcrStatus] = None
+
+
+def _publish_pending() -> None:
+    global _PENDING
+    with _STATUS_LOCK:
+        _PENDING = True
+        _READY_EVENT.clear()
+
+
+def _publish_status(status: ManagedUmiOcrStatus) -> None:
+    global _PENDING, _LAST_STATUS
+    with _STATUS_LOCK:
+        _LAST_STATUS = status
+        _PENDING = False
+        _READY_EVENT.set()
+
+
+def current_umi_ocr_status() -> Optional[ManagedUmiOcrStatus]:
+    """返回最近一次托管启动（含预热）的结果；尚未完成或未托管时为 None。"""
+    with _STATUS_LOCK:
+        return _LAST_STATUS
+
+
+def wait_umi_ocr_ready(
+    timeout_sec: float, stop: Optional[threading.Event] = None
+) -> Optional[ManagedUmiOcrStatus]:
+    """阻塞等待托管的 Umi-OCR 完成启动与预热。
+
+    - 未有托管实例在启动中时立即返回最近一次状态（可能为 None）；
+    - 超时或 stop 被置位时返回 None，由调用方决定是否继续（按 0.2s 分片等待以及时响应 stop）。
+    """
+    with _STATUS_LOCK:
+        pending = _PENDING
+        last = _LAST_STATUS
+    if not pending:
+        return last
+    deadline = time.monotonic() + max(0.0, float(timeout_sec))
+    while not _READY_EVENT.wait(max(0.0, min(0.2, deadline - time.monotonic()))):
+        if (stop is not None and stop.is_set()) or time.monotonic() >= deadline:
+            return None
+    return current_umi_ocr_status()
+
+
+# `.pre_settings` 原始内容的备份后缀；备份为空文件表示原本不存在
+_PRE_SETTINGS_BACKUP_SUFFIX = ".super_buyer.bak"
+
+
+def _warmup_sample(text: str):
+    """生成纯数字预热图（白底黑字，尺寸接近均价 ROI 上半部分）。"""
+    try:
+        from PIL import Image, ImageDraw  # type: ignore
+    except Exception:
+        return None
+    try:
+        from super_buyer.services.font_loader import pil_font
+
+        font = pil_font(18)
+    except Exception:
+        font = None
+    img = Image.new("L", (160, 24), 255)
+    draw = ImageDraw.Draw(img)
+    try:
+        draw.text((6, 1), str(text), fill=0, font=font)
+    except Exception:
+        draw.text((6, 1), str(text), fill=0)
+    return img
 
 
 class ManagedUmiOcrProcess:
-    """管理 Umi-OCR 随应用启动与退出的生命周期。"""
+    """管理 Umi-OCR 随应用启动与退出的生命周期。
+
+    多实例（`umi_ocr.instances`=K 或 `umi_ocr.base_urls`）：
+    - Umi-OCR 以安装目录为单位限制多开（`UmiOCR-data/.pre_settings` 记录 pid 与端口），
+      因此每个托管实例需要独立安装目录，通过 `umi_ocr.exe_paths` 按实例顺序配置；
+    - 仅对本应用启动的实例，在启动前把端口写入对应安装目录的 `.pre_settings`，
+      原文件先备份到同目录，退出时恢复（异常退出遗留的备份在下次启动/退出时恢复）；
+    - 就绪的实例注册到 `ocr_pool`，由 OCR 客户端按在途请求数派发。
+
+    熔断（`services.ocr_guard`）：实例连续失败被熔断时，若该实例由本应用启动且
+    `umi_ocr.breaker_restart` 开启，则在后台重启并预热该实例，成功后恢复熔断。
+    """
 
     def __init__(
         self,
@@ -40,9 +156,15 @@ class ManagedUmiOcrProcess:
         self.cfg = cfg
         self.app_root = Path(app_root).resolve()
         self.on_event = on_event or (lambda _level, _msg: None)
-        self._proc: Optional[subprocess.Popen[Any]] = None
+        self._procs: List[subprocess.Popen[Any]] = []
+        self._proc_by_url: Dict[str, subprocess.Popen[Any]] = {}
+        self._restart_lock = threading.Lock()
+        self._restarting: set[str] = set()
         self._spawned_by_app = False
         self._stopped = False
+        self._spawn_perf: Dict[str, float] = {}
+        self._patched_settings: List[Path] = []
+        self.status: Optional[ManagedUmiOcrStatus] = None
         atexit.register(self.stop)
 
     def _emit(self, level: str, message: str) -> None:
@@ -61,21 +183,33 @@ class ManagedUmiOcrProcess:
     def _base_url(self) -> str:
         return str(self._umi_cfg().get("base_url", "http://127.0.0.1:1224") or "http://127.0.0.1:1224")
 
-    def _parse_host_port(self) -> tuple[str, int]:
-        base_url = self._base_url()
+    def _fleet_urls(self) -> List[str]:
+        return fleet_urls_from_cfg(self._umi_cfg()) or [self._base_url()]
+
+    def _is_fleet(self) -> bool:
+        return len(self._fleet_urls()) > 1
+
+    def _parse_host_port(self, base_url: Optional[str] = None) -> tuple[str, int]:
+        base_url = base_url or self._fleet_urls()[0]
         parsed = urlparse(base_url if "://" in base_url else f"http://{base_url}")
         host = str(parsed.hostname or "127.0.0.1")
         port = int(parsed.port or 80)
         return host, port
 
-    def _is_local_endpoint(self) -> bool:
-        host, _ = self._parse_host_port()
+    def _is_local_endpoint(self, base_url: Optional[str] = None) -> bool:
+        host, _ = self._parse_host_port(base_url)
         return host in {"127.0.0.1", "localhost", "::1"}
 
-    def _should_manage(self) -> bool:
+    def _should_manage(self, base_url: Optional[str] = None) -> bool:
         umi_cfg = self._umi_cfg()
         auto_start = bool(umi_cfg.get("auto_start", True))
-        return auto_start and self._is_local_endpoint()
+        return auto_start and self._is_local_endpoint(base_url)
+
+    def _cfg_float(self, key: str, default: float) -> float:
+        try:
+            return float(self._umi_cfg().get(key, default))
+        except Exception:
+            return float(default)
 
     def _wait_timeout_sec(self) -> float:
         try:
@@ -83,17 +217,27 @@ class ManagedUmiOcrProcess:
         except Exception:
             return 20.0
 
-    def _configured_exe_path(self) -> Path | None:
+    def _configured_exe_path(self, index: int = 0) -> Path | None:
+        raw_list = self._umi_cfg().get("exe_paths")
+        if isinstance(raw_list, (list, tuple)) and index < len(raw_list):
+            raw = str(raw_list[index] or "").strip()
+            if raw:
+                return Path(raw).expanduser()
+        if index > 0:
+            return None
         raw = str(self._umi_cfg().get("exe_path", "") or "").strip()
         if not raw:
             return None
         return Path(raw).expanduser()
 
-    def _candidate_executables(self) -> list[Path]:
+    def _candidate_executables(self, index: int = 0) -> list[Path]:
         candidates: list[Path] = []
-        configured = self._configured_exe_path()
+        configured = self._configured_exe_path(index)
         if configured is not None:
             candidates.append(configured)
+        if index > 0:
+            # 额外实例只使用显式配置的独立安装目录
+            return candidates
 
         for rel in (
             Path("Umi-OCR_Paddle_v2.1.5") / "Umi-OCR.exe",
@@ -115,8 +259,8 @@ class ManagedUmiOcrProcess:
             uniq.append(path)
         return uniq
 
-    def _find_executable(self) -> Path | None:
-        for path in self._candidate_executables():
+    def _find_executable(self, index: int = 0) -> Path | None:
+        for path in self._candidate_executables(index):
             try:
                 if path.exists() and path.is_file():
                     return path.resolve()
@@ -124,37 +268,314 @@ class ManagedUmiOcrProcess:
                 continue
         return None
 
-    def _endpoint_ready(self, *, timeout_sec: float = 0.6) -> bool:
-        host, port = self._parse_host_port()
+    def _assign_port(self, exe_path: Path, port: int) -> None:
+        """把端口写入安装目录的 `.pre_settings`（Umi-OCR 启动时从这里读取监听端口）。
+
+        修改前备份原文件，`stop` 时由 `_restore_settings` 恢复；已有备份（上次未正常
+        退出）时保留该备份，它才是用户的原始设置。
+        """
+        settings = exe_path.parent / "UmiOCR-data" / ".pre_settings"
+        if not settings.parent.is_dir():
+            return
+        backup = settings.with_name(settings.name + _PRE_SETTINGS_BACKUP_SUFFIX)
+        if backup.exists() and settings not in self._patched_settings:
+            self._patched_settings.append(settings)
+        data: Dict[str, Any] = {}
+        try:
+            if settings.exists():
+                raw = json.loads(settings.read_text(encoding="utf-8"))
+                if isinstance(raw, dict):
+                    data = raw
+        except Exception:
+            data = {}
+        if int(data.get("server_port", 0) or 0) == int(port):
+            return
+        try:
+            if not backup.exists():
+                if settings.exists():
+                    shutil.copy2(settings, backup)
+                else:
+                    backup.write_bytes(b"")
+        except Exception:
+            # 无法备份时不改动用户的设置
+            return
+        if settings not in self._patched_settings:
+            self._patched_settings.append(settings)
+        data["server_port"] = int(port)
+        try:
+            settings.write_text(json.dumps(data, ensure_ascii=False, indent=4), encoding="utf-8")
+        except Exception:
+            pass
+
+    def _restore_settings(self) -> None:
+        """恢复 `_assign_port` 改动过的 `.pre_settings`（须在实例退出后调用）。"""
+        patched, self._patched_settings = list(self._patched_settings), []
+        for settings in patched:
+            backup = settings.with_name(settings.name + _PRE_SETTINGS_BACKUP_SUFFIX)
+            try:
+                if not backup.exists():
+                    continue
+                if backup.stat().st_size == 0:
+                    settings.unlink(missing_ok=True)
+                else:
+                    shutil.copy2(backup, settings)
+                backup.unlink()
+            except Exception:
+                pass
+
+    def _endpoint_ready(self, base_url: Optional[str] = None, *, timeout_sec: float = 0.6) -> bool:
+        host, port = self._parse_host_port(base_url)
         try:
             with socket.create_connection((host, port), timeout=max(0.1, float(timeout_sec))):
                 return True
         except OSError:
             return False
 
-    def _wait_until_ready(self, timeout_sec: float) -> bool:
+    def _wait_until_ready(self, timeout_sec: float, base_url: Optional[str] = None) -> bool:
         deadline = time.time() + max(0.0, float(timeout_sec))
         while time.time() < deadline:
-            if self._endpoint_ready(timeout_sec=0.4):
+            if self._endpoint_ready(base_url, timeout_sec=0.4):
                 return True
             time.sleep(0.25)
-        return self._endpoint_ready(timeout_sec=0.4)
+        return self._endpoint_ready(base_url, timeout_sec=0.4)
 
     def start(self) -> ManagedUmiOcrStatus:
-        if not self._should_manage():
-            return ManagedUmiOcrStatus(managed=False, ready=self._endpoint_ready())
+        """启动（或复用）Umi-OCR，并在端口就绪后执行预热。
+
+        结果同时写入 `self.status` 与模块级就绪状态，Runner 可通过
+        `wait_umi_ocr_ready` 在步骤 1 前阻塞等待。
+        """
+        _publish_pending()
+        self._spawn_perf = {}
+        configure_ocr_guard_from_cfg(self.cfg)
+        get_ocr_guard().add_trip_listener(self._on_breaker_trip)
+        status: ManagedUmiOcrStatus
+        try:
+            status = self._launch()
+            if status.ready:
+                self._warm_up(status)
+                self._record_startup(status)
+        except Exception as exc:
+            status = ManagedUmiOcrStatus(managed=self._should_manage(), ready=False, message=f"Umi-OCR 启动异常：{exc}")
+        self._register_fleet(status)
+        self.status = status
+        _publish_status(status)
+        return status
+
+    def start_in_background(self) -> threading.Thread:
+        """在后台线程执行 `start`（启动 + 预热可能持续数秒）。
+
+        线程启动前同步标记"启动中"，保证此后开始的 Runner 调用 `wait_umi_ocr_ready`
+        时一定会等待，而不是因后台线程尚未运行而直接放行。
+        """
+        _publish_pending()
+        thread = threading.Thread(target=self.start, name="umi-ocr-start", daemon=True)
+        thread.start()
+        return thread
+
+    def _register_fleet(self, status: ManagedUmiOcrStatus) -> None:
+        urls = self._fleet_urls()
+        if len(urls) < 2:
+            return
+        ready = set(status.endpoints or [])
+        configure_umi_ocr_fleet(
+            urls,
+            unhealthy=[u for u in urls if u not in ready],
+            aliases=[self._base_url()],
+        )
+
+    def _warmup_options(self) -> Dict[str, Any]:
+        # 与步骤 6 读价使用相同的档位，预热后首次读价不会因参数变化触发引擎重启
+        try:
+            from super_buyer.services.ocr import ocr_options
+
+            return ocr_options(self._umi_cfg(), "price")
+        except Exception:
+            raw = self._umi_cfg().get("options", {})
+            return dict(raw) if isinstance(raw, dict) else {}
+
+    def _warm_up(self, status: ManagedUmiOcrStatus) -> None:
+        """对每个已就绪实例执行预热，并汇总到 status。"""
+        urls = list(status.endpoints or []) or [self._fleet_urls()[0]]
+        if not bool(self._umi_cfg().get("warmup_enabled", True)):
+            status.warmed = False
+            return
+        if len(urls) == 1:
+            results = [self._warm_up_endpoint(urls[0], started=status.started)]
+        else:
+            # 多实例并行预热，总耗时约等于最慢实例
+            by_url = {str(it.get("base_url")): it for it in status.instances}
+            with ThreadPoolExecutor(max_workers=len(urls)) as ex:
+                futs = [
+                    ex.submit(self._warm_up_endpoint, url, started=bool((by_url.get(url) or {}).get("started")))
+                    for url in urls
+                ]
+                results = [f.result() for f in futs]
+        for res in results:
+            for inst in status.instances:
+                if inst.get("base_url") == res.get("base_url"):
+                    inst.update({k: v for k, v in res.items() if k != "base_url"})
+        warmed = [r for r in results if r.get("warmed")]
+        primary = results[0]
+        status.warmup_rounds = int(primary.get("warmup_rounds", 0))
+        status.warmup_latencies_ms = list(primary.get("warmup_latencies_ms", []))
+        status.first_ocr_ms = primary.get("first_ocr_ms")
+        colds = [r["cold_start_ms"] for r in results if r.get("cold_start_ms") is not None]
+        status.cold_start_ms = max(colds) if colds else None
+        if not warmed:
+            status.warmed = False
+            return
+        status.warm_latency_ms = round(sum(float(r["warm_latency_ms"]) for r in warmed) / len(warmed), 1)
+        status.warmed = True
+        parts = [f"首次识别={status.first_ocr_ms}ms", f"稳态延迟={status.warm_latency_ms}ms", f"预热轮数={status.warmup_rounds}"]
+        if status.cold_start_ms is not None:
+            parts.insert(0, f"冷启动={status.cold_start_ms}ms")
+        if len(results) > 1:
+            parts.append(f"实例={len(warmed)}/{len(results)}")
+        self._emit("info", "Umi-OCR 预热完成：" + " ".join(parts))
+
+    def _warm_up_endpoint(self, base_url: str, *, started: bool) -> Dict[str, Any]:
+        """发送合成的纯数字识别请求，直到延迟稳定。
+
+        PaddleOCR 首次识别才懒加载模型；若不预热，这次冷启动会落在第一轮购买的步骤 6。
+        稳定判定：至少 `warmup_min_rounds` 轮，且最近两轮延迟差不超过
+        `warmup_stable_ratio`（相对较大者）。
+        """
+        result: Dict[str, Any] = {"base_url": base_url, "warmed": False, "warmup_rounds": 0}
+        try:
+            from super_buyer.services.ocr import engine_start_key, recognize_text
+        except Exception:
+            return result
+        max_rounds = max(1, int(self._cfg_float("warmup_max_rounds", 8)))
+        min_rounds = max(1, min(max_rounds, int(self._cfg_float("warmup_min_rounds", 3))))
+        stable_ratio = max(0.0, self._cfg_float("warmup_stable_ratio", 0.25))
+        # 首次识别包含模型加载，单独放宽超时
+        first_timeout = max(1.0, self._cfg_float("warmup_first_timeout_sec", 30.0))
+        timeout = max(0.5, self._cfg_float("timeout_sec", 2.5))
+        options = self._warmup_options()
+        spawn_perf = float(self._spawn_perf.get(base_url, 0.0) or 0.0)
+        latencies: List[float] = []
+        for idx in range(max_rounds):
+            if self._stopped:
+                break
+            sample = _warmup_sample(_WARMUP_TEXTS[idx % len(_WARMUP_TEXTS)])
+            if sample is None:
+                break
+            t0 = time.perf_counter()
+            try:
+                recognize_text(
+                    sample,
+                    base_url=base_url,
+                    timeout=(first_timeout if not latencies else timeout),
+                    options=options,
+                    balance=False,
+                    guarded=False,
+                )
+            except Exception as exc:
+                self._emit("warn", f"Umi-OCR 预热请求失败（{base_url} 第{idx + 1}轮）：{exc}")
+                continue
+            t1 = time.perf_counter()
+            elapsed_ms = (t1 - t0) * 1000.0
+            if not latencies:
+                result["first_ocr_ms"] = round(elapsed_ms, 1)
+                if started and spawn_perf > 0.0:
+                    result["cold_start_ms"] = round((t1 - spawn_perf) * 1000.0, 1)
+            latencies.append(round(elapsed_ms, 1))
+            if len(latencies) >= max(2, min_rounds):
+                a, b = latencies[-2], latencies[-1]
+                if abs(a - b) <= stable_ratio * max(a, b, 1.0):
+                    break
+        result["warmup_rounds"] = len(latencies)
+        result["warmup_latencies_ms"] = list(latencies)
+        if not latencies:
+            return result
+        # 第一轮含模型加载，稳态延迟取其后各轮的最后两轮均值
+        tail = latencies[1:][-2:] or latencies[-1:]
+        result["warm_latency_ms"] = round(sum(tail) / len(tail), 1)
+        result["warmed"] = True
+        # 预热绕过熔断器：由此告知其引擎已按读价参数加载，首个正式请求不再按冷请求处理
+        get_ocr_guard().mark_warm(base_url, engine_start_key(options))
+        return result
+
+    def _record_startup(self, status: ManagedUmiOcrStatus) -> None:
+        """将启动/预热耗时追加到 output_dir/umi_ocr_startup.jsonl，便于跟踪冷启动变化。"""
+        try:
+            paths_cfg = self.cfg.get("paths") or {}
+            out_dir = str((paths_cfg.get("output_dir") if isinstance(paths_cfg, dict) else None) or "")
+        except Exception:
+            out_dir = ""
+        if not out_dir:
+            return
+        now_ts = time.time()
+        record: Dict[str, Any] = {
+            "ts": now_ts,
+            "iso": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now_ts)),
+            "base_url": self._base_url(),
+        }
+        record.update({k: v for k, v in asdict(status).items() if k != "message"})
+        try:
+            path = Path(out_dir)
+            path.mkdir(parents=True, exist_ok=True)
+            with (path / "umi_ocr_startup.jsonl").open("a", encoding="utf-8") as fh:
+                fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except Exception:
+            pass
 
-        if self._endpoint_ready():
-            msg = f"检测到 Umi-OCR 已在运行：{self._base_url()}"
+    def _launch(self) -> ManagedUmiOcrStatus:
+        """按实例列表逐个启动/复用；至少一个实例就绪即视为可用。"""
+        urls = self._fleet_urls()
+        results = [self._launch_one(idx, url) for idx, url in enumerate(urls)]
+        if len(results) == 1:
+            status = results[0]
+            if status.ready:
+                status.endpoints = [urls[0]]
+            status.instances = [{"base_url": urls[0], "ready": status.ready, "started": status.started}]
+            return status
+        ready_urls = [url for url, res in zip(urls, results) if res.ready]
+        instances = [
+            {
+                "base_url": url,
+                "ready": res.ready,
+                "started": res.started,
+                "using_existing": res.using_existing,
+                "exe_path": res.exe_path,
+            }
+            for url, res in zip(urls, results)
+        ]
+        msg = f"Umi-OCR 多实例就绪 {len(ready_urls)}/{len(urls)}"
+        self._emit("success" if ready_urls else "warn", msg)
+        return ManagedUmiOcrStatus(
+            managed=any(res.managed for res in results),
+            ready=bool(ready_urls),
+            using_existing=all(res.using_existing for res in results if res.ready) and bool(ready_urls),
+            started=any(res.started for res in results),
+            exe_path=results[0].exe_path,
+            message=msg,
+            endpoints=ready_urls,
+            instances=instances,
+        )
+
+    def _launch_one(self, index: int, base_url: str) -> ManagedUmiOcrStatus:
+        if not self._should_manage(base_url):
+            return ManagedUmiOcrStatus(managed=False, ready=self._endpoint_ready(base_url))
+
+        if self._endpoint_ready(base_url):
+            msg = f"检测到 Umi-OCR 已在运行：{base_url}"
             self._emit("info", msg)
             return ManagedUmiOcrStatus(managed=True, ready=True, using_existing=True, message=msg)
 
-        exe_path = self._find_executable()
+        exe_path = self._find_executable(index)
         if exe_path is None:
-            msg = "未找到可启动的 Umi-OCR.exe，OCR 功能将不可用。"
+            if index > 0:
+                msg = f"未配置第 {index + 1} 个 Umi-OCR 实例的独立安装目录（umi_ocr.exe_paths），跳过 {base_url}"
+            else:
+                msg = "未找到可启动的 Umi-OCR.exe，OCR 功能将不可用。"
             self._emit("warn", msg)
             return ManagedUmiOcrStatus(managed=True, ready=False, message=msg)
 
+        if self._is_fleet():
+            self._assign_port(exe_path, self._parse_host_port(base_url)[1])
+
         creationflags = 0
         startupinfo = None
         if os.name == "nt":
@@ -170,8 +591,9 @@ class ManagedUmiOcrProcess:
             except Exception:
                 startupinfo = None
 
+        self._spawn_perf[base_url] = time.perf_counter()
         try:
-            self._proc = subprocess.Popen(
+            proc = subprocess.Popen(
                 [str(exe_path)],
                 cwd=str(exe_path.parent),
                 stdin=subprocess.DEVNULL,
@@ -180,6 +602,8 @@ class ManagedUmiOcrProcess:
                 startupinfo=startupinfo,
                 creationflags=creationflags,
             )
+            self._procs.append(proc)
+            self._proc_by_url[normalize_base_url(base_url)] = proc
             self._spawned_by_app = True
             self._stopped = False
         except Exception as exc:
@@ -187,7 +611,7 @@ class ManagedUmiOcrProcess:
             self._emit("error", msg)
             return ManagedUmiOcrStatus(managed=True, ready=False, exe_path=str(exe_path), message=msg)
 
-        if self._wait_until_ready(self._wait_timeout_sec()):
+        if self._wait_until_ready(self._wait_timeout_sec(), base_url):
             msg = f"Umi-OCR 已启动：{exe_path}"
             self._emit("success", msg)
             return ManagedUmiOcrStatus(
@@ -200,7 +624,12 @@ class ManagedUmiOcrProcess:
 
         msg = f"Umi-OCR 启动后未在预期时间内就绪：{exe_path}"
         self._emit("warn", msg)
-        self.stop()
+        self._terminate(proc)
+        try:
+            self._procs.remove(proc)
+            self._proc_by_url.pop(normalize_base_url(base_url), None)
+        except ValueError:
+            pass
         return ManagedUmiOcrStatus(
             managed=True,
             ready=False,
@@ -209,17 +638,74 @@ class ManagedUmiOcrProcess:
             message=msg,
         )
 
+    def _on_breaker_trip(self, base_url: str, metrics: Dict[str, Any]) -> None:
+        msg = (
+            f"Umi-OCR 连续失败 {metrics.get('consecutive_failures')} 次，已熔断：{base_url}"
+            f"（累计熔断 {metrics.get('trips')} 次，最近错误：{metrics.get('last_error') or '-'}）"
+        )
+        self._emit("warn", msg)
+        if self._stopped or not bool(self._umi_cfg().get("breaker_restart", True)):
+            return
+        threading.Thread(target=self.restart_endpoint, args=(base_url,), daemon=True).start()
+
+    def restart_endpoint(self, base_url: str) -> bool:
+        """重启并预热单个实例（仅限本应用启动的实例）；成功后恢复熔断并放回实例池。"""
+        key = normalize_base_url(base_url)
+        with self._restart_lock:
+            if key in self._restarting:
+                return False
+            self._restarting.add(key)
+        try:
+            urls = [normalize_base_url(u) for u in self._fleet_urls()]
+            if key not in urls or not self._should_manage(key):
+                return False
+            proc = self._proc_by_url.pop(key, None)
+            if proc is None and self._endpoint_ready(key):
+                self._emit("warn", f"Umi-OCR 实例非本应用启动，无法自动重启：{key}")
+                return False
+            if proc is not None:
+                self._terminate(proc)
+                try:
+                    self._procs.remove(proc)
+                except ValueError:
+                    pass
+            res = self._launch_one(urls.index(key), key)
+            if not res.ready or self._stopped:
+                self._emit("error", f"Umi-OCR 实例重启失败：{key} {res.message}")
+                return False
+            # 先重置熔断状态，预热成功后再记录引擎参数
+            get_ocr_guard().reset(key)
+            warm = self._warm_up_endpoint(key, started=res.started)
+            pool = get_umi_ocr_pool()
+            if pool is not None:
+                pool.readmit(key)
+            if self.status is not None:
+                self.status.restarts += 1
+            self._emit("success", f"Umi-OCR 实例已重启：{key} 稳态延迟={warm.get('warm_latency_ms', '-')}ms")
+            return True
+        except Exception as exc:
+            self._emit("error", f"Umi-OCR 实例重启异常：{key} {exc}")
+            return False
+        finally:
+            with self._restart_lock:
+                self._restarting.discard(key)
+
     def stop(self) -> None:
         if self._stopped:
             return
         self._stopped = True
-        if not self._spawned_by_app:
-            return
-        proc = self._proc
-        self._proc = None
-        self._spawned_by_app = False
-        if proc is None:
-            return
+        get_ocr_guard().remove_trip_listener(self._on_breaker_trip)
+        if self._spawned_by_app:
+            procs = list(self._procs)
+            self._procs = []
+            self._proc_by_url = {}
+            self._spawned_by_app = False
+            for proc in procs:
+                self._terminate(proc)
+        self._restore_settings()
+
+    @staticmethod
+    def _terminate(proc: subprocess.Popen[Any]) -> None:
         try:
             if proc.poll() is not None:
                 return
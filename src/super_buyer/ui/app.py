@@ -6,7 +6,7 @@ import sys
 import shutil
 from pathlib import Path
 from tkinter import messagebox, ttk
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 import importlib.resources as pkg_resources
 import json
 
@@ -14,17 +14,26 @@ from super_buyer.config import ConfigPaths, ensure_default_config, load_config,
 from super_buyer.core.task_runner import TaskRunner
 from super_buyer.services.compat import ensure_pyautogui_confidence_compat
 from super_buyer.services.font_loader import setup_matplotlib_chinese
+from super_buyer.services.history import (
+    configure_history_from_cfg,
+    resolve_paths as resolve_history_paths,
+    stop_history_writer,
+)
+from super_buyer.services.history_columnar import local_date_nums
+from super_buyer.services.history_rollup import start_history_compactor, stop_history_compactor
 from super_buyer.services.runtime_logs import (
     MAX_VISIBLE_LOG_LINES,
     append_runtime_log,
+    configure_runtime_logs_from_cfg,
     read_latest_runtime_logs,
+    stop_runtime_log_writer,
 )
 from super_buyer.services.umi_runtime import ManagedUmiOcrProcess
 from super_buyer.ui.goods_market import GoodsMarketUI
 from super_buyer.ui.tabs.init_config import InitConfigTab
 from super_buyer.ui.tabs.multi_snipe import MultiSnipeTab
 from super_buyer.ui.tabs.profit import ProfitTab
-from super_buyer.ui.widgets import LightTipManager
+from super_buyer.ui.widgets import LightTipManager, LogPump
 from super_buyer.ui.tabs.tasks import SingleFastBuyTab
 
 ensure_pyautogui_confidence_compat()
@@ -37,6 +46,8 @@ class App(tk.Tk):
         self.title("基于图像识别的自动购买助手")
         self.geometry("1120x740")
         self.tip_manager = LightTipManager(self)
+        # 日志控件批量投递（运行线程的日志合并后由主线程周期性写入）
+        self._log_pump = LogPump(self, limit=MAX_VISIBLE_LOG_LINES)
         # Autosave scheduler
         self._autosave_after_id: str | None = None
         self._autosave_delay_ms: int = 300
@@ -67,6 +78,8 @@ class App(tk.Tk):
                 umi_cfg.setdefault("auto_start", True)
                 umi_cfg.setdefault("startup_wait_sec", 20.0)
                 umi_cfg.setdefault("exe_path", "")
+                umi_cfg.setdefault("warmup_enabled", True)
+                umi_cfg.setdefault("ready_wait_sec", 60.0)
         except Exception:
             pass
         try:
@@ -84,6 +97,21 @@ class App(tk.Tk):
             paths_cfg["output_dir"] = str(self.paths.output_dir)
         except Exception:
             pass
+        # 历史存储后端（jsonl / sqlite），UI 查询与运行器写入共用
+        try:
+            configure_history_from_cfg(self.cfg)
+        except Exception:
+            pass
+        # 运行日志写后线程（按频道/日期保持句柄，批量 flush）
+        try:
+            configure_runtime_logs_from_cfg(self.cfg)
+        except Exception:
+            pass
+        # 后台汇总（分钟→小时→天）与过期数据裁剪
+        try:
+            start_history_compactor(resolve_history_paths(self.paths.output_dir), self.cfg)
+        except Exception:
+            pass
         # 首次运行：确保 goods.json 存在（从包内默认数据复制）
         try:
             self._ensure_default_goods(self.paths.root / "goods.json")
@@ -271,6 +299,13 @@ class App(tk.Tk):
                     pass
 
     def _on_umi_ocr_event(self, level: str, message: str) -> None:
+        # 托管进程在后台线程启动/预热，提示需切回 Tk 主线程
+        try:
+            self.after(0, lambda: self._show_umi_ocr_event(level, message))
+        except Exception:
+            pass
+
+    def _show_umi_ocr_event(self, level: str, message: str) -> None:
         kind = str(level or "info").lower()
         try:
             if kind in {"warn", "error"}:
@@ -287,7 +322,8 @@ class App(tk.Tk):
                 app_root=self._resolve_app_root(),
                 on_event=self._on_umi_ocr_event,
             )
-            self._umi_ocr_runtime.start()
+            # 启动 + 预热可能持续数秒，放到后台线程避免阻塞界面（"启动中"状态在此同步发布）
+            self._umi_ocr_runtime.start_in_background()
         except Exception as exc:
             try:
                 self.tip_manager.show(f"Umi-OCR 托管启动失败：{exc}", kind="warn", duration=4.0)
@@ -978,6 +1014,18 @@ class App(tk.Tk):
                 umi_runtime.stop()
         except Exception:
             pass
+        try:
+            stop_history_compactor()
+        except Exception:
+            pass
+        try:
+            stop_history_writer()
+        except Exception:
+            pass
+        try:
+            stop_runtime_log_writer()
+        except Exception:
+            pass
         try:
             self.destroy()
         except Exception:
@@ -987,19 +1035,6 @@ class App(tk.Tk):
     # ---------- Tab3: OCR Lab（已移除） ----------
 
     # ---------- 执行日志（统一详细模式） ----------
-    def _trim_log_widget_lines(self, widget: tk.Text, *, limit: int = MAX_VISIBLE_LOG_LINES) -> None:
-        try:
-            line_count = int(str(widget.index("end-1c")).split(".")[0])
-        except Exception:
-            return
-        overflow = max(0, line_count - int(limit))
-        if overflow <= 0:
-            return
-        try:
-            widget.delete("1.0", f"{overflow + 1}.0")
-        except Exception:
-            pass
-
     def _restore_runtime_log_widget(self, channel: str, widget: tk.Text | None) -> None:
         if widget is None:
             return
@@ -1029,27 +1064,7 @@ class App(tk.Tk):
         lock: Any,
         echo_to_console: bool = False,
     ) -> None:
-        try:
-            import threading as _th
-
-            if _th.current_thread() is not _th.main_thread():
-                try:
-                    self.after(
-                        0,
-                        lambda: self._append_runtime_log(
-                            channel,
-                            s,
-                            widget=widget,
-                            lock=lock,
-                            echo_to_console=echo_to_console,
-                        ),
-                    )
-                except Exception:
-                    pass
-                return
-        except Exception:
-            pass
-
+        """落盘一条日志并交给 LogPump 批量显示（任意线程可调用）。"""
         try:
             normalized = append_runtime_log(self.paths.output_dir, channel, s)
         except Exception:
@@ -1063,14 +1078,7 @@ class App(tk.Tk):
                     pass
             return
 
-        with lock:
-            try:
-                widget.configure(state=tk.NORMAL)
-                widget.insert(tk.END, normalized + "\n")
-                self._trim_log_widget_lines(widget)
-                widget.see(tk.END)
-            finally:
-                widget.configure(state=tk.DISABLED)
+        self._log_pump.push(widget, normalized, lock=lock)
 
     def _append_log(self, s: str) -> None:
         txt = getattr(self, "txt", None)
@@ -1104,7 +1112,7 @@ class App(tk.Tk):
         if not it:
             return
         try:
-            from history_store import query_price, query_price_minutely  # type: ignore
+            from history_store import CHART_MAX_POINTS, query_price, query_price_columns, query_price_series  # type: ignore
         except Exception:
             messagebox.showwarning("历史价格", "历史模块不可用。")
             return
@@ -1176,16 +1184,25 @@ class App(tk.Tk):
 
             sec = _sec_for_label(rng_var.get())
             since = time.time() - sec
-            # Prefer minutely aggregate; fallback to raw ticks if aggregator unavailable
-            x: List[Any] = []  # datetime for minutes
+            # 优先使用分层聚合（按范围自动选分钟/小时/天）；无聚合数据时回退原始记录
+            x: List[Any] = []  # datetime for buckets
             y_avg: List[int] = []
             y_min: List[int] = []
             y_max: List[int] = []
+            # 列式存储可用时直接取数组（日期数向量化换算），否则逐条转换字典记录
+            cols = None
+            try:
+                cols = query_price_columns(item_id, since, max_points=CHART_MAX_POINTS)
+            except Exception:
+                cols = None
             try:
-                recs_m = query_price_minutely(item_id, since)
+                recs_m = [] if cols is not None else query_price_series(item_id, since, max_points=CHART_MAX_POINTS)
             except Exception:
                 recs_m = []
-            if recs_m:
+            if cols is not None and len(cols):
+                x = local_date_nums(cols.ts)
+                y_min, y_max, y_avg = cols.min, cols.max, cols.avg
+            elif recs_m:
                 for r in recs_m:
                     try:
                         ts = float(r.get("ts", r.get("ts_min", 0.0)) or 0.0)
@@ -1213,7 +1230,7 @@ class App(tk.Tk):
 
             fig = plt.Figure(figsize=(6.4, 3.4), dpi=100)
             ax = fig.add_subplot(111)
-            if x and y_avg:
+            if len(x) and len(y_avg):
                 # Draw avg line and min-max band
                 ax.plot_date(x, y_avg, "-", linewidth=1.5, label="平均价")
                 try:
@@ -1249,8 +1266,8 @@ class App(tk.Tk):
 
                 ax.yaxis.set_major_formatter(mtick.FuncFormatter(_fmt_tick))
                 fig.autofmt_xdate()
-                mn = min(y_min) if y_min else 0
-                mx = max(y_max) if y_max else 0
+                mn = int(min(y_min)) if len(y_min) else 0
+                mx = int(max(y_max)) if len(y_max) else 0
                 ax.legend(loc="upper right")
                 # 文本显示千分位
                 try:
@@ -1286,19 +1303,103 @@ class App(tk.Tk):
                 removed = int(clear_price_history(item_id))
             except Exception:
                 pass
-            messagebox.showinfo("清空历史", f"已清空 {removed} 条记录。")
+            if removed < 0:
+                # JSONL 后端：已标记删除，后台压缩时物理清理
+                messagebox.showinfo("清空历史", f"已清空 [{name}] 的历史价格记录。")
+            else:
+                messagebox.showinfo("清空历史", f"已清空 {removed} 条记录。")
             _render()
 
         ttk.Button(btnf, text="清空历史", command=_clear_price).pack(
             side=tk.RIGHT, padx=6
         )
+        lab_export = ttk.Label(btnf, text="")
+        lab_export.pack(side=tk.LEFT)
+        ttk.Button(
+            btnf,
+            text="导出CSV",
+            command=lambda: self._export_history_csv(top, lab_export, "price", item_id, f"{name}_price_history"),
+        ).pack(side=tk.RIGHT, padx=6)
+
+    def _export_history_csv(self, top: tk.Toplevel, status: ttk.Label, kind: str, item_id: str, stem: str) -> None:
+        """后台线程流式导出物品的全部价格/购买记录（.csv.gz 时压缩），进度显示在 status。"""
+        from tkinter import filedialog as _fd
+
+        path = _fd.asksaveasfilename(
+            parent=top,
+            title="导出CSV",
+            defaultextension=".csv",
+            filetypes=[("CSV", ".csv"), ("CSV (gzip)", ".csv.gz"), ("All", "*.*")],
+            initialfile=f"{stem}.csv",
+        )
+        if not path:
+            return
+        try:
+            from history_store import export_history_csv  # type: ignore
+        except Exception:
+            messagebox.showwarning("导出CSV", "历史模块不可用。", parent=top)
+            return
+        state = {"closed": False}
+
+        def _ui(fn) -> None:
+            try:
+                if not state["closed"]:
+                    self.after(0, fn)
+            except Exception:
+                pass
+
+        def _set_status(text: str) -> None:
+            try:
+                status.configure(text=text)
+            except Exception:
+                pass
+
+        def _progress(rows: int, fraction: Optional[float]) -> None:
+            pct = f" ({fraction * 100:.0f}%)" if fraction is not None else ""
+            _ui(lambda: _set_status(f"已导出 {rows:,} 行{pct}"))
+
+        def _work() -> None:
+            try:
+                rows = export_history_csv(
+                    path, kind, item_id, progress=_progress, cancel=lambda: state["closed"]
+                )
+            except Exception as e:
+                err = str(e)
+                _ui(lambda: (_set_status(""), messagebox.showerror("导出CSV", f"失败: {err}", parent=top)))
+                return
+            if rows >= 0:
+                _ui(lambda: (_set_status(""), messagebox.showinfo("导出CSV", f"已导出 {rows:,} 行到: {path}", parent=top)))
+
+        def _on_destroy(e) -> None:
+            # 关闭窗口即取消导出
+            if e.widget is top:
+                state["closed"] = True
+
+        top.bind("<Destroy>", _on_destroy, add="+")
+        _set_status("正在导出…")
+        threading.Thread(target=_work, name="history-export", daemon=True).start()
+
+    # 购买记录表格的时间范围（指标取物化汇总，始终为全部记录；默认同为全部，避免表格与指标口径不一）
+    _PURCHASE_RANGES = {"近7天": 7 * 86400, "近1月": 30 * 86400, "近3月": 90 * 86400, "全部": 0}
+
+    def _purchase_range_selector(self, parent) -> tk.StringVar:
+        var = tk.StringVar(value="全部")
+        ttk.Combobox(
+            parent, textvariable=var, state="readonly", values=list(self._PURCHASE_RANGES), width=8
+        ).pack(side=tk.RIGHT, padx=6)
+        ttk.Label(parent, text="明细范围").pack(side=tk.RIGHT)
+        return var
+
+    def _purchase_range_since(self, label: str) -> float:
+        sec = self._PURCHASE_RANGES.get(label, 0)
+        return time.time() - sec if sec > 0 else 0.0
 
     def _open_purchase_history(self, idx: int | None) -> None:
         it = self._get_item_by_index(idx)
         if not it:
             return
         try:
-            from history_store import query_purchase, summarize_purchases  # type: ignore
+            from history_store import purchase_summary, query_purchase  # type: ignore
         except Exception:
             messagebox.showwarning("购买记录", "历史模块不可用。")
             return
@@ -1314,9 +1415,10 @@ class App(tk.Tk):
         except Exception:
             pass
 
-        # Metrics row（无筛选：展示总购买量、均价、最高/最低购买价）
+        # Metrics row（全部记录的总购买量、均价、最高/最低购买价，取自物化汇总）
         met = ttk.Frame(top)
         met.pack(fill=tk.X, padx=8, pady=(0, 6))
+        rng_var = self._purchase_range_selector(met)
         lab_qty = ttk.Label(met, text="购买量: 0")
         lab_avg = ttk.Label(met, text="均价: 0")
         lab_max = ttk.Label(met, text="最高价: 0")
@@ -1340,8 +1442,8 @@ class App(tk.Tk):
         tree.pack(fill=tk.BOTH, expand=True, padx=8, pady=(0, 8))
 
         def _reload():
-            # 无筛选：读取所有记录
-            recs = query_purchase(item_id, 0)
+            # 表格只读取所选时间范围内的记录
+            recs = query_purchase(item_id, self._purchase_range_since(rng_var.get()))
             # Fill table
             for r in tree.get_children():
                 tree.delete(r)
@@ -1358,7 +1460,7 @@ class App(tk.Tk):
                     vs = (iso, task_name, str(price), str(qty), str(amount))
                 tree.insert("", tk.END, iid=str(i), values=vs)
             # Metrics（数量、均价、最高、最低）
-            m = summarize_purchases(recs)
+            m = purchase_summary(item_id)
 
             def fmt(n):
                 try:
@@ -1371,40 +1473,18 @@ class App(tk.Tk):
             lab_max.configure(text=f"最高价: {fmt(m.get('max_price', 0))}")
             lab_min.configure(text=f"最低价: {fmt(m.get('min_price', 0))}")
 
+        rng_var.trace_add("write", lambda *_: _reload())
         _reload()
 
         btnf = ttk.Frame(top)
         btnf.pack(fill=tk.X, padx=8, pady=(0, 8))
         ttk.Button(btnf, text="关闭", command=top.destroy).pack(side=tk.RIGHT)
 
-        def _export_csv():
-            from tkinter import filedialog as _fd
+        lab_export = ttk.Label(btnf, text="")
+        lab_export.pack(side=tk.LEFT)
 
-            path = _fd.asksaveasfilename(
-                title="导出CSV",
-                defaultextension=".csv",
-                filetypes=[("CSV", ".csv"), ("All", "*.*")],
-                initialfile=f"{name}_purchase_history.csv",
-            )
-            if not path:
-                return
-            try:
-                import csv
-
-                recs = query_purchase(item_id, 0)
-                with open(path, "w", encoding="utf-8-sig", newline="") as f:
-                    w = csv.writer(f)
-                    w.writerow(["时间", "任务", "单价", "数量", "总价"])
-                    for r in recs:
-                        iso = str(r.get("iso", ""))
-                        task_name = str(r.get("task_name", "") or "-")
-                        price = int(r.get("price", 0))
-                        qty = int(r.get("qty", 0))
-                        amount = int(r.get("amount", price * qty))
-                        w.writerow([iso, task_name, price, qty, amount])
-                messagebox.showinfo("导出CSV", f"已导出到: {path}")
-            except Exception as e:
-                messagebox.showerror("选图片", f"失败: {e}")
+        def _export_csv():
+            self._export_history_csv(top, lab_export, "purchase", item_id, f"{name}_purchase_history")
 
         def _clear_purchase():
             try:
@@ -1421,7 +1501,10 @@ class App(tk.Tk):
                 removed = int(clear_purchase_history(item_id))
             except Exception:
                 pass
-            messagebox.showinfo("清空记录", f"已清空 {removed} 条记录。")
+            if removed < 0:
+                messagebox.showinfo("清空记录", f"已清空 [{name}] 的购买记录。")
+            else:
+                messagebox.showinfo("清空记录", f"已清空 {removed} 条记录。")
             _reload()
 
         ttk.Button(btnf, text="导出CSV", command=_export_csv).pack(
@@ -1433,7 +1516,7 @@ class App(tk.Tk):
 
     def _open_purchase_history_for_item(self, item_id: str, name: str) -> None:
         try:
-            from history_store import query_purchase, summarize_purchases  # type: ignore
+            from history_store import purchase_summary, query_purchase  # type: ignore
         except Exception:
             messagebox.showwarning("购买记录", "历史模块不可用。")
             return
@@ -1450,6 +1533,7 @@ class App(tk.Tk):
         # Metrics row
         met = ttk.Frame(top)
         met.pack(fill=tk.X, padx=8, pady=(8, 6))
+        rng_var = self._purchase_range_selector(met)
         lab_qty = ttk.Label(met, text="购买量: 0")
         lab_avg = ttk.Label(met, text="均价: 0")
         lab_max = ttk.Label(met, text="最高价: 0")
@@ -1472,7 +1556,7 @@ class App(tk.Tk):
         tree.pack(fill=tk.BOTH, expand=True, padx=8, pady=(0, 8))
 
         def _reload():
-            recs = query_purchase(item_id, 0)
+            recs = query_purchase(item_id, self._purchase_range_since(rng_var.get()))
             for r in tree.get_children():
                 tree.delete(r)
             for i, r in enumerate(recs):
@@ -1486,7 +1570,7 @@ class App(tk.Tk):
                 except Exception:
                     vs = (iso, task_name, str(price), str(qty), str(amount))
                 tree.insert("", tk.END, iid=str(i), values=vs)
-            m = summarize_purchases(recs)
+            m = purchase_summary(item_id)
 
             def fmt(n):
                 try:
@@ -1499,6 +1583,7 @@ class App(tk.Tk):
             lab_max.configure(text=f"最高价: {fmt(m.get('max_price', 0))}")
             lab_min.configure(text=f"最低价: {fmt(m.get('min_price', 0))}")
 
+        rng_var.trace_add("write", lambda *_: _reload())
         _reload()
         btnf = ttk.Frame(top)
         btnf.pack(fill=tk.X, padx=8, pady=(0, 8))
@@ -10,6 +10,7 @@ import tkinter as tk
 from tkinter import messagebox, ttk
 
 from super_buyer.services.font_loader import pil_font, setup_matplotlib_chinese, tk_font
+from super_buyer.services.history_columnar import local_date_nums
 from super_buyer.ui.widgets.selectors import RegionSelector
 
 
@@ -745,7 +746,7 @@ class GoodsMarketUI(ttk.Frame):
 
     def _open_price_history_for_goods(self, it: dict) -> None:
         try:
-            from history_store import query_price, query_price_minutely  # type: ignore
+            from history_store import CHART_MAX_POINTS, query_price, query_price_columns, query_price_series  # type: ignore
         except Exception:
             messagebox.showwarning("历史价格", "历史模块不可用。")
             return
@@ -806,16 +807,24 @@ class GoodsMarketUI(ttk.Frame):
                     pass
             sec = _sec_for_label(rng_var.get())
             since = _time.time() - sec
-            # Prefer minutely aggregate
+            # Prefer tiered aggregate (minute/hour/day by range)
             x = []
             y_avg = []
             y_min = []
             y_max = []
+            cols = None
             try:
-                recs_m = query_price_minutely(item_id, since)
+                cols = query_price_columns(item_id, since, max_points=CHART_MAX_POINTS)
+            except Exception:
+                cols = None
+            try:
+                recs_m = [] if cols is not None else query_price_series(item_id, since, max_points=CHART_MAX_POINTS)
             except Exception:
                 recs_m = []
-            if recs_m:
+            if cols is not None and len(cols):
+                x = local_date_nums(cols.ts)
+                y_min, y_max, y_avg = cols.min, cols.max, cols.avg
+            elif recs_m:
                 for r in recs_m:
                     try:
                         ts = float(r.get("ts", r.get("ts_min", 0.0)) or 0.0)
@@ -842,7 +851,7 @@ class GoodsMarketUI(ttk.Frame):
                     y_max.append(pr)
             fig = plt.Figure(figsize=(6.4, 3.4), dpi=100)
             ax = fig.add_subplot(111)
-            if x and y_avg:
+            if len(x) and len(y_avg):
                 ax.plot_date(x, y_avg, "-", linewidth=1.5, label="平均价")
                 try:
                     ax.fill_between(x, y_min, y_max, color="#90CAF9", alpha=0.25, label="区间[最低,最高]")
@@ -867,8 +876,8 @@ class GoodsMarketUI(ttk.Frame):
                         return str(v)
                 ax.yaxis.set_major_formatter(mtick.FuncFormatter(_fmt_tick))
                 fig.autofmt_xdate()
-                mn = min(y_min) if y_min else 0
-                mx = max(y_max) if y_max else 0
+                mn = int(min(y_min)) if len(y_min) else 0
+                mx = int(max(y_max)) if len(y_max) else 0
                 try:
                     lbl_stats.configure(text=f"最高价: {mx:,}    最低价: {mn:,}")
                 except Exception:
@@ -12,6 +12,7 @@ from tkinter import filedialog, messagebox, ttk
 from super_buyer.core.launcher import run_launch_flow
 from super_buyer.config.loader import save_config
 from super_buyer.services.font_loader import tk_font
+from super_buyer.services.preprocess import PreprocessPipeline, PreprocessSpec
 from super_buyer.ui.widgets.selectors import RegionSelector
 from super_buyer.ui.widgets.template_row import TemplateRow
 
@@ -1049,16 +1050,18 @@ class InitConfigTab(BaseTab):
             sc = 0.6
         if sc > 2.5:
             sc = 2.5
-        try:
-            if abs(sc - 1.0) > 1e-3:
-                h0, w0 = crop_bgr.shape[:2]
-                crop_bgr = _cv2.resize(crop_bgr, (max(1, int(w0 * sc)), max(1, int(h0 * sc))), interpolation=_cv2.INTER_CUBIC)
-        except Exception:
-            pass
-        # Binarize (Otsu)
-        try:
-            grayc = _cv2.cvtColor(crop_bgr, _cv2.COLOR_BGR2GRAY)
-            _thr, thb = _cv2.threshold(grayc, 0, 255, _cv2.THRESH_BINARY + _cv2.THRESH_OTSU)
+        # 缩放 + 二值化（Otsu），与运行时共用前处理流水线（缩放结果只计算一次）
+        try:
+            arrays = PreprocessPipeline().run_arrays(
+                crop_bgr,
+                {
+                    "scaled": PreprocessSpec(scale=sc, gray=False, threshold="none"),
+                    "bin": PreprocessSpec(scale=sc),
+                },
+                bgr=True,
+            )
+            crop_bgr = arrays["scaled"]
+            thb = arrays["bin"]
         except Exception:
             thb = None
         # Save preview crop (binary if available)
@@ -1080,7 +1083,7 @@ class InitConfigTab(BaseTab):
             import time as _time
             from PIL import Image as _Image  # type: ignore
             import numpy as _np  # type: ignore
-            from super_buyer.services.ocr import recognize_text  # type: ignore
+            from super_buyer.services.ocr import ocr_options, recognize_text  # type: ignore
             # Compose PIL image from bin/crop
             img = None
             if thb is not None:
@@ -1101,7 +1104,7 @@ class InitConfigTab(BaseTab):
                 img,
                 base_url=str(ocfg.get("base_url", "http://127.0.0.1:1224")),
                 timeout=float(ocfg.get("timeout_sec", 2.5) or 2.5),
-                options=dict(ocfg.get("options", {}) or {}),
+                options=ocr_options(ocfg, "price"),
             ) if img is not None else []
             elapsed_ms = (_time.perf_counter() - t0) * 1000.0
             raw_text = "\n".join((b.text or "").strip() for b in boxes if (b.text or "").strip())
@@ -1266,7 +1269,7 @@ class InitConfigTab(BaseTab):
             import time as _time
             import numpy as _np  # type: ignore
             from PIL import Image as _Image  # type: ignore
-            from super_buyer.services.ocr import recognize_text  # type: ignore
+            from super_buyer.services.ocr import ocr_options, recognize_text  # type: ignore
             # 构造 PIL.Image
             img = None
             if bin_img is not None:
@@ -1286,7 +1289,7 @@ class InitConfigTab(BaseTab):
                 img,
                 base_url=str(ocfg.get("base_url", "http://127.0.0.1:1224")),
                 timeout=float(ocfg.get("timeout_sec", 2.5) or 2.5),
-                options=dict(ocfg.get("options", {}) or {}),
+                options=ocr_options(ocfg, "price"),
             ) if img is not None else []
             elapsed_ms = (_time.perf_counter() - t0) * 1000.0
             raw_text = "\n".join((b.text or "").strip() for b in boxes if (b.text or "").strip())
@@ -1972,21 +1975,13 @@ class InitConfigTab(BaseTab):
             pass
 
         # Binarize both
+        _prep = PreprocessPipeline()
+
         def _bin(pil_img):
             try:
-                import cv2 as _cv2  # type: ignore
-                import numpy as _np  # type: ignore
-                arr = _np.array(pil_img)
-                bgr = _cv2.cvtColor(arr, _cv2.COLOR_RGB2BGR)
-                gray = _cv2.cvtColor(bgr, _cv2.COLOR_BGR2GRAY)
-                _thr, th = _cv2.threshold(gray, 0, 255, _cv2.THRESH_BINARY + _cv2.THRESH_OTSU)
-                from PIL import Image as _Image  # type: ignore
-                return _Image.fromarray(th)
+                return _prep.run(pil_img, {"bin": PreprocessSpec()})["bin"]
             except Exception:
-                try:
-                    return pil_img.convert("L").point(lambda p: 255 if p > 128 else 0)
-                except Exception:
-                    return pil_img
+                return pil_img
 
         bin_top = _bin(img_top)
         bin_bot = _bin(img_bot)
@@ -2008,13 +2003,13 @@ class InitConfigTab(BaseTab):
             ms = -1.0
             t0 = _time.perf_counter()
             try:
-                from super_buyer.services.ocr import recognize_text  # type: ignore
+                from super_buyer.services.ocr import ocr_options, recognize_text  # type: ignore
                 ocfg = self.cfg.get("umi_ocr") or {}
                 boxes = recognize_text(
                     pil_img,
                     base_url=str(ocfg.get("base_url", "http://127.0.0.1:1224")),
                     timeout=float(ocfg.get("timeout_sec", 2.5) or 2.5),
-                    options=dict(ocfg.get("options", {}) or {}),
+                    options=ocr_options(ocfg, "price"),
                 ) if pil_img is not None else []
                 raw = "\n".join((b.text or "").strip() for b in boxes if (b.text or "").strip())
             except Exception as _e:
@@ -1056,6 +1056,17 @@ class MultiSnipeTab(BaseTab):
         self._snipe_stop.clear()
 
         def _loop():
+            runner.begin_session(self.paths.output_dir)
+            try:
+                _run()
+            finally:
+                runner.end_session()
+
+        def _run():
+            try:
+                runner.wait_ocr_ready(self._snipe_stop)
+            except Exception:
+                pass
             while not self._snipe_stop.is_set():
                 try:
                     res = runner.run_once()
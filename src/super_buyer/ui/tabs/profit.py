@@ -1,6 +1,7 @@
 
 from __future__ import annotations
 
+import threading
 from typing import TYPE_CHECKING
 
 import tkinter as tk
@@ -185,6 +186,8 @@ class ProfitTab(BaseTab):
         ttk.Label(lf_out, text="保本卖价(单件)").grid(row=r, column=0, sticky="e", padx=6, pady=6)
         ttk.Label(lf_out, textvariable=out_breakeven).grid(row=r, column=1, sticky="w", padx=6, pady=6)
 
+        self._build_purchase_summary(outer, v_buy, pad)
+
         # 底部操作
         bar = ttk.Frame(outer)
         bar.pack(fill=tk.X, **pad)
@@ -202,4 +205,79 @@ class ProfitTab(BaseTab):
         # 初始计算
         recalc()
 
+    def _build_purchase_summary(self, outer: ttk.Frame, v_buy: tk.DoubleVar, pad: dict) -> None:
+        """历史购买汇总（读取物化汇总，不扫描购买记录）；双击一行以其均价填入买入价。"""
+        lf = ttk.LabelFrame(outer, text="历史购买汇总")
+        lf.pack(fill=tk.BOTH, expand=True, **pad)
+        cols = ("name", "count", "qty", "amount", "avg", "min", "max", "used_max")
+        heads = ("物品", "次数", "数量", "总额", "均价", "最低", "最高", "顶价占比")
+        tree = ttk.Treeview(lf, columns=cols, show="headings", height=6)
+        for c, h in zip(cols, heads):
+            tree.heading(c, text=h)
+            tree.column(c, width=(160 if c == "name" else 80), anchor=("w" if c == "name" else "e"))
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=6, pady=6)
+        avg_by_row: dict[str, int] = {}
+        state = {"loading": False}
+
+        def _reload() -> None:
+            # 首次加载可能需要扫描购买记录构建汇总：放到后台线程，完成后回到 Tk 线程填表
+            if state["loading"]:
+                return
+            state["loading"] = True
+            threading.Thread(target=_load, name="purchase-summaries", daemon=True).start()
+
+        def _load() -> None:
+            try:
+                from history_store import purchase_summaries  # type: ignore
+
+                summaries = purchase_summaries()
+            except Exception:
+                summaries = {}
+            try:
+                lf.after(0, lambda: _fill(summaries))
+            except Exception:
+                state["loading"] = False
+
+        def _fill(summaries: dict) -> None:
+            state["loading"] = False
+            try:
+                if not tree.winfo_exists():
+                    return
+            except Exception:
+                return
+            for r in tree.get_children():
+                tree.delete(r)
+            avg_by_row.clear()
+            rows = sorted(summaries.items(), key=lambda kv: -int(kv[1].get("total_amount", 0)))
+            for item_id, m in rows:
+                avg_by_row[item_id] = int(m.get("avg_price", 0))
+                tree.insert(
+                    "",
+                    tk.END,
+                    iid=item_id,
+                    values=(
+                        m.get("item_name") or item_id,
+                        f"{int(m.get('count', 0)):,}",
+                        f"{int(m.get('quantity', 0)):,}",
+                        f"{int(m.get('total_amount', 0)):,}",
+                        f"{int(m.get('avg_price', 0)):,}",
+                        f"{int(m.get('min_price', 0)):,}",
+                        f"{int(m.get('max_price', 0)):,}",
+                        f"{float(m.get('used_max_ratio', 0.0)) * 100:.0f}%",
+                    ),
+                )
+
+        def _use_avg(_e=None) -> None:
+            sel = tree.selection()
+            if sel and avg_by_row.get(sel[0], 0) > 0:
+                try:
+                    v_buy.set(float(avg_by_row[sel[0]]))
+                except Exception:
+                    pass
+
+        tree.bind("<Double-1>", _use_avg)
+        ttk.Button(lf, text="刷新", command=_reload).pack(side=tk.TOP, padx=6, pady=6)
+        # 窗口显示后再加载
+        lf.after_idle(_reload)
+
 
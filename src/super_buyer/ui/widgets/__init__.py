@@ -5,6 +5,7 @@
 from __future__ import annotations
 
 from .light_tip import LightTipManager
+from .log_pump import LogPump
 from .template_row import TemplateRow
 
-__all__ = ["TemplateRow", "LightTipManager"]
+__all__ = ["TemplateRow", "LightTipManager", "LogPump"]
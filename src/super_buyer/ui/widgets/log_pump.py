@@ -0,0 +1,131 @@
+"""
+日志控件批量投递：后台线程产生的日志合并后由主线程周期性写入 Text 控件。
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import deque
+from contextlib import nullcontext
+from typing import Any, Deque, Dict, List, Tuple
+
+import tkinter as tk
+
+__all__ = ["LogPump"]
+
+
+class _WidgetBacklog:
+    """单个日志控件的待显示行（有界）。"""
+
+    __slots__ = ("widget", "lock", "lines", "dropped")
+
+    def __init__(self, widget: Any, lock: Any, limit: int) -> None:
+        self.widget = widget
+        self.lock = lock
+        self.lines: Deque[str] = deque(maxlen=limit)
+        self.dropped = False
+
+
+class LogPump:
+    """
+    日志控件的批量投递。
+
+    - `push` 可在任意线程调用，只把文本放入对应控件的待显示队列；
+    - 主线程上由单个周期性 `after` 回调统一处理：每个控件一次 insert、一次裁剪、一次滚动；
+    - 控件不可见（所在页签未选中/窗口最小化）时暂不写入，待显示行只保留最后 `limit` 行，
+      超出时重新显示前先清空控件（被挤掉的行仍在日志文件中），并降低轮询频率。
+    """
+
+    def __init__(
+        self,
+        root: tk.Misc,
+        *,
+        limit: int,
+        interval_ms: int = 80,
+        hidden_poll_ms: int = 500,
+    ) -> None:
+        self.root = root
+        self.limit = max(1, int(limit))
+        self.interval_ms = max(1, int(interval_ms))
+        self.hidden_poll_ms = max(self.interval_ms, int(hidden_poll_ms))
+        self._lock = threading.Lock()
+        self._backlogs: Dict[str, _WidgetBacklog] = {}
+        self._scheduled = False
+
+    def push(self, widget: Any, text: str, *, lock: Any = None) -> None:
+        key = str(widget)
+        with self._lock:
+            backlog = self._backlogs.get(key)
+            if backlog is None:
+                backlog = self._backlogs[key] = _WidgetBacklog(widget, lock, self.limit)
+            if len(backlog.lines) >= self.limit:
+                backlog.dropped = True
+            backlog.lines.append(text)
+            schedule = not self._scheduled
+            self._scheduled = True
+        if schedule:
+            self._schedule(self.interval_ms)
+
+    def _schedule(self, delay_ms: int) -> None:
+        try:
+            self.root.after(delay_ms, self._drain)
+        except Exception:
+            with self._lock:
+                self._scheduled = False
+
+    def _drain(self) -> None:
+        ready: List[Tuple[Any, Any, List[str], bool]] = []
+        waiting = False
+        with self._lock:
+            for key, backlog in list(self._backlogs.items()):
+                if not backlog.lines:
+                    continue
+                if not _is_viewable(backlog.widget):
+                    waiting = True
+                    continue
+                ready.append((backlog.widget, backlog.lock, list(backlog.lines), backlog.dropped))
+                backlog.lines.clear()
+                backlog.dropped = False
+            if not waiting:
+                self._scheduled = False
+        for widget, lock, lines, dropped in ready:
+            self._flush(widget, lock, lines, dropped)
+        if waiting:
+            self._schedule(self.hidden_poll_ms)
+
+    def _flush(self, widget: Any, lock: Any, lines: List[str], dropped: bool) -> None:
+        text = "\n".join(lines) + "\n"
+        with lock if lock is not None else nullcontext():
+            try:
+                widget.configure(state=tk.NORMAL)
+                if dropped:
+                    widget.delete("1.0", tk.END)
+                widget.insert(tk.END, text)
+                _trim_lines(widget, self.limit)
+                widget.see(tk.END)
+            except Exception:
+                pass
+            finally:
+                try:
+                    widget.configure(state=tk.DISABLED)
+                except Exception:
+                    pass
+
+
+def _is_viewable(widget: Any) -> bool:
+    try:
+        return bool(widget.winfo_viewable())
+    except Exception:
+        # 控件已销毁时不再保留待显示行
+        return True
+
+
+def _trim_lines(widget: Any, limit: int) -> None:
+    try:
+        line_count = int(str(widget.index("end-1c")).split(".")[0])
+    except Exception:
+        return
+    overflow = max(0, line_count - int(limit))
+    if overflow > 0:
+        widget.delete("1.0", f"{overflow + 1}.0")
+
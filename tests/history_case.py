@@ -0,0 +1,66 @@
+"""历史存储测试的公共基类：临时输出目录与进程内状态（缓存/注册表）的重置。"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import unittest
+from typing import Any, Dict
+
+import history_store
+from super_buyer.services import history as history_service
+from super_buyer.services import (
+    history_columnar,
+    history_locking,
+    history_purchase_agg,
+    history_rollup,
+    history_segments,
+    history_sqlite,
+    history_tombstones,
+)
+
+
+def reset_history_state() -> None:
+    """清空历史相关模块的全部进程级状态。"""
+    history_rollup.stop_history_compactor()
+    history_service.stop_history_writer()
+    history_service.close_history_handles()
+    for cache in (history_service._MIN_AGG, history_service._LAST_PRICE_CACHE, history_service._LAST_RAW_WRITE):
+        cache.clear()
+    history_service._IMPORT_CHECKED.clear()
+    history_sqlite.close_history_dbs()
+    history_store._JSONL_CACHE.clear()
+    history_segments.reset_manifests()
+    history_columnar.reset_columnar_stores()
+    history_purchase_agg.reset_purchase_aggregates()
+    history_tombstones.reset_tombstones()
+    history_locking.reset_history_locking()
+
+
+class HistoryCase(unittest.TestCase):
+    """每个测试使用独立的输出目录（同时设置 ARENA_BUYER_OUTPUT_DIR），前后重置进程级状态。
+
+    子类通过 `backend_options` 指定 `configure_history_backend` 的参数。
+    """
+
+    backend_options: Dict[str, Any] = {"name": "jsonl"}
+
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self._old_output_dir = os.environ.get("ARENA_BUYER_OUTPUT_DIR")
+        os.environ["ARENA_BUYER_OUTPUT_DIR"] = self._tmp.name
+        self.paths = history_service.resolve_paths(self._tmp.name)
+        self._reset()
+        history_service.configure_history_backend(**self.backend_options)
+
+    def tearDown(self) -> None:
+        history_service.configure_history_backend("jsonl")
+        self._reset()
+        if self._old_output_dir is None:
+            os.environ.pop("ARENA_BUYER_OUTPUT_DIR", None)
+        else:
+            os.environ["ARENA_BUYER_OUTPUT_DIR"] = self._old_output_dir
+        self._tmp.cleanup()
+
+    def _reset(self) -> None:
+        reset_history_state()
@@ -0,0 +1,123 @@
+"""列式走势存储测试：与字典记录口径一致、增量追加与裁剪。"""
+
+from __future__ import annotations
+
+import unittest
+
+import history_store
+from history_case import HistoryCase
+from super_buyer.services import history as history_service
+from super_buyer.services import history_columnar
+from super_buyer.services.history_rollup import RetentionPolicy, bucket_start, compact_history, purge_tombstones
+
+try:
+    import numpy as np  # type: ignore
+except Exception:
+    np = None  # type: ignore
+
+DAY = 86400.0
+NOW = bucket_start(1710000000.0, "day") + 12 * 3600.0
+FIELDS = ("ts", "min", "max", "avg", "count")
+
+
+@unittest.skipIf(np is None, "需要 numpy")
+class ColumnarSeriesTests(HistoryCase):
+    backend_options = {"name": "jsonl", "columnar": True}
+
+    def _seed(self, start: float, end: float) -> None:
+        ts = start
+        while ts < end:
+            price = 1000 + int((ts // 3600) % 24) * 10
+            history_service.append_price(item_id="item-1", item_name="物品", price=price, paths=self.paths, ts=ts)
+            history_service.append_price(item_id="item-1", item_name="物品", price=price + 200, paths=self.paths, ts=ts + 20)
+            ts += 2 * 3600
+
+    def _assert_same(self, since: float) -> None:
+        cols = history_store.query_price_columns("item-1", since, now=NOW)
+        series = history_store.query_price_series("item-1", since, now=NOW)
+        self.assertEqual({r["tier"] for r in series} or {cols.tier}, {cols.tier})
+        self.assertEqual([tuple(r[k] for k in FIELDS) for r in cols.to_records()], [tuple(r[k] for k in FIELDS) for r in series])
+
+    def test_columns_match_dict_series_before_and_after_compaction(self) -> None:
+        self._seed(NOW - 10 * DAY, NOW - 2 * DAY)
+        for since in (NOW - DAY * 1.5, NOW - 7 * DAY, NOW - 365 * DAY):
+            self._assert_same(since)
+        compact_history(self.paths, RetentionPolicy(raw_days=0, minute_days=0), now=NOW - 2 * DAY + 3600)
+        # 回填后的新数据经分钟落盘/汇总追加到列式文件
+        self._seed(NOW - 2 * DAY + 3600, NOW - 60)
+        compact_history(self.paths, RetentionPolicy(raw_days=0, minute_days=0), now=NOW)
+        for since in (NOW - DAY * 1.5, NOW - 7 * DAY, NOW - 365 * DAY):
+            self._assert_same(since)
+        store = history_columnar.get_columnar_store(self.paths.columns_dir)
+        self.assertIsInstance(store.load("hour", "item-1").avg, np.memmap)
+
+    def test_query_apis_accept_max_points(self) -> None:
+        self._seed(NOW - 10 * DAY, NOW - 60)
+        full = history_store.query_price_series("item-1", NOW - 7 * DAY, now=NOW)
+        self.assertGreater(len(full), 40)
+        series = history_store.query_price_series("item-1", NOW - 7 * DAY, now=NOW, max_points=40)
+        cols = history_store.query_price_columns("item-1", NOW - 7 * DAY, now=NOW, max_points=40)
+        self.assertEqual(len(series), 40)
+        self.assertEqual([tuple(r[k] for k in FIELDS) for r in cols.to_records()], [tuple(r[k] for k in FIELDS) for r in series])
+        self.assertEqual(min(r["min"] for r in series), min(r["min"] for r in full))
+        self.assertEqual(max(r["max"] for r in series), max(r["max"] for r in full))
+
+    def test_prune_and_clear_drop_columns(self) -> None:
+        self._seed(NOW - 3 * DAY, NOW - 60)
+        self.assertTrue(len(history_store.query_price_columns("item-1", NOW - DAY, now=NOW)))
+        store = history_columnar.get_columnar_store(self.paths.columns_dir)
+        total = len(store.load("minute", "item-1"))
+        removed = store.prune("minute", NOW - DAY)
+        self.assertGreater(removed, 0)
+        self.assertEqual(len(store.load("minute", "item-1")), total - removed)
+        self.assertTrue(all(store.load("minute", "item-1").ts >= NOW - DAY))
+        history_store.clear_price_history("item-1")
+        self.assertEqual(len(history_store.query_price_columns("item-1", NOW - DAY, now=NOW)), 0)
+        purge_tombstones(self.paths)
+        self.assertFalse(store.exists("minute", "item-1"))
+        self.assertEqual(len(history_store.query_price_columns("item-1", NOW - DAY, now=NOW)), 0)
+
+    def test_append_drops_torn_tail(self) -> None:
+        store = history_columnar.get_columnar_store(self.paths.columns_dir)
+        first = {"ts": NOW - 120, "min": 100, "max": 120, "avg": 110, "count": 2}
+        second = {"ts": NOW - 60, "min": 200, "max": 220, "avg": 210, "count": 3}
+        store.append("minute", "item-1", [first], create=True)
+        with store.file_for("minute", "item-1").open("ab") as fh:
+            fh.write(b"\x01" * 13)
+        self.assertEqual(store.append("minute", "item-1", [second]), 1)
+        loaded = store.load("minute", "item-1").to_records()
+        self.assertEqual([{k: r[k] for k in FIELDS} for r in loaded], [first, second])
+
+
+@unittest.skipIf(np is None, "需要 numpy")
+class DownsampleTests(unittest.TestCase):
+    def _cols(self, n: int) -> history_columnar.PriceColumns:
+        ts = NOW + np.arange(n, dtype="<f8") * 60.0
+        avg = (10000 + 500 * np.sin(np.arange(n) / 50.0)).astype("<i8")
+        avg[n // 3] = 50000  # 尖峰
+        return history_columnar.PriceColumns("minute", ts, avg - 100, avg + 100, avg, np.ones(n, dtype="<i8"))
+
+    def test_lttb_keeps_bounds_spike_and_band(self) -> None:
+        cols = self._cols(43200)
+        out = history_columnar.downsample_columns(cols, 600)
+        self.assertEqual(len(out), 600)
+        self.assertEqual((out.ts[0], out.ts[-1]), (cols.ts[0], cols.ts[-1]))
+        self.assertTrue(np.all(np.diff(out.ts) > 0))
+        self.assertEqual(int(out.avg.max()), 50000)
+        self.assertEqual((int(out.min.min()), int(out.max.max())), (int(cols.min.min()), int(cols.max.max())))
+        self.assertEqual(int(out.count.sum()), len(cols))
+        self.assertIs(history_columnar.downsample_columns(out, 600), out)
+
+
+class RecordDownsampleTests(unittest.TestCase):
+    def test_fallback_merges_adjacent_records(self) -> None:
+        series = [{"ts": float(i), "min": 10 + i, "max": 20 + i, "avg": 15 + i, "count": 1, "tier": "minute"} for i in range(10)]
+        out = history_store._downsample_records(series, 3)
+        self.assertEqual([r["ts"] for r in out], [0.0, 3.0, 6.0])
+        self.assertEqual((out[0]["min"], out[0]["max"], out[0]["count"]), (10, 22, 3))
+        self.assertEqual(sum(r["count"] for r in out), 10)
+        self.assertEqual(out[-1]["max"], 29)
+
+
+if __name__ == "__main__":
+    unittest.main()
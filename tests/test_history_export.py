@@ -0,0 +1,114 @@
+"""流式导出测试：与查询结果一致、gzip、取消与 SQLite 后端。"""
+
+from __future__ import annotations
+
+import csv
+import gzip
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import history_store
+from history_case import HistoryCase
+from super_buyer.services import history as history_service
+
+T0 = 1710000000.0
+
+
+class HistoryExportTests(HistoryCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.out = Path(self._tmp.name) / "export"
+        self.out.mkdir()
+
+    def _seed(self) -> None:
+        for i in range(40):
+            item = f"item-{i % 2}"
+            history_service.append_price(item_id=item, item_name="物品", price=1000 + i * 50, paths=self.paths, ts=T0 + i * 90)
+            if i % 4 == 0:
+                history_service.append_purchase(
+                    item_id=item, item_name="物品", price=900 + i, qty=2, paths=self.paths, ts=T0 + i * 90, task_name="任务"
+                )
+
+    def _read_csv(self, path: Path):
+        opener = gzip.open if path.suffix == ".gz" else open
+        with opener(path, "rt", encoding="utf-8-sig", newline="") as fh:
+            return list(csv.reader(fh))
+
+    def _check_exports(self) -> None:
+        prices = history_store.query_price("item-1", T0 + 600)
+        progress = []
+        dest = self.out / "price.csv.gz"
+        rows = history_store.export_history_csv(
+            dest, "price", "item-1", T0 + 600, progress=lambda n, f: progress.append((n, f))
+        )
+        self.assertEqual(rows, len(prices))
+        with open(dest, "rb") as fh:
+            self.assertEqual(fh.read(2), b"\x1f\x8b")
+        table = self._read_csv(dest)
+        self.assertEqual(table[0], history_store.PRICE_CSV_HEADER)
+        self.assertEqual([int(r[1]) for r in table[1:]], [r["price"] for r in prices])
+        self.assertEqual(progress[-1], (rows, 1.0))
+
+        purchases = history_store.query_purchase("item-0", 0.0)
+        dest = self.out / "purchase.csv"
+        self.assertEqual(history_store.export_history_csv(dest, "purchase", "item-0"), len(purchases))
+        table = self._read_csv(dest)
+        self.assertEqual(table[0], history_store.PURCHASE_CSV_HEADER)
+        self.assertEqual(table[1][1:], ["任务", str(purchases[0]["price"]), "2", str(purchases[0]["amount"])])
+
+        # 全部物品：行首带物品列，until_ts 为开区间
+        dest = self.out / "all.csv"
+        self.assertEqual(history_store.export_history_csv(dest, "purchase", None, 0.0, T0 + 8 * 90), 2)
+        self.assertEqual(self._read_csv(dest)[0][:2], history_store.ITEM_CSV_HEADER)
+
+    def test_jsonl_export_matches_queries(self) -> None:
+        history_service.configure_history_backend("jsonl", partition="day")
+        self._seed()
+        self._check_exports()
+
+    def test_sqlite_export_matches_queries(self) -> None:
+        history_service.configure_history_backend("sqlite")
+        self._seed()
+        self._check_exports()
+
+    def test_cancel_removes_partial_file(self) -> None:
+        self._seed()
+        history_store._EXPORT_PROGRESS_ROWS = 5
+        try:
+            dest = self.out / "price.csv"
+            self.assertEqual(history_store.export_history_csv(dest, "price", None, cancel=lambda: True), -1)
+        finally:
+            history_store._EXPORT_PROGRESS_ROWS = 5000
+        self.assertEqual(list(self.out.iterdir()), [])
+
+    def test_export_includes_write_behind_queue(self) -> None:
+        release = threading.Event()
+        loop = history_service.HistoryWriter._loop
+
+        def delayed_loop(writer: history_service.HistoryWriter) -> None:
+            # 写后线程暂不消费，记录停留在队列中
+            release.wait(5.0)
+            loop(writer)
+
+        with mock.patch.object(history_service.HistoryWriter, "_loop", delayed_loop):
+            history_service.start_history_writer(flush_interval_sec=0.05)
+        try:
+            self._seed()
+            threading.Timer(0.2, release.set).start()
+            dest = self.out / "price.csv"
+            self.assertEqual(history_store.export_history_csv(dest, "price", None), 40)
+        finally:
+            release.set()
+            history_service.stop_history_writer()
+
+    def test_iter_history_is_lazy(self) -> None:
+        self._seed()
+        it = history_store.iter_history("price", "item-0")
+        self.assertEqual(next(it)["item_id"], "item-0")
+        self.assertEqual(sum(1 for _ in it), 19)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,203 @@
+"""多进程共享输出目录测试：并发追加不丢行/不串行、写入者序号递增、分钟聚合租约与样本转交。"""
+
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import history_store
+from super_buyer.services import history as history_service
+from super_buyer.services import history_locking
+
+_WRITER_SCRIPT = textwrap.dedent(
+    """
+    import sys
+    from super_buyer.services import history as h
+
+    base, tag, n = sys.argv[1], sys.argv[2], int(sys.argv[3])
+    h.configure_history_backend("jsonl", partition="none", shared=True)
+    paths = h.resolve_paths(base)
+    h.start_history_writer()
+    for i in range(n):
+        ts = 1710000000.0 + i * 11
+        h.append_price(item_id="item-1", item_name=tag * 200, price=1000 + i, paths=paths, ts=ts)
+        h.append_purchase(item_id="item-1", item_name=tag, price=1000, qty=1, paths=paths, ts=ts)
+    h.stop_history_writer()
+    """
+)
+
+# 写完后落盘已结束的分钟，由父进程取出剩余的转交样本
+_FORWARD_SCRIPT = textwrap.dedent(
+    """
+    import sys
+    from super_buyer.services import history as h
+
+    base, n = sys.argv[1], int(sys.argv[2])
+    h.configure_history_backend("jsonl", partition="none", shared=True)
+    paths = h.resolve_paths(base)
+    h.start_history_writer()
+    for i in range(n):
+        h.append_price(item_id="item-1", item_name="x", price=1000 + i, paths=paths, ts=1710000000.0 + i * 7)
+    h.flush_history_writer()
+    h.flush_closed_minutes(paths, now=1720000000.0)
+    h.stop_history_writer()
+    """
+)
+
+
+class SharedOutputTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        history_locking.reset_history_locking()
+
+    def tearDown(self) -> None:
+        history_locking.reset_history_locking()
+        self._tmp.cleanup()
+
+    def _lines(self, name: str):
+        with (Path(self._tmp.name) / name).open("r", encoding="utf-8") as fh:
+            return [json.loads(line) for line in fh]
+
+    def test_concurrent_processes_append_whole_lines(self) -> None:
+        n = 300
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(p for p in sys.path if p)
+        procs = [
+            subprocess.Popen([sys.executable, "-c", _WRITER_SCRIPT, self._tmp.name, tag, str(n)], env=env)
+            for tag in ("a", "b", "c")
+        ]
+        for p in procs:
+            self.assertEqual(p.wait(timeout=120), 0)
+        for name in ("price_history.jsonl", "purchase_history.jsonl"):
+            recs = self._lines(name)
+            self.assertEqual(len(recs), 3 * n)
+            by_writer = {}
+            for rec in recs:
+                by_writer.setdefault(rec["wid"], []).append(rec["seq"])
+            self.assertEqual(len(by_writer), 3)
+            for seqs in by_writer.values():
+                self.assertEqual(len(seqs), n)
+                self.assertEqual(seqs, sorted(seqs))
+        # 同一物品的分钟聚合只由一个进程（租约持有者）写入
+        minutes = self._lines("price_history_minutely.jsonl")
+        self.assertTrue(minutes)
+        self.assertEqual(len({r["wid"] for r in minutes}), 1)
+        self.assertEqual(json.loads((Path(self._tmp.name) / history_locking.OWNERS_FILENAME).read_text()), {})
+
+    def test_non_owner_samples_reach_minute_tier(self) -> None:
+        n = 120
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(p for p in sys.path if p)
+        procs = [
+            subprocess.Popen([sys.executable, "-c", _FORWARD_SCRIPT, self._tmp.name, str(n)], env=env)
+            for _ in range(3)
+        ]
+        for p in procs:
+            self.assertEqual(p.wait(timeout=120), 0)
+        try:
+            history_service.configure_history_backend("jsonl", partition="none", shared=True)
+            history_service._MIN_AGG.clear()
+            history_service.flush_closed_minutes(history_service.resolve_paths(self._tmp.name), now=1720000000.0)
+        finally:
+            history_service.configure_history_backend("jsonl")
+            history_service.release_minute_owners()
+        minutes = self._lines("price_history_minutely.jsonl")
+        # 每个进程的每个样本都计入且只计入一次分钟聚合
+        self.assertEqual(sum(r["count"] for r in minutes), 3 * n)
+        self.assertEqual(history_locking.inbox_items(self._tmp.name), [])
+
+    def test_forwarded_samples_merge_into_owner_minutes(self) -> None:
+        paths = history_service.resolve_paths(self._tmp.name)
+        t0 = 1710000000.0 - 1710000000.0 % 60
+        history_service.configure_history_backend("jsonl", partition="none", shared=True)
+        try:
+            with mock.patch.object(history_service, "_owns_minutes", return_value=False):
+                history_service._write_price("item-1", "x", 900, t0 + 1, None, paths)
+                history_service._write_price("item-1", "x", 1300, t0 + 65, None, paths)
+            self.assertEqual(history_locking.inbox_items(self._tmp.name), ["item-1"])
+            history_service._write_price("item-1", "x", 1000, t0 + 30, None, paths)
+            history_service._write_price("item-1", "x", 1100, t0 + 70, None, paths)
+            # 转交的迟到样本（所在分钟已落盘）单独补记
+            with mock.patch.object(history_service, "_owns_minutes", return_value=False):
+                history_service._write_price("item-1", "x", 800, t0 + 40, None, paths)
+            history_service.flush_closed_minutes(paths, now=t0 + 600)
+        finally:
+            history_service.configure_history_backend("jsonl")
+            history_service._MIN_AGG.clear()
+            history_service._LAST_PRICE_CACHE.clear()
+            history_service._LAST_RAW_WRITE.clear()
+        minutes = self._lines("price_history_minutely.jsonl")
+        self.assertEqual(sorted((r["ts"], r["count"]) for r in minutes), [(t0, 1), (t0, 2), (t0 + 60, 2)])
+        with mock.patch.object(history_store, "_paths", return_value=paths):
+            merged = history_store.query_price_minutely("item-1", 0.0)
+        self.assertEqual([(r["count"], r["min"], r["max"], r["avg"]) for r in merged], [(3, 800, 1000, 900), (2, 1100, 1300, 1200)])
+
+    def test_minute_lease_is_exclusive_until_expiry_or_release(self) -> None:
+        lock = history_locking.get_process_lock(self._tmp.name)
+        a = history_locking.MinuteOwners(self._tmp.name, lock, "wid-a", lease_sec=30)
+        b = history_locking.MinuteOwners(self._tmp.name, lock, "wid-b", lease_sec=30)
+        t = 1000.0
+        self.assertTrue(a.owns("item-1", now=t))
+        self.assertFalse(b.owns("item-1", now=t + 1))
+        self.assertTrue(b.owns("item-2", now=t + 1))
+        # 持有者续期后其他进程仍无法接管
+        self.assertTrue(a.owns("item-1", now=t + 20))
+        self.assertFalse(b.owns("item-1", now=t + 45))
+        # 到期未续期后由其他进程接管
+        self.assertTrue(b.owns("item-1", now=t + 51))
+        self.assertFalse(a.owns("item-1", now=t + 52))
+        b.release_all()
+        self.assertTrue(a.owns("item-2", now=t + 53))
+
+    def test_lease_check_under_write_lock_does_not_deadlock(self) -> None:
+        # 落盘线程持写锁时调用 owns，另一线程同时在 owns 里等写锁（独立锁实例，失败时不卡住 tearDown）
+        lock = history_locking.InterProcessLock(Path(self._tmp.name) / "deadlock.lock")
+        owners = history_locking.MinuteOwners(self._tmp.name, lock, "wid-a", lease_sec=30)
+        results: dict = {}
+        waiting = threading.Event()
+
+        def _flusher() -> None:
+            with lock:
+                waiting.wait(5)
+                time.sleep(0.2)
+                results["flusher"] = owners.owns("item-1", now=1000.0)
+
+        def _writer() -> None:
+            waiting.set()
+            results["writer"] = owners.owns("item-2", now=1000.0)
+
+        threads = [threading.Thread(target=_flusher, daemon=True), threading.Thread(target=_writer, daemon=True)]
+        threads[0].start()
+        time.sleep(0.05)
+        threads[1].start()
+        for th in threads:
+            th.join(5)
+        self.assertFalse(any(th.is_alive() for th in threads))
+        self.assertEqual(results, {"flusher": True, "writer": True})
+
+    def test_shared_mode_is_configurable_and_jsonl_only(self) -> None:
+        try:
+            history_service.configure_history_from_cfg({"history": {"backend": "jsonl", "shared_output": True}})
+            self.assertTrue(history_service.history_shared())
+            paths = history_service.resolve_paths(self._tmp.name)
+            with history_service.history_write_lock(paths):
+                with history_service.history_write_lock(paths):
+                    pass
+            self.assertTrue((Path(self._tmp.name) / history_locking.LOCK_FILENAME).exists())
+            history_service.configure_history_from_cfg({"history": {"backend": "sqlite", "shared_output": True}})
+            self.assertFalse(history_service.history_shared())
+        finally:
+            history_service.configure_history_backend("jsonl")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+"""购买物化汇总测试：与逐条汇总一致、重启后补齐未保存的记录、清空与 SQLite 后端。"""
+
+from __future__ import annotations
+
+import json
+import time
+import unittest
+
+import history_store
+from history_case import HistoryCase
+from super_buyer.services import history as history_service
+from super_buyer.services import history_purchase_agg
+
+DAY = 86400.0
+T0 = time.mktime((2024, 3, 1, 12, 0, 0, 0, 0, -1))
+FIELDS = ("count", "quantity", "total_amount", "avg_price", "min_price", "max_price")
+
+
+class PurchaseAggregateTests(HistoryCase):
+    def _buy(self, i: int, item_id: str = "item-1") -> None:
+        history_service.append_purchase(
+            item_id=item_id,
+            item_name="物品",
+            price=1000 + (i % 5) * 100,
+            qty=1 + i % 3,
+            paths=self.paths,
+            ts=T0 + i * DAY / 4,
+            task_name=("任务A" if i % 2 else None),
+            used_max=(i % 4 == 0),
+        )
+
+    def _expected(self, item_id: str = "item-1"):
+        return {k: v for k, v in history_store.summarize_purchases(history_store.query_purchase(item_id, 0.0)).items()}
+
+    def _assert_matches_records(self, item_id: str = "item-1") -> None:
+        summary = history_store.purchase_summary(item_id)
+        self.assertEqual({k: summary[k] for k in FIELDS}, {k: self._expected(item_id)[k] for k in FIELDS})
+
+    def test_incremental_summary_matches_records_and_survives_restart(self) -> None:
+        history_service.configure_history_backend("jsonl", partition="day")
+        for i in range(6):
+            self._buy(i)
+        # 首次查询由记录构建并持久化，之后的写入增量更新
+        self._assert_matches_records()
+        history_service.start_history_writer()
+        for i in range(6, 12):
+            self._buy(i)
+        history_service.flush_history_writer()
+        self._assert_matches_records()
+        history_service.stop_history_writer()
+        self.assertTrue((self.paths.base_dir / history_purchase_agg.AGG_FILENAME).exists())
+
+        # 模拟保存汇总前崩溃：直接追加的记录在重启后由文件尾部补齐
+        history_purchase_agg.reset_purchase_aggregates()
+        history_service.configure_history_backend("jsonl")
+        with self.paths.purchase_file.open("a", encoding="utf-8") as fh:
+            fh.write(json.dumps({"ts": T0 + 20 * DAY, "item_id": "item-1", "price": 5000, "qty": 2, "amount": 10000}) + "\n")
+        self._assert_matches_records()
+        self.assertEqual(history_store.purchase_summary("item-1")["max_price"], 5000)
+
+        by_task = history_store.purchase_summary_by_task("item-1")
+        self.assertEqual(set(by_task), {"任务A", "-"})
+        self.assertEqual(sum(b["count"] for b in by_task.values()), 13)
+        days = history_store.purchase_summary_by_day("item-1", T0 + DAY)
+        self.assertEqual(days[0]["day"], time.strftime("%Y-%m-%d", time.localtime(T0 + DAY)))
+        # T0 为中午、每 6 小时一条：首日只有 2 条
+        self.assertEqual(sum(d["count"] for d in days), 13 - 2)
+        self.assertEqual(history_store.purchase_summary("item-1")["used_max"], 3)
+
+    def test_clear_resets_summary_and_counts_later_purchases(self) -> None:
+        for i in range(4):
+            self._buy(i)
+            self._buy(i, "item-2")
+        self._assert_matches_records()
+        history_store.clear_purchase_history("item-1")
+        self.assertEqual(history_store.purchase_summary("item-1")["count"], 0)
+        self.assertEqual(set(history_store.purchase_summaries()), {"item-2"})
+        history_service.append_purchase(item_id="item-1", item_name="物品", price=777, qty=1, paths=self.paths)
+        self.assertEqual(history_store.purchase_summary("item-1")["total_amount"], 777)
+        # 重建时同样跳过墓碑隐藏的记录
+        history_purchase_agg.reset_purchase_aggregates()
+        (self.paths.base_dir / history_purchase_agg.AGG_FILENAME).unlink()
+        self.assertEqual(history_store.purchase_summary("item-1")["total_amount"], 777)
+        self._assert_matches_records("item-2")
+
+    def test_sqlite_backend_matches_jsonl(self) -> None:
+        for i in range(10):
+            self._buy(i)
+        expected = (
+            history_store.purchase_summary("item-1"),
+            history_store.purchase_summary_by_task("item-1"),
+            history_store.purchase_summary_by_day("item-1"),
+        )
+        history_service.configure_history_backend("sqlite")
+        self.assertEqual(history_store.purchase_summary("item-1"), expected[0])
+        self._buy(10)
+        self._assert_matches_records()
+        self.assertEqual(history_store.purchase_summary_by_task("item-1")["-"]["count"], expected[1]["-"]["count"] + 1)
+        self.assertEqual(len(history_store.purchase_summary_by_day("item-1")), len(expected[2]) + 1)
+        self.assertEqual(history_store.purchase_summaries()["item-1"]["item_name"], "物品")
+        history_store.clear_purchase_history("item-1")
+        self.assertEqual(history_store.purchase_summaries(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+"""价格分层汇总、保留与压缩测试。"""
+
+from __future__ import annotations
+
+import json
+import unittest
+
+import history_store
+from history_case import HistoryCase
+from super_buyer.services import history as history_service
+from super_buyer.services.history_rollup import (
+    RetentionPolicy,
+    bucket_start,
+    choose_tier,
+    compact_history,
+    prune_jsonl,
+)
+
+DAY = 86400.0
+NOW = bucket_start(1710000000.0, "day") + 12 * 3600.0
+
+
+class _HistoryCase(HistoryCase):
+    def _seed(self) -> None:
+        """10 天前到现在：每 2 小时两次报价（同一分钟内），价格随小时变化。"""
+        ts = NOW - 10 * DAY
+        while ts < NOW - 60:
+            price = 1000 + int((ts // 3600) % 24) * 10
+            history_service.append_price(item_id="item-1", item_name="物品", price=price, paths=self.paths, ts=ts)
+            history_service.append_price(item_id="item-1", item_name="物品", price=price + 200, paths=self.paths, ts=ts + 20)
+            ts += 2 * 3600
+
+
+class JsonlRollupTests(_HistoryCase):
+    def test_compaction_rolls_tiers_prunes_and_is_incremental(self) -> None:
+        self._seed()
+        policy = RetentionPolicy()
+        stats = compact_history(self.paths, policy, now=NOW)
+        self.assertEqual(stats["minutes_flushed"], 1)
+        self.assertEqual(stats["hours"], 120)
+        self.assertEqual(stats["days"], 10)
+        self.assertEqual(stats["raw_pruned"], 36 * 2)
+        # 再次执行：没有新结束的时间段，不重复写入
+        again = compact_history(self.paths, policy, now=NOW + 30)
+        self.assertEqual((again["hours"], again["days"]), (0, 0))
+
+        hour = history_store.query_price_series("item-1", NOW - 7 * DAY, now=NOW)
+        self.assertTrue(all(r["tier"] == "hour" for r in hour))
+        self.assertEqual(len(hour), 84)
+        self.assertEqual((hour[0]["min"], hour[0]["max"], hour[0]["count"]), (hour[0]["avg"] - 100, hour[0]["avg"] + 100, 2))
+        day = history_store.query_price_series("item-1", NOW - 365 * DAY, now=NOW)
+        self.assertEqual([r["tier"] for r in day], ["day"] * 11)
+        self.assertEqual(sum(r["count"] for r in day), 240)
+        # 最近一天仍走分钟层
+        minute = history_store.query_price_series("item-1", NOW - DAY, now=NOW)
+        self.assertEqual({r["tier"] for r in minute}, {"minute"})
+
+    def test_unrolled_range_is_filled_from_finer_tier(self) -> None:
+        self._seed()
+        hour = history_store.query_price_series("item-1", NOW - 7 * DAY, now=NOW)
+        self.assertEqual(len(hour), 84)
+        self.assertFalse(self.paths.price_hourly_file.exists())
+
+    def test_prune_drops_only_expired_records(self) -> None:
+        path = self.paths.price_file
+        with path.open("w", encoding="utf-8") as fh:
+            for ts in (1.0, 2.0, 3.0):
+                fh.write(json.dumps({"ts": ts}) + "\n")
+        self.assertEqual(prune_jsonl(path, 2.0), 1)
+        self.assertEqual(prune_jsonl(path, 2.0), 0)
+        self.assertEqual([json.loads(x)["ts"] for x in path.read_text(encoding="utf-8").splitlines()], [2.0, 3.0])
+
+
+class SqliteRollupTests(_HistoryCase):
+    backend_options = {"name": "sqlite"}
+
+    def test_compaction_matches_jsonl_tiers(self) -> None:
+        self._seed()
+        stats = compact_history(self.paths, RetentionPolicy(), now=NOW)
+        self.assertEqual(stats["raw_pruned"], 36 * 2)
+        again = compact_history(self.paths, RetentionPolicy(), now=NOW + 30)
+        db = history_service.open_history_db(self.paths)
+        rows = db.count_rows()
+        self.assertEqual((rows["price_hourly"], rows["price_daily"]), (120, 10))
+        self.assertEqual(again["hours"], 1)  # 只重算上次最后一个小时桶
+        hour = history_store.query_price_series("item-1", NOW - 7 * DAY, now=NOW)
+        self.assertEqual(len(hour), 84)
+        day = history_store.query_price_series("item-1", NOW - 365 * DAY, now=NOW)
+        self.assertEqual(sum(r["count"] for r in day), 240)
+
+
+class TierChoiceTests(unittest.TestCase):
+    def test_choose_tier_by_span(self) -> None:
+        self.assertEqual(choose_tier(NOW - 3600, NOW), "minute")
+        self.assertEqual(choose_tier(NOW - 7 * DAY, NOW), "hour")
+        self.assertEqual(choose_tier(NOW - 30 * DAY, NOW), "hour")
+        self.assertEqual(choose_tier(NOW - 365 * DAY, NOW), "day")
+
+
+if __name__ == "__main__":
+    unittest.main()
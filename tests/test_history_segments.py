@@ -0,0 +1,108 @@
+"""历史分段存储与按 since_ts 裁剪分段测试。"""
+
+from __future__ import annotations
+
+import os
+import unittest
+
+import history_store
+from history_case import HistoryCase
+from super_buyer.services import history as history_service
+from super_buyer.services import history_locking, history_segments
+from super_buyer.services.history_rollup import bucket_start, drop_segments
+
+DAY = 86400.0
+DAY0 = bucket_start(1710000000.0, "day")
+
+
+class HistorySegmentsTests(HistoryCase):
+    def _write_day(self, day: int) -> None:
+        base = DAY0 + day * DAY + 3600.0
+        for i in range(6):
+            history_service.append_price(
+                item_id=f"item-{i % 2}", item_name="x", price=1000 + day * 500 + i * 150, paths=self.paths, ts=base + i * 40
+            )
+        history_service.append_purchase(item_id="item-1", item_name="x", price=900 + day, qty=1, paths=self.paths, ts=base)
+
+    def _snapshot(self, since: float):
+        return (
+            history_store.query_price("item-1", since),
+            history_store.query_price_minutely("item-1", since),
+            history_store.query_purchase("item-1", since),
+            history_store.summarize_prices_by_item(["item-0", "item-1"], since),
+        )
+
+    def _opened_files(self):
+        return sorted(os.path.relpath(k, os.path.realpath(self._tmp.name)) for k in history_store._JSONL_CACHE)
+
+    def test_day_segments_match_single_file_and_prune_by_since(self) -> None:
+        for day in range(3):
+            self._write_day(day)
+        expected = [self._snapshot(0.0), self._snapshot(DAY0 + 2 * DAY)]
+        for p in (self.paths.price_file, self.paths.price_minutely_file, self.paths.purchase_file):
+            p.unlink()
+        self._reset()
+
+        history_service.configure_history_backend("jsonl", partition="day")
+        for day in range(3):
+            self._write_day(day)
+        self.assertFalse(self.paths.price_file.exists())
+        self.assertEqual(len(history_segments.get_manifest(self.paths.segments_dir).segments("price")), 3)
+
+        self.assertEqual(self._snapshot(0.0), expected[0])
+        history_store._JSONL_CACHE.clear()
+        self.assertEqual(self._snapshot(DAY0 + 2 * DAY), expected[1])
+        day2 = history_segments.segment_key(DAY0 + 2 * DAY, "day")
+        self.assertEqual(
+            self._opened_files(),
+            sorted(os.path.join("history_segments", kind, f"{day2}.jsonl") for kind in ("price", "price_minutely", "purchase")),
+        )
+
+    def test_legacy_file_is_read_until_since_passes_it(self) -> None:
+        self._write_day(0)
+        history_service.configure_history_backend("jsonl", partition="day")
+        self._write_day(1)
+        self._write_day(2)
+        prices = history_store.query_price("item-1", 0.0)
+        self.assertEqual(len(prices), 9)
+        self.assertEqual(prices, sorted(prices, key=lambda r: r["ts"]))
+        history_store._JSONL_CACHE.clear()
+        self.assertEqual(len(history_store.query_price("item-1", DAY0 + DAY)), 6)
+        self.assertNotIn(self.paths.price_file.name, " ".join(self._opened_files()))
+
+    def test_drop_segments_and_manifest_rebuild(self) -> None:
+        history_service.configure_history_backend("jsonl", partition="day")
+        for day in range(3):
+            self._write_day(day)
+        self.assertEqual(drop_segments(self.paths, "price", DAY0 + DAY + 60.0), 6)
+        (self.paths.segments_dir / history_segments.MANIFEST_FILENAME).unlink()
+        history_segments.reset_manifests()
+        self.assertEqual(len(history_segments.get_manifest(self.paths.segments_dir).segments("price")), 2)
+        self.assertEqual(len(history_store.query_price("item-1", 0.0)), 6)
+
+    def test_sqlite_import_reads_segments(self) -> None:
+        history_service.configure_history_backend("jsonl", partition="day")
+        for day in range(2):
+            self._write_day(day)
+        expected = self._snapshot(0.0)
+        history_service.configure_history_backend("sqlite")
+        self.assertEqual(self._snapshot(0.0)[0], expected[0])
+        self.assertEqual(self._snapshot(0.0)[2], expected[2])
+
+    def test_shared_manifests_merge_instead_of_overwriting(self) -> None:
+        # 两个进程各自的 manifest 实例（各持一把跨进程锁）交替登记分段
+        root = self.paths.segments_dir
+        lock = history_locking.get_process_lock(self.paths.base_dir)
+        first = history_segments.SegmentManifest(root, lock)
+        second = history_segments.SegmentManifest(root, history_locking.InterProcessLock(lock.path))
+        for day, manifest in enumerate((first, second, first, second)):
+            manifest.segment_for("price", DAY0 + day * DAY + 60.0, "day").touch()
+        self.assertEqual(len(first.segments("price")), 4)
+        self.assertEqual(len(second.drop_before("price", DAY0 + DAY)), 1)
+        self.assertEqual(len(first.segments("price")), 3)
+        first.segment_for("price", DAY0 + 4 * DAY + 60.0, "day").touch()
+        self.assertEqual(len(history_segments.SegmentManifest(root).segments("price")), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,9 +5,12 @@ from __future__ import annotations
 import os
 import tempfile
 import unittest
+from pathlib import Path
 
 import history_store
 from super_buyer.services import history as history_service
+from super_buyer.services import history_sqlite
+from super_buyer.services.history_rollup import purge_tombstones
 
 
 class QueryPriceMinutelyTests(unittest.TestCase):
@@ -142,5 +145,196 @@ class QueryPriceMinutelyTests(unittest.TestCase):
         self.assertEqual(summary["max_price"], 160)
 
 
+class JsonlTailCacheTests(unittest.TestCase):
+    """增量读取缓存：追加只解析新行，截断/重写时全量重载。"""
+
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self._tmp.name) / "h.jsonl"
+        history_store._JSONL_CACHE.clear()
+
+    def tearDown(self) -> None:
+        history_store._JSONL_CACHE.clear()
+        self._tmp.cleanup()
+
+    def _append(self, text: str) -> None:
+        with self.path.open("a", encoding="utf-8") as fh:
+            fh.write(text)
+
+    def test_append_parses_only_new_complete_lines(self) -> None:
+        self._append('{"n": 1}\n{"n": 2}\n')
+        first = history_store._read_jsonl(self.path)
+        self._append('{"n": 3}\n{"n": ')
+        second = history_store._read_jsonl(self.path)
+        entry = history_store._JSONL_CACHE[history_store._cache_key(self.path)]
+        self.assertEqual([r["n"] for r in second], [1, 2, 3])
+        self.assertEqual(entry.offset, len('{"n": 1}\n{"n": 2}\n{"n": 3}\n'))
+        # 旧快照不受后续追加影响，且与新快照共享同一记录对象
+        self.assertEqual(len(first), 2)
+        self.assertIs(first[0], second[0])
+        self._append('4}\n')
+        self.assertEqual([r["n"] for r in history_store._read_jsonl(self.path)], [1, 2, 3, 4])
+
+    def test_truncate_or_rewrite_triggers_full_reload(self) -> None:
+        self._append('{"n": 1}\n{"n": 2}\n')
+        history_store._read_jsonl(self.path)
+        self.path.write_text('{"n": 9}\n', encoding="utf-8")
+        self.assertEqual([r["n"] for r in history_store._read_jsonl(self.path)], [9])
+        self.path.write_text('{"n": 7}\n{"n": 8}\n{"n": 9}\n', encoding="utf-8")
+        self.assertEqual([r["n"] for r in history_store._read_jsonl(self.path)], [7, 8, 9])
+
+    def test_item_index_range_query_handles_out_of_order_appends(self) -> None:
+        self._append('{"item_id": "a", "ts": 10, "n": 1}\n{"item_id": "b", "ts": 11, "n": 2}\n{"item_id": "a", "ts": 30, "n": 3}\n')
+        self.assertEqual([r["n"] for r in history_store._records_for_item(self.path, "a", 0)], [1, 3])
+        self._append('{"item_id": "a", "ts": 20, "n": 4}\n{"item_id": "a", "ts": 30, "n": 5}\n')
+        self.assertEqual([r["n"] for r in history_store._records_for_item(self.path, "a", 15)], [4, 3, 5])
+        self.assertEqual(history_store._records_for_item(self.path, "missing", 0), [])
+        entry = history_store._JSONL_CACHE[history_store._cache_key(self.path)]
+        self.assertEqual((entry.indexed, sorted(entry.index)), (5, ["a", "b"]))
+
+
+class SqliteBackendTests(unittest.TestCase):
+    """history.backend=sqlite 时查询口径应与 JSONL 一致。"""
+
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self._old_output_dir = os.environ.get("ARENA_BUYER_OUTPUT_DIR")
+        os.environ["ARENA_BUYER_OUTPUT_DIR"] = self._tmp.name
+        self.paths = history_service.resolve_paths(self._tmp.name)
+        for cache in (history_service._MIN_AGG, history_service._LAST_PRICE_CACHE, history_service._LAST_RAW_WRITE):
+            cache.clear()
+        history_service._IMPORT_CHECKED.clear()
+
+    def tearDown(self) -> None:
+        history_service.configure_history_backend("jsonl")
+        history_sqlite.close_history_dbs()
+        for cache in (history_service._MIN_AGG, history_service._LAST_PRICE_CACHE, history_service._LAST_RAW_WRITE):
+            cache.clear()
+        history_service._IMPORT_CHECKED.clear()
+        history_store._JSONL_CACHE.clear()
+        if self._old_output_dir is None:
+            os.environ.pop("ARENA_BUYER_OUTPUT_DIR", None)
+        else:
+            os.environ["ARENA_BUYER_OUTPUT_DIR"] = self._old_output_dir
+        self._tmp.cleanup()
+
+    def _seed_prices(self) -> None:
+        for ts, item_id, price in (
+            (1710000001.0, "item-1", 100),
+            (1710000061.0, "item-1", 120),
+            (1710000301.0, "item-1", 200),
+            (1710000001.0, "item-2", 300),
+        ):
+            history_service.append_price(item_id=item_id, item_name=item_id, price=price, paths=self.paths, ts=ts)
+
+    def test_config_switch_selects_backend(self) -> None:
+        self.assertEqual(history_service.configure_history_from_cfg({"history": {"backend": "SQLite"}}), "sqlite")
+        self.assertEqual(history_service.configure_history_from_cfg({"history": {"backend": "bogus"}}), "jsonl")
+
+    def test_jsonl_import_matches_jsonl_queries(self) -> None:
+        self._seed_prices()
+        history_service.append_purchase(item_id="item-1", item_name="x", price=100, qty=2, paths=self.paths, ts=1710000002.0)
+        expected_minutely = history_store.query_price_minutely("item-1", 0.0)
+        expected_stats = history_store.summarize_prices_by_item(["item-1", "item-2", "missing"], 1710000000.0)
+        expected_price = history_store.query_price("item-1", 1710000060.0)
+
+        history_service.configure_history_backend("sqlite")
+        minutely = history_store.query_price_minutely("item-1", 0.0)
+        self.assertEqual(
+            [(r["ts"], r["min"], r["max"], r["avg"], r["count"]) for r in minutely],
+            [(r["ts"], r["min"], r["max"], r["avg"], r["count"]) for r in expected_minutely],
+        )
+        self.assertEqual(history_store.summarize_prices_by_item(["item-1", "item-2", "missing"], 1710000000.0), expected_stats)
+        self.assertEqual(history_store.query_price("item-1", 1710000060.0), expected_price)
+        self.assertEqual(history_store.query_purchase("item-1", 0.0)[0]["amount"], 200)
+        # 导入只执行一次
+        history_service._IMPORT_CHECKED.clear()
+        db = history_service.open_history_db(self.paths)
+        self.assertEqual(db.count_rows()["price_event"], 4)
+
+    def test_writes_go_to_sqlite_and_clear_removes_item(self) -> None:
+        history_service.configure_history_backend("sqlite")
+        self._seed_prices()
+        history_service.append_price(item_id="item-1", item_name="item-1", price=110, paths=self.paths, ts=1710000062.0)
+        self.assertFalse(self.paths.price_file.exists())
+        minutely = history_store.query_price_minutely("item-1", 1710000060.0)
+        self.assertEqual([(r["ts"], r["min"], r["max"], r["avg"], r["count"]) for r in minutely][0], (1710000060.0, 110, 120, 115, 2))
+        self.assertEqual(history_store.clear_price_history("item-1"), 4)
+        self.assertEqual(history_store.query_price_minutely("item-1", 0.0), [])
+        self.assertEqual(history_store.summarize_prices_by_item(["item-2"], 0.0)["item-2"]["latest_price"], 300)
+
+
+class WriteBehindWriterTests(unittest.TestCase):
+    """写后线程：入队即返回，排空后结果与同步写入一致。"""
+
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self._old_output_dir = os.environ.get("ARENA_BUYER_OUTPUT_DIR")
+        os.environ["ARENA_BUYER_OUTPUT_DIR"] = self._tmp.name
+        self.paths = history_service.resolve_paths(self._tmp.name)
+        for cache in (history_service._MIN_AGG, history_service._LAST_PRICE_CACHE, history_service._LAST_RAW_WRITE):
+            cache.clear()
+        history_store._JSONL_CACHE.clear()
+
+    def tearDown(self) -> None:
+        history_service.stop_history_writer()
+        for cache in (history_service._MIN_AGG, history_service._LAST_PRICE_CACHE, history_service._LAST_RAW_WRITE):
+            cache.clear()
+        history_store._JSONL_CACHE.clear()
+        if self._old_output_dir is None:
+            os.environ.pop("ARENA_BUYER_OUTPUT_DIR", None)
+        else:
+            os.environ["ARENA_BUYER_OUTPUT_DIR"] = self._old_output_dir
+        self._tmp.cleanup()
+
+    def _write(self) -> None:
+        for i in range(200):
+            history_service.append_price(
+                item_id=f"item-{i % 3}", item_name="x", price=1000 + i * 50, paths=self.paths, ts=1710000000.0 + i * 7
+            )
+        history_service.append_purchase(item_id="item-1", item_name="x", price=100, qty=2, paths=self.paths, ts=1710000002.0)
+
+    def test_drained_writer_matches_sync_writes(self) -> None:
+        self._write()
+        expected = [p.read_bytes() for p in (self.paths.price_file, self.paths.price_minutely_file, self.paths.purchase_file)]
+        for p in (self.paths.price_file, self.paths.price_minutely_file, self.paths.purchase_file):
+            p.unlink()
+        for cache in (history_service._MIN_AGG, history_service._LAST_PRICE_CACHE, history_service._LAST_RAW_WRITE):
+            cache.clear()
+
+        writer = history_service.configure_history_from_cfg({"history": {"write_behind": True}}) and history_service.history_writer()
+        self.assertIsNotNone(writer)
+        self._write()
+        self.assertTrue(history_service.flush_history_writer(timeout=5.0))
+        self.assertEqual(writer.stats["enqueued"], 201)
+        self.assertLess(writer.stats["batches"], 201)
+        actual = [p.read_bytes() for p in (self.paths.price_file, self.paths.price_minutely_file, self.paths.purchase_file)]
+        self.assertEqual(actual, expected)
+
+    def test_rewrite_reopens_handles_and_stop_drains(self) -> None:
+        history_service.start_history_writer()
+        history_service.append_price(item_id="item-1", item_name="x", price=100, paths=self.paths, ts=1710000001.0)
+        history_service.append_price(item_id="item-2", item_name="x", price=200, paths=self.paths, ts=1710000002.0)
+        history_service.flush_history_writer()
+        self.assertEqual(history_store.clear_price_history("item-1"), -1)
+        self.assertEqual(purge_tombstones(self.paths)["price"], 1)
+        history_service.append_price(item_id="item-3", item_name="x", price=300, paths=self.paths, ts=1710000003.0)
+        self.assertTrue(history_service.stop_history_writer())
+        self.assertIsNone(history_service.history_writer())
+        self.assertEqual([r["item_id"] for r in history_store._read_jsonl(self.paths.price_file)], ["item-2", "item-3"])
+
+    def test_full_queue_falls_back_to_sync_write(self) -> None:
+        writer = history_service.start_history_writer(queue_size=1, put_timeout_sec=0.05)
+        with history_service.history_write_lock():
+            # 持锁阻塞写线程，使队列保持满
+            for i in range(4):
+                history_service.append_price(
+                    item_id="item-1", item_name="x", price=100 + i * 100, paths=self.paths, ts=1710000000.0 + i * 20
+                )
+        history_service.flush_history_writer()
+        self.assertGreaterEqual(writer.stats["full"], 1)
+        self.assertEqual(len(history_store._read_jsonl(self.paths.price_file)), 4)
+
+
 if __name__ == "__main__":
     unittest.main()
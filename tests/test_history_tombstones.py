@@ -0,0 +1,64 @@
+"""删除墓碑测试：清空立即对读取生效，物理删除由压缩完成。"""
+
+from __future__ import annotations
+
+import time
+import unittest
+
+import history_store
+from history_case import HistoryCase
+from super_buyer.services import history as history_service
+from super_buyer.services.history_rollup import RetentionPolicy, bucket_start, compact_history
+from super_buyer.services.history_tombstones import get_tombstones
+
+NOW = bucket_start(time.time(), "hour") - 3600.0
+
+
+class TombstoneTests(HistoryCase):
+    def _seed(self, item_id: str, start: float, n: int) -> None:
+        for i in range(n):
+            history_service.append_price(item_id=item_id, item_name="x", price=1000 + i * 100, paths=self.paths, ts=start + i * 61)
+        history_service.append_purchase(item_id=item_id, item_name="x", price=900, qty=1, paths=self.paths, ts=start)
+
+    def _lines(self, path) -> int:
+        return sum(1 for line in path.read_text(encoding="utf-8").splitlines() if line.strip())
+
+    def test_clear_hides_immediately_and_compaction_purges(self) -> None:
+        self._seed("item-1", NOW - 1800, 10)
+        self._seed("item-2", NOW - 1800, 10)
+        size = self.paths.price_file.stat().st_size
+        self.assertEqual(history_store.clear_price_history("item-1"), -1)
+        self.assertEqual(history_store.clear_purchase_history("item-1"), -1)
+        # 只写墓碑，不改写数据文件
+        self.assertEqual(self.paths.price_file.stat().st_size, size)
+        self.assertEqual(history_store.query_price("item-1", 0.0), [])
+        self.assertEqual(history_store.query_price_minutely("item-1", 0.0), [])
+        self.assertEqual(history_store.query_purchase("item-1", 0.0), [])
+        self.assertEqual(history_store.summarize_prices_by_item(["item-1"], 0.0)["item-1"]["count"], 0)
+        self.assertEqual(len(history_store.query_price("item-2", 0.0)), 10)
+
+        stats = compact_history(self.paths, RetentionPolicy(raw_days=0, minute_days=0), now=NOW + 7200)
+        # 原始 10 条 + 购买 1 条 + 分钟/小时聚合若干
+        self.assertGreater(stats["tombstones_purged"], 11)
+        self.assertEqual(get_tombstones(self.paths.base_dir).snapshot("price"), {})
+        self.assertEqual(self._lines(self.paths.price_file), 10)
+        # 汇总跳过被隐藏的物品
+        self.assertEqual(history_store.query_price_series("item-1", NOW - 30 * 86400), [])
+        self.assertEqual(len(history_store.query_price("item-2", 0.0)), 10)
+
+    def test_records_after_clear_stay_visible(self) -> None:
+        history_service.start_history_writer()
+        self._seed("item-1", NOW - 1800, 5)
+        history_service.flush_history_writer()
+        history_store.clear_price_history("item-1")
+        later = time.time() + 5
+        history_service.append_price(item_id="item-1", item_name="x", price=4321, paths=self.paths, ts=later)
+        history_service.flush_history_writer()
+        self.assertEqual([r["price"] for r in history_store.query_price("item-1", 0.0)], [4321])
+        compact_history(self.paths, RetentionPolicy(raw_days=0, minute_days=0), now=NOW + 7200)
+        history_service.flush_history_writer()
+        self.assertEqual([r["price"] for r in history_store.query_price("item-1", 0.0)], [4321])
+
+
+if __name__ == "__main__":
+    unittest.main()
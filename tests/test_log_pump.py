@@ -0,0 +1,105 @@
+"""日志控件批量投递测试：合并写入、单次调度、隐藏时有界积压。"""
+
+from __future__ import annotations
+
+import threading
+import unittest
+from typing import Any, Callable, List, Tuple
+
+from super_buyer.ui.widgets.log_pump import LogPump
+
+
+class _Root:
+    def __init__(self) -> None:
+        self.calls: List[Tuple[int, Callable[[], None]]] = []
+
+    def after(self, ms: int, fn: Callable[[], None]) -> None:
+        self.calls.append((ms, fn))
+
+    def run(self) -> None:
+        calls, self.calls = self.calls, []
+        for _ms, fn in calls:
+            fn()
+
+
+class _Text:
+    """Text 控件替身：按行保存内容，统计 insert/see 次数。"""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.lines: List[str] = []
+        self.viewable = True
+        self.inserts = 0
+        self.sees = 0
+
+    def __str__(self) -> str:
+        return self.name
+
+    def winfo_viewable(self) -> bool:
+        return self.viewable
+
+    def configure(self, **_kw: Any) -> None:
+        pass
+
+    def insert(self, _index: str, text: str) -> None:
+        self.inserts += 1
+        self.lines.extend(text.splitlines())
+
+    def delete(self, start: str, end: str) -> None:
+        if end == "end":
+            self.lines.clear()
+        else:
+            del self.lines[: int(end.split(".")[0]) - 1]
+
+    def index(self, _index: str) -> str:
+        return f"{len(self.lines) + 1}.0"
+
+    def see(self, _index: str) -> None:
+        self.sees += 1
+
+
+class LogPumpTests(unittest.TestCase):
+    def test_batches_lines_from_threads_into_one_insert_per_widget(self) -> None:
+        root = _Root()
+        pump = LogPump(root, limit=1000)  # type: ignore[arg-type]
+        a, b = _Text(".a"), _Text(".b")
+        threads = [
+            threading.Thread(target=lambda w=w, k=k: [pump.push(w, f"{k}-{i}") for i in range(100)])
+            for k, w in enumerate((a, b, a))
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(root.calls), 1)
+        root.run()
+        self.assertEqual((a.inserts, a.sees, len(a.lines)), (1, 1, 200))
+        self.assertEqual((b.inserts, len(b.lines)), (1, 100))
+        self.assertEqual([s for s in a.lines if s.startswith("0-")], [f"0-{i}" for i in range(100)])
+        self.assertEqual(root.calls, [])
+
+    def test_hidden_widget_keeps_bounded_backlog_until_visible(self) -> None:
+        root = _Root()
+        pump = LogPump(root, limit=50, hidden_poll_ms=500)  # type: ignore[arg-type]
+        w = _Text(".log")
+        w.lines = ["旧"] * 30
+        w.viewable = False
+        for i in range(120):
+            pump.push(w, str(i))
+        root.run()
+        self.assertEqual(w.inserts, 0)
+        self.assertEqual([ms for ms, _fn in root.calls], [500])
+        w.viewable = True
+        root.run()
+        # 积压超过上限时旧内容已不连续：清空后只显示最后 limit 行
+        self.assertNotIn("旧", w.lines)
+        self.assertGreaterEqual(len(w.lines), 49)
+        self.assertEqual(w.lines, [str(i) for i in range(120 - len(w.lines), 120)])
+        pump.push(w, "120")
+        root.run()
+        self.assertLessEqual(len(w.lines), 50)
+        self.assertEqual(w.lines[-1], "120")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+"""运行指标测试：直方图分位精度、快照/重置与会话导出。"""
+
+from __future__ import annotations
+
+import contextvars
+import json
+import random
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from super_buyer.services import metrics
+
+
+class HistogramTests(unittest.TestCase):
+    def test_bucket_bounds_cover_index(self) -> None:
+        for v in list(range(0, 300)) + [1000, 4095, 4096, 123456, 10**9]:
+            low, high = metrics.bucket_bounds(metrics.bucket_index(v))
+            self.assertLessEqual(low, v)
+            self.assertLessEqual(v, high)
+            self.assertLessEqual(high - low, max(1, v) * 0.04)
+
+    def test_quantiles_within_relative_error(self) -> None:
+        rng = random.Random(7)
+        values = [rng.lognormvariate(3.0, 1.0) for _ in range(20000)]
+        hist = metrics.Histogram()
+        for v in values:
+            hist.observe(v)
+        values.sort()
+        for q, got in zip((0.5, 0.95, 0.99), hist.quantiles((0.5, 0.95, 0.99))):
+            exact = values[int(q * len(values)) - 1]
+            self.assertAlmostEqual(got, exact, delta=exact * 0.04)
+        summary = hist.summary()
+        self.assertEqual(summary["count"], 20000)
+        self.assertEqual(summary["max_ms"], round(values[-1], 3))
+        self.assertEqual(metrics.Histogram().quantiles(), [0.0, 0.0, 0.0])
+
+
+class RegistryTests(unittest.TestCase):
+    def tearDown(self) -> None:
+        metrics.end_metrics_session()
+        metrics.get_metrics().reset("")
+
+    def test_snapshot_reset_and_session_export(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            session = metrics.begin_metrics_session(tmp, {"metrics": {"export": True, "export_sec": 3600}}, "single")
+            for ms in (10, 20, 30):
+                metrics.observe_ms("single.step6", ms)
+            metrics.inc("single.step6.成功")
+            metrics.set_gauge("multi.ocr_batch.size", 5)
+            with metrics.get_metrics().timer("ocr.request"):
+                pass
+            snap = metrics.get_metrics().snapshot()
+            self.assertEqual(snap["session"], session)
+            self.assertEqual(snap["histograms"]["single.step6"]["count"], 3)
+            self.assertEqual(snap["counters"], {"single.step6.成功": 1.0})
+            self.assertEqual(snap["histograms"]["ocr.request"]["count"], 1)
+            metrics.end_metrics_session()
+            files = list((Path(tmp) / metrics.METRICS_DIRNAME).glob("*.jsonl"))
+            self.assertEqual(len(files), 1)
+            rows = [json.loads(line) for line in files[0].read_text(encoding="utf-8").splitlines()]
+            self.assertAlmostEqual(rows[-1]["histograms"]["single.step6"]["p50_ms"], 20.0, delta=0.8)
+            # 新会话清零
+            metrics.begin_metrics_session(tmp, {}, "multi")
+            self.assertEqual(metrics.get_metrics().snapshot()["histograms"], {})
+            metrics.end_metrics_session()
+            self.assertEqual(len(files[0].read_text(encoding="utf-8").splitlines()), len(rows))
+
+    def test_overlapping_sessions_are_independent(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            cfg = {"metrics": {"export": True, "export_sec": 3600}}
+            single = metrics.begin_metrics_session(tmp, cfg, "single")
+            metrics.observe_ms("single.step1", 5)
+            multi = metrics.begin_metrics_session(tmp, cfg, "multi")
+            metrics.observe_ms("multi.scan", 7)
+            # 后开始的运行不清零、不结束先开始的运行；记录只进入当前所属的会话
+            self.assertEqual(metrics.get_metrics(single).snapshot()["histograms"]["single.step1"]["count"], 1)
+            self.assertNotIn("multi.scan", metrics.get_metrics(single).snapshot()["histograms"])
+            self.assertNotIn("single.step1", metrics.get_metrics(multi).snapshot()["histograms"])
+            metrics.end_metrics_session(multi)
+            metrics.inc("single.step1.成功")
+            self.assertEqual(metrics.get_metrics().snapshot()["session"], single)
+            self.assertEqual(metrics.get_metrics(single).snapshot()["counters"], {"single.step1.成功": 1.0})
+            metrics.end_metrics_session(single)
+            rows = [
+                json.loads(line)
+                for f in (Path(tmp) / metrics.METRICS_DIRNAME).glob("*.jsonl")
+                for line in f.read_text(encoding="utf-8").splitlines()
+            ]
+            self.assertEqual(sorted(r["session"] for r in rows), sorted([single, multi]))
+
+    def test_samples_route_to_the_calling_runners_session(self) -> None:
+        sessions: dict = {}
+        started = threading.Barrier(3)
+        recorded = threading.Barrier(3)
+        finish = threading.Event()
+
+        def _runner(name: str) -> None:
+            session = metrics.begin_metrics_session("", {}, name)
+            sessions[name] = session
+            started.wait(5)
+            metrics.observe_ms(f"{name}.scan", 5)
+            # 线程池任务带上提交方的上下文
+            with ThreadPoolExecutor(max_workers=1) as ex:
+                ex.submit(contextvars.copy_context().run, metrics.inc, "ocr.request.error").result()
+            recorded.wait(5)
+            finish.wait(5)
+            metrics.end_metrics_session(session)
+
+        threads = [threading.Thread(target=_runner, args=(name,)) for name in ("single", "multi")]
+        for th in threads:
+            th.start()
+        started.wait(5)
+        metrics.observe_ms("ui.refresh", 1)
+        recorded.wait(5)
+        try:
+            for name, other in (("single", "multi"), ("multi", "single")):
+                snap = metrics.get_metrics(sessions[name]).snapshot()
+                self.assertNotIn(f"{other}.scan", snap["histograms"])
+                self.assertNotIn("ui.refresh", snap["histograms"])
+                self.assertEqual(snap["counters"], {"ocr.request.error": 1.0})
+            # 不属于任何会话的记录进入默认注册表
+            self.assertEqual(metrics.get_metrics().snapshot()["histograms"]["ui.refresh"]["count"], 1)
+        finally:
+            finish.set()
+            for th in threads:
+                th.join(5)
+
+
+if __name__ == "__main__":
+    unittest.main()
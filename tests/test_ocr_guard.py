@@ -0,0 +1,159 @@
+"""OCR 自适应超时与熔断测试。"""
+
+from __future__ import annotations
+
+import sys
+import time
+import types
+import unittest
+from unittest import mock
+
+from super_buyer.services import ocr, ocr_guard, ocr_pool
+from super_buyer.services.ocr_guard import OcrCircuitOpenError, OcrGuard, OcrGuardSettings
+
+URL = "http://127.0.0.1:1224"
+
+
+class AdaptiveTimeoutTests(unittest.TestCase):
+    def test_uses_requested_timeout_until_enough_samples(self) -> None:
+        guard = OcrGuard(OcrGuardSettings(timeout_min_samples=5))
+        for _ in range(4):
+            guard.record_success(URL, 50.0)
+        self.assertEqual(guard.before_request(URL, 2.5), 2.5)
+
+    def test_deadline_follows_p99_within_floor_and_ceiling(self) -> None:
+        guard = OcrGuard(OcrGuardSettings(timeout_min_samples=5, timeout_floor_sec=0.3, timeout_p99_factor=2.0))
+        for ms in (100.0, 110.0, 120.0, 150.0, 200.0):
+            guard.record_success(URL, ms)
+        self.assertAlmostEqual(guard.before_request(URL, 2.5), 0.4)
+        fast = OcrGuard(OcrGuardSettings(timeout_min_samples=1, timeout_floor_sec=0.3))
+        fast.record_success(URL, 10.0)
+        self.assertAlmostEqual(fast.before_request(URL, 2.5), 0.3)
+        slow = OcrGuard(OcrGuardSettings(timeout_min_samples=1, timeout_ceiling_sec=1.0))
+        slow.record_success(URL, 4000.0)
+        self.assertAlmostEqual(slow.before_request(URL, 2.5), 1.0)
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    def test_trips_after_consecutive_failures_and_fails_fast(self) -> None:
+        guard = OcrGuard(OcrGuardSettings(breaker_failures=3, breaker_cooldown_sec=30.0))
+        trips = []
+        guard.add_trip_listener(lambda url, m: trips.append((url, m["trips"])))
+        for _ in range(3):
+            guard.before_request(URL, 2.5)
+            guard.record_failure(URL, TimeoutError("read timed out"), timed_out=True)
+        # 熔断前已发出的在途请求随后失败，不重复熔断
+        guard.record_failure(URL, "late")
+        self.assertEqual(trips, [(URL, 1)])
+        t0 = time.perf_counter()
+        with self.assertRaises(OcrCircuitOpenError):
+            guard.before_request(URL + "/", 2.5)
+        self.assertLess(time.perf_counter() - t0, 0.05)
+        (snap,) = guard.snapshot()
+        self.assertEqual((snap["state"], snap["trips"], snap["fast_fails"], snap["timeouts"]), ("open", 1, 1, 3))
+
+    def test_half_open_probe_closes_or_reopens(self) -> None:
+        guard = OcrGuard(OcrGuardSettings(breaker_failures=1, breaker_cooldown_sec=0.0))
+        guard.record_failure(URL, "boom")
+        guard.before_request(URL, 2.5)  # 冷却结束，放行探测
+        with self.assertRaises(OcrCircuitOpenError):
+            guard.before_request(URL, 2.5)  # 探测在途时其余请求仍快速失败
+        guard.record_failure(URL, "boom again")
+        self.assertEqual(guard.snapshot()[0]["trips"], 2)
+        guard.before_request(URL, 2.5)
+        guard.record_success(URL, 80.0)
+        self.assertEqual(guard.snapshot()[0]["state"], "closed")
+        guard.before_request(URL, 2.5)
+
+    def test_reset_closes_breaker(self) -> None:
+        guard = OcrGuard(OcrGuardSettings(breaker_failures=1, breaker_cooldown_sec=60.0))
+        guard.record_failure(URL, "boom")
+        self.assertTrue(guard.is_open(URL))
+        guard.reset(URL)
+        self.assertFalse(guard.is_open(URL))
+        self.assertEqual(guard.before_request(URL, 1.5), 1.5)
+
+
+class ColdRequestTests(unittest.TestCase):
+    def test_first_request_after_engine_change_is_excluded(self) -> None:
+        guard = OcrGuard(OcrGuardSettings(breaker_failures=1, timeout_min_samples=1, cold_timeout_sec=12.0))
+        warm, changed = ("a",), ("b",)
+        # 首个请求：冷超时，成功耗时不进入分布
+        self.assertEqual(guard.before_request(URL, 2.5, engine_key=warm), 12.0)
+        guard.record_success(URL, 6000.0, engine_key=warm)
+        self.assertEqual(guard.snapshot()[0]["samples"], 0)
+        guard.before_request(URL, 2.5, engine_key=warm)
+        guard.record_success(URL, 100.0, engine_key=warm)
+        self.assertAlmostEqual(guard.before_request(URL, 2.5, engine_key=warm), 1.5)
+        # 引擎参数变化：再次按冷请求处理
+        self.assertEqual(guard.before_request(URL, 2.5, engine_key=changed), 12.0)
+        guard.reset(URL)
+        self.assertEqual(guard.before_request(URL, 2.5, engine_key=warm), 12.0)
+        guard.record_success(URL, 5000.0, engine_key=warm)
+        self.assertEqual(guard.snapshot()[0]["cold_requests"], 2)
+
+    def test_only_one_cold_request_per_key_escapes_the_breaker(self) -> None:
+        guard = OcrGuard(OcrGuardSettings(breaker_failures=3, cold_timeout_sec=12.0))
+        key = ("a",)
+        # 实例卡死：只有第一个请求享有冷超时且失败不计数，之后的失败照常熔断
+        self.assertEqual(guard.before_request(URL, 2.5, engine_key=key), 12.0)
+        guard.record_failure(URL, TimeoutError("read timed out"), timed_out=True, engine_key=key)
+        for _ in range(3):
+            self.assertEqual(guard.before_request(URL, 2.5, engine_key=key), 2.5)
+            guard.record_failure(URL, TimeoutError("read timed out"), timed_out=True, engine_key=key)
+        self.assertTrue(guard.is_open(URL))
+        snap = guard.snapshot()[0]
+        self.assertEqual((snap["cold_requests"], snap["trips"]), (1, 1))
+
+    def test_warm_up_marks_engine_key(self) -> None:
+        guard = OcrGuard(OcrGuardSettings(cold_timeout_sec=12.0))
+        guard.mark_warm(URL, ("a",))
+        self.assertEqual(guard.before_request(URL, 2.5, engine_key=("a",)), 2.5)
+
+
+class _Resp:
+    def raise_for_status(self) -> None:
+        pass
+
+    def json(self) -> dict:
+        return {"code": 101, "data": ""}
+
+
+class BreakerFailoverTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.guard = OcrGuard(OcrGuardSettings(breaker_failures=1, breaker_cooldown_sec=60.0))
+        self.urls = ["http://a:1", "http://b:1"]
+        self.pool = ocr_pool.configure_umi_ocr_fleet(self.urls)
+        self.addCleanup(ocr_pool.configure_umi_ocr_fleet, [])
+        self.posted = []
+        fake = types.SimpleNamespace(post=lambda url, **_kw: self.posted.append(url) or _Resp())
+        for patcher in (
+            mock.patch.dict(sys.modules, {"requests": fake}),
+            mock.patch.object(ocr, "get_ocr_guard", return_value=self.guard),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _image(self):
+        return ocr.Image.new("L", (8, 8), 255)
+
+    @unittest.skipIf(ocr.Image is None, "需要 Pillow")
+    def test_open_breaker_is_routed_to_healthy_instance(self) -> None:
+        self.guard.record_failure("http://a:1", "boom")
+        for _ in range(3):
+            ocr.recognize_text(self._image(), base_url="http://a:1")
+        self.assertEqual(self.posted, ["http://b:1/api/ocr"] * 3)
+        self.assertTrue(all(row["inflight"] == 0 for row in self.pool.snapshot()))
+
+    @unittest.skipIf(ocr.Image is None, "需要 Pillow")
+    def test_all_instances_open_fails_fast(self) -> None:
+        for url in self.urls:
+            self.guard.record_failure(url, "boom")
+        with self.assertRaises(ocr_guard.OcrCircuitOpenError):
+            ocr.recognize_text(self._image(), base_url="http://a:1")
+        self.assertEqual(self.posted, [])
+        self.assertTrue(all(row["inflight"] == 0 for row in self.pool.snapshot()))
+
+
+if __name__ == "__main__":
+    unittest.main()
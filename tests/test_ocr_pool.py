@@ -0,0 +1,63 @@
+"""Umi-OCR 多实例派发测试。"""
+
+from __future__ import annotations
+
+import unittest
+
+from super_buyer.services import ocr_pool
+from super_buyer.services.ocr_pool import UmiOcrPool, fleet_urls_from_cfg
+
+
+class FleetUrlTests(unittest.TestCase):
+    def test_single_instance_by_default(self) -> None:
+        self.assertEqual(fleet_urls_from_cfg({}), ["http://127.0.0.1:1224"])
+
+    def test_instances_allocate_consecutive_ports(self) -> None:
+        urls = fleet_urls_from_cfg({"base_url": "http://127.0.0.1:1224/", "instances": 3})
+        self.assertEqual(
+            urls,
+            ["http://127.0.0.1:1224", "http://127.0.0.1:1225", "http://127.0.0.1:1226"],
+        )
+
+    def test_explicit_base_urls_take_precedence(self) -> None:
+        urls = fleet_urls_from_cfg({"instances": 4, "base_urls": ["127.0.0.1:2000", "http://127.0.0.1:2000"]})
+        self.assertEqual(urls, ["http://127.0.0.1:2000"])
+
+
+class UmiOcrPoolTests(unittest.TestCase):
+    def tearDown(self) -> None:
+        ocr_pool.configure_umi_ocr_fleet([])
+
+    def test_acquire_prefers_least_inflight(self) -> None:
+        pool = UmiOcrPool(["http://a:1", "http://b:1"])
+        first = pool.acquire()
+        second = pool.acquire()
+        self.assertNotEqual(first, second)
+        pool.release(first, ok=True, elapsed_ms=10.0)
+        self.assertEqual(pool.acquire(), first)
+
+    def test_failure_ejects_until_readmitted(self) -> None:
+        pool = UmiOcrPool(["http://a:1", "http://b:1"], eject_base_sec=30.0)
+        url = pool.acquire()
+        pool.release(url, ok=False, elapsed_ms=2500.0)
+        other = "http://b:1" if url == "http://a:1" else "http://a:1"
+        for _ in range(3):
+            picked = pool.acquire()
+            self.assertEqual(picked, other)
+            pool.release(picked, ok=True, elapsed_ms=5.0)
+        pool.readmit(url)
+        healthy = {row["base_url"] for row in pool.snapshot() if row["healthy"]}
+        self.assertEqual(healthy, {"http://a:1", "http://b:1"})
+
+    def test_configure_from_cfg_registers_alias(self) -> None:
+        pool = ocr_pool.configure_umi_ocr_fleet_from_cfg(
+            {"umi_ocr": {"base_url": "http://127.0.0.1:9", "base_urls": ["http://h:1", "http://h:2"]}}
+        )
+        self.assertIsNotNone(pool)
+        self.assertIn("http://127.0.0.1:9", pool)
+        self.assertIs(ocr_pool.get_umi_ocr_pool(), pool)
+        self.assertIsNone(ocr_pool.configure_umi_ocr_fleet(["http://h:1"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+"""OCR 识别档位合并测试。"""
+
+from __future__ import annotations
+
+import unittest
+from unittest import mock
+
+from super_buyer.services import ocr
+from super_buyer.services.ocr import OcrBox, ocr_allowlist, ocr_options, resolve_ocr_profile
+
+
+class OcrProfileTests(unittest.TestCase):
+    def test_digit_profiles_disable_layout_parsing(self) -> None:
+        umi_cfg = {"options": {"data.format": "text", "ocr.language": "models/config_chinese.txt"}}
+        for name in ("price", "quantity"):
+            prof = resolve_ocr_profile(umi_cfg, name)
+            self.assertEqual(prof.options["tbpu.parser"], "none")
+            self.assertEqual(prof.options["ocr.language"], "models/config_chinese.txt")
+            self.assertNotIn("allowlist", prof.options)
+            self.assertTrue(prof.allowlist)
+
+    def test_unknown_profile_keeps_base_options(self) -> None:
+        umi_cfg = {"options": {"data.format": "text"}}
+        self.assertEqual(ocr_options(umi_cfg, None), {"data.format": "text"})
+        self.assertEqual(ocr_options(umi_cfg, "unknown"), {"data.format": "text"})
+
+    def test_config_profiles_override_builtin(self) -> None:
+        umi_cfg = {"profiles": {"price": {"tbpu.parser": "single_line", "allowlist": "0123456789"}}}
+        prof = resolve_ocr_profile(umi_cfg, "price")
+        self.assertEqual(prof.options["tbpu.parser"], "single_line")
+        self.assertEqual(prof.allowlist, "0123456789")
+
+    def test_engine_start_options_are_identical_across_profiles(self) -> None:
+        umi_cfg = {
+            "options": {"ocr.limit_side_len": 960, "ocr.cls": True},
+            "profiles": {"price": {"ocr.limit_side_len": 640, "ocr.cls": False}},
+        }
+        for name in (None, "price", "quantity", "name"):
+            opts = ocr_options(umi_cfg, name)
+            self.assertEqual((opts["ocr.limit_side_len"], opts["ocr.cls"]), (960, True))
+            self.assertNotIn("ocr.maxSideLen", opts)
+
+    def test_quantity_allowlist_filters_number_boxes(self) -> None:
+        boxes = [OcrBox("120", (0, 0, 1, 1)), OcrBox("1.2K", (0, 0, 1, 1))]
+        with mock.patch.object(ocr, "recognize_text", return_value=boxes):
+            got = ocr.recognize_numbers(object(), allowlist=ocr_allowlist({}, "quantity"))
+        self.assertEqual([b.value for b in got], [120])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+"""OCR 推测执行测试。"""
+
+from __future__ import annotations
+
+import threading
+import time
+import unittest
+
+from super_buyer.services.ocr_speculate import SpeculativeOcr
+
+
+class SpeculativeOcrTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.spec = SpeculativeOcr(max_workers=2)
+        self.addCleanup(self.spec.shutdown)
+
+    def test_hit_returns_value_and_overlap(self) -> None:
+        self.spec.submit("avg", lambda: (time.sleep(0.05), 1234)[1], scene=("g", 1))
+        time.sleep(0.08)  # 主流程此时在做输入/等待
+        res = self.spec.join("avg", scene=("g", 1), timeout=1.0)
+        self.assertTrue(res.hit)
+        self.assertEqual(res.value, 1234)
+        self.assertGreater(res.saved_ms, 30.0)
+        self.assertFalse(self.spec.pending("avg"))
+
+    def test_scene_change_discards_result(self) -> None:
+        self.spec.submit("avg", lambda: 1, scene=("g", 1))
+        res = self.spec.join("avg", scene=("g", 2), timeout=1.0)
+        self.assertEqual(res.status, "stale")
+        self.assertEqual(self.spec.join("avg", scene=("g", 2), timeout=1.0).status, "miss")
+
+    def test_timeout_and_error_fall_back(self) -> None:
+        gate = threading.Event()
+        self.addCleanup(gate.set)
+        self.spec.submit("qty", gate.wait, scene=1)
+        t0 = time.perf_counter()
+        self.assertEqual(self.spec.join("qty", scene=1, timeout=0.05).status, "timeout")
+        self.assertLess(time.perf_counter() - t0, 0.5)
+
+        def _boom() -> int:
+            raise RuntimeError("ocr down")
+
+        self.spec.submit("avg", _boom, scene=1)
+        res = self.spec.join("avg", scene=1, timeout=1.0)
+        self.assertEqual((res.status, res.error), ("error", "ocr down"))
+
+    def test_resubmit_replaces_previous_task(self) -> None:
+        self.spec.submit("avg", lambda: 1, scene=1)
+        self.spec.submit("avg", lambda: 2, scene=2)
+        self.assertEqual(self.spec.join("avg", scene=2, timeout=1.0).value, 2)
+        stats = self.spec.stats()
+        self.assertEqual((stats["submitted"], stats["stale"], stats["hit"], stats["pending"]), (2, 1, 1, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+"""多变体 OCR 投票测试。"""
+
+from __future__ import annotations
+
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from super_buyer.services.ocr_vote import vote_numbers
+
+
+def _reader(value, score=None, delay=0.0):
+    def _run():
+        time.sleep(delay)
+        return value, score
+
+    return _run
+
+
+class VoteNumbersTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.pool = ThreadPoolExecutor(max_workers=3)
+
+    def tearDown(self) -> None:
+        self.pool.shutdown(wait=True)
+
+    def test_two_agreeing_variants_return_without_waiting_for_slow_one(self) -> None:
+        res = vote_numbers(
+            {"otsu": _reader(1234, delay=0.01), "fixed": _reader(1234, delay=0.02), "scaled": _reader(99, delay=0.5)},
+            executor=self.pool,
+            min_agree=2,
+        )
+        self.assertEqual(res.value, 1234)
+        self.assertEqual(res.decided_by, "agree")
+        self.assertLess(res.elapsed_ms, 400)
+        self.assertNotIn("scaled", res.results)
+
+    def test_high_confidence_single_variant_is_accepted(self) -> None:
+        res = vote_numbers(
+            {"otsu": _reader(5678, score=0.99), "fixed": _reader(None, delay=0.3)},
+            executor=self.pool,
+            min_agree=2,
+            accept_score=0.95,
+        )
+        self.assertEqual((res.value, res.decided_by, res.variants), (5678, "score", ["otsu"]))
+
+    def test_disagreement_falls_back_to_preferred_order(self) -> None:
+        res = vote_numbers(
+            {"otsu": _reader(1000, delay=0.05), "fixed": _reader(1900), "scaled": _reader(None)},
+            executor=self.pool,
+            min_agree=2,
+            fallback_order=["otsu", "fixed", "scaled"],
+        )
+        self.assertEqual((res.value, res.decided_by), (1000, "fallback"))
+
+    def test_max_in_flight_submits_next_variant_only_on_disagreement(self) -> None:
+        calls = []
+
+        def _tracked(name, value):
+            def _run():
+                calls.append(name)
+                return value, None
+
+            return _run
+
+        readers = {"otsu": _tracked("otsu", 1234), "fixed": _tracked("fixed", 1234), "scaled": _tracked("scaled", 1234)}
+        res = vote_numbers(readers, executor=self.pool, min_agree=2, max_in_flight=2)
+        self.assertEqual((res.value, res.decided_by), (1234, "agree"))
+        self.assertEqual(sorted(calls), ["fixed", "otsu"])
+        self.assertEqual(res.cancelled, 1)
+
+        calls.clear()
+        readers = {"otsu": _tracked("otsu", 1000), "fixed": _tracked("fixed", 1900), "scaled": _tracked("scaled", 1900)}
+        res = vote_numbers(readers, executor=self.pool, min_agree=2, max_in_flight=2)
+        self.assertEqual((res.value, res.decided_by), (1900, "agree"))
+        self.assertEqual(sorted(calls), ["fixed", "otsu", "scaled"])
+
+    def test_errors_are_collected(self) -> None:
+        def _boom():
+            raise RuntimeError("timeout")
+
+        res = vote_numbers({"otsu": _boom, "fixed": _reader(None)}, executor=self.pool)
+        self.assertIsNone(res.value)
+        self.assertEqual(res.decided_by, "none")
+        self.assertIn("otsu", res.errors)
+
+    def test_deadline_stops_waiting_for_stuck_variants(self) -> None:
+        res = vote_numbers(
+            {"otsu": _reader(777), "fixed": _reader(888, delay=0.6)},
+            executor=self.pool,
+            min_agree=2,
+            timeout_sec=0.1,
+        )
+        self.assertEqual((res.value, res.decided_by), (777, "fallback"))
+        self.assertLess(res.elapsed_ms, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
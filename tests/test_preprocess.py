@@ -0,0 +1,63 @@
+"""OCR 前处理流水线测试。"""
+
+from __future__ import annotations
+
+import unittest
+
+from super_buyer.services import preprocess
+from super_buyer.services.preprocess import PreprocessPipeline, PreprocessSpec, otsu_level
+
+
+class OtsuLevelTests(unittest.TestCase):
+    def test_bimodal_histogram_splits_between_modes(self) -> None:
+        hist = [0] * 256
+        hist[30] = 500
+        hist[220] = 300
+        level = otsu_level(hist)
+        self.assertGreaterEqual(level, 30)
+        self.assertLess(level, 220)
+
+    def test_empty_histogram(self) -> None:
+        self.assertEqual(otsu_level([0] * 256), 0)
+
+
+@unittest.skipIf(preprocess.Image is None, "需要 Pillow")
+class PipelineTests(unittest.TestCase):
+    def _sample(self):
+        img = preprocess.Image.new("RGB", (40, 20), (255, 255, 255))
+        for x in range(10, 30):
+            for y in range(5, 15):
+                img.putpixel((x, y), (20, 20, 20))
+        return img
+
+    def test_variants_share_one_call(self) -> None:
+        prep = PreprocessPipeline()
+        out = prep.run(
+            self._sample(),
+            {
+                "top": PreprocessSpec(crop=(0, 0, 40, 10), scale=2.0),
+                "inv": PreprocessSpec(invert=True, pad=3),
+                "color": PreprocessSpec(gray=False, threshold="none"),
+            },
+        )
+        self.assertEqual(out["top"].size, (80, 20))
+        self.assertEqual(out["inv"].size, (46, 26))
+        self.assertEqual(out["inv"].getpixel((20, 10)), 255)
+        self.assertEqual(out["inv"].getpixel((0, 0)), 255)
+        self.assertEqual(out["color"].mode, "RGB")
+        self.assertEqual(prep.stats()["runs"], 1)
+
+    def test_buffers_are_reused_across_runs(self) -> None:
+        prep = PreprocessPipeline()
+        if not prep.accelerated():
+            self.skipTest("需要 OpenCV/numpy")
+        specs = {"bin": PreprocessSpec(scale=1.5)}
+        prep.run(self._sample(), specs)
+        allocated = prep.stats()["allocations"]
+        for _ in range(3):
+            prep.run(self._sample(), specs)
+        self.assertEqual(prep.stats()["allocations"], allocated)
+
+
+if __name__ == "__main__":
+    unittest.main()
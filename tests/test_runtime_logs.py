@@ -7,6 +7,7 @@ import time
 import unittest
 from pathlib import Path
 
+from super_buyer.services import runtime_logs
 from super_buyer.services.runtime_logs import (
     append_runtime_log,
     read_latest_runtime_logs,
@@ -72,6 +73,52 @@ class RuntimeLogStoreTests(unittest.TestCase):
         self.assertEqual(exec_logs, [f"【{time.strftime('%H:%M:%S', time.localtime(ts_exec))}】执行日志"])
         self.assertEqual(multi_logs, [f"【{time.strftime('%H:%M:%S', time.localtime(ts_multi))}】多商品日志"])
 
+    def test_tail_reader_matches_forward_read_across_block_boundaries(self) -> None:
+        path = self.output_dir / "tail.jsonl"
+        lines = [f'{{"message": "第{i}条{"测" * (i % 37)}"}}' for i in range(500)]
+        path.write_text("\n\n".join(lines) + "\n", encoding="utf-8")
+        for block in (7, 64, 4096):
+            for limit in (1, 3, 120, 499, 500, 800):
+                self.assertEqual(runtime_logs._tail_lines(path, limit, block_size=block), lines[-limit:])
+
+
+class RuntimeLogWriterTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.output_dir = Path(self._tmp.name)
+        self.writer = runtime_logs.start_runtime_log_writer(flush_interval_sec=60.0, flush_lines=1000)
+
+    def tearDown(self) -> None:
+        runtime_logs.stop_runtime_log_writer()
+        self._tmp.cleanup()
+
+    def _day_file(self, ts: float, channel: str = "exec") -> Path:
+        return self.output_dir / "logs" / time.strftime("%Y-%m-%d", time.localtime(ts)) / f"{channel}.jsonl"
+
+    def test_write_behind_keeps_handles_and_rotates_by_day(self) -> None:
+        day1 = 1710000001.0
+        day2 = day1 + 86400.0
+        for i in range(50):
+            append_runtime_log(self.output_dir, "exec", f"第{i}条", ts=day1 + i)
+        append_runtime_log(self.output_dir, "exec", "次日", ts=day2)
+        append_runtime_log(self.output_dir, "multi", "多商品", ts=day2)
+        self.assertTrue(runtime_logs.flush_runtime_logs())
+        # 跨日后每个频道只保留当天的句柄
+        self.assertEqual(sorted(day for day, _fh in self.writer._handles.values()), [time.strftime("%Y-%m-%d", time.localtime(day2))] * 2)
+        with self._day_file(day1).open("r", encoding="utf-8") as fh:
+            self.assertEqual(sum(1 for _ in fh), 50)
+        latest = read_latest_runtime_logs(self.output_dir, "exec", limit=2)
+        self.assertEqual([s.split("】", 1)[1] for s in latest], ["第49条", "次日"])
+
+    def test_stop_writes_remaining_lines_and_falls_back_to_sync(self) -> None:
+        ts = 1710000001.0
+        append_runtime_log(self.output_dir, "exec", "队列中", ts=ts)
+        self.assertTrue(runtime_logs.stop_runtime_log_writer())
+        self.assertEqual(self.writer._handles, {})
+        append_runtime_log(self.output_dir, "exec", "同步写入", ts=ts + 1)
+        with self._day_file(ts).open("r", encoding="utf-8") as fh:
+            self.assertEqual(len(fh.readlines()), 2)
+
 
 if __name__ == "__main__":
     unittest.main()
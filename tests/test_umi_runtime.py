@@ -0,0 +1,153 @@
+"""Umi-OCR 托管启动预热与就绪状态测试。"""
+
+from __future__ import annotations
+
+import json
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from super_buyer.services import umi_runtime
+from super_buyer.services.ocr_guard import get_ocr_guard
+from super_buyer.services.umi_runtime import ManagedUmiOcrProcess, ManagedUmiOcrStatus
+
+
+class UmiWarmupTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.output_dir = Path(self._tmp.name)
+        umi_runtime._publish_status(None)  # type: ignore[arg-type]
+
+    def tearDown(self) -> None:
+        umi_runtime._publish_status(None)  # type: ignore[arg-type]
+        self._tmp.cleanup()
+
+    def _make(self, **umi_cfg) -> ManagedUmiOcrProcess:
+        cfg = {
+            "umi_ocr": {"base_url": "http://127.0.0.1:1", "warmup_stable_ratio": 0.9, **umi_cfg},
+            "paths": {"output_dir": str(self.output_dir)},
+        }
+        proc = ManagedUmiOcrProcess(cfg, app_root=self.output_dir)
+        self.addCleanup(proc.stop)
+        return proc
+
+    def test_wait_returns_immediately_when_nothing_is_starting(self) -> None:
+        t0 = time.perf_counter()
+        self.assertIsNone(umi_runtime.wait_umi_ocr_ready(5.0))
+        self.assertLess(time.perf_counter() - t0, 0.5)
+
+    def test_start_warms_up_until_latency_stabilizes(self) -> None:
+        delays = iter([0.05, 0.01, 0.01, 0.01, 0.01])
+        calls = []
+
+        def _fake_recognize(_img, **kwargs):
+            calls.append(kwargs.get("timeout"))
+            time.sleep(next(delays))
+            return []
+
+        proc = self._make(warmup_min_rounds=3, warmup_first_timeout_sec=9.0)
+        launched = ManagedUmiOcrStatus(managed=True, ready=True, using_existing=True)
+        with mock.patch.object(proc, "_launch", return_value=launched), \
+                mock.patch.object(umi_runtime, "_warmup_sample", return_value=object()), \
+                mock.patch("super_buyer.services.ocr.recognize_text", side_effect=_fake_recognize):
+            status = proc.start()
+
+        self.assertTrue(status.ready)
+        self.assertTrue(status.warmed)
+        self.assertEqual(status.warmup_rounds, 3)
+        self.assertEqual(calls[0], 9.0)
+        self.assertIsNotNone(status.first_ocr_ms)
+        self.assertLess(status.warm_latency_ms, status.first_ocr_ms)
+        self.assertIs(umi_runtime.wait_umi_ocr_ready(0.1), status)
+        self.assertTrue((self.output_dir / "umi_ocr_startup.jsonl").exists())
+
+    def test_background_start_is_pending_before_thread_runs(self) -> None:
+        proc = self._make()
+        gate = threading.Event()
+        launched = ManagedUmiOcrStatus(managed=True, ready=False, message="slow")
+        with mock.patch.object(proc, "_launch", side_effect=lambda: gate.wait(2.0) and launched or launched):
+            thread = proc.start_in_background()
+            # 后台线程尚未完成：等待方必须阻塞到超时，而不是立即放行
+            self.assertIsNone(umi_runtime.wait_umi_ocr_ready(0.05))
+            gate.set()
+            self.assertIs(umi_runtime.wait_umi_ocr_ready(2.0), launched)
+            thread.join(2.0)
+
+    def test_wait_returns_when_stop_is_set(self) -> None:
+        umi_runtime._publish_pending()
+        stop = threading.Event()
+        threading.Timer(0.1, stop.set).start()
+        t0 = time.perf_counter()
+        self.assertIsNone(umi_runtime.wait_umi_ocr_ready(30.0, stop))
+        self.assertLess(time.perf_counter() - t0, 1.0)
+
+    def test_assigned_port_is_restored_on_stop(self) -> None:
+        exe = self.output_dir / "umi" / "Umi-OCR.exe"
+        data_dir = exe.parent / "UmiOCR-data"
+        data_dir.mkdir(parents=True)
+        settings = data_dir / ".pre_settings"
+        original = '{"server_port": 1224, "theme": "dark"}'
+        settings.write_text(original, encoding="utf-8")
+        proc = self._make()
+        proc._assign_port(exe, 1301)
+        self.assertEqual(json.loads(settings.read_text(encoding="utf-8"))["server_port"], 1301)
+        # 重启实例再次写入时不覆盖原始备份
+        proc._assign_port(exe, 1302)
+        proc.stop()
+        self.assertEqual(settings.read_text(encoding="utf-8"), original)
+        self.assertEqual(sorted(p.name for p in data_dir.iterdir()), [".pre_settings"])
+
+        # 原本不存在的文件在退出后删除
+        settings.unlink()
+        proc = self._make()
+        proc._assign_port(exe, 1301)
+        self.assertTrue(settings.exists())
+        proc.stop()
+        self.assertEqual(list(data_dir.iterdir()), [])
+
+    def test_failed_launch_is_published_without_warmup(self) -> None:
+        proc = self._make()
+        failed = ManagedUmiOcrStatus(managed=True, ready=False, message="missing")
+        with mock.patch.object(proc, "_launch", return_value=failed), \
+                mock.patch.object(proc, "_warm_up") as warm:
+            status = proc.start()
+
+        warm.assert_not_called()
+        self.assertFalse(status.ready)
+        self.assertIs(umi_runtime.current_umi_ocr_status(), status)
+
+    def test_breaker_trip_restarts_owned_instance(self) -> None:
+        url = "http://127.0.0.1:1"
+        guard = get_ocr_guard()
+        self.addCleanup(guard.reset)
+        self.addCleanup(guard.update_settings, guard.settings)
+        proc = self._make(breaker_failures=2, breaker_cooldown_sec=60.0)
+        launched = ManagedUmiOcrStatus(managed=True, ready=True, started=True)
+        old_proc = mock.Mock()
+        proc._proc_by_url[url] = old_proc
+        proc._procs.append(old_proc)
+        restarted = threading.Event()
+        with mock.patch.object(proc, "_launch", return_value=launched), \
+                mock.patch.object(proc, "_warm_up"), \
+                mock.patch.object(proc, "_launch_one", return_value=launched) as relaunch, \
+                mock.patch.object(proc, "_warm_up_endpoint", side_effect=lambda *_a, **_k: restarted.set() or {}), \
+                mock.patch.object(ManagedUmiOcrProcess, "_terminate") as terminate:
+            proc.start()
+            guard.record_failure(url, "timeout")
+            guard.record_failure(url, "timeout")
+            self.assertTrue(restarted.wait(2.0))
+            deadline = time.time() + 2.0
+            while guard.is_open(url) and time.time() < deadline:
+                time.sleep(0.01)
+
+        terminate.assert_called_once_with(old_proc)
+        relaunch.assert_called_once_with(0, url)
+        self.assertFalse(guard.is_open(url))
+        self.assertEqual(next(m for m in guard.snapshot() if m["base_url"] == url)["trips"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+"""Umi-OCR 替身服务测试。"""
+
+from __future__ import annotations
+
+import base64
+import io
+import json
+import sys
+import time
+import unittest
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# 替身服务属于压测工具，位于 tools/（不在应用包内）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tools"))
+
+import umi_stub  # noqa: E402
+from umi_stub import FixtureRecognizer, LatencyModel, UmiOcrStubServer, constant_recognizer  # noqa: E402
+
+
+def _post(base_url: str, payload: dict) -> dict:
+    req = urllib.request.Request(
+        base_url + "/api/ocr",
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(req, timeout=5) as resp:
+        return json.loads(resp.read().decode("utf-8"))
+
+
+_B64 = base64.b64encode(b"not-really-an-image").decode("ascii")
+
+
+class StubServerTests(unittest.TestCase):
+    def test_response_schema_matches_umi_ocr(self) -> None:
+        with UmiOcrStubServer(constant_recognizer("1,234")) as stub:
+            res = _post(stub.base_url, {"base64": _B64, "options": {"data.format": "dict"}})
+            text = _post(stub.base_url, {"base64": _B64, "options": {"data.format": "text"}})
+        self.assertEqual(res["code"], 100)
+        block = res["data"][0]
+        self.assertEqual(block["text"], "1,234")
+        self.assertEqual(len(block["box"]), 4)
+        self.assertEqual(text, {**text, "code": 100, "data": "1,234"})
+
+    def test_no_text_returns_code_101(self) -> None:
+        with UmiOcrStubServer(constant_recognizer(None)) as stub:
+            res = _post(stub.base_url, {"base64": _B64})
+            stats = stub.stats()
+        self.assertEqual(res["code"], 101)
+        self.assertEqual((stats["requests"], stats["empty"]), (1, 1))
+
+    def test_concurrency_limit_queues_requests(self) -> None:
+        stub = UmiOcrStubServer(
+            constant_recognizer("7"),
+            latency=LatencyModel(kind="fixed", mean_ms=50.0),
+            max_concurrency=1,
+        )
+        with stub:
+            t0 = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=3) as ex:
+                codes = [r["code"] for r in ex.map(lambda _i: _post(stub.base_url, {"base64": _B64}), range(3))]
+            elapsed = time.perf_counter() - t0
+            stats = stub.stats()
+        self.assertEqual(codes, [100, 100, 100])
+        self.assertEqual(stats["peak_concurrency"], 1)
+        self.assertGreaterEqual(elapsed, 0.14)
+        self.assertGreater(stats["avg_queue_ms"], 0.0)
+
+    def test_latency_spec_parsing(self) -> None:
+        self.assertEqual(LatencyModel.parse("25").sample_ms(), 25.0)
+        model = LatencyModel.parse("normal:40:10", seed=1)
+        self.assertEqual((model.kind, model.mean_ms, model.jitter_ms), ("normal", 40.0, 10.0))
+        self.assertEqual(LatencyModel.parse("normal:40:10", seed=1).sample_ms(), model.sample_ms())
+
+
+@unittest.skipIf(umi_stub.Image is None, "需要 Pillow")
+class FixtureRecognizerTests(unittest.TestCase):
+    def _png(self, img) -> bytes:
+        buf = io.BytesIO()
+        img.save(buf, format="PNG")
+        return buf.getvalue()
+
+    def _sample(self, x0: int):
+        img = umi_stub.Image.new("L", (48, 16), 20)
+        for x in range(x0, x0 + 12):
+            for y in range(2, 14):
+                img.putpixel((x, y), 230)
+        return img
+
+    def test_matches_exact_and_rescaled_or_inverted_fixture(self) -> None:
+        left, right = self._sample(2), self._sample(32)
+        rec = FixtureRecognizer({self._png(left): "111", self._png(right): "222"})
+        self.assertEqual(rec(self._png(left)), "111")
+        self.assertEqual(rec(self._png(right.resize((96, 32)))), "222")
+        self.assertEqual(rec(self._png(left.point(lambda p: 255 - p))), "111")
+
+
+if __name__ == "__main__":
+    unittest.main()
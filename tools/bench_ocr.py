@@ -0,0 +1,439 @@
+"""离线 OCR 准确率/延迟基准：用已标注的 ROI 样本集对比各识别路径。
+
+样本集目录（默认 data/output/ocr_corpus）：
+- 图片：未经二值化的 ROI 截图（如 `debug.save_roi_on_fail` 落盘的 `*_img_top.png`、
+  初始化配置“平均单价预览”保存的裁剪图）；
+- 标注：`labels.json`（{"文件名": 期望整数}）或 `labels.csv`（文件名,期望整数）；
+  也可直接把期望值写在文件名前缀：`12345__xxx.png`。
+
+识别路径 = 前处理变体 × Umi 档位 × 图片编码（另可通过 --local 接入本地识别函数）。
+每条路径报告准确率、p50/p95 延迟与并发吞吐，输出 JSON 与 Markdown 报告。
+数字识别无候选时的文本回退请求单独计时（回退次数/回退耗时），不计入主路径延迟。
+
+`--synthetic` 使用合成的纯数字图（与启动预热相同），无需标注样本即可对比各档位
+（price/quantity/name）的单次识别延迟。
+
+用法：
+    uv run python tools/bench_ocr.py --corpus data/output/ocr_corpus
+    uv run python tools/bench_ocr.py --stub --stub-latency normal:40:10   # 无 Umi-OCR 时使用替身服务
+    uv run python tools/bench_ocr.py --variants otsu,fixed --profiles default,price --encodings PNG,BMP
+    uv run python tools/bench_ocr.py --synthetic --variants raw --rounds 20   # 档位延迟对比
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import io
+import itertools
+import json
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT / "src"))
+
+from super_buyer.config.loader import load_config  # noqa: E402
+from super_buyer.core.common import parse_price_text  # noqa: E402
+from super_buyer.services.ocr import DEFAULT_OCR_PROFILES, ocr_options, recognize_numbers, recognize_text  # noqa: E402
+from super_buyer.services.preprocess import PreprocessPipeline, PreprocessSpec  # noqa: E402
+from umi_stub import (  # noqa: E402
+    FixtureRecognizer,
+    LatencyModel,
+    UmiOcrStubServer,
+    read_corpus_labels,
+)
+
+DEFAULT_CORPUS = REPO_ROOT / "data" / "output" / "ocr_corpus"
+DEFAULT_REPORT = REPO_ROOT / "docs" / "OCR识别基准报告.md"
+DEFAULT_RESULTS = REPO_ROOT / "data" / "output" / "ocr_benchmark_results.json"
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".bmp"}
+
+# 读取函数：返回 (值, 原文, 回退请求耗时 ms；未回退时为 None)
+Reader = Callable[[Any], tuple[int | None, str, float | None]]
+
+
+@dataclass(slots=True)
+class Sample:
+    name: str
+    label: int
+    image: Any
+
+
+@dataclass(slots=True)
+class OcrPath:
+    engine: str
+    variant: str
+    profile: str
+    encoding: str
+
+    @property
+    def name(self) -> str:
+        return f"{self.engine}/{self.variant}/{self.profile}/{self.encoding}"
+
+
+def variant_specs(scale: float, fixed_level: int) -> dict[str, PreprocessSpec | None]:
+    alt = scale * 1.5 if scale * 1.5 <= 2.5 else max(0.6, scale / 1.5)
+    return {
+        "raw": None,
+        "otsu": PreprocessSpec(scale=scale),
+        "fixed": PreprocessSpec(scale=scale, threshold="fixed", fixed_level=fixed_level),
+        "scaled": PreprocessSpec(scale=alt),
+        "invert": PreprocessSpec(scale=scale, invert=True),
+        "gray": PreprocessSpec(scale=scale, threshold="none"),
+    }
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+def load_corpus(corpus: Path) -> list[Sample]:
+    from PIL import Image  # type: ignore
+
+    labels = read_corpus_labels(corpus)
+    samples: list[Sample] = []
+    for path in sorted(corpus.iterdir()):
+        if path.suffix.lower() not in IMAGE_SUFFIXES:
+            continue
+        label = labels.get(path.name)
+        if label is None:
+            continue
+        with Image.open(path) as im:
+            samples.append(Sample(name=path.name, label=int(label), image=im.convert("RGB")))
+    return samples
+
+
+def synthetic_samples() -> list[Sample]:
+    """合成纯数字样本（与 Umi-OCR 启动预热使用的图片相同）。"""
+    from super_buyer.services.umi_runtime import _WARMUP_TEXTS, _warmup_sample
+
+    samples: list[Sample] = []
+    for text in _WARMUP_TEXTS:
+        img = _warmup_sample(text)
+        if img is not None:
+            samples.append(Sample(name=f"synthetic:{text}", label=int(text), image=img.convert("RGB")))
+    return samples
+
+
+def _png_bytes(img: Any) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _load_local_engine(spec: str) -> Callable[[Any], str]:
+    module_name, _, func_name = spec.partition(":")
+    if not module_name or not func_name:
+        raise ValueError(f"本地识别函数格式应为 module:function，当前为 {spec!r}")
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def make_reader(path: OcrPath, umi_cfg: dict[str, Any], local_engines: dict[str, Callable[[Any], str]]) -> Reader:
+    if path.engine != "umi":
+        fn = local_engines[path.engine]
+
+        def _local(img: Any) -> tuple[int | None, str, float | None]:
+            text = str(fn(img) or "")
+            return parse_price_text(text), text, None
+
+        return _local
+
+    base_url = str(umi_cfg.get("base_url", "http://127.0.0.1:1224"))
+    timeout = float(umi_cfg.get("timeout_sec", 2.5) or 2.5)
+    options = ocr_options(umi_cfg, None if path.profile == "default" else path.profile)
+
+    def _umi(img: Any) -> tuple[int | None, str, float | None]:
+        # 与运行时一致：数字候选取最大值，无候选时回退文本解析（回退请求单独计时）
+        cands = recognize_numbers(img, base_url=base_url, timeout=timeout, options=options, image_format=path.encoding)
+        vals = [int(c.value) for c in cands if c.value is not None]
+        text = " ".join((c.text or "").strip() for c in cands if (c.text or "").strip())
+        if vals:
+            return max(vals), text, None
+        fallback_ms: float | None = None
+        if not cands:
+            t0 = time.perf_counter()
+            boxes = recognize_text(img, base_url=base_url, timeout=timeout, options=options, image_format=path.encoding)
+            fallback_ms = (time.perf_counter() - t0) * 1000.0
+            text = " ".join((b.text or "").strip() for b in boxes if (b.text or "").strip())
+        return parse_price_text(text), text, fallback_ms
+
+    return _umi
+
+
+def bench_path(
+    path: OcrPath,
+    samples: list[Sample],
+    reader: Reader,
+    spec: PreprocessSpec | None,
+    *,
+    rounds: int,
+    warmup: int,
+    concurrency: int,
+) -> dict[str, Any]:
+    prep = PreprocessPipeline()
+    images: list[Any] = []
+    for sample in samples:
+        images.append(sample.image if spec is None else prep.run(sample.image, {"v": spec})["v"])
+    prep_ms = prep.stats()["avg_ms"] if spec is not None else 0.0
+
+    for _ in range(max(0, warmup)):
+        for img in images:
+            try:
+                reader(img)
+            except Exception:
+                pass
+
+    latencies: list[float] = []
+    fallback_latencies: list[float] = []
+    correct = 0
+    errors = 0
+    misreads: list[dict[str, Any]] = []
+    for round_idx in range(max(1, rounds)):
+        for sample, img in zip(samples, images):
+            t0 = time.perf_counter()
+            fallback_ms: float | None = None
+            try:
+                value, text, fallback_ms = reader(img)
+            except Exception as exc:
+                value, text = None, f"错误: {exc}"
+                errors += 1
+            elapsed_ms = (time.perf_counter() - t0) * 1000.0
+            if fallback_ms is not None:
+                fallback_latencies.append(fallback_ms)
+                elapsed_ms -= fallback_ms
+            latencies.append(elapsed_ms)
+            if round_idx > 0:
+                continue
+            if value == sample.label:
+                correct += 1
+            elif len(misreads) < 10:
+                misreads.append({"sample": sample.name, "label": sample.label, "value": value, "text": text[:60]})
+
+    # 并发吞吐：所有样本 × 轮次一次性提交
+    jobs = images * max(1, rounds)
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as ex:
+        list(ex.map(lambda im: _safe_call(reader, im), jobs))
+    wall = max(1e-9, time.perf_counter() - t0)
+
+    return {
+        "path": path.name,
+        "engine": path.engine,
+        "variant": path.variant,
+        "profile": path.profile,
+        "encoding": path.encoding,
+        "samples": len(samples),
+        "correct": correct,
+        "accuracy": round(correct / len(samples), 4) if samples else 0.0,
+        "errors": errors,
+        "avg_ms": round(statistics.fmean(latencies), 3) if latencies else 0.0,
+        "p50_ms": round(_percentile(latencies, 50), 3),
+        "p95_ms": round(_percentile(latencies, 95), 3),
+        "prep_ms_avg": round(float(prep_ms), 3),
+        "fallbacks": len(fallback_latencies),
+        "fallback_avg_ms": round(statistics.fmean(fallback_latencies), 3) if fallback_latencies else 0.0,
+        "throughput_rps": round(len(jobs) / wall, 2),
+        "concurrency": int(concurrency),
+        "misreads": misreads,
+    }
+
+
+def _safe_call(reader: Reader, img: Any) -> None:
+    try:
+        reader(img)
+    except Exception:
+        pass
+
+
+def build_report(results: dict[str, Any]) -> str:
+    meta = results["meta"]
+    rows = sorted(results["paths"], key=lambda r: (-r["accuracy"], r["p95_ms"]))
+    lines = [
+        "# OCR 识别基准报告",
+        "",
+        f"- 测试时间：{meta['measured_at']}",
+        f"- 样本集：`{meta['corpus']}`（{meta['samples']} 张已标注 ROI）",
+        f"- Umi-OCR：`{meta['base_url']}`",
+        f"- 轮次：{meta['rounds']}（预热 {meta['warmup']}），并发吞吐线程数：{meta['concurrency']}",
+        "",
+        "## 结论",
+        "",
+    ]
+    if rows:
+        best = rows[0]
+        fastest = min((r for r in rows if r["accuracy"] >= best["accuracy"]), key=lambda r: r["p95_ms"])
+        lines.append(f"- 准确率最高：`{best['path']}`，{best['accuracy'] * 100:.1f}%（{best['correct']}/{best['samples']}）。")
+        lines.append(f"- 同准确率下 p95 最低：`{fastest['path']}`，p95={fastest['p95_ms']:.1f} ms，吞吐 {fastest['throughput_rps']:.1f} 次/秒。")
+    else:
+        lines.append("- 没有可用的测量结果。")
+    lines += [
+        "",
+        "## 实测数据",
+        "",
+        "| 路径 | 准确率 | 平均(ms) | p50(ms) | p95(ms) | 前处理(ms) | 吞吐(次/秒) | 回退次数 | 回退平均(ms) | 错误 |",
+        "| --- | ---: | ---: | ---: | ---: | ---: | ---: | ---: | ---: | ---: |",
+    ]
+    for r in rows:
+        lines.append(
+            f"| `{r['path']}` | {r['accuracy'] * 100:.1f}% | {r['avg_ms']:.1f} | {r['p50_ms']:.1f} | "
+            f"{r['p95_ms']:.1f} | {r['prep_ms_avg']:.2f} | {r['throughput_rps']:.1f} | "
+            f"{r['fallbacks']} | {r['fallback_avg_ms']:.1f} | {r['errors']} |"
+        )
+    misreads = [(r["path"], m) for r in rows for m in r["misreads"]]
+    if misreads:
+        lines += ["", "## 误读样例", "", "| 路径 | 样本 | 期望 | 识别 | 原文 |", "| --- | --- | ---: | ---: | --- |"]
+        for path_name, m in misreads[:30]:
+            lines.append(f"| `{path_name}` | {m['sample']} | {m['label']} | {m['value']} | {m['text']} |")
+    lines += [
+        "",
+        "## 复跑命令",
+        "",
+        "```powershell",
+        "uv run python tools/bench_ocr.py",
+        "```",
+    ]
+    return "\n".join(lines)
+
+
+def _split(raw: str) -> list[str]:
+    return [p.strip() for p in str(raw or "").split(",") if p.strip()]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="OCR 离线准确率/延迟基准工具")
+    parser.add_argument("--config", type=Path, default=Path("config.json"), help="配置文件路径")
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS, help="已标注 ROI 样本目录")
+    parser.add_argument("--synthetic", action="store_true", help="使用合成纯数字图代替样本目录（档位延迟对比）")
+    parser.add_argument("--base-url", default="", help="覆盖 umi_ocr.base_url（例如指向已启动的替身服务）")
+    parser.add_argument("--stub", action="store_true", help="在进程内启动 Umi-OCR 替身服务（按样本标注识别）")
+    parser.add_argument("--stub-latency", default="fixed:0", help="替身服务延迟分布 kind:mean[:jitter]")
+    parser.add_argument("--stub-concurrency", type=int, default=1, help="替身服务并发上限")
+    parser.add_argument("--variants", default="otsu,fixed,scaled", help="前处理变体：raw,otsu,fixed,scaled,invert,gray")
+    parser.add_argument(
+        "--profiles",
+        default="default,price",
+        help=f"Umi 档位：default 表示仅 umi_ocr.options，可选 {','.join(DEFAULT_OCR_PROFILES)}",
+    )
+    parser.add_argument("--encodings", default="PNG", help="图片编码：PNG,BMP,JPEG")
+    parser.add_argument("--local", action="append", default=[], help="本地识别函数 module:function（返回文本），可重复")
+    parser.add_argument("--scale", type=float, default=None, help="缩放倍数（默认取 avg_price_area.scale）")
+    parser.add_argument("--fixed-level", type=int, default=128, help="fixed 变体的固定阈值")
+    parser.add_argument("--rounds", type=int, default=5, help="测量轮次（准确率仅统计第 1 轮）")
+    parser.add_argument("--warmup", type=int, default=1, help="预热轮次")
+    parser.add_argument("--concurrency", type=int, default=4, help="吞吐测试并发线程数")
+    parser.add_argument("--results-json", type=Path, default=DEFAULT_RESULTS, help="JSON 结果输出路径")
+    parser.add_argument("--report", type=Path, default=DEFAULT_REPORT, help="Markdown 报告输出路径")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    cfg = load_config(str(args.config))
+    umi_cfg = dict(cfg.get("umi_ocr", {}) or {})
+    if args.base_url:
+        umi_cfg["base_url"] = str(args.base_url)
+    try:
+        scale = float(args.scale if args.scale is not None else (cfg.get("avg_price_area", {}) or {}).get("scale", 1.0))
+    except Exception:
+        scale = 1.0
+    scale = max(0.6, min(2.5, scale))
+
+    corpus = args.corpus.resolve()
+    if args.synthetic:
+        samples = synthetic_samples()
+        if not samples:
+            print("无法生成合成样本（缺少 Pillow）", file=sys.stderr)
+            return 1
+    elif not corpus.is_dir():
+        print(f"样本目录不存在: {corpus}", file=sys.stderr)
+        return 1
+    else:
+        samples = load_corpus(corpus)
+    if not samples:
+        print(f"样本目录中没有已标注的图片: {corpus}", file=sys.stderr)
+        return 1
+
+    stub: UmiOcrStubServer | None = None
+    if args.stub:
+        recognizer = (
+            FixtureRecognizer({_png_bytes(s.image): str(s.label) for s in samples})
+            if args.synthetic
+            else FixtureRecognizer.from_corpus(corpus)
+        )
+        stub = UmiOcrStubServer(
+            recognizer,
+            latency=LatencyModel.parse(args.stub_latency, seed=0),
+            max_concurrency=int(args.stub_concurrency),
+        ).start()
+        umi_cfg["base_url"] = stub.base_url
+
+    specs = variant_specs(scale, int(args.fixed_level))
+    variants = [v for v in _split(args.variants) if v in specs]
+    local_engines = {f"local:{spec}": _load_local_engine(spec) for spec in args.local}
+    paths = [
+        OcrPath(engine="umi", variant=v, profile=p, encoding=e.upper())
+        for v, p, e in itertools.product(variants, _split(args.profiles), _split(args.encodings))
+    ]
+    paths += [OcrPath(engine=name, variant=v, profile="-", encoding="-") for name in local_engines for v in variants]
+
+    results: dict[str, Any] = {
+        "meta": {
+            "measured_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "corpus": "synthetic" if args.synthetic else str(corpus),
+            "samples": len(samples),
+            "base_url": str(umi_cfg.get("base_url", "")) + ("（替身服务）" if stub is not None else ""),
+            "scale": scale,
+            "rounds": int(args.rounds),
+            "warmup": int(args.warmup),
+            "concurrency": int(args.concurrency),
+        },
+        "paths": [],
+    }
+    try:
+        for path in paths:
+            res = bench_path(
+                path,
+                samples,
+                make_reader(path, umi_cfg, local_engines),
+                specs[path.variant],
+                rounds=int(args.rounds),
+                warmup=int(args.warmup),
+                concurrency=int(args.concurrency),
+            )
+            results["paths"].append(res)
+            print(
+                f"{res['path']:<36} 准确率={res['accuracy'] * 100:5.1f}% "
+                f"p50={res['p50_ms']:.1f}ms p95={res['p95_ms']:.1f}ms 吞吐={res['throughput_rps']:.1f}/s"
+            )
+    finally:
+        if stub is not None:
+            stub.stop()
+
+    report = build_report(results)
+    args.results_json.parent.mkdir(parents=True, exist_ok=True)
+    args.results_json.write_text(
+        json.dumps(results, ensure_ascii=False, indent=2),
+        encoding="utf-8",
+        newline="\r\n",
+    )
+    args.report.parent.mkdir(parents=True, exist_ok=True)
+    args.report.write_text(report + "\r\n", encoding="utf-8", newline="\r\n")
+    print(f"\n报告已写入: {args.report}")
+    print(f"结果已写入: {args.results_json}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,118 @@
+"""Umi-OCR 本地替身服务：在 Linux / CI 上代替 Umi-OCR.exe。
+
+用法：
+    # 常驻服务：把 config.json 的 umi_ocr.base_url 指向 http://127.0.0.1:1224
+    uv run python tools/umi_ocr_stub.py --port 1224 --fixtures data/output/ocr_corpus --latency normal:40:10
+
+    # 压测客户端：经 services/ocr.py 发送请求，对比客户端耗时与替身服务耗时
+    uv run python tools/umi_ocr_stub.py --load 500 --concurrency 4 --latency fixed:20 --max-concurrency 2
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT / "src"))
+
+from umi_stub import (  # noqa: E402
+    FixtureRecognizer,
+    LatencyModel,
+    UmiOcrStubServer,
+    constant_recognizer,
+)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Umi-OCR 本地替身服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=1224, help="监听端口（0 表示自动分配）")
+    parser.add_argument("--latency", default="fixed:0", help="延迟分布 kind:mean[:jitter]，如 normal:40:10")
+    parser.add_argument("--cold-ms", type=float, default=0.0, help="首个请求额外耗时（模拟冷启动）")
+    parser.add_argument("--seed", type=int, default=None, help="延迟采样随机种子")
+    parser.add_argument("--max-concurrency", type=int, default=1, help="同时处理的请求数上限，超出排队")
+    parser.add_argument("--fixtures", type=Path, default=None, help="已标注样本目录（与 bench_ocr 相同格式）")
+    parser.add_argument("--text", default="12345", help="未提供样本时固定返回的文本（空串表示无文字）")
+    parser.add_argument("--load", type=int, default=0, help="压测请求数；为 0 时仅常驻服务")
+    parser.add_argument("--concurrency", type=int, default=4, help="压测客户端并发线程数")
+    return parser.parse_args()
+
+
+def run_load(server: UmiOcrStubServer, total: int, concurrency: int, image_path: Path | None) -> None:
+    from PIL import Image  # type: ignore
+
+    from super_buyer.services.ocr import recognize_numbers
+
+    if image_path is not None:
+        img = Image.open(image_path).convert("RGB")
+    else:
+        img = Image.new("RGB", (120, 32), (255, 255, 255))
+    base_url = server.base_url
+    latencies: list[float] = []
+
+    def _one(_i: int) -> None:
+        t0 = time.perf_counter()
+        try:
+            recognize_numbers(img, base_url=base_url, timeout=10.0, balance=False)
+        finally:
+            latencies.append((time.perf_counter() - t0) * 1000.0)
+
+    server.reset_stats()
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as ex:
+        list(ex.map(_one, range(total)))
+    wall = max(1e-9, time.perf_counter() - t0)
+    stats = server.stats()
+    ordered = sorted(latencies)
+    avg = statistics.fmean(ordered)
+    service = float(stats["avg_service_ms"])
+    queue = float(stats["avg_queue_ms"])
+    print(f"请求数={total} 并发={concurrency} 吞吐={total / wall:.1f}/s")
+    print(
+        f"客户端 平均={avg:.2f}ms p50={ordered[len(ordered) // 2]:.2f}ms "
+        f"p95={ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]:.2f}ms"
+    )
+    print(f"替身服务 处理={service:.2f}ms 排队={queue:.2f}ms 并发峰值={stats['peak_concurrency']}")
+    print(f"客户端开销（平均耗时 - 服务处理 - 排队）≈ {avg - service - queue:.2f}ms")
+
+
+def main() -> int:
+    args = parse_args()
+    if args.fixtures is not None:
+        recognizer = FixtureRecognizer.from_corpus(args.fixtures)
+        print(f"已加载标注样本 {len(recognizer)} 张: {args.fixtures}")
+    else:
+        recognizer = constant_recognizer(args.text or None)
+    latency = LatencyModel.parse(args.latency, seed=args.seed)
+    latency.cold_ms = float(args.cold_ms)
+    server = UmiOcrStubServer(
+        recognizer,
+        latency=latency,
+        max_concurrency=args.max_concurrency,
+        host=args.host,
+        port=(0 if args.load > 0 else args.port),
+    )
+    with server:
+        if args.load > 0:
+            sample = None
+            if args.fixtures is not None:
+                sample = next((p for p in sorted(Path(args.fixtures).glob("*.png"))), None)
+            run_load(server, int(args.load), int(args.concurrency), sample)
+            return 0
+        print(f"Umi-OCR 替身服务已启动: {server.base_url}（Ctrl+C 退出）")
+        try:
+            while True:
+                time.sleep(1.0)
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
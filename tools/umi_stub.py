@@ -0,0 +1,387 @@
+"""
+Umi-OCR 本地替身服务（压测 / CI 用，不随应用打包）。
+
+由 `tools/umi_ocr_stub.py`、`tools/bench_ocr.py` 与测试导入（需把 tools/ 加入 sys.path）。
+
+在 Linux 上模拟 Umi-OCR 的 HTTP 接口，便于在没有 Umi-OCR.exe 的环境下
+压测 `services/ocr.py`、`MultiSnipeRunner.ocr_batch` 与各运行器，并单独度量客户端开销：
+- `POST /api/ocr`：与 Umi-OCR 相同的响应结构（`code` 100/101，`data` 文本块列表或文本）；
+- `GET /api/ocr/get_options`：返回简化的参数说明；
+- `GET /stub/stats`：替身自身的统计（请求数、排队/处理耗时、并发峰值）。
+
+识别结果由可替换的确定性识别器给出（固定文本 / 已标注样本匹配），
+延迟按配置的分布采样，并发上限通过信号量排队模拟 Umi-OCR 单引擎串行处理。
+"""
+
+from __future__ import annotations
+
+import base64
+import csv
+import hashlib
+import io
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    from PIL import Image  # type: ignore
+except Exception:
+    Image = None  # type: ignore
+
+# 识别器：输入原始图片字节，返回识别文本（None/空串表示无文字，对应 code 101）
+Recognizer = Callable[[bytes], Optional[str]]
+
+_IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".bmp"}
+_SIG_SIZE = (24, 8)
+
+
+@dataclass
+class LatencyModel:
+    """单次识别的模拟耗时分布（毫秒）。
+
+    kind: "fixed" | "uniform" | "normal" | "lognormal"
+    - fixed：恒为 mean_ms；
+    - uniform：mean_ms ± jitter_ms 均匀分布；
+    - normal：均值 mean_ms、标准差 jitter_ms；
+    - lognormal：中位数 mean_ms、对数标准差 jitter_ms / mean_ms（长尾）。
+    cold_ms 仅叠加在首个请求上，模拟引擎冷启动。
+    """
+
+    kind: str = "fixed"
+    mean_ms: float = 0.0
+    jitter_ms: float = 0.0
+    cold_ms: float = 0.0
+    seed: Optional[int] = None
+    _rng: random.Random = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self._rng = random.Random(self.seed)
+
+    @classmethod
+    def parse(cls, spec: str, *, seed: Optional[int] = None) -> "LatencyModel":
+        """解析 "kind:mean[:jitter]"，如 "normal:40:10"；纯数字视为 fixed。"""
+        parts = [p.strip() for p in str(spec or "").split(":") if p.strip()]
+        if not parts:
+            return cls(seed=seed)
+        if re.fullmatch(r"[\d.]+", parts[0]):
+            return cls(kind="fixed", mean_ms=float(parts[0]), seed=seed)
+        mean = float(parts[1]) if len(parts) > 1 else 0.0
+        jitter = float(parts[2]) if len(parts) > 2 else 0.0
+        return cls(kind=parts[0].lower(), mean_ms=mean, jitter_ms=jitter, seed=seed)
+
+    def sample_ms(self) -> float:
+        mean = max(0.0, float(self.mean_ms))
+        jitter = max(0.0, float(self.jitter_ms))
+        kind = str(self.kind or "fixed").lower()
+        if kind == "uniform":
+            val = self._rng.uniform(mean - jitter, mean + jitter)
+        elif kind == "normal":
+            val = self._rng.gauss(mean, jitter)
+        elif kind == "lognormal" and mean > 0:
+            val = self._rng.lognormvariate(0.0, jitter / mean) * mean
+        else:
+            val = mean
+        return max(0.0, val)
+
+
+def constant_recognizer(text: Optional[str]) -> Recognizer:
+    """总是返回同一段文本（None 表示始终无文字）。"""
+
+    def _recognize(_data: bytes) -> Optional[str]:
+        return text
+
+    return _recognize
+
+
+def read_corpus_labels(corpus: Path) -> Dict[str, int]:
+    """读取样本目录的标注：labels.json / labels.csv / 文件名前缀 `<数字>__`。"""
+    corpus = Path(corpus)
+    labels: Dict[str, int] = {}
+    json_path = corpus / "labels.json"
+    csv_path = corpus / "labels.csv"
+    if json_path.exists():
+        raw = json.loads(json_path.read_text(encoding="utf-8"))
+        for key, value in (raw or {}).items():
+            labels[str(key)] = int(value)
+    if csv_path.exists():
+        with csv_path.open("r", encoding="utf-8", newline="") as fh:
+            for row in csv.reader(fh):
+                if len(row) >= 2 and row[1].strip().isdigit():
+                    labels[row[0].strip()] = int(row[1].strip())
+    for path in corpus.iterdir():
+        if path.suffix.lower() not in _IMAGE_SUFFIXES or path.name in labels:
+            continue
+        m = re.match(r"^(\d+)__", path.name)
+        if m:
+            labels[path.name] = int(m.group(1))
+    return labels
+
+
+def _signature(data: bytes) -> Optional[int]:
+    """把图片缩放到固定网格并按均值二值化，得到对缩放/重编码/阈值化不敏感的位签名。"""
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as im:
+            small = im.convert("L").resize(_SIG_SIZE, Image.BILINEAR)
+            pixels = list(small.getdata())
+    except Exception:
+        return None
+    mean = sum(pixels) / float(len(pixels) or 1)
+    bits = 0
+    for p in pixels:
+        bits = (bits << 1) | (1 if p > mean else 0)
+    return bits
+
+
+class FixtureRecognizer:
+    """按已标注样本确定性识别。
+
+    先按图片字节 SHA-1 精确匹配；否则按位签名取汉明距离最近的样本
+    （同时比较反色签名，兼容 invert 前处理），距离超过 max_distance 视为无文字。
+    """
+
+    def __init__(self, fixtures: Dict[bytes, str], *, max_distance: Optional[int] = None) -> None:
+        self._exact: Dict[str, str] = {}
+        self._sigs: List[Tuple[int, str]] = []
+        for data, text in fixtures.items():
+            self._exact[hashlib.sha1(data).hexdigest()] = str(text)
+            sig = _signature(data)
+            if sig is not None:
+                self._sigs.append((sig, str(text)))
+        nbits = _SIG_SIZE[0] * _SIG_SIZE[1]
+        self.max_distance = int(max_distance if max_distance is not None else nbits // 5)
+        self._mask = (1 << nbits) - 1
+
+    @classmethod
+    def from_corpus(cls, corpus: Path, **kwargs: Any) -> "FixtureRecognizer":
+        fixtures: Dict[bytes, str] = {}
+        for name, label in read_corpus_labels(Path(corpus)).items():
+            path = Path(corpus) / name
+            if path.exists():
+                fixtures[path.read_bytes()] = str(label)
+        return cls(fixtures, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self._exact)
+
+    def __call__(self, data: bytes) -> Optional[str]:
+        hit = self._exact.get(hashlib.sha1(data).hexdigest())
+        if hit is not None:
+            return hit
+        sig = _signature(data)
+        if sig is None or not self._sigs:
+            return None
+        best: Optional[str] = None
+        best_dist = self.max_distance + 1
+        for ref, text in self._sigs:
+            dist = min(bin(sig ^ ref).count("1"), bin((sig ^ self._mask) ^ ref).count("1"))
+            if dist < best_dist:
+                best, best_dist = text, dist
+        return best
+
+
+def _image_size(data: bytes) -> Tuple[int, int]:
+    if Image is not None:
+        try:
+            with Image.open(io.BytesIO(data)) as im:
+                return int(im.width), int(im.height)
+        except Exception:
+            pass
+    return 100, 30
+
+
+class UmiOcrStubServer:
+    """Umi-OCR 替身 HTTP 服务（后台线程运行）。
+
+    port=0 时由系统分配端口，启动后通过 `base_url` 获取地址。
+    """
+
+    def __init__(
+        self,
+        recognizer: Optional[Recognizer] = None,
+        *,
+        latency: Optional[LatencyModel] = None,
+        max_concurrency: int = 1,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        self.recognizer: Recognizer = recognizer or constant_recognizer(None)
+        self.latency = latency or LatencyModel()
+        self.max_concurrency = max(1, int(max_concurrency))
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+        self._host = str(host)
+        self._port = int(port)
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self.reset_stats()
+
+    # ---------- 生命周期 ----------
+    @property
+    def base_url(self) -> str:
+        if self._httpd is None:
+            return f"http://{self._host}:{self._port}"
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "UmiOcrStubServer":
+        if self._httpd is not None:
+            return self
+        stub = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+                return
+
+            def do_GET(self) -> None:  # noqa: N802
+                if self.path.rstrip("/") == "/api/ocr/get_options":
+                    self._reply(200, stub.options_schema())
+                elif self.path.rstrip("/") == "/stub/stats":
+                    self._reply(200, stub.stats())
+                else:
+                    self._reply(404, {"code": 404, "data": f"未知路径: {self.path}"})
+
+            def do_POST(self) -> None:  # noqa: N802
+                length = int(self.headers.get("Content-Length", "0") or 0)
+                body = self.rfile.read(length) if length > 0 else b""
+                if self.path.rstrip("/") != "/api/ocr":
+                    self._reply(404, {"code": 404, "data": f"未知路径: {self.path}"})
+                    return
+                try:
+                    payload = json.loads(body.decode("utf-8") or "{}")
+                except Exception:
+                    self._reply(200, {"code": 800, "data": "请求不是合法的 JSON"})
+                    return
+                self._reply(200, stub.handle_ocr(payload))
+
+            def _reply(self, status: int, obj: Dict[str, Any]) -> None:
+                raw = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+        httpd = ThreadingHTTPServer((self._host, self._port), _Handler)
+        httpd.daemon_threads = True
+        self._httpd = httpd
+        self._thread = threading.Thread(target=httpd.serve_forever, name="UmiOcrStub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        httpd, self._httpd = self._httpd, None
+        if httpd is None:
+            return
+        try:
+            httpd.shutdown()
+            httpd.server_close()
+        except Exception:
+            pass
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    def __enter__(self) -> "UmiOcrStubServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    # ---------- 请求处理 ----------
+    def handle_ocr(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """处理一次 /api/ocr 请求（可脱离 HTTP 直接调用）。"""
+        t_arrive = time.perf_counter()
+        try:
+            data = base64.b64decode(str(payload.get("base64", "") or ""), validate=False)
+        except Exception:
+            data = b""
+        if not data:
+            return {"code": 800, "data": "缺少 base64 图片"}
+        options = payload.get("options") if isinstance(payload.get("options"), dict) else {}
+        with self._slots:
+            t_start = time.perf_counter()
+            with self._lock:
+                self._in_flight += 1
+                self._peak = max(self._peak, self._in_flight)
+                first = self._requests == 0
+                self._requests += 1
+                self._queue_ms += (t_start - t_arrive) * 1000.0
+            try:
+                delay_ms = self.latency.sample_ms() + (float(self.latency.cold_ms) if first else 0.0)
+                try:
+                    text = self.recognizer(data)
+                except Exception:
+                    text = None
+                remain = delay_ms / 1000.0 - (time.perf_counter() - t_start)
+                if remain > 0:
+                    time.sleep(remain)
+            finally:
+                elapsed = time.perf_counter() - t_start
+                with self._lock:
+                    self._in_flight -= 1
+                    self._busy_ms += elapsed * 1000.0
+        text = str(text or "").strip()
+        stamp = time.time()
+        if not text:
+            with self._lock:
+                self._empty += 1
+            return {"code": 101, "data": 'No text found in image. Path: "base64"', "time": elapsed, "timestamp": stamp}
+        if str((options or {}).get("data.format", "dict")) == "text":
+            return {"code": 100, "data": text, "time": elapsed, "timestamp": stamp}
+        w, h = _image_size(data)
+        box = [[1, 1], [max(2, w - 1), 1], [max(2, w - 1), max(2, h - 1)], [1, max(2, h - 1)]]
+        block = {"text": text, "score": 0.99, "box": box, "end": ""}
+        return {"code": 100, "data": [block], "time": elapsed, "timestamp": stamp}
+
+    @staticmethod
+    def options_schema() -> Dict[str, Any]:
+        return {
+            "ocr.language": {"title": "语言", "default": "models/config_chinese.txt"},
+            "ocr.cls": {"title": "纠正文本方向", "default": False},
+            "ocr.limit_side_len": {"title": "限制图像边长", "default": 960},
+            "tbpu.parser": {"title": "排版解析方案", "default": "multi_para"},
+            "data.format": {"title": "数据返回格式", "default": "dict"},
+        }
+
+    # ---------- 统计 ----------
+    def reset_stats(self) -> None:
+        with getattr(self, "_lock", threading.Lock()):
+            self._requests = 0
+            self._empty = 0
+            self._in_flight = 0
+            self._peak = 0
+            self._busy_ms = 0.0
+            self._queue_ms = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            n = self._requests
+            return {
+                "requests": n,
+                "empty": self._empty,
+                "in_flight": self._in_flight,
+                "peak_concurrency": self._peak,
+                "max_concurrency": self.max_concurrency,
+                "avg_service_ms": round(self._busy_ms / n, 3) if n else 0.0,
+                "avg_queue_ms": round(self._queue_ms / n, 3) if n else 0.0,
+            }
+
+
+__all__ = [
+    "FixtureRecognizer",
+    "LatencyModel",
+    "Recognizer",
+    "UmiOcrStubServer",
+    "constant_recognizer",
+    "read_corpus_labels",
+]